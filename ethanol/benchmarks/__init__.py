@@ -0,0 +1,13 @@
+"""
+This package contains microbenchmarks of the Ethanol controller.
+They don't need access points: run them from the pox directory, e.g.
+
+python -m pox.ethanol.benchmarks.bench_codecs
+
+suite.py runs all the end-to-end scenarios (with simulated agents, see pox.ethanol.simulator)
+and writes the results as JSON, to be compared with the results of another release:
+
+python -m pox.ethanol.benchmarks.suite run before.json
+python -m pox.ethanol.benchmarks.suite compare before.json after.json
+
+"""
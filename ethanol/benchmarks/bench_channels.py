@@ -0,0 +1,98 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+  cost of the channel assignment (see graph_coloring/engine.py) as the number of radios grows:
+  full plan (DSATUR + tabu search) and incremental recolor of the neighborhood of one radio
+
+  the APs are placed on a square grid (like the simulator, see simulator/fleet.py),
+  each AP has one 2.4 GHz radio and one 5 GHz radio and hears the APs up to IN_RANGE_DISTANCE cells away
+
+  usage: python -m pox.ethanol.benchmarks.bench_channels [seconds per test]
+
+@author: Henrique Duarte Moura
+@organization: WINET/DCC/UFMG
+@copyright: h3dema (c) 2017
+@contact: henriquemoura@hotmail.com
+@licence: GNU General Public License v2.0
+(https://www.gnu.org/licenses/old-licenses/gpl-2.0.html)
+@since: July 2015
+@status: in development
+"""
+import sys
+import math
+import time
+import random
+
+from pox.ethanol.graph_coloring.graph import ConflictGraph
+from pox.ethanol.graph_coloring.engine import ChannelAssignment
+from pox.ethanol.simulator.fleet import IN_RANGE_DISTANCE, REFERENCE_SIGNAL
+
+FLEET_SIZES = [100, 1000, 2500]
+""" number of APs tested (2 radios per AP) """
+
+CHANNELS_24GHZ = range(1, 12)
+
+CHANNELS_5GHZ = [36, 40, 44, 48]
+
+
+def build_graph(num_aps, seed=1):
+    """ @return: ConflictGraph of num_aps APs on a grid, all radios of a band in the same channel """
+    rnd = random.Random(seed)
+    graph = ConflictGraph()
+    bands = [('phy0', CHANNELS_24GHZ, 6), ('phy1', CHANNELS_5GHZ, 36)]
+    for n in xrange(num_aps):
+        for wiphy, channels, current in bands:
+            graph.add_radio((n, wiphy), channels, current, load=rnd.random())
+    side = int(math.ceil(math.sqrt(num_aps)))
+    r = int(IN_RANGE_DISTANCE)
+    for n in xrange(num_aps):
+        x, y = n % side, n // side
+        heard = {}
+        for dx in range(-r, r + 1):
+            for dy in range(-r, r + 1):
+                d = math.hypot(dx, dy)
+                m = (y + dy) * side + x + dx
+                if 0 < d <= IN_RANGE_DISTANCE and 0 <= x + dx < side and 0 <= m < num_aps:
+                    heard[m] = REFERENCE_SIGNAL - 35 * math.log10(d) + rnd.uniform(-3, 3)
+        for wiphy, channels, current in bands:
+            graph.set_scan((n, wiphy), dict(((m, wiphy), s) for m, s in heard.items()))
+    return graph
+
+
+def cost(func, duration):
+    """ @return: milliseconds per call of func() """
+    n = 0
+    t0 = time.time()
+    elapsed = 0
+    while elapsed < duration or n == 0:
+        func()
+        n += 1
+        elapsed = time.time() - t0
+    return 1e3 * elapsed / n
+
+
+def run(duration=1.0):
+    """ prints the cost (ms) of a full plan and of an incremental recolor for each size in FLEET_SIZES
+        @param duration: seconds of each test
+    """
+    print "%6s %6s %6s %12s %12s %12s %12s" % ('APs', 'radios', 'edges', 'before', 'after',
+                                               'plan ms', 'recolor ms')
+    rnd = random.Random(1)
+    for num_aps in FLEET_SIZES:
+        graph = build_graph(num_aps)
+        engine = ChannelAssignment(graph, apply=lambda radio, channel: True, seed=1)
+        before = engine.stats()
+        radios = [rnd.choice(graph.radios) for _ in xrange(100)]
+        plan = cost(lambda: engine.assign(apply=False), duration)
+        engine.assign()
+        recolor = cost(lambda: engine.recolor([rnd.choice(radios)], apply=False), duration)
+        after = engine.stats()
+        engine.stop()
+        print "%6d %6d %6d %12.1f %12.1f %12.2f %12.2f" % (num_aps, before['radios'], before['edges'],
+                                                           before['interference'], after['interference'],
+                                                           plan, recolor)
+
+
+if __name__ == "__main__":
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 1.0
+    run(duration)
@@ -0,0 +1,76 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+  messages/second of the construct Structs vs. the compiled codecs (see ssl_message/msg_codec.py)
+
+  usage: python -m pox.ethanol.benchmarks.bench_codecs [seconds per test] [number of items in the arrays]
+
+@author: Henrique Duarte Moura
+@organization: WINET/DCC/UFMG
+@copyright: h3dema (c) 2017
+@contact: henriquemoura@hotmail.com
+@licence: GNU General Public License v2.0
+(https://www.gnu.org/licenses/old-licenses/gpl-2.0.html)
+@since: July 2015
+@status: in development
+
+@requires: construct 2.5.2
+"""
+import sys
+import time
+
+from pox.ethanol.ssl_message.msg_codec import get_codec, make_sample
+from pox.ethanol.ssl_message.msg_core import msg_default
+from pox.ethanol.ssl_message.msg_ping import msg_ping
+from pox.ethanol.ssl_message.msg_snr_power import msg_snr_power
+from pox.ethanol.ssl_message.msg_sta_statistics import msg_sta_statistics
+from pox.ethanol.ssl_message.msg_mean_sta_stats import msg_mean_statistics
+from pox.ethanol.ssl_message.msg_channelinfo import msg_channelinfo
+from pox.ethanol.ssl_message.msg_ap_in_range import msg_ap_in_range
+
+MESSAGES = [msg_default, msg_ping, msg_snr_power,
+            msg_sta_statistics, msg_mean_statistics, msg_channelinfo, msg_ap_in_range]
+""" message types tested """
+
+
+def rate(func, arg, duration):
+    """ @return: number of calls of func(arg) per second """
+    n = 0
+    t0 = time.time()
+    elapsed = 0
+    while elapsed < duration:
+        for _ in xrange(10):
+            func(arg)
+        n += 10
+        elapsed = time.time() - t0
+    return n / elapsed
+
+
+def run(duration=1.0, num_items=20):
+    """ prints the messages/second of parse and build for each message in MESSAGES
+        @param duration: seconds of each test
+        @param num_items: number of items of the arrays (e.g. stations in msg_sta_statistics)
+    """
+    print "%-22s %6s %12s %12s %7s %12s %12s %7s" % ('message', 'bytes',
+                                                     'parse/s', 'compiled', 'x',
+                                                     'build/s', 'compiled', 'x')
+    for struct in MESSAGES:
+        codec = get_codec(struct)
+        obj = make_sample(struct, seed=1, max_items=num_items)
+        data = struct.build(obj)
+        if codec is None:
+            print "%-22s not compiled" % struct.name
+            continue
+        p0 = rate(struct.parse, data, duration)
+        p1 = rate(codec.parse, data, duration)
+        b0 = rate(struct.build, obj, duration)
+        b1 = rate(codec.build, obj, duration)
+        print "%-22s %6d %12.0f %12.0f %7.1f %12.0f %12.0f %7.1f" % (struct.name, len(data),
+                                                                     p0, p1, p1 / p0,
+                                                                     b0, b1, b1 / b0)
+
+
+if __name__ == "__main__":
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 1.0
+    num_items = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    run(duration, num_items)
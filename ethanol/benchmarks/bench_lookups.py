@@ -0,0 +1,130 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+  cost of finding a VAP (by BSSID) and a station (by MAC address) as the number of APs grows:
+  hash indexes (see ethanol/index.py) vs. the linear scan over all APs and VAPs
+
+  usage: python -m pox.ethanol.benchmarks.bench_lookups [seconds per test] [stations per AP]
+
+@author: Henrique Duarte Moura
+@organization: WINET/DCC/UFMG
+@copyright: h3dema (c) 2017
+@contact: henriquemoura@hotmail.com
+@licence: GNU General Public License v2.0
+(https://www.gnu.org/licenses/old-licenses/gpl-2.0.html)
+@since: July 2015
+@status: in development
+"""
+import sys
+import time
+import random
+
+from pox.ethanol.ethanol.index import mac_key
+from pox.ethanol.ethanol.registry import Registry
+
+FLEET_SIZES = [10, 100, 1000]
+""" number of APs tested """
+
+VAPS_PER_AP = 2
+""" number of VAPs (SSIDs) of each AP """
+
+
+class _Device(object):
+    """ stands for a VAP or a Station: only the MAC address is used by the lookups """
+
+    def __init__(self, mac_address):
+        self.mac_address = mac_address
+
+
+class _AP(object):
+    """ stands for an AP: list of VAPs, each VAP with a list of stations """
+
+    def __init__(self, vaps):
+        self.vaps = vaps
+
+
+def _mac(n):
+    """ @return: the n-th MAC address """
+    return ':'.join(['%02x' % ((n >> s) & 0xff) for s in (40, 32, 24, 16, 8, 0)])
+
+
+def build_fleet(num_aps, stations_per_ap):
+    """ @return: list of _AP and the indexes BSSID --> VAP and MAC --> station """
+    vaps_by_bssid = Registry('vap', key=mac_key)
+    stations_by_mac = Registry('station', key=mac_key)
+    aps = []
+    n = 0
+    for _ in xrange(num_aps):
+        vaps = []
+        for _ in xrange(VAPS_PER_AP):
+            vap = _Device(_mac(n))
+            vap.stations = []
+            vaps_by_bssid.add(vap.mac_address, vap)
+            vaps.append(vap)
+            n += 1
+        for i in xrange(stations_per_ap):
+            sta = _Device(_mac(n))
+            vaps[i % VAPS_PER_AP].stations.append(sta)
+            stations_by_mac.add(sta.mac_address, sta)
+            n += 1
+        aps.append(_AP(vaps))
+    return aps, vaps_by_bssid, stations_by_mac
+
+
+def linear_vap(aps, mac_address):
+    """ lookup used before the indexes: walks every AP and every VAP """
+    for ap in aps:
+        fvap = [vp for vp in ap.vaps if vp.mac_address == mac_address]
+        if len(fvap) > 0:
+            return fvap[0]
+    return None
+
+
+def linear_station(aps, mac_address):
+    """ walks every station of every VAP """
+    for ap in aps:
+        for vap in ap.vaps:
+            for sta in vap.stations:
+                if sta.mac_address == mac_address:
+                    return sta
+    return None
+
+
+def cost(func, keys, duration):
+    """ @return: microseconds per call of func(key), keys are used in turn """
+    n = 0
+    t0 = time.time()
+    elapsed = 0
+    while elapsed < duration:
+        for k in keys:
+            func(k)
+        n += len(keys)
+        elapsed = time.time() - t0
+    return 1e6 * elapsed / n
+
+
+def run(duration=1.0, stations_per_ap=20):
+    """ prints the cost (us/lookup) of each method for each size in FLEET_SIZES
+        @param duration: seconds of each test
+        @param stations_per_ap: number of stations connected to each AP
+    """
+    print "%6s %6s %8s %12s %12s %12s %12s" % ('APs', 'VAPs', 'stations',
+                                               'vap index', 'vap scan',
+                                               'sta index', 'sta scan')
+    rnd = random.Random(1)
+    for num_aps in FLEET_SIZES:
+        aps, vaps_by_bssid, stations_by_mac = build_fleet(num_aps, stations_per_ap)
+        bssids = [rnd.choice(rnd.choice(aps).vaps).mac_address for _ in xrange(100)]
+        stas = [sta.mac_address for sta in rnd.sample(stations_by_mac.values(), 100)]
+        vi = cost(vaps_by_bssid.get, bssids, duration)
+        vs = cost(lambda m: linear_vap(aps, m), bssids, duration)
+        si = cost(stations_by_mac.get, stas, duration)
+        ss = cost(lambda m: linear_station(aps, m), stas, duration)
+        print "%6d %6d %8d %12.2f %12.2f %12.2f %12.2f" % (num_aps, len(vaps_by_bssid), len(stations_by_mac),
+                                                           vi, vs, si, ss)
+
+
+if __name__ == "__main__":
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 1.0
+    stations_per_ap = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    run(duration, stations_per_ap)
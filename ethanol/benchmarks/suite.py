@@ -0,0 +1,402 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+  end-to-end benchmarks of the controller. The results are written as JSON (with percentiles),
+  so the results of two releases can be compared:
+
+  * codecs: build/parse rate of each message struct of ssl_message
+  * round_trip: latency of send_and_receive_msg() to a simulated AP, over loopback TLS
+  * server: accept/dispatch throughput of msg_server under concurrent hellos and association messages
+  * onboarding: time to onboard N simulated APs (hello --> AP ready)
+  * lookups: cost of the registry lookups (VAP by BSSID, station by MAC) with 10/100/1000 APs
+  * channels: channel assignment of 100/1000 APs (2 radios each): full plan and incremental recolor
+  * admission: association messages decided by the admission control with 100/1000 VAPs
+
+  The scenarios use fixed seeds and sizes, so two runs in the same machine are comparable.
+
+  usage: python -m pox.ethanol.benchmarks.suite run [output.json] [scenario ...]
+         python -m pox.ethanol.benchmarks.suite compare old.json new.json [tolerance %]
+
+  compare prints the metrics of new.json that are worse than old.json by more than tolerance
+  (default 10%) and exits with status 1 if there is any.
+
+@author: Henrique Duarte Moura
+@organization: WINET/DCC/UFMG
+@copyright: h3dema (c) 2017
+@contact: henriquemoura@hotmail.com
+@licence: GNU General Public License v2.0
+(https://www.gnu.org/licenses/old-licenses/gpl-2.0.html)
+@since: July 2015
+@status: in development
+
+@requires: construct 2.5.2
+"""
+import os
+import sys
+import json
+import time
+import random
+import itertools
+import platform
+import importlib
+from threading import Thread
+
+from construct import Struct
+
+from pox.ethanol.ssl_message.msg_common import VERSION, MSG_TYPE
+from pox.ethanol.ssl_message.msg_codec import get_codec, make_sample, fast
+from pox.ethanol.ssl_message.latency import LatencyHistogram, monotonic
+from pox.ethanol.ssl_message.msg_server import SSL_CERTIFICATE
+
+SCENARIOS = ['codecs', 'round_trip', 'server', 'onboarding', 'lookups', 'channels', 'admission']
+""" all scenarios, in the order they are executed """
+
+DURATION = 1.0
+""" seconds of each measurement"""
+
+CONTROLLER = ('127.0.0.1', 22250)
+""" address of the controller started by the benchmarks (not the default port, so it does not clash with a running controller)"""
+
+ONBOARDING_SIZES = [10, 100]
+""" number of APs onboarded"""
+
+LOOKUP_SIZES = [10, 100, 1000]
+""" number of APs in the registries"""
+
+CHANNEL_SIZES = [100, 1000]
+""" number of APs of the channel assignment (see bench_channels.py)"""
+
+ADMISSION_SIZES = [100, 1000]
+""" number of VAPs of the admission control"""
+
+SERVER_CLIENTS = 32
+""" concurrent clients of the server scenario"""
+
+ASSOCIATIONS_PER_HELLO = 10
+""" association messages sent by a client of the server scenario after each hello (in the same connection)"""
+
+TOLERANCE = 10.0
+""" default tolerance (%) of compare()"""
+
+
+def measure(func, arg, duration, batch=10):
+    """ calls func(arg) for duration seconds
+        @return: dictionary with the calls per second and the percentiles of the latency of one call
+                 (the time of each batch of calls divided by batch)
+    """
+    hist = LatencyHistogram()
+    n = 0
+    t0 = monotonic()
+    elapsed = 0
+    while elapsed < duration:
+        t1 = monotonic()
+        for _ in xrange(batch):
+            func(arg)
+        t2 = monotonic()
+        hist.record((t2 - t1) / batch)
+        n += batch
+        elapsed = t2 - t0
+    return {'per_second': n / elapsed, 'latency': hist.as_dict()}
+
+
+def message_structs():
+    """ @return: list of the message structs (msg_*) defined in the modules of ssl_message """
+    import pox.ethanol.ssl_message as pkg
+    path = os.path.dirname(os.path.abspath(pkg.__file__))
+    structs = {}
+    for fname in sorted(os.listdir(path)):
+        if not (fname.startswith('msg_') and fname.endswith('.py')):
+            continue
+        module = importlib.import_module('pox.ethanol.ssl_message.%s' % fname[:-3])
+        for name, obj in vars(module).items():
+            if isinstance(obj, Struct) and name.startswith('msg_') and obj.name not in structs:
+                structs[obj.name] = obj
+    return [structs[k] for k in sorted(structs)]
+
+
+def bench_codecs(duration=DURATION, num_items=20):
+    """ build and parse of each message struct, with the codec used by send_and_receive_msg (see msg_codec.fast) """
+    results = {}
+    for struct in message_structs():
+        try:
+            obj = make_sample(struct, seed=1, max_items=num_items)
+            data = struct.build(obj)
+        except Exception as e:
+            results[struct.name] = {'error': str(e)}
+            continue
+        results[struct.name] = {'bytes': len(data),
+                                'compiled': get_codec(struct) is not None,
+                                'parse': measure(fast(struct.parse), data, duration),
+                                'build': measure(fast(struct.build), obj, duration),
+                                }
+    return results
+
+
+def bench_round_trip(duration=DURATION, certfile=SSL_CERTIFICATE):
+    """ request --> reply of a simulated AP (no latency added), using the connection pool """
+    from pox.ethanol.simulator.fleet import Fleet
+    from pox.ethanol.ssl_message.msg_ping import send_msg_ping
+    from pox.ethanol.ssl_message.msg_snr_power import get_snr
+    from pox.ethanol.ssl_message.msg_radio_wlans import get_radio_wlans
+    from pox.ethanol.ssl_message.msg_sta_statistics import get_sta_statistics
+    from pox.ethanol.ssl_message.msg_pool import connection_pool
+    fleet = Fleet(CONTROLLER, num_aps=1, stations_per_ap=20, certfile=certfile)
+    fleet.start(hello=False)
+    server = fleet.aps[0].server
+    requests = [('ping', lambda s: send_msg_ping(s)),
+                ('get_snr', lambda s: get_snr(s, intf_name='wlan0')),
+                ('get_radio_wlans', lambda s: get_radio_wlans(s)),
+                ('get_sta_statistics', lambda s: get_sta_statistics(s, intf_name='wlan0')),
+                ]
+    results = {}
+    try:
+        for name, func in requests:
+            func(server)  # the handshake is not measured
+            results[name] = measure(func, server, duration, batch=1)
+    finally:
+        fleet.stop(bye=False)
+    results['pool'] = connection_pool.stats()
+    return results
+
+
+def bench_server(duration=DURATION, certfile=SSL_CERTIFICATE, clients=SERVER_CLIENTS):
+    """ clients connect to the controller, send a hello and ASSOCIATIONS_PER_HELLO association messages,
+        and disconnect, until duration is over
+    """
+    from pox.ethanol.ssl_message.msg_server import SslServer, process_msg
+    from pox.ethanol.simulator.fleet import ControllerLink, loopback_address, build_association, default_fields
+    from pox.ethanol.ssl_message.msg_hello import msg_hello
+    from construct import Container
+
+    server = SslServer(certfile, process_msg)
+    server.add_listener(CONTROLLER)
+    t = Thread(target=server.serve_forever)
+    t.daemon = True
+    t.start()
+
+    # device_type 0: the controller does not start the onboarding of the client
+    hello = msg_hello.build(Container(device_type=0, tcp_port=0, rtt=0, **default_fields(MSG_TYPE.MSG_HELLO_TYPE)))
+    hello_latency = LatencyHistogram('hello')
+    association_latency = LatencyHistogram('association')
+    counters = [0] * clients
+    deadline = monotonic() + duration
+
+    def client(n):
+        rnd = random.Random(n)
+        link = ControllerLink(CONTROLLER, loopback_address(3, n))
+        while monotonic() < deadline:
+            t0 = monotonic()
+            if link.request(hello) is None:
+                break
+            hello_latency.record(monotonic() - t0)
+            for _ in xrange(ASSOCIATIONS_PER_HELLO):
+                msg = build_association(MSG_TYPE.MSG_USER_CONNECTING,
+                                        '02:ff:00:00:00:%02x' % rnd.randint(0, 255),
+                                        '02:fe:00:00:%02x:%02x' % (n, rnd.randint(0, 255)))
+                t0 = monotonic()
+                if link.request(msg) is None:
+                    break
+                association_latency.record(monotonic() - t0)
+            counters[n] += 1 + ASSOCIATIONS_PER_HELLO
+            link.close()  # the next hello is a new connection
+
+    t0 = monotonic()
+    threads = [Thread(target=client, args=(n,)) for n in range(clients)]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    elapsed = monotonic() - t0
+    stats = server.stats()
+    server.stop()
+    t.join()
+    return {'clients': clients,
+            'messages_per_second': sum(counters) / elapsed,
+            'connections_per_second': stats['handshakes'] / elapsed,
+            'hello_latency': hello_latency.as_dict(),
+            'association_latency': association_latency.as_dict(),
+            'server': stats,
+            }
+
+
+def bench_onboarding(sizes=ONBOARDING_SIZES, certfile=SSL_CERTIFICATE, timeout=120.0):
+    """ time between the first hello and the moment all the simulated APs are in connected_aps() """
+    from pox.ethanol.ssl_message.msg_server import SslServer, process_msg
+    from pox.ethanol.simulator.fleet import Fleet
+    from pox.ethanol.ethanol.ap import connected_aps, remove_ap_byIP
+    from pox.ethanol.ethanol.onboarding import onboarding
+
+    server = SslServer(certfile, process_msg)
+    server.add_listener(CONTROLLER)
+    t = Thread(target=server.serve_forever)
+    t.daemon = True
+    t.start()
+    results = {}
+    try:
+        for num_aps in sizes:
+            onboarding.latency.reset()
+            onboarding.discovery_latency.reset()
+            fleet = Fleet(CONTROLLER, num_aps=num_aps, certfile=certfile)
+            ips = set(ap.ip for ap in fleet.aps)
+            t0 = monotonic()
+            fleet.start()
+            hellos = monotonic() - t0
+            while monotonic() - t0 < timeout:
+                if len(ips.intersection(connected_aps().keys())) == num_aps:
+                    break
+                time.sleep(0.01)
+            elapsed = monotonic() - t0
+            ready = len(ips.intersection(connected_aps().keys()))
+            fleet.stop(bye=False)
+            for ip in ips:
+                remove_ap_byIP(ip)
+            results[str(num_aps)] = {'ready': ready,
+                                     'seconds': elapsed,
+                                     'hellos_seconds': hellos,
+                                     'aps_per_second': ready / elapsed,
+                                     'latency': onboarding.latency.as_dict(),
+                                     'discovery_latency': onboarding.discovery_latency.as_dict(),
+                                     }
+    finally:
+        server.stop()
+        t.join()
+    return results
+
+
+def bench_lookups(sizes=LOOKUP_SIZES, duration=DURATION, stations_per_ap=20):
+    """ registry lookups vs. the linear scan (see bench_lookups.py) """
+    from pox.ethanol.benchmarks.bench_lookups import build_fleet, linear_vap, linear_station
+    rnd = random.Random(1)
+    results = {}
+    for num_aps in sizes:
+        aps, vaps_by_bssid, stations_by_mac = build_fleet(num_aps, stations_per_ap)
+        bssid = rnd.choice(rnd.choice(aps).vaps).mac_address
+        sta = rnd.choice(stations_by_mac.values()).mac_address
+        results[str(num_aps)] = {'vap_index': measure(vaps_by_bssid.get, bssid, duration),
+                                 'vap_scan': measure(lambda m: linear_vap(aps, m), bssid, duration),
+                                 'station_index': measure(stations_by_mac.get, sta, duration),
+                                 'station_scan': measure(lambda m: linear_station(aps, m), sta, duration),
+                                 }
+    return results
+
+
+def bench_channels(sizes=CHANNEL_SIZES, duration=DURATION):
+    """ full plan and incremental recolor of the channel assignment engine (see bench_channels.py) """
+    from pox.ethanol.benchmarks.bench_channels import build_graph
+    from pox.ethanol.graph_coloring.engine import ChannelAssignment
+    rnd = random.Random(1)
+    results = {}
+    for num_aps in sizes:
+        engine = ChannelAssignment(build_graph(num_aps), apply=lambda radio, channel: True, seed=1)
+        plan = measure(lambda apply: engine.assign(apply), False, duration, batch=1)
+        engine.assign()
+        radios = engine.graph.radios
+        recolor = measure(lambda apply: engine.recolor([rnd.choice(radios)], apply), False, duration, batch=1)
+        engine.stop()
+        results[str(num_aps)] = {'plan': plan, 'recolor': recolor}
+    return results
+
+
+def bench_admission(sizes=ADMISSION_SIZES, duration=DURATION, stations=5000):
+    """ decisions of the admission control and process_association() (parse + decision + reply) """
+    from pox.ethanol.ethanol.admission import admission
+    from pox.ethanol.ssl_message.msg_association import process_association
+    from pox.ethanol.simulator.fleet import build_association
+    rnd = random.Random(1)
+    macs = ['02:00:00:00:%02x:%02x' % (i // 256, i % 256) for i in range(stations)]
+    results = {}
+    for num_vaps in sizes:
+        bssids = ['06:00:00:00:%02x:%02x' % (i // 256, i % 256) for i in range(num_vaps)]
+        for bssid in bssids:
+            admission.add_vap(bssid, ssid='bench')
+            admission.configure(bssid, soft_limit=stations // num_vaps)
+        msgs = [build_association(rnd.choice([MSG_TYPE.MSG_ASSOCIATION, MSG_TYPE.MSG_DISASSOCIATION]),
+                                  rnd.choice(bssids), rnd.choice(macs)) for _ in range(1000)]
+        it = itertools.cycle(msgs)
+        admission.latency.reset()
+        results[str(num_vaps)] = {'process_association': measure(lambda _: process_association(next(it), None),
+                                                                 None, duration),
+                                  'decision': admission.latency.as_dict(),
+                                  }
+        for bssid in bssids:
+            admission.remove_vap(bssid)
+    return results
+
+
+def run(scenarios=SCENARIOS, certfile=SSL_CERTIFICATE, duration=DURATION):
+    """ @param scenarios: names of the scenarios (see SCENARIOS)
+        @param duration: seconds of each measurement
+        @return: dictionary with the environment, the results of each scenario and the time spent in each one
+    """
+    functions = {'codecs': lambda: bench_codecs(duration),
+                 'round_trip': lambda: bench_round_trip(duration, certfile),
+                 'server': lambda: bench_server(duration, certfile),
+                 'onboarding': lambda: bench_onboarding(certfile=certfile),
+                 'lookups': lambda: bench_lookups(duration=duration),
+                 'channels': lambda: bench_channels(duration=duration),
+                 'admission': lambda: bench_admission(duration=duration),
+                 }
+    report = {'version': VERSION,
+              'python': platform.python_version(),
+              'machine': platform.machine(),
+              'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+              'duration': duration,
+              'results': {},
+              'elapsed': {},
+              }
+    for name in scenarios:
+        t0 = monotonic()
+        report['results'][name] = functions[name]()
+        report['elapsed'][name] = monotonic() - t0
+    return report
+
+
+def _flatten(d, prefix=''):
+    """ @return: dictionary path ('a.b.c') --> number """
+    values = {}
+    for k, v in d.items():
+        path = '%s.%s' % (prefix, k) if prefix else str(k)
+        if isinstance(v, dict):
+            values.update(_flatten(v, path))
+        elif isinstance(v, (int, long, float)) and not isinstance(v, bool):
+            values[path] = v
+    return values
+
+
+def compare(old, new, tolerance=TOLERANCE):
+    """ compares the percentiles (lower is better) and the rates (higher is better) of two reports
+        @return: list of (metric, old value, new value, change in %) that got worse than tolerance
+    """
+    old_values = _flatten(old['results'])
+    regressions = []
+    for path, v in sorted(_flatten(new['results']).items()):
+        metric = path.rsplit('.', 1)[-1]
+        if path not in old_values or old_values[path] == 0:
+            continue
+        change = 100.0 * (v - old_values[path]) / old_values[path]
+        if metric in ('p50', 'p90', 'p99') and change > tolerance:
+            regressions.append((path, old_values[path], v, change))
+        elif metric.endswith('per_second') and -change > tolerance:
+            regressions.append((path, old_values[path], v, change))
+    return regressions
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 3 and sys.argv[1] == 'compare':
+        tolerance = float(sys.argv[4]) if len(sys.argv) > 4 else TOLERANCE
+        with open(sys.argv[2]) as f:
+            old = json.load(f)
+        with open(sys.argv[3]) as f:
+            new = json.load(f)
+        regressions = compare(old, new, tolerance)
+        for path, a, b, change in regressions:
+            print "%-70s %14.6g %14.6g %+8.1f%%" % (path, a, b, change)
+        sys.exit(1 if regressions else 0)
+    output = sys.argv[2] if len(sys.argv) > 2 and sys.argv[1] == 'run' else None
+    scenarios = sys.argv[3:] if len(sys.argv) > 3 else SCENARIOS
+    report = run(scenarios)
+    if output is None or output == '-':
+        print json.dumps(report, indent=2, sort_keys=True)
+    else:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
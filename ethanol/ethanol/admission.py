@@ -0,0 +1,520 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# ##################################
+#
+# Copyright 2015 Henrique Moura
+#
+# This file is part of Ethanol.
+#
+# ##################################
+#
+"""
+This module implements the admission control of the stations (see msg_association.process_association).
+
+The AP waits for the reply of the association messages before it answers the station, so the decision
+is taken in the thread of the SslServer from state that is kept up to date (precomputed) for each VAP:
+the stations associated to the VAP, its load, its limits and a blacklist. The MAC addresses of the stations
+are mapped to small integers (station ids), so the blacklists are bitsets (a python long per VAP).
+The id of a station is freed (and reused, smallest first) when the station leaves and is not blocked.
+
+An association (authorization, reassociation) is denied if:
+  - the station is in the global blacklist or in the blacklist of the VAP;
+  - the VAP has max_stations stations;
+  - load balancing: the VAP is overloaded (soft_limit stations or load >= max_load) and there is
+    another VAP with the same SSID that is not. The station is denied at most MAX_DENIALS times in a row
+    (it may not hear the other VAPs).
+
+If a subclass of VAP overrides evUserAssociating (and the other evUser* methods), the method is called after
+the decision, and its result is used if it returns in ADMISSION_DEADLINE seconds.
+Otherwise the precomputed decision is used (the safe default).
+
+  >>> from pox.ethanol.ethanol.admission import admission
+  >>> admission.configure(bssid, max_stations=32, soft_limit=20, max_load=0.8)
+  >>> admission.block(mac_sta)       # all VAPs
+  >>> admission.stats()              # counters and percentiles of the decision latency
+
+@author: Henrique Duarte Moura
+@organization: WINET/DCC/UFMG
+@copyright: h3dema (c) 2017
+@contact: henriquemoura@hotmail.com
+@licence: GNU General Public License v2.0
+(https://www.gnu.org/licenses/old-licenses/gpl-2.0.html)
+@since: July 2015
+@status: in development
+"""
+from heapq import heappush, heappop
+from threading import Lock
+
+from pox.ethanol.ssl_message.msg_common import MSG_TYPE
+from pox.ethanol.ssl_message.msg_log import log
+from pox.ethanol.ssl_message.latency import monotonic, LatencyHistogram
+from pox.ethanol.ethanol.index import mac_key
+
+ADMISSION_DEADLINE = 0.005
+""" seconds the evUser* methods of the VAP have to decide (None = no limit)"""
+
+ADMISSION_WORKERS = 16
+""" threads that run the evUser* methods (so the deadline can be enforced)"""
+
+MAX_STATIONS = 0
+""" default maximum number of stations per VAP (0 = no limit)"""
+
+SOFT_LIMIT = 0
+""" default number of stations above which the VAP is overloaded (0 = no limit)"""
+
+MAX_LOAD = 1.0
+""" default load (fraction of the time the channel is busy) above which the VAP is overloaded"""
+
+MAX_DENIALS = 3
+""" number of times in a row a station is denied by the load balancing before it is admitted"""
+
+ADMISSION_TYPES = (MSG_TYPE.MSG_ASSOCIATION, MSG_TYPE.MSG_REASSOCIATION, MSG_TYPE.MSG_AUTHORIZATION)
+""" messages that are decided by the admission control (the others are always allowed)"""
+
+RESPONSE_TYPES = ADMISSION_TYPES + (MSG_TYPE.MSG_DISASSOCIATION,)
+""" messages whose reply carries response = 1 when they are allowed by a known VAP"""
+
+HOOKS = {MSG_TYPE.MSG_ASSOCIATION: 'evUserAssociating',
+         MSG_TYPE.MSG_DISASSOCIATION: 'evUserDisassociating',
+         MSG_TYPE.MSG_REASSOCIATION: 'evUserReassociating',
+         MSG_TYPE.MSG_AUTHORIZATION: 'evUserAuthenticating',
+         MSG_TYPE.MSG_USER_DISCONNECTING: 'evUserDisconnecting',
+         MSG_TYPE.MSG_USER_CONNECTING: 'evUserConnecting',
+         }
+""" message type --> method of the VAP called for the message"""
+
+
+class _Group(object):
+    """ VAPs with the same SSID """
+    __slots__ = ['ssid', 'vaps', 'spare']
+
+    def __init__(self, ssid):
+        self.ssid = ssid
+        self.vaps = 0
+        self.spare = 0  # number of VAPs that are not overloaded
+
+
+class VapState(object):
+    """ precomputed state of a VAP used by the decisions """
+    __slots__ = ['bssid', 'group', 'stations', 'max_stations', 'soft_limit', 'load', 'max_load',
+                 'blacklist', 'hooks', 'overloaded']
+
+    def __init__(self, bssid, group, hooks):
+        self.bssid = bssid
+        self.group = group
+        self.stations = set()  # station ids
+        self.max_stations = MAX_STATIONS
+        self.soft_limit = SOFT_LIMIT
+        self.load = 0.0
+        self.max_load = MAX_LOAD
+        self.blacklist = 0  # bitset of station ids
+        self.hooks = hooks  # message type --> bound method of the VAP (only the overridden methods)
+        self.overloaded = False
+
+    def is_overloaded(self):
+        return (0 < self.soft_limit <= len(self.stations)) or self.load >= self.max_load
+
+
+def _hooks(vap):
+    """ @return: dictionary message type --> method of vap, for the evUser* methods that its class overrides """
+    from pox.ethanol.ethanol.vap import VAP
+    hooks = {}
+    for m_type, name in HOOKS.items():
+        method = getattr(vap, name, None)
+        if method is None:
+            continue
+        if isinstance(vap, VAP) and getattr(type(vap), name).im_func is getattr(VAP, name).im_func:
+            continue  # the default method always returns True
+        hooks[m_type] = method
+    return hooks
+
+
+class AdmissionControl(object):
+    """ decides the association messages from the precomputed state of the VAPs
+    """
+
+    def __init__(self, deadline=ADMISSION_DEADLINE, num_workers=ADMISSION_WORKERS):
+        """
+          @param deadline: seconds the evUser* methods have to decide (None = no limit)
+          @param num_workers: threads used to call the evUser* methods
+        """
+        self.deadline = deadline
+        self.num_workers = num_workers
+        self.__lock = Lock()
+        self.__executor = None
+        self.__vaps = {}  # bssid --> VapState
+        self.__groups = {}  # ssid --> _Group
+        self.__ids = {}  # MAC address of the station --> station id
+        self.__macs = {}  # station id --> MAC address of the station
+        self.__free = []  # heap of the station ids released (see __release)
+        self.__blocked = {}  # station id --> number of blacklists with the station
+        self.__where = {}  # station id --> VapState of the VAP where the station is
+        self.__denials = {}  # station id --> number of denials (load balancing) in a row
+        self.__blacklist = 0  # bitset of the station ids blocked in all VAPs
+        self.__orphans = {}  # bssid of a VAP not registered yet --> station ids admitted by default
+        self.latency = LatencyHistogram('admission')
+        """ duration of the decision (including the evUser* methods)"""
+        self.hook_latency = LatencyHistogram('admission_hook')
+        """ duration of the evUser* methods"""
+        self.reply_latency = LatencyHistogram('association_reply')
+        """ message received --> reply built (see process_association)"""
+        self.__counters = {'decisions': 0,
+                           'admitted': 0,
+                           'blacklisted': 0,
+                           'full': 0,
+                           'balanced': 0,  # denied by the load balancing
+                           'unknown_vap': 0,
+                           'hook_denied': 0,
+                           'hook_timeouts': 0,
+                           'hook_errors': 0,
+                           }
+
+    def stats(self):
+        """ @return: dictionary with the counters, the number of VAPs and stations, and the latency percentiles """
+        with self.__lock:
+            d = dict(self.__counters)
+            d['vaps'] = len(self.__vaps)
+            d['stations'] = len(self.__where)
+            d['ids'] = len(self.__ids)
+        d['latency'] = self.latency.as_dict()
+        d['hook_latency'] = self.hook_latency.as_dict()
+        d['reply_latency'] = self.reply_latency.as_dict()
+        return d
+
+    def station_id(self, mac_sta):
+        """ @return: the station id of the MAC address (a new id if it is not known). must hold the lock """
+        key = mac_key(mac_sta)
+        sid = self.__ids.get(key)
+        if sid is None:
+            # the ids in use are 0..n-1 except the free ones, so n = len(self.__ids) if no id is free
+            sid = heappop(self.__free) if self.__free else len(self.__ids)
+            self.__ids[key] = sid
+            self.__macs[sid] = key
+        return sid
+
+    def __release(self, sid):
+        """ frees the station id if the state does not refer to it anymore (the station left). must hold the lock """
+        if sid in self.__where or sid in self.__denials or sid in self.__blocked:
+            return
+        for stations in self.__orphans.itervalues():
+            if sid in stations:
+                return
+        key = self.__macs.pop(sid, None)
+        if key is not None:
+            del self.__ids[key]
+            heappush(self.__free, sid)
+
+    #
+    # state of the VAPs
+    #
+    def add_vap(self, bssid, vap=None, ssid=None):
+        """ inserts a VAP (called by register_functions)
+            @param vap: the VAP object (its overridden evUser* methods are called by the decisions)
+            @param ssid: SSID of the VAP (default: vap.ssid). VAPs with the same SSID are balanced
+        """
+        if ssid is None and vap is not None:
+            ssid = getattr(vap, 'ssid', None)
+        hooks = _hooks(vap) if vap is not None else {}
+        with self.__lock:
+            self.__remove(mac_key(bssid))
+            state = VapState(mac_key(bssid), None, hooks)
+            self.__join(state, ssid)
+            self.__vaps[state.bssid] = state
+            for sid in self.__orphans.pop(state.bssid, ()):  # associated before the AP finished its onboarding
+                self.__update(MSG_TYPE.MSG_ASSOCIATION, state, sid, True)
+
+    def remove_vap(self, bssid):
+        """ removes the VAP (e.g. the AP disconnected). its stations are forgotten """
+        with self.__lock:
+            self.__remove(mac_key(bssid))
+
+    def set_ssid(self, bssid, ssid):
+        """ moves the VAP to the group of its new SSID (called by the ssid setter of the VAP)
+            @return: False if the VAP is unknown
+        """
+        with self.__lock:
+            state = self.__vaps.get(mac_key(bssid))
+            if state is None:
+                return False
+            if state.group.ssid != ssid:
+                self.__leave(state)
+                self.__join(state, ssid)
+            return True
+
+    def __join(self, state, ssid):
+        """ puts the VAP in the group of the ssid. must hold the lock """
+        group = self.__groups.get(ssid)
+        if group is None:
+            group = self.__groups[ssid] = _Group(ssid)
+        state.group = group
+        group.vaps += 1
+        if not state.overloaded:
+            group.spare += 1
+
+    def __leave(self, state):
+        """ removes the VAP from its group. must hold the lock """
+        group = state.group
+        group.vaps -= 1
+        if not state.overloaded:
+            group.spare -= 1
+        if group.vaps == 0:
+            self.__groups.pop(group.ssid, None)
+
+    def __remove(self, bssid):
+        state = self.__vaps.pop(bssid, None)
+        if state is None:
+            return
+        for sid in state.stations:
+            if self.__where.get(sid) is state:
+                del self.__where[sid]
+        self.__leave(state)
+        released = set(state.stations)
+        if state.blacklist:
+            for sid in list(self.__blocked):
+                if state.blacklist >> sid & 1:
+                    self.__unblocked(sid)
+                    released.add(sid)
+        for sid in released:
+            self.__release(sid)
+
+    def configure(self, bssid, max_stations=None, soft_limit=None, max_load=None):
+        """ changes the limits of the VAP (None = unchanged)
+            @param max_stations: the VAP denies new stations above this number (0 = no limit)
+            @param soft_limit: number of stations above which the VAP is overloaded (0 = no limit)
+            @param max_load: load above which the VAP is overloaded
+            @return: False if the VAP is unknown
+        """
+        with self.__lock:
+            state = self.__vaps.get(mac_key(bssid))
+            if state is None:
+                return False
+            if max_stations is not None:
+                state.max_stations = max_stations
+            if soft_limit is not None:
+                state.soft_limit = soft_limit
+            if max_load is not None:
+                state.max_load = max_load
+            self.__update_overloaded(state)
+            return True
+
+    def set_load(self, bssid, load):
+        """ updates the load of the VAP (fraction of the time its channel is busy) """
+        with self.__lock:
+            state = self.__vaps.get(mac_key(bssid))
+            if state is not None:
+                state.load = load
+                self.__update_overloaded(state)
+
+    def __update_overloaded(self, state):
+        """ keeps the number of VAPs of the group that are not overloaded. must hold the lock """
+        overloaded = state.is_overloaded()
+        if overloaded != state.overloaded:
+            state.overloaded = overloaded
+            state.group.spare += -1 if overloaded else 1
+
+    def station_count(self, bssid):
+        """ @return: number of stations associated to the VAP (-1 if the VAP is unknown) """
+        state = self.__vaps.get(mac_key(bssid))
+        return -1 if state is None else len(state.stations)
+
+    def accepts(self, bssid, mac_sta, like=None):
+        """ checks (without changing the state) if the VAP would admit the station now
+            @param like: bssid of another VAP. if given, the VAP must have the same SSID
+            @return: False if the VAP is unknown, full, overloaded or blocks the station
+        """
+        with self.__lock:
+            state = self.__vaps.get(mac_key(bssid))
+            if state is None:
+                return False
+            if like is not None:
+                other = self.__vaps.get(mac_key(like))
+                if other is not None and other.group is not state.group:
+                    return False
+            sid = self.__ids.get(mac_key(mac_sta))
+            if sid is not None:
+                if sid in state.stations:
+                    return True
+                if (self.__blacklist | state.blacklist) >> sid & 1:
+                    return False
+            if 0 < state.max_stations <= len(state.stations):
+                return False
+            return not state.overloaded or state.group.spare == 0
+
+    def block(self, mac_sta, bssid=None):
+        """ puts the station in the blacklist of the VAP (all VAPs if bssid is None)
+            @return: False if the VAP is unknown
+        """
+        with self.__lock:
+            sid = self.station_id(mac_sta)
+            if bssid is None:
+                state = None
+                blacklist = self.__blacklist
+            else:
+                state = self.__vaps.get(mac_key(bssid))
+                if state is None:
+                    self.__release(sid)
+                    return False
+                blacklist = state.blacklist
+            if not blacklist >> sid & 1:
+                self.__blocked[sid] = self.__blocked.get(sid, 0) + 1
+                if state is None:
+                    self.__blacklist |= 1 << sid
+                else:
+                    state.blacklist |= 1 << sid
+            return True
+
+    def unblock(self, mac_sta, bssid=None):
+        """ removes the station from the blacklist of the VAP (the global blacklist if bssid is None) """
+        with self.__lock:
+            sid = self.__ids.get(mac_key(mac_sta))
+            if sid is None:
+                return
+            if bssid is None:
+                if not self.__blacklist >> sid & 1:
+                    return
+                self.__blacklist &= ~(1 << sid)
+            else:
+                state = self.__vaps.get(mac_key(bssid))
+                if state is None or not state.blacklist >> sid & 1:
+                    return
+                state.blacklist &= ~(1 << sid)
+            self.__unblocked(sid)
+            self.__release(sid)
+
+    def __unblocked(self, sid):
+        """ the station was removed from one blacklist. must hold the lock """
+        count = self.__blocked[sid] - 1
+        if count > 0:
+            self.__blocked[sid] = count
+        else:
+            del self.__blocked[sid]
+
+    #
+    # decisions
+    #
+    def decide(self, m_type, bssid, mac_sta):
+        """ decides an association message and updates the state of the VAP
+
+            @param m_type: MSG_ASSOCIATION, MSG_DISASSOCIATION, MSG_USER_CONNECTING, ...
+            @param bssid: MAC address of the VAP
+            @param mac_sta: MAC address of the station
+            @return: tuple (allowed, response) used in the reply
+        """
+        t0 = monotonic()
+        with self.__lock:
+            state = self.__vaps.get(mac_key(bssid)) if bssid is not None else None
+            if state is None:
+                self.__counters['unknown_vap'] += 1
+                allowed, hook = True, None  # default behavior: the VAP is not known yet
+                self.__orphan(m_type, mac_key(bssid), mac_sta)
+            else:
+                sid = self.station_id(mac_sta)
+                allowed = self.__admit(m_type, state, sid)
+                hook = state.hooks.get(m_type)
+        if hook is not None:
+            allowed = self.__call_hook(hook, mac_sta, allowed)
+        if state is not None:
+            with self.__lock:
+                sid = self.station_id(mac_sta)  # the id may have been released while the hook ran
+                self.__update(m_type, state, sid, allowed)
+                self.__release(sid)
+                self.__counters['decisions'] += 1
+        self.latency.record(monotonic() - t0)
+        response = 1 if allowed and state is not None and m_type in RESPONSE_TYPES else 0
+        return allowed, response
+
+    def __orphan(self, m_type, bssid, mac_sta):
+        """ remembers the stations of a VAP that is not registered yet (see add_vap). must hold the lock """
+        if bssid is None:
+            return
+        sid = self.station_id(mac_sta)
+        if m_type in (MSG_TYPE.MSG_DISASSOCIATION, MSG_TYPE.MSG_USER_DISCONNECTING):
+            stations = self.__orphans.get(bssid)
+            if stations is not None:
+                stations.discard(sid)
+                if not stations:
+                    del self.__orphans[bssid]
+        elif m_type in (MSG_TYPE.MSG_ASSOCIATION, MSG_TYPE.MSG_REASSOCIATION, MSG_TYPE.MSG_USER_CONNECTING):
+            self.__orphans.setdefault(bssid, set()).add(sid)
+        self.__release(sid)
+
+    def __admit(self, m_type, state, sid):
+        """ @return: True if the station can associate to the VAP. must hold the lock """
+        if m_type not in ADMISSION_TYPES:
+            return True
+        counters = self.__counters
+        if (self.__blacklist | state.blacklist) >> sid & 1:
+            counters['blacklisted'] += 1
+            return False
+        if sid in state.stations:
+            counters['admitted'] += 1
+            return True  # already associated (e.g. reassociation)
+        if 0 < state.max_stations <= len(state.stations):
+            counters['full'] += 1
+            return False
+        if state.overloaded and state.group.spare > 0:
+            denials = self.__denials.get(sid, 0)
+            if denials < MAX_DENIALS:
+                self.__denials[sid] = denials + 1
+                counters['balanced'] += 1
+                return False
+        self.__denials.pop(sid, None)
+        counters['admitted'] += 1
+        return True
+
+    def __update(self, m_type, state, sid, allowed):
+        """ the station enters or leaves the VAP. must hold the lock """
+        if m_type in (MSG_TYPE.MSG_DISASSOCIATION, MSG_TYPE.MSG_USER_DISCONNECTING):
+            state.stations.discard(sid)
+            if self.__where.get(sid) is state:
+                del self.__where[sid]
+        elif allowed and m_type in (MSG_TYPE.MSG_ASSOCIATION, MSG_TYPE.MSG_REASSOCIATION,
+                                    MSG_TYPE.MSG_USER_CONNECTING):
+            old = self.__where.get(sid)
+            if old is not state:
+                if old is not None:  # roamed without disassociating from the old VAP
+                    old.stations.discard(sid)
+                    self.__update_overloaded(old)
+                self.__where[sid] = state
+                state.stations.add(sid)
+        else:
+            return
+        self.__update_overloaded(state)
+
+    def __call_hook(self, hook, mac_sta, default):
+        """ calls the evUser* method of the VAP, waiting at most self.deadline seconds
+            @return: the result of the method, or default if it did not finish in time or raised an exception
+        """
+        t0 = monotonic()
+        try:
+            if self.deadline is None:
+                result = hook(mac_sta)
+            else:
+                result = self.__submit(hook, mac_sta).result(self.deadline)
+        except Exception as e:
+            from pox.ethanol.ssl_message.aio import TimeoutError
+            with self.__lock:
+                self.__counters['hook_timeouts' if isinstance(e, TimeoutError) else 'hook_errors'] += 1
+            log.warning("%s did not decide about %s: %s", hook.__name__, mac_sta,
+                        'timeout' if isinstance(e, TimeoutError) else e)
+            return default
+        finally:
+            self.hook_latency.record(monotonic() - t0)
+        if result is False:
+            with self.__lock:
+                self.__counters['hook_denied'] += 1
+            return False
+        return default if result is None else bool(result)
+
+    def __submit(self, func, *args):
+        if self.__executor is None:
+            from pox.ethanol.ssl_message.aio import Executor
+            with self.__lock:
+                if self.__executor is None:
+                    self.__executor = Executor(self.num_workers)
+        return self.__executor.submit(func, *args)
+
+
+admission = AdmissionControl()
+""" admission control used by process_association() """
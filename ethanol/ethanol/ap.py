@@ -26,10 +26,15 @@
 
 import uuid
 
-from pox.ethanol.ssl_message.msg_common import SERVER_PORT
+from pox.ethanol.ssl_message.msg_common import SERVER_PORT, next_msg_id
+from pox.ethanol.ssl_message.msg_batch import Batch
+from pox.ethanol.ethanol.cache import CachedObject, cached_property, cached_method, invalidates
 from pox.ethanol.ssl_message.msg_log import log
+from pox.ethanol.ethanol.index import vaps_by_bssid, radios_by_name
+from pox.ethanol.ethanol.registry import Registry
 from pox.ethanol.ssl_message.msg_ap_ssid import get_ap_ssids
 from pox.ethanol.ssl_message.msg_radio_wlans import get_radio_wlans
+from pox.ethanol.ssl_message.msg_association import unregister_functions
 from pox.ethanol.ssl_message.msg_mean_sta_stats import \
     send_msg_mean_sta_statistics
 from pox.ethanol.ssl_message.msg_mean_sta_stats import \
@@ -41,15 +46,19 @@ from pox.ethanol.ssl_message.msg_hostapd_conf import \
     get_hostapd_conf, set_hostapd_conf
 
 
-__list_of_aps = {}
+__list_of_aps = Registry('ap')
 """
     list of all aps connected to the controller
     mantained by add_ap() and remove_ap().
     __list_of_aps provides a list of all ethanol enabled aps connected
-    to the controller
+    to the controller (ip --> AP object)
 """
 
 
+CONFIG_TTL = 60.0
+""" seconds the wireless interfaces and the hostapd parameters of the AP are cached"""
+
+
 map_openflow_vs_ethanol_ip = {}
 """ provides a mapping from the ap's ip address to the ap object
 """
@@ -58,9 +67,11 @@ map_openflow_vs_ethanol_ip = {}
 def connected_aps():
     """use this function to get the dictionary that contains all aps
     currently connected to Ethanol controller
-      @return: list of ap's objects
+      @return: a read-only dictionary ip --> ap's object.
+               it is a snapshot: it does not change if an AP connects or disconnects
+      @note: only the APs that were discovered (READY). The APs being discovered are in onboarding.pending
     """
-    return __list_of_aps
+    return __list_of_aps.snapshot()
 
 
 def is_ap_with_ip_connected(ip):
@@ -80,7 +91,7 @@ def get_ap_by_ip(ip):
         if it doesn't exist
         @param ip: a string with the ip address in dotted format
     """
-    return None if ip not in __list_of_aps else __list_of_aps[ip]
+    return __list_of_aps.get(ip)
 
 
 def get_vap_by_mac_address(mac_address):
@@ -91,15 +102,9 @@ def get_vap_by_mac_address(mac_address):
         @param mac_address: MAC address in dotted format of the Virtual AP
         (SSID)
     """
-    vap = None
-    if (len(__list_of_aps)) > 0:
-        for ap_ip in __list_of_aps:
-            ap = __list_of_aps[ap_ip]
-            fvap = [vp for vp in ap.vaps if vp.mac_address == mac_address]
-            if len(fvap) > 0:
-                vap = fvap[0]
-                log.info(" VAP %s encontrada e anexada" % vap)
-                break
+    vap = vaps_by_bssid.get(mac_address)
+    if vap is not None:
+        log.debug(" VAP %s encontrada e anexada" % vap)
     return vap
 
 
@@ -131,22 +136,40 @@ def add_ap(client_address):
         connection to the AP
         @type client_address: tuple or list
     """
+    from pox.ethanol.ethanol.onboarding import ASYNC_ONBOARDING, onboarding
     ip = client_address[0]
     port = client_address[1]
 
-    if not(ip in __list_of_aps):
-        # create a new ap
+    if ip in __list_of_aps:
+        log.debug('AP %s exists' % ip)
+        return None  # returns None if no new AP object was created
+
+    if ASYNC_ONBOARDING:
+        # the AP is discovered by the onboarding pipeline, and inserted in the list when it is ready
+        # (hellos of an AP that is being discovered are ignored)
+        return onboarding.submit(ip, lambda: AP(ip, port, discover=False))
 
-        # comentado porque nao tem todas as funcoes do AP
-        __list_of_aps[ip] = AP(ip, port)
+    # only one thread creates the AP, if the device sends two hello messages
+    ap, created = __list_of_aps.get_or_create(ip, lambda: AP(ip, port))
+    if created:
         log.info("Adding AP with IP %s to the list of connected aps (size %d)"
                  % (ip, len(__list_of_aps)))
-        return __list_of_aps[ip]
+        return ap
     else:
         log.debug('AP %s exists' % ip)
         return None # returns None if no new AP object was created
 
 
+def publish_ap(ap):
+    """ inserts an AP that was discovered in the list of connected aps
+        called by the onboarding pipeline
+        @param ap: AP object in the READY state
+    """
+    if __list_of_aps.add_if_absent(ap.ip, ap):
+        log.info("Adding AP with IP %s to the list of connected aps (size %d)"
+                 % (ap.ip, len(__list_of_aps)))
+
+
 def remove_ap_byIP(ip):
     """
         removes the ap from the list
@@ -157,61 +180,95 @@ def remove_ap_byIP(ip):
     """
 
     # is the AP object instantiated ? yes--> destroy it
+    from pox.ethanol.ethanol.onboarding import onboarding
+    onboarding.cancel(ip)
 
     # remove from the list
-    if ip in __list_of_aps:
-        del __list_of_aps[ip]
+    ap = __list_of_aps.remove(ip)
+    if ap is not None:
+        # and from the indexes
+        for vap in ap.vaps:
+            vaps_by_bssid.remove(vap.mac_address, vap)
+            unregister_functions(vap.mac_address, vap)
+        for radio in ap.radios:
+            radios_by_name.remove((ip, radio.wiphy), radio)
 
 
-class AP(object):
+class AP(CachedObject):
     """
     defines the AP class that represents the physical wifi device
     """
 
-    def __init__(self, ip, port=SERVER_PORT):
+    def __init__(self, ip, port=SERVER_PORT, discover=True):
         """
          constructor
          @param ip: socket IP address to connect to the physical AP
          @param port: socket port to connect to the physical AP
+         @param discover: if True, the radios and VAPs are discovered now,
+                          otherwise the AP stays in the PENDING state until discover() is called
         """
-        # import placed here to avoid 'import loop'
-        from pox.ethanol.ethanol.radio import Radio
-        from pox.ethanol.ethanol.network import Network
-        from pox.ethanol.ethanol.network import add_network, get_or_create_network_by_ssid
-
+        from pox.ethanol.ethanol.onboarding import PENDING
         self.__id = uuid.uuid4()  #
         # client_address tuple
         self.__ip = ip
         self.__port = port
-        self.__msg_id = 0
         self.__radios = {}
         self.__listVAP = []
-        server = self.__get_connection()
         self.___wiphys = set()
         map_openflow_vs_ethanol_ip[ip] = self
         self.__stats_msec = -1  # disabled
         self.__stats_alpha = 0.1
+        self.__last_interface_stats = None  # last statistics pushed by the AP (see evInterfaceStats)
+        self.state = PENDING
+        """ onboarding state: PENDING, READY or FAILED (see onboarding.py)"""
+
+        if discover:
+            self.discover()
+        log.info('New AP created - id: %s', self.id)
+
+    def discover(self):
+        """ retrieves the radios (represented by the physical wifi interfaces) and
+            the SSIDs of the AP, and creates the Radio, Network and VAP objects.
+            Called by the onboarding pipeline (or by __init__)
+
+            @return: True if the AP is READY, False if the AP did not answer (the discovery can be retried)
+        """
+        # import placed here to avoid 'import loop'
+        from pox.ethanol.ethanol.radio import Radio
+        from pox.ethanol.ethanol.network import Network
+        from pox.ethanol.ethanol.network import get_or_create_network_by_ssid
+        from pox.ethanol.ethanol.onboarding import READY
+        ip, port = self.__ip, self.__port
+        server = self.__get_connection()
 
         """ retrieve and create radios (represented by the physical
         wifi interfaces)
         """
-        msg, wlans = get_radio_wlans(server)
+        # the radios and the ssids are requested in one round trip
+        with Batch() as b:
+            wlans_request = b.submit(get_radio_wlans, server)
+            ssids_request = b.submit(get_ap_ssids, server)
+        msg, wlans = wlans_request.result()
+        if wlans is None:
+            log.info('AP %s did not send its wireless interfaces', ip)
+            return False
+        self.property_cache.put('listwlan_interfaces', wlans, CONFIG_TTL)
         intf_x_mac = {}
 
         log.info('wireless interfaces: [%s]' % ",".join([_w['intf_name']
                                                         for _w in wlans if _w is not None and _w.intf_name is not None]))
-        if wlans is not None:
-            # identify distinct set of phy interfaces
-            for wlan in wlans:
-                wiphy_idx = wlan.wiphy
-                wiphy_name = wlan.intf_name
-                intf_x_mac[wlan.intf_name] = wlan.mac_addr
-                self.___wiphys.add(wiphy_name)
-                # create radio objects belonging to this AP
+        # identify distinct set of phy interfaces
+        for wlan in wlans:
+            wiphy_idx = wlan.wiphy
+            wiphy_name = wlan.intf_name
+            intf_x_mac[wlan.intf_name] = wlan.mac_addr
+            self.___wiphys.add(wiphy_name)
+            # create radio objects belonging to this AP
+            if wiphy_name not in self.__radios:
                 radio = Radio(self, wiphy_name, ip, port)
                 self.__radios[wiphy_name] = radio
 
-        msg, list_ssids = get_ap_ssids(server)
+        msg, list_ssids = ssids_request.result()
 
         if list_ssids is not None and len(list_ssids) > 0:
             # TODO: tratar quando o ssid vem nulo
@@ -228,16 +285,17 @@ class AP(object):
                         # exception if network exists
                         log.debug('Network SSID %s already exists', ssid.ssid)
                         net = get_or_create_network_by_ssid(ssid.ssid)  # retrieve the network
-                    
+
             log.info('Creating and association the VAP objects')
             #
             # retrieve configured vaps
             # and create vap objects
             #
+            known_vaps = set([vap.mac_address for vap in self.__listVAP])
             for i in range(len(list_ssids)):
                 intf_name = list_ssids[i]['intf_name']
                 ssid = list_ssids[i]['ssid']
-                if intf_name in self.__radios:
+                if intf_name in self.__radios and intf_x_mac[intf_name] not in known_vaps:
                     # if there is no such ssid in list_of_networks
                     # (network.py) add it
                     vap = \
@@ -246,9 +304,20 @@ class AP(object):
                                                                 intf_x_mac[intf_name])
             log.info("Num# of VAPs: %d" % len(self.__listVAP))
         else:
-          log.debug("AP returned no SSIDs")
-            
-        log.info('New AP created - id: %s', self.id)
+            log.debug("AP returned no SSIDs")
+
+        self.state = READY
+        return True
+
+    @property
+    def ip(self):
+        """ ip address of the connection to the AP """
+        return self.__ip
+
+    @property
+    def get_connection(self):
+        """ (ip, port) of the AP, the same as Device.get_connection """
+        return self.__get_connection()
 
     @property
     def id(self):
@@ -262,10 +331,13 @@ class AP(object):
         """ Called when the instance is about to be destroyed.
             Removes this ap from the mapping
         """
-        if self.__ip in map_openflow_vs_ethanol_ip:
+        if map_openflow_vs_ethanol_ip is None:
+            return  # module globals are None during the interpreter shutdown
+        if map_openflow_vs_ethanol_ip.get(self.__ip) is self:
             del map_openflow_vs_ethanol_ip[self.__ip]
-        log.info('Removing AP %s from list' % self.__ip)
-        remove_ap_byIP(self.__ip)
+        if get_ap_by_ip(self.__ip) is self:  # a failed AP may be replaced by a new one with the same ip
+            log.info('Removing AP %s from list' % self.__ip)
+            remove_ap_byIP(self.__ip)
 
     def __str__(self):
         """
@@ -282,13 +354,16 @@ class AP(object):
 
     @property
     def msg_id(self):
-        """helper function: returns the next message id to be sent, and
-           increments the message ID by 1
-           @return: id for the new message
+        """ returns the id to be used in the next message.
+           the ids are allocated by next_msg_id(), so they are unique in the whole controller
+        """
+        return next_msg_id()
+
+    def batch(self):
+        """ gathers the reads of properties (and method calls) of this AP in one round trip
+            @return: a msg_batch.Batch (see Device.batch)
         """
-        id = self.__msg_id
-        self.__msg_id += 1
-        return id
+        return Batch(self)
 
     def __get_connection(self):
         """
@@ -352,7 +427,7 @@ class AP(object):
         msg, value = get_ap_interferenceMap(server, m_id=self.msg_id, intf_name=intf_name)
         return value
 
-    @property
+    @cached_property(ttl=CONFIG_TTL)
     def listwlan_interfaces(self):
         """ wireless interfaces in this AP
           @return: a list with the names of wireless interfaces in this AP
@@ -361,23 +436,46 @@ class AP(object):
         msg, value = get_radio_wlans(server, id=self.msg_id)
         return value
 
-    def get_interface_stats(self):
-        """ get statistics for all interfaces """
+    def get_interface_stats(self, as_array=False):
+        """ get statistics for all interfaces
+            @param as_array: if True, returns the numpy structured array with one record per interface
+                             (the names of the interfaces are in the same order in msg['intf']). Requires numpy
+            @return: dictionary interface name --> statistics
+        """
         server = self.__get_connection()
-        msg, value = send_msg_mean_sta_statistics(server, id=self.msg_id)
+        msg, value = send_msg_mean_sta_statistics(server, id=self.msg_id, as_array=as_array)
+        if as_array:
+            return None if msg is None or 'mean_net_statistics' not in msg else msg['mean_net_statistics']
         return value
 
     def enable_interface_stats(self):
         server = self.__get_connection()
-        for interface in self.listwlan_interfaces:
-            send_msg_mean_sta_statistics_interface_add(server, id=self.msg_id,
-                                                       intf_name=interface['intf_name'])
+        with Batch() as b:
+            for interface in self.listwlan_interfaces:
+                b.submit(send_msg_mean_sta_statistics_interface_add, server, id=self.msg_id,
+                         intf_name=interface['intf_name'])
 
     def disable_interface_stats(self):
         server = self.__get_connection()
-        for interface in self.listwlan_interfaces:
-            send_msg_mean_sta_statistics_interface_remove(server, id=self.msg_id,
-                                                          intf_name=interface['intf_name'])
+        with Batch() as b:
+            for interface in self.listwlan_interfaces:
+                b.submit(send_msg_mean_sta_statistics_interface_remove, server, id=self.msg_id,
+                         intf_name=interface['intf_name'])
+
+    def evInterfaceStats(self, stats):
+        """ called by the telemetry thread when the AP pushes its statistics (every statistics_time ms)
+            the default implementation saves the report in last_interface_stats. Override to process it
+            @param stats: dictionary interface name --> statistics
+        """
+        from pox.ethanol.ssl_message.latency import monotonic
+        self.__last_interface_stats = (monotonic(), stats)
+
+    @property
+    def last_interface_stats(self):
+        """ @return: tuple (time received, statistics) of the last report pushed by the AP, or None
+            the time is from latency.monotonic()
+        """
+        return self.__last_interface_stats
 
     @property
     def statistics_time(self):
@@ -407,6 +505,7 @@ class AP(object):
         server = self.__get_connection()
         send_msg_mean_sta_statistics_alpha(server, id=self.msg_id, alpha=alpha)
 
+    @cached_method(ttl=CONFIG_TTL)
     def read_hostapd_conf_param(self, param):
         """ reads the hostapd.conf, finds the param requested, and returns its value
         """
@@ -414,6 +513,7 @@ class AP(object):
         msg, value = get_hostapd_conf(server, id=self.msg_id, intf_name=None, conf_param=param)
         return value
 
+    @invalidates('read_hostapd_conf_param')
     def write_hostapd_conf_param(self, param, value):
         """ reads the hostapd.conf, finds the param requested, and (over)write value to its contents
         """
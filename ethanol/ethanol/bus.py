@@ -0,0 +1,400 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# ##################################
+#
+# Copyright 2015 Henrique Moura
+#
+# This file is part of Ethanol.
+#
+# ##################################
+#
+"""
+This module implements the event bus of the controller.
+
+An event is published in a topic (e.g. HELLO, SNR_THRESHOLD, MGMT_FRAME) with a key
+(MAC address, SSID, ip, message type, ...). A subscriber receives only the events of its topic,
+and if it gives a key (or a list of keys), only the events with one of these keys.
+
+  * SYNC subscribers are called by the thread that publishes the event (use only for fast functions)
+  * ASYNC subscribers (default) are called by the worker threads of the topic.
+    Each subscriber has its own bounded queue: a slow subscriber does not delay the publisher
+    (e.g. the reply to the AP) nor the other subscribers. If its queue is full, the oldest event is discarded.
+    The events of a subscriber are delivered in order (one worker at a time per subscriber).
+  * batch_size > 1: the callback receives a list of Event (the events waiting in the queue, up to batch_size).
+    Use it for high-rate topics.
+
+  >>> from pox.ethanol.ethanol.bus import bus, HELLO
+  >>> sub = bus.subscribe(HELLO, my_function, key='192.168.1.1')   # my_function(msg=..., fromaddr=...)
+  >>> sub.stats()   # delivered, dropped, errors, latency percentiles
+  >>> bus.unsubscribe(sub)
+
+BusEvents provides the same interface of events.Events (events_hello.on_change += f),
+but the functions are ASYNC subscribers of the bus.
+
+@author: Henrique Duarte Moura
+@organization: WINET/DCC/UFMG
+@copyright: h3dema (c) 2017
+@contact: henriquemoura@hotmail.com
+@licence: GNU General Public License v2.0
+(https://www.gnu.org/licenses/old-licenses/gpl-2.0.html)
+@since: July 2015
+@status: in development
+"""
+from collections import deque
+from threading import Thread, Lock, Condition
+
+from pox.ethanol.ssl_message.msg_log import log
+from pox.ethanol.ssl_message.latency import monotonic, LatencyHistogram
+
+SYNC = 'sync'
+""" the subscriber is called by the publisher"""
+
+ASYNC = 'async'
+""" the subscriber is called by a worker thread of the topic"""
+
+DEFAULT_WORKERS = 2
+""" number of threads of each topic"""
+
+DEFAULT_QUEUE_SIZE = 10000
+""" maximum number of events waiting for each subscriber"""
+
+HELLO = 'hello'
+""" hello messages (key: ip of the device)"""
+
+BYE = 'bye'
+""" bye messages (key: ip of the device)"""
+
+SNR_THRESHOLD = 'snr_threshold'
+""" snr threshold reached messages (key: MAC address of the station)"""
+
+MGMT_FRAME = 'mgmt_frame'
+""" management frames received by a VAP (key: (MAC address of the VAP, frame type))"""
+
+ASSOCIATION = 'association'
+""" association messages decided by the controller (key: MAC address of the station)"""
+
+HEALTH = 'health'
+""" changes of the control plane health of a device, see prober.py (key: ip of the device)"""
+
+
+class Event(object):
+    """ an event delivered to a batch subscriber """
+    __slots__ = ('key', 'args', 'kwargs', 'time')
+
+    def __init__(self, key, args, kwargs, time):
+        self.key = key
+        self.args = args
+        self.kwargs = kwargs
+        self.time = time  #: monotonic() when the event was published
+
+
+class Subscription(object):
+    """ a subscriber of a topic (returned by EventBus.subscribe) """
+
+    def __init__(self, topic, callback, mode, keys, batch_size, max_queue):
+        self.topic = topic
+        self.callback = callback
+        self.mode = mode
+        self.keys = keys
+        self.batch_size = batch_size
+        self.max_queue = max_queue
+        self.active = True
+        self.pending = deque()  # events waiting (ASYNC)
+        self.scheduled = False  # is in the ready queue of the topic or being delivered by a worker
+        self.lock = Lock()  # the SYNC callbacks run in the threads of the publishers, at the same time
+        self.latency = LatencyHistogram(getattr(callback, '__name__', None))
+        """ publish --> end of the callback"""
+        self.counters = {'delivered': 0,
+                         'dropped': 0,  # discarded because the queue was full
+                         'errors': 0,  # exceptions raised by the callback
+                         'batches': 0,
+                         'max_queue_length': 0,
+                         }
+
+    def stats(self):
+        """ @return: dictionary with the counters, the queue length and the latency percentiles """
+        with self.lock:
+            d = dict(self.counters)
+        d['queue_length'] = len(self.pending)
+        d['latency'] = self.latency.as_dict()
+        return d
+
+    def deliver(self, events):
+        """ calls the callback with the events (list of Event) """
+        try:
+            if self.batch_size > 1:
+                self.callback(events)
+            else:
+                for ev in events:
+                    self.callback(*ev.args, **ev.kwargs)
+        except Exception as e:
+            with self.lock:
+                self.counters['errors'] += 1
+            log.error("Error in subscriber %s of %s: %s", self.callback, self.topic.name, e)
+        now = monotonic()
+        for ev in events:
+            self.latency.record(now - ev.time)
+        with self.lock:
+            self.counters['delivered'] += len(events)
+            self.counters['batches'] += 1
+
+
+class Topic(object):
+    """ the subscribers of a topic, and the threads that deliver their events """
+
+    def __init__(self, name, workers=DEFAULT_WORKERS, max_queue=DEFAULT_QUEUE_SIZE):
+        """
+          @param name: name of the topic
+          @param workers: number of threads
+          @param max_queue: default size of the queue of each subscriber
+        """
+        self.name = name
+        self.workers = workers
+        self.max_queue = max_queue
+        self.__cond = Condition(Lock())
+        self.__ready = deque()  # subscriptions with events to deliver
+        self.__threads = []
+        # copy on write: the publishers read without lock
+        self.__by_key = {}  # key --> tuple of subscriptions
+        self.__all = ()  # subscriptions without key
+        self.published = 0
+
+    def subscriptions(self):
+        """ @return: list of the subscriptions of this topic """
+        subs = list(self.__all)
+        for s in self.__by_key.values():
+            subs.extend([sub for sub in s if sub not in subs])
+        return subs
+
+    def add(self, sub):
+        with self.__cond:
+            if sub.keys is None:
+                self.__all = self.__all + (sub,)
+            else:
+                by_key = dict(self.__by_key)
+                for key in sub.keys:
+                    by_key[key] = by_key.get(key, ()) + (sub,)
+                self.__by_key = by_key
+
+    def remove(self, sub):
+        with self.__cond:
+            sub.active = False
+            sub.pending.clear()
+            self.__all = tuple([s for s in self.__all if s is not sub])
+            by_key = {}
+            for key, subs in self.__by_key.items():
+                subs = tuple([s for s in subs if s is not sub])
+                if subs:
+                    by_key[key] = subs
+            self.__by_key = by_key
+
+    def has_subscribers(self, key=None):
+        """ @return: True if an event with this key would be delivered to some subscriber """
+        return len(self.__all) > 0 or (key is not None and key in self.__by_key)
+
+    def publish(self, key, args, kwargs):
+        """ delivers the event to the SYNC subscribers and queues it for the ASYNC subscribers
+            @return: number of subscribers that received the event
+        """
+        subs = self.__all
+        if key is not None:
+            subs = subs + self.__by_key.get(key, ())
+        if len(subs) == 0:
+            return 0
+        ev = Event(key, args, kwargs, monotonic())
+        self.published += 1
+        for sub in subs:
+            if sub.mode == SYNC:
+                sub.deliver([ev])
+            else:
+                self.__queue(sub, ev)
+        return len(subs)
+
+    def __queue(self, sub, ev):
+        with self.__cond:
+            if not sub.active:
+                return
+            if len(sub.pending) >= sub.max_queue:
+                sub.pending.popleft()
+                sub.counters['dropped'] += 1
+            sub.pending.append(ev)
+            if len(sub.pending) > sub.counters['max_queue_length']:
+                sub.counters['max_queue_length'] = len(sub.pending)
+            if not sub.scheduled:
+                sub.scheduled = True
+                self.__ready.append(sub)
+                if len(self.__threads) < self.workers:
+                    self.__start()
+                self.__cond.notify()
+
+    def __start(self):
+        """ must be called holding self.__cond """
+        t = Thread(target=self.__worker, name='bus-%s' % self.name)
+        t.daemon = True
+        t.start()
+        self.__threads.append(t)
+
+    def __worker(self):
+        while True:
+            with self.__cond:
+                while len(self.__ready) == 0:
+                    self.__cond.wait()
+                sub = self.__ready.popleft()
+                n = min(sub.batch_size, len(sub.pending))
+                events = [sub.pending.popleft() for _ in xrange(n)]
+            if events:
+                sub.deliver(events)
+            with self.__cond:
+                if sub.active and len(sub.pending) > 0:
+                    self.__ready.append(sub)  # the other subscribers go first
+                    self.__cond.notify()
+                else:
+                    sub.scheduled = False
+
+
+class EventBus(object):
+    """ a set of topics """
+
+    def __init__(self):
+        self.__lock = Lock()
+        self.__topics = {}
+
+    def topic(self, name):
+        """ @return: the Topic (created if it does not exist) """
+        t = self.__topics.get(name)
+        if t is None:
+            with self.__lock:
+                t = self.__topics.setdefault(name, Topic(name))
+        return t
+
+    def configure(self, name, workers=None, max_queue=None):
+        """ changes the number of threads and the default queue size of a topic
+            (high-rate topics may use more threads)
+        """
+        t = self.topic(name)
+        if workers is not None:
+            t.workers = workers
+        if max_queue is not None:
+            t.max_queue = max_queue
+        return t
+
+    def subscribe(self, topic, callback, key=None, mode=ASYNC, batch_size=1, max_queue=None):
+        """ registers callback in topic
+
+            @param topic: name of the topic
+            @param callback: function called with the arguments of publish() (or with a list of Event if batch_size > 1)
+            @param key: receive only the events with this key (a list or set = any of these keys). None = all events
+            @param mode: SYNC or ASYNC
+            @param batch_size: maximum number of events delivered in one call (ASYNC only)
+            @param max_queue: maximum number of events waiting for this subscriber (default: the topic's max_queue)
+            @return: Subscription
+        """
+        t = self.topic(topic)
+        if key is not None and not isinstance(key, (list, set, frozenset)):
+            key = [key]
+        if mode == SYNC:
+            batch_size = 1
+        sub = Subscription(t, callback, mode, None if key is None else frozenset(key),
+                           max(1, batch_size), max_queue or t.max_queue)
+        t.add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        """ removes the subscription. the events waiting in its queue are discarded """
+        sub.topic.remove(sub)
+
+    def publish(self, topic, *args, **kwargs):
+        """ publishes an event. the subscribers receive *args and **kwargs
+
+            @param topic: name of the topic
+            @param key: (keyword argument, not passed to the subscribers) key of the event
+            @return: number of subscribers that received the event
+        """
+        key = kwargs.pop('key', None)
+        return self.post(topic, key, args, kwargs)
+
+    def post(self, topic, key, args, kwargs):
+        """ same as publish, but the key is not taken from kwargs (the subscribers may receive an argument named key)
+            @return: number of subscribers that received the event
+        """
+        t = self.__topics.get(topic)
+        if t is None:
+            return 0
+        return t.publish(key, args, kwargs)
+
+    def has_subscribers(self, topic, key=None):
+        """ @return: True if an event of topic with this key would be delivered """
+        t = self.__topics.get(topic)
+        return t is not None and t.has_subscribers(key)
+
+    def stats(self):
+        """ @return: dictionary topic --> {'published': n, 'subscribers': [stats of each subscriber]} """
+        with self.__lock:
+            topics = list(self.__topics.values())
+        return dict([(t.name, {'published': t.published,
+                               'subscribers': [s.stats() for s in t.subscriptions()]})
+                     for t in topics])
+
+
+bus = EventBus()
+""" event bus of the controller"""
+
+
+class _BusSlot(object):
+    """ replaces events._EventSlot: the functions added with += are ASYNC subscribers of a topic """
+
+    def __init__(self, bus, topic, key):
+        self.__bus = bus
+        self.__topic = topic
+        self.__key = key
+        self.__subs = []
+        self.__name__ = topic
+
+    def __repr__(self):
+        return "event '%s'" % self.__name__
+
+    def __call__(self, *a, **kw):
+        key = self.__key(*a, **kw) if self.__key is not None else None
+        self.__bus.post(self.__topic, key, a, kw)
+
+    def __iadd__(self, f):
+        self.__subs.append((f, self.__bus.subscribe(self.__topic, f)))
+        return self
+
+    def __isub__(self, f):
+        for g, sub in [s for s in self.__subs if s[0] == f]:
+            self.__bus.unsubscribe(sub)
+            self.__subs.remove((g, sub))
+        return self
+
+    def __len__(self):
+        return len(self.__subs)
+
+    def __iter__(self):
+        return iter([f for f, _ in self.__subs])
+
+    def __getitem__(self, key):
+        return self.__subs[key][0]
+
+
+class BusEvents(object):
+    """ same interface of events.Events: events_hello.on_change += f, events_hello.on_change(msg=...),
+        but the events are published in the topic of the bus
+    """
+
+    def __init__(self, topic, key=None, bus=bus):
+        """
+          @param topic: name of the topic
+          @param key: function that receives the arguments of the event and returns its key
+        """
+        self.__topic = topic
+        self.__key = key
+        self.__bus = bus
+
+    def __getattr__(self, name):
+        if name.startswith('__') or name.startswith('_BusEvents'):
+            raise AttributeError(name)
+        slot = _BusSlot(self.__bus, self.__topic if name == 'on_change' else '%s.%s' % (self.__topic, name),
+                        self.__key)
+        return self.__dict__.setdefault(name, slot)
@@ -0,0 +1,205 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# ##################################
+#
+# Copyright 2015 Henrique Moura
+#
+# This file is part of Ethanol.
+#
+# ##################################
+#
+"""
+This module provides a controller-side cache for the properties that rarely change
+(valid channels, bitrates, interfaces, hostapd parameters, ...).
+
+Each object (AP, Radio, VAP) has its own PropertyCache. A property declared with
+@cached_property(ttl) only asks the device if its value is older than ttl seconds.
+The setter of a cached property invalidates the cached value (the next read asks the device again).
+
+  >>> radio.validChannels       # asks the AP
+  >>> radio.validChannels       # cached
+  >>> radio.refresh('validChannels')  # or radio.refresh() to discard everything
+  >>> radio.property_cache.stats()
+
+@author: Henrique Duarte Moura
+@organization: WINET/DCC/UFMG
+@copyright: h3dema (c) 2017
+@contact: henriquemoura@hotmail.com
+@licence: GNU General Public License v2.0
+(https://www.gnu.org/licenses/old-licenses/gpl-2.0.html)
+@since: July 2015
+@status: in development
+"""
+from collections import OrderedDict
+from functools import wraps
+from threading import Lock
+
+from pox.ethanol.ssl_message.latency import monotonic
+
+CACHE_ENABLED = True
+""" if False, all properties go to the device on every access"""
+
+DEFAULT_TTL = 30.0
+""" seconds a cached value is valid, if the property does not define its ttl"""
+
+CACHE_MAX_ENTRIES = 128
+""" maximum number of values kept by each object (least recently used are discarded)"""
+
+
+class PropertyCache(object):
+    """ cache of one object: key --> (expiration time, value), bounded by max_entries (LRU)
+    """
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES):
+        """
+          @param max_entries: maximum number of cached values
+        """
+        self.max_entries = max_entries
+        self.ttls = {}
+        """ property name --> ttl (overrides the ttl defined in the class). 0 disables the cache of the property"""
+        self.__lock = Lock()
+        self.__entries = OrderedDict()
+        self.__counters = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def stats(self):
+        """ @return: dictionary with the counters hits, misses, evictions, invalidations and the number of entries """
+        with self.__lock:
+            d = dict(self.__counters)
+            d['entries'] = len(self.__entries)
+        return d
+
+    def get(self, key, loader, ttl=DEFAULT_TTL):
+        """ returns the cached value of key, or calls loader() if there is no valid value
+
+            @param key: property name, or tuple (name, arguments)
+            @param loader: function without parameters that gets the value from the device
+            @param ttl: seconds the value is valid
+            @return: the value
+        """
+        name = key[0] if isinstance(key, tuple) else key
+        ttl = self.ttls.get(name, ttl)
+        if not CACHE_ENABLED or ttl <= 0:
+            return loader()
+        now = monotonic()
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is not None and entry[0] > now:
+                del self.__entries[key]
+                self.__entries[key] = entry  # most recently used
+                self.__counters['hits'] += 1
+                return entry[1]
+            self.__counters['misses'] += 1
+        value = loader()
+        if value is not None:  # errors (None) are not cached
+            self.put(key, value, ttl)
+        return value
+
+    def put(self, key, value, ttl=DEFAULT_TTL):
+        """ stores value for ttl seconds """
+        with self.__lock:
+            self.__entries.pop(key, None)
+            self.__entries[key] = (monotonic() + ttl, value)
+            while len(self.__entries) > self.max_entries:
+                self.__entries.popitem(last=False)
+                self.__counters['evictions'] += 1
+
+    def invalidate(self, *names):
+        """ discards the cached values of the properties in names (all values if names is empty) """
+        with self.__lock:
+            if len(names) == 0:
+                n = len(self.__entries)
+                self.__entries.clear()
+            else:
+                keys = [k for k in self.__entries
+                        if (k[0] if isinstance(k, tuple) else k) in names]
+                for k in keys:
+                    del self.__entries[k]
+                n = len(keys)
+            self.__counters['invalidations'] += n
+
+
+class CachedObject(object):
+    """ superclass of the objects that use @cached_property or @cached_method """
+
+    @property
+    def property_cache(self):
+        """ the PropertyCache of this object (created on the first use) """
+        cache = self.__dict__.get('_property_cache')
+        if cache is None:
+            cache = self.__dict__.setdefault('_property_cache', PropertyCache())
+        return cache
+
+    def refresh(self, *names):
+        """ discards the cached values, so the next read asks the device
+
+            @param names: names of the properties (all if empty)
+        """
+        self.property_cache.invalidate(*names)
+
+
+class _CachedProperty(property):
+    """ a property whose getter is cached and whose setter invalidates the cached value """
+
+    def __init__(self, fget=None, fset=None, fdel=None, doc=None, ttl=DEFAULT_TTL):
+        self.ttl = ttl
+        name = fget.__name__
+
+        @wraps(fget)
+        def getter(obj):
+            return obj.property_cache.get(name, lambda: fget(obj), self.ttl)
+
+        self.__fget = fget
+        super(_CachedProperty, self).__init__(getter, fset, fdel, doc or fget.__doc__)
+        self.__doc__ = doc or fget.__doc__  # the docstring of this class would hide the docstring of fget
+
+    def setter(self, fset):
+        name = self.__fget.__name__
+
+        @wraps(fset)
+        def setter(obj, value):
+            try:
+                fset(obj, value)
+            finally:
+                obj.property_cache.invalidate(name)
+        return _CachedProperty(self.__fget, setter, self.fdel, self.__doc__, self.ttl)
+
+
+def cached_property(ttl=DEFAULT_TTL):
+    """ decorator: like @property, but the value is kept for ttl seconds.
+        the setter (defined with @<name>.setter) invalidates the cached value.
+        the class must inherit from CachedObject
+    """
+    def decorator(fget):
+        return _CachedProperty(fget, ttl=ttl)
+    return decorator
+
+
+def cached_method(ttl=DEFAULT_TTL):
+    """ decorator: caches the value returned by a method for each set of (hashable) arguments.
+        the class must inherit from CachedObject
+    """
+    def decorator(func):
+        name = func.__name__
+
+        @wraps(func)
+        def method(self, *args):
+            return self.property_cache.get((name, args), lambda: func(self, *args), ttl)
+        return method
+    return decorator
+
+
+def invalidates(*names):
+    """ decorator: the method changes the device, so the cached values of the properties in names are discarded """
+    def decorator(func):
+        @wraps(func)
+        def method(self, *args, **kwargs):
+            try:
+                return func(self, *args, **kwargs)
+            finally:
+                self.property_cache.invalidate(*names)
+        return method
+    return decorator
@@ -26,6 +26,8 @@ It is a superclass for Station and VAP
 import uuid
 
 from pox.ethanol.ssl_message.msg_log import log
+from pox.ethanol.ssl_message.msg_common import next_msg_id
+from pox.ethanol.ssl_message.msg_batch import Batch
 from pox.ethanol.ssl_message.msg_sent_received import \
     send_msg_get_bytesreceived, send_msg_get_bytessent, \
     send_msg_get_byteslost
@@ -42,14 +44,15 @@ from pox.ethanol.ssl_message.msg_ap_in_range import get_ap_in_range
 from pox.ethanol.ssl_message.msg_bitrates import get_tx_bitrate
 from pox.ethanol.ssl_message.msg_uptime import get_uptime
 from pox.ethanol.ssl_message.msg_tos import tos_cleanall, tos_add, tos_replace
-from pox.ethanol.ssl_message.msg_metric import set_metric
+from pox.ethanol.ssl_message.msg_metric import set_metric, register_metric, unregister_metric
+from pox.ethanol.ethanol.cache import CachedObject
 
 """define a type of metric"""
 METRIC_TO_SUBSCRIBE = ['bytesReceived', 'bytesSent', 'bytesLost', 'packetsReceived', 'packetsSent', 'packetsLost',
                        'retries', 'failed', 'jitter', 'delay', 'tx_bitrate', 'SNR']
 
 
-class Device(object):
+class Device(CachedObject):
     """
       this superclass provides the attributes and methods
       shared by Station and VAP
@@ -67,7 +70,6 @@ class Device(object):
         self.__ip, self.__port = socket
         self.__intf_name = intf_name
         self.__mac_address = None
-        self.__msg_id = 0
         log.debug("DEVICE id:%s created", self.__id)
 
     @property
@@ -84,12 +86,21 @@ class Device(object):
 
     @property
     def msg_id(self):
-        """helper function: returns the next message id to be sent.
-           increments the message ID by 1
+        """ returns the id to be used in the next message.
+           the ids are allocated by next_msg_id(), so they are unique in the whole controller
         """
-        id = self.__msg_id
-        self.__msg_id += 1
-        return id
+        return next_msg_id()
+
+    def batch(self):
+        """ gathers the reads of properties (and method calls) of this device in one round trip
+
+            >>> with station.batch() as b:
+            ...     rx, tx = b.bytesReceived, b.bytesSent
+            >>> rx.result()
+
+            @return: a msg_batch.Batch. Each read returns a Future that has the value after the with block
+        """
+        return Batch(self)
 
     @property
     def intf_name(self):
@@ -103,6 +114,12 @@ class Device(object):
         """
         return self.__mac_address
 
+    @mac_address.setter
+    def mac_address(self, value):
+        """ set by the subclasses (the VAP's BSSID, or the MAC address of the station's interface)
+        """
+        self.__mac_address = value
+
     @property
     def ipv4_address(self):
         """NOT IMPLEMENTED YET -- function in C is ok
@@ -451,8 +468,12 @@ class Device(object):
                 processed_all = False
             else:
                 metric_value += 2 ** METRIC_TO_SUBSCRIBE.index(m)
+        """ register/unregister in the server (the reports are delivered to evMetric) """
+        if activate:
+            register_metric(self.mac_address, self)
+        else:
+            unregister_metric(self.mac_address)
         """ call agent to program the metric """
-        """ register/unregister in the server """
         server = self.get_connection
         set_metric(server, id=self.msg_id, metric=metric_value, enable=activate, period=period)
         return processed_all
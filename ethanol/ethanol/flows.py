@@ -0,0 +1,312 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# ##################################
+#
+# Copyright 2015 Henrique Moura
+#
+# This file is part of Ethanol.
+#
+# ##################################
+#
+"""
+This module installs the forwarding entries of the stations in the OpenFlow switch of their APs
+(proactive flows). It is a pox module:
+
+./pox.py ethanol.ethanol.switch ethanol.server ethanol.ethanol.flows
+
+A learning switch only knows where a station is after the station sends a packet, so the first
+packets to (and the broadcasts from) a new station are sent to the controller (packet-in) and flooded.
+When the AP informs that a station associated (see msg_association.events_association), Ethanol already
+knows its MAC address, its VAP and its AP. The FlowManager then installs in the switch of the AP:
+
+  - dl_dst = station --> output to the port of the VAP
+  - in_port = port of the VAP, dl_src = station, dl_dst = broadcast --> flood (ARP, DHCP)
+
+and, if the switch is an ethanol.ethanol.switch.LearningSwitch, inserts the station in its table.
+The flows are removed when the station disassociates or roams (the flows of the station in the other
+switches are also removed, so they learn the new location).
+
+The association events are received from the event bus in batches (up to FLOW_BATCH events):
+the flow_mods of a batch are coalesced (only the last change of a station is sent) and
+written to each switch at once.
+
+The flows have the cookie FLOW_COOKIE and are installed with OFPFF_SEND_FLOW_REM. When a flow that
+matched packets is removed, the counter packet_ins_avoided is incremented (at least its first packet
+would be a packet-in without it).
+
+@author: Henrique Duarte Moura
+@organization: WINET/DCC/UFMG
+@copyright: h3dema (c) 2017
+@contact: henriquemoura@hotmail.com
+@licence: GNU General Public License v2.0
+(https://www.gnu.org/licenses/old-licenses/gpl-2.0.html)
+@since: July 2015
+@status: in development
+"""
+from collections import OrderedDict
+from threading import Lock
+
+from pox.core import core
+import pox.openflow.libopenflow_01 as of
+from pox.lib.addresses import EthAddr
+from pox.lib.util import dpid_to_str
+
+from pox.ethanol.ssl_message.msg_common import MSG_TYPE
+from pox.ethanol.ssl_message.msg_log import log
+from pox.ethanol.ssl_message.latency import monotonic, LatencyHistogram
+from pox.ethanol.ethanol.bus import bus, ASSOCIATION
+from pox.ethanol.ethanol.index import mac_key
+
+FLOW_PRIORITY = of.OFP_DEFAULT_PRIORITY + 0x1000
+""" priority of the flows (above the flows of the learning switch)"""
+
+FLOW_IDLE_TIMEOUT = 300
+""" seconds without traffic before the switch removes the flows of a station (0 = never)"""
+
+FLOW_COOKIE = 0x657468616e6f6c
+""" cookie of the flows installed by the FlowManager"""
+
+FLOW_BATCH = 64
+""" maximum number of association events handled (and flow_mods coalesced) at once"""
+
+BROADCAST = EthAddr('ff:ff:ff:ff:ff:ff')
+
+JOIN_TYPES = (MSG_TYPE.MSG_ASSOCIATION, MSG_TYPE.MSG_REASSOCIATION, MSG_TYPE.MSG_USER_CONNECTING)
+""" messages that install the flows of the station (if allowed)"""
+
+LEAVE_TYPES = (MSG_TYPE.MSG_DISASSOCIATION, MSG_TYPE.MSG_USER_DISCONNECTING)
+""" messages that remove the flows of the station"""
+
+
+class FlowManager(object):
+    """ installs and removes the flows of the stations when the association events arrive
+    """
+
+    def __init__(self, idle_timeout=FLOW_IDLE_TIMEOUT, priority=FLOW_PRIORITY, batch_size=FLOW_BATCH):
+        """
+          @param idle_timeout: seconds without traffic before the switch removes the flows (0 = never)
+          @param priority: priority of the flows
+          @param batch_size: maximum number of association events handled at once
+        """
+        self.idle_timeout = idle_timeout
+        self.priority = priority
+        self.__lock = Lock()
+        self.__connections = {}  # dpid --> Connection
+        self.__dpid_by_ip = {}  # ip of the AP --> dpid of its switch
+        self.__stations = {}  # MAC address of the station --> (dpid, port of the VAP)
+        self.latency = LatencyHistogram('flows')
+        """ association event published --> flow_mods sent"""
+        self.__counters = {'events': 0,
+                           'installed': 0,  # stations whose flows were installed
+                           'removed': 0,  # stations whose flows were removed (left or roamed)
+                           'moved': 0,  # stations that roamed to another AP
+                           'skipped': 0,  # the flows were already installed
+                           'no_switch': 0,  # the AP has no OpenFlow connection
+                           'no_port': 0,  # the interface of the VAP is not a port of the switch
+                           'flow_mods': 0,
+                           'coalesced': 0,  # flow_mods replaced by a newer one in the same batch
+                           'batches': 0,  # writes to the switches
+                           'expired': 0,  # flows removed by the switch (idle timeout)
+                           'packet_ins': 0,
+                           'packet_ins_avoided': 0,
+                           'packet_ins_missed': 0,  # packet-ins to a station whose flows are installed
+                           }
+        self.__listeners = core.openflow.addListeners(self)
+        self.__sub = bus.subscribe(ASSOCIATION, self.__associations, batch_size=batch_size)
+
+    def stats(self):
+        """ @return: dictionary with the counters, the number of stations and switches and the latency percentiles """
+        with self.__lock:
+            d = dict(self.__counters)
+            d['stations'] = len(self.__stations)
+            d['switches'] = len(self.__connections)
+        d['latency'] = self.latency.as_dict()
+        return d
+
+    def stop(self):
+        """ stops receiving the association events (the flows are not removed) """
+        bus.unsubscribe(self.__sub)
+        core.openflow.removeListeners(self.__listeners)
+
+    #
+    # OpenFlow events
+    #
+    def _handle_ConnectionUp(self, event):
+        ip = event.connection.sock.getpeername()[0]
+        with self.__lock:
+            self.__connections[event.dpid] = event.connection
+            self.__dpid_by_ip[ip] = event.dpid
+        log.debug("FlowManager: switch %s of %s", dpid_to_str(event.dpid), ip)
+
+    def _handle_ConnectionDown(self, event):
+        with self.__lock:
+            self.__connections.pop(event.dpid, None)
+            for ip in [ip for ip, dpid in self.__dpid_by_ip.items() if dpid == event.dpid]:
+                del self.__dpid_by_ip[ip]
+            for mac in [m for m, (dpid, port) in self.__stations.items() if dpid == event.dpid]:
+                del self.__stations[mac]
+
+    def _handle_PacketIn(self, event):
+        packet = event.parsed
+        with self.__lock:
+            self.__counters['packet_ins'] += 1
+            if packet is None:
+                return
+            where = self.__stations.get(mac_key(str(packet.dst)))
+            if where is not None and where[0] == event.dpid:
+                self.__counters['packet_ins_missed'] += 1
+
+    def _handle_FlowRemoved(self, event):
+        flow = event.ofp
+        if flow.cookie != FLOW_COOKIE:
+            return
+        with self.__lock:
+            if flow.packet_count > 0:
+                self.__counters['packet_ins_avoided'] += 1
+            if not event.deleted and flow.match.dl_dst != BROADCAST:
+                # the switch removed the flow: the next association installs it again
+                self.__counters['expired'] += 1
+                mac = mac_key(str(flow.match.dl_dst))
+                where = self.__stations.get(mac)
+                if where is not None and where[0] == event.dpid:
+                    del self.__stations[mac]
+
+    #
+    # association events
+    #
+    def __associations(self, events):
+        """ called by the event bus with a list of bus.Event (see process_association) """
+        batches = {}  # dpid --> OrderedDict: (flow, station) --> flow_mod
+        with self.__lock:
+            for ev in events:
+                self.__counters['events'] += 1
+                kw = ev.kwargs
+                mac = mac_key(kw.get('mac_sta'))
+                if mac is None:
+                    continue
+                if kw.get('m_type') in JOIN_TYPES and kw.get('allowed'):
+                    self.__join(mac, kw.get('mac_ap'), kw.get('fromaddr'), batches)
+                elif kw.get('m_type') in LEAVE_TYPES:
+                    self.__leave(mac, batches)
+            writes = [(self.__connections.get(dpid), msgs.values()) for dpid, msgs in batches.iteritems()]
+        for connection, msgs in writes:
+            if connection is None or len(msgs) == 0:
+                continue
+            try:
+                connection.send(b''.join(m.pack() for m in msgs))
+            except Exception as e:
+                log.error("Error sending %d flow_mods to %s: %s", len(msgs), dpid_to_str(connection.dpid), e)
+                continue
+            with self.__lock:
+                self.__counters['flow_mods'] += len(msgs)
+                self.__counters['batches'] += 1
+        now = monotonic()
+        for ev in events:
+            self.latency.record(now - ev.time)
+
+    def __join(self, mac, mac_ap, fromaddr, batches):
+        """ installs the flows of the station in the switch of the AP. must hold the lock """
+        dpid = self.__dpid_by_ip.get(fromaddr[0]) if fromaddr else None
+        if dpid is None:
+            self.__counters['no_switch'] += 1
+            return
+        port = self.__port(dpid, mac_ap)
+        if port is None:
+            self.__counters['no_port'] += 1
+            return
+        where = self.__stations.get(mac)
+        if where == (dpid, port):
+            self.__counters['skipped'] += 1
+            return
+        if where is not None:
+            # roamed: the old AP and the other switches must forget the station
+            self.__counters['moved'] += 1
+            self.__leave(mac, batches)
+            for other in self.__connections:
+                if other not in (dpid, where[0]):
+                    self.__queue(batches, other, ('purge', mac), self.__delete(mac))
+                    self.__learning_switch(other, mac)
+        self.__stations[mac] = (dpid, port)
+        self.__queue(batches, dpid, ('down', mac), self.__downstream(mac, port))
+        self.__queue(batches, dpid, ('up', mac, port), self.__broadcast(mac, port))
+        self.__learning_switch(dpid, mac, port)
+        self.__counters['installed'] += 1
+
+    def __leave(self, mac, batches):
+        """ removes the flows of the station from the switch of its AP. must hold the lock """
+        where = self.__stations.pop(mac, None)
+        if where is None:
+            return
+        dpid, port = where
+        # non strict: also removes the flows to the station installed by the learning switch
+        self.__queue(batches, dpid, ('down', mac), self.__delete(mac))
+        self.__queue(batches, dpid, ('up', mac, port), self.__broadcast(mac, port, of.OFPFC_DELETE_STRICT))
+        self.__learning_switch(dpid, mac)
+        self.__counters['removed'] += 1
+
+    def __queue(self, batches, dpid, key, msg):
+        """ puts msg in the batch of dpid. replaces the previous flow_mod of key (coalesced) """
+        batch = batches.setdefault(dpid, OrderedDict())
+        if batch.pop(key, None) is not None:
+            self.__counters['coalesced'] += 1
+        batch[key] = msg
+
+    def __port(self, dpid, mac_ap):
+        """ @return: number of the port of the switch dpid that is the interface of the VAP mac_ap (or None) """
+        from pox.ethanol.ethanol.ap import get_vap_by_mac_address
+        connection = self.__connections.get(dpid)
+        vap = get_vap_by_mac_address(mac_ap)
+        if connection is None or vap is None or vap.intf_name is None:
+            return None
+        try:
+            return connection.ports[vap.intf_name].port_no
+        except KeyError:
+            return None
+
+    def __learning_switch(self, dpid, mac, port=None):
+        """ inserts (port is not None) or removes the station in the table of the learning switch of dpid """
+        if not core.hasComponent('l2_learning'):
+            return
+        switch = getattr(core.l2_learning, 'switches', {}).get(dpid)
+        if switch is None:
+            return
+        if port is None:
+            switch.forget(mac)
+        else:
+            switch.learn(mac, port)
+
+    #
+    # flow_mods
+    #
+    def __flow_mod(self, command):
+        return of.ofp_flow_mod(command=command, cookie=FLOW_COOKIE, priority=self.priority,
+                               idle_timeout=self.idle_timeout, flags=of.OFPFF_SEND_FLOW_REM)
+
+    def __downstream(self, mac, port):
+        """ packets to the station go to the port of its VAP """
+        msg = self.__flow_mod(of.OFPFC_ADD)
+        msg.match = of.ofp_match(dl_dst=EthAddr(mac))
+        msg.actions.append(of.ofp_action_output(port=port))
+        return msg
+
+    def __broadcast(self, mac, port, command=of.OFPFC_ADD):
+        """ broadcasts of the station (ARP, DHCP) are flooded by the switch """
+        msg = self.__flow_mod(command)
+        msg.match = of.ofp_match(in_port=port, dl_src=EthAddr(mac), dl_dst=BROADCAST)
+        if command == of.OFPFC_ADD:
+            msg.actions.append(of.ofp_action_output(port=of.OFPP_FLOOD))
+        return msg
+
+    def __delete(self, mac):
+        """ removes all flows to the station (any priority) """
+        msg = of.ofp_flow_mod(command=of.OFPFC_DELETE)
+        msg.match = of.ofp_match(dl_dst=EthAddr(mac))
+        return msg
+
+
+def launch(idle_timeout=FLOW_IDLE_TIMEOUT, priority=FLOW_PRIORITY, batch_size=FLOW_BATCH):
+    """
+      ./pox.py ethanol.ethanol.flows --idle_timeout=300 --batch_size=64
+    """
+    core.registerNew(FlowManager, int(idle_timeout), int(priority), int(batch_size))
@@ -0,0 +1,430 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# ##################################
+#
+# Copyright 2015 Henrique Moura
+#
+# This file is part of Ethanol.
+#
+# ##################################
+#
+"""
+This module implements the handoff decisions triggered by the SNR reports of the stations
+(see msg_handle_snr.process_snr_threshold).
+
+The station waits for the reply of its SNR threshold message, so the new AP is chosen in the thread of the
+SslServer, from the candidates kept for each station: the VAPs it heard recently, with their SNR.
+The candidates are updated by:
+  - the scans of the station (Station.getAPsInRange, see scan());
+  - the station statistics of the VAPs (VAP.connected_stations / get_sta_statistics, see poll());
+  - the SNR reports themselves (SNR of the current VAP).
+
+A station moves to the candidate with the highest SNR if:
+  - its SNR is at least HYSTERESIS dB above the SNR of the current VAP and at least MIN_SNR;
+  - the candidate was heard in the last CANDIDATE_TTL seconds;
+  - the candidate is an ethanol VAP with the same SSID that accepts the station (see AdmissionControl.accepts);
+  - the AP of the candidate is healthy (its control plane latency is not degraded, see prober.py);
+  - the station did not move in the last HOLD_TIME seconds (avoids ping-pong).
+
+A policy function can replace this choice: it is called with the candidates, and its result is used if it
+returns in HANDOFF_DEADLINE seconds (otherwise the default choice is used).
+
+After the reply, the transition is sent to the station (Station.triggerTransition) or, if the station is not
+an ethanol station, to its current VAP (VAP.mlme_bss_transition). The handoff succeeds if the station
+associates to the new VAP in HANDOFF_TIMEOUT seconds (association messages, see bus.ASSOCIATION).
+
+  >>> from pox.ethanol.ethanol.handoff import handoff
+  >>> handoff.observe_signal(mac_sta, bssid, -60)   # the station heard bssid at -60 dBm
+  >>> handoff.decide(mac_sta, current_bssid, snr)   # MAC address of the new VAP or None
+  >>> handoff.stats()                               # counters, success rate and latency percentiles
+
+@author: Henrique Duarte Moura
+@organization: WINET/DCC/UFMG
+@copyright: h3dema (c) 2017
+@contact: henriquemoura@hotmail.com
+@licence: GNU General Public License v2.0
+(https://www.gnu.org/licenses/old-licenses/gpl-2.0.html)
+@since: July 2015
+@status: in development
+"""
+from threading import Lock
+
+from pox.ethanol.ssl_message.msg_common import MSG_TYPE
+from pox.ethanol.ssl_message.msg_log import log
+from pox.ethanol.ssl_message.latency import monotonic, LatencyHistogram
+from pox.ethanol.ethanol.index import mac_key, vaps_by_bssid, stations_by_mac
+from pox.ethanol.ethanol.admission import admission
+from pox.ethanol.ethanol.prober import prober
+
+HANDOFF_DEADLINE = 0.05
+""" seconds the policy function has to choose the new AP (None = no limit)"""
+
+HANDOFF_WORKERS = 8
+""" threads that run the policy function and send the transitions"""
+
+CANDIDATE_TTL = 10.0
+""" seconds an observation of a VAP is used as a candidate"""
+
+MAX_CANDIDATES = 16
+""" maximum number of candidates kept for each station (the oldest are discarded)"""
+
+HYSTERESIS = 3.0
+""" dB. the new VAP must have a SNR this much higher than the current VAP"""
+
+MIN_SNR = 10.0
+""" dB. minimum SNR of the new VAP"""
+
+HOLD_TIME = 5.0
+""" seconds a station stays in a VAP after a handoff before it is moved again"""
+
+HANDOFF_TIMEOUT = 5.0
+""" seconds the station has to associate to the new VAP (otherwise the handoff failed)"""
+
+NOISE_FLOOR = -95.0
+""" dBm. used to convert the signal levels into SNR"""
+
+JOIN_TYPES = (MSG_TYPE.MSG_ASSOCIATION, MSG_TYPE.MSG_REASSOCIATION, MSG_TYPE.MSG_USER_CONNECTING)
+""" association messages that put the station in a VAP"""
+
+
+def snr_of(signal, is_dBm=True):
+    """ @return: the SNR (dB) of a signal level in dBm (some drivers report a percentage) """
+    if is_dBm is False:
+        return float(signal) * (-NOISE_FLOOR - 40.0) / 100.0
+    return float(signal) - NOISE_FLOOR
+
+
+class StationState(object):
+    """ candidates of a station """
+    __slots__ = ['current', 'snr', 'candidates', 'moved', 'pending']
+
+    def __init__(self):
+        self.current = None  # bssid (mac_key) of the VAP of the station
+        self.snr = None  # SNR reported by the station for the current VAP
+        self.candidates = {}  # bssid --> (SNR, monotonic() of the observation)
+        self.moved = None  # monotonic() of the last handoff
+        self.pending = None  # (target bssid, monotonic() of the decision) of the handoff in progress
+
+
+class HandoffEngine(object):
+    """ decides the handoffs from the candidates of the stations
+    """
+
+    def __init__(self, deadline=HANDOFF_DEADLINE, num_workers=HANDOFF_WORKERS, policy=None):
+        """
+          @param deadline: seconds the policy has to choose (None = no limit)
+          @param num_workers: threads used to call the policy and send the transitions
+          @param policy: function policy(mac_sta, current, snr, candidates) that returns the bssid of the new VAP,
+                         or None to stay. candidates is a dictionary bssid --> SNR of the valid candidates
+        """
+        self.deadline = deadline
+        self.num_workers = num_workers
+        self.policy = policy
+        self.__lock = Lock()
+        self.__executor = None
+        self.__sub = None
+        self.__stations = {}  # mac_key of the station --> StationState
+        self.latency = LatencyHistogram('handoff_decision')
+        """ duration of decide() (including the policy)"""
+        self.policy_latency = LatencyHistogram('handoff_policy')
+        """ duration of the policy function"""
+        self.reply_latency = LatencyHistogram('snr_reply')
+        """ message received --> reply built (see process_snr_threshold)"""
+        self.transition_latency = LatencyHistogram('handoff_transition')
+        """ decision --> association of the station to the new VAP"""
+        self.__counters = {'decisions': 0,
+                           'handoffs': 0,  # decisions that chose a new VAP
+                           'stay': 0,  # no candidate is good enough
+                           'held': 0,  # the station moved less than HOLD_TIME seconds ago
+                           'succeeded': 0,
+                           'failed': 0,  # the station associated to another VAP
+                           'timeouts': 0,  # the station did not associate in HANDOFF_TIMEOUT seconds
+                           'transition_errors': 0,
+                           'policy_timeouts': 0,
+                           'policy_errors': 0,
+                           'observations': 0,
+                           }
+
+    def stats(self):
+        """ @return: dictionary with the counters, the success rate and the latency percentiles """
+        with self.__lock:
+            self.__expire(monotonic())
+            d = dict(self.__counters)
+            d['stations'] = len(self.__stations)
+            d['pending'] = sum(1 for s in self.__stations.itervalues() if s.pending is not None)
+        finished = d['succeeded'] + d['failed'] + d['timeouts']
+        d['success_rate'] = float(d['succeeded']) / finished if finished > 0 else None
+        d['latency'] = self.latency.as_dict()
+        d['policy_latency'] = self.policy_latency.as_dict()
+        d['reply_latency'] = self.reply_latency.as_dict()
+        d['transition_latency'] = self.transition_latency.as_dict()
+        return d
+
+    def __state(self, mac_sta):
+        """ @return: the StationState of the station (created if needed). must hold the lock """
+        key = mac_key(mac_sta)
+        state = self.__stations.get(key)
+        if state is None:
+            state = self.__stations[key] = StationState()
+        return state
+
+    #
+    # candidates
+    #
+    def observe(self, mac_sta, bssid, snr, now=None):
+        """ the station heard the VAP bssid with this SNR (dB) """
+        if mac_sta is None or bssid is None or snr is None:
+            return
+        now = monotonic() if now is None else now
+        with self.__lock:
+            state = self.__state(mac_sta)
+            bssid = mac_key(bssid)
+            state.candidates[bssid] = (float(snr), now)
+            if len(state.candidates) > MAX_CANDIDATES:
+                oldest = min(state.candidates, key=lambda b: state.candidates[b][1])
+                del state.candidates[oldest]
+            self.__counters['observations'] += 1
+
+    def observe_signal(self, mac_sta, bssid, signal, is_dBm=True):
+        """ the station heard the VAP bssid with this signal level (dBm) """
+        self.observe(mac_sta, bssid, snr_of(signal, is_dBm))
+
+    def update_from_scan(self, mac_sta, aps):
+        """ @param aps: list of ap_in_range entries (mac_addr, signal, is_dBm) of a scan of the station """
+        now = monotonic()
+        for entry in aps or []:
+            self.observe(mac_sta, entry['mac_addr'], snr_of(entry['signal'], entry['is_dBm']), now)
+
+    def update_from_statistics(self, bssid, stats):
+        """ @param stats: list of the station statistics (mac_addr, signal) of the VAP bssid.
+                          the stations are associated to the VAP
+        """
+        now = monotonic()
+        for entry in stats or []:
+            mac_sta = entry['mac_addr']
+            self.observe(mac_sta, bssid, snr_of(entry['signal']), now)
+            self.set_current(mac_sta, bssid)
+
+    def scan(self, station):
+        """ asks the station (Station object) for the APs in range and updates its candidates """
+        num_aps, aps = station.getAPsInRange  # property
+        self.update_from_scan(station.mac_address, aps)
+        return num_aps
+
+    def poll(self, vap):
+        """ asks the VAP for the statistics of its stations and updates their candidates """
+        from pox.ethanol.ssl_message.msg_sta_statistics import get_sta_statistics
+        msg, stats = get_sta_statistics(vap.get_connection, id=vap.msg_id, intf_name=vap.intf_name)
+        self.update_from_statistics(vap.mac_address, stats)
+        return len(stats or [])
+
+    def set_current(self, mac_sta, bssid):
+        """ the station is associated to the VAP bssid """
+        with self.__lock:
+            self.__state(mac_sta).current = None if bssid is None else mac_key(bssid)
+
+    def forget(self, mac_sta):
+        """ removes the candidates of the station (e.g. it left the network) """
+        with self.__lock:
+            self.__stations.pop(mac_key(mac_sta), None)
+
+    def candidates(self, mac_sta, now=None):
+        """ @return: dictionary bssid --> SNR of the valid candidates of the station (without the current VAP) """
+        now = monotonic() if now is None else now
+        with self.__lock:
+            state = self.__stations.get(mac_key(mac_sta))
+            if state is None:
+                return {}
+            items = state.candidates.items()
+            current = state.current
+        return dict((b, snr) for b, (snr, t) in items
+                    if b != current and now - t <= CANDIDATE_TTL and admission.accepts(b, mac_sta, current) and
+                    self.__healthy(b))
+
+    def __healthy(self, bssid):
+        """ @return: False if the prober flagged the AP of the VAP (degraded or unreachable) """
+        vap = vaps_by_bssid.get(bssid)
+        return vap is None or prober.healthy(vap.get_connection)
+
+    #
+    # decisions
+    #
+    def decide(self, mac_sta, current, snr):
+        """ chooses the new VAP of the station (called when its SNR reaches the threshold)
+
+            @param mac_sta: MAC address of the station
+            @param current: MAC address of the VAP of the station (None = the last one known)
+            @param snr: SNR (dB) of the current VAP measured by the station
+            @return: the MAC address of the new VAP, or None if the station stays
+        """
+        t0 = monotonic()
+        with self.__lock:
+            state = self.__state(mac_sta)
+            if current is not None:
+                state.current = mac_key(current)
+            state.snr = snr
+            if state.current is not None and snr is not None:
+                state.candidates[state.current] = (float(snr), t0)
+            self.__expire_one(state, t0)
+            held = state.moved is not None and t0 - state.moved < HOLD_TIME
+            self.__counters['decisions'] += 1
+            if held:
+                self.__counters['held'] += 1
+            current = state.current
+        target = None
+        if not held:
+            candidates = self.candidates(mac_sta, t0)
+            target = self.best(current, snr, candidates)
+            if self.policy is not None and candidates:
+                target = self.__call_policy(mac_sta, current, snr, candidates, target)
+        with self.__lock:
+            if target is not None and target != current:
+                state.pending = (target, t0)
+                state.moved = t0
+                self.__counters['handoffs'] += 1
+            else:
+                target = None
+                if not held:
+                    self.__counters['stay'] += 1
+        self.latency.record(monotonic() - t0)
+        if target is not None:
+            self.__subscribe()
+        return target
+
+    def best(self, current, snr, candidates):
+        """ the default choice
+            @param candidates: dictionary bssid --> SNR
+            @return: the candidate with the highest SNR, if it is HYSTERESIS dB better than snr (or None)
+        """
+        if not candidates:
+            return None
+        target = max(candidates, key=lambda b: (candidates[b], b))
+        value = candidates[target]
+        if value < MIN_SNR:
+            return None
+        if current is not None and snr is not None and value < snr + HYSTERESIS:
+            return None
+        return target
+
+    def __call_policy(self, mac_sta, current, snr, candidates, default):
+        """ calls the policy, waiting at most self.deadline seconds
+            @return: the choice of the policy, or default if it did not finish in time or raised an exception
+        """
+        t0 = monotonic()
+        try:
+            if self.deadline is None:
+                result = self.policy(mac_sta, current, snr, candidates)
+            else:
+                result = self.__submit(self.policy, mac_sta, current, snr, candidates).result(self.deadline)
+        except Exception as e:
+            from pox.ethanol.ssl_message.aio import TimeoutError
+            with self.__lock:
+                self.__counters['policy_timeouts' if isinstance(e, TimeoutError) else 'policy_errors'] += 1
+            log.warning("handoff policy did not decide about %s: %s", mac_sta,
+                        'timeout' if isinstance(e, TimeoutError) else e)
+            return default
+        finally:
+            self.policy_latency.record(monotonic() - t0)
+        return None if result is None else mac_key(result)
+
+    def __submit(self, func, *args):
+        if self.__executor is None:
+            from pox.ethanol.ssl_message.aio import Executor
+            with self.__lock:
+                if self.__executor is None:
+                    self.__executor = Executor(self.num_workers)
+        return self.__executor.submit(func, *args)
+
+    #
+    # transitions
+    #
+    def execute(self, mac_sta, current, target):
+        """ sends the transition in a worker thread (see transition)
+            @return: aio.Future with the result of transition()
+        """
+        return self.__submit(self.transition, mac_sta, current, target)
+
+    def transition(self, mac_sta, current, target):
+        """ asks the station to move to the VAP target: Station.triggerTransition if it is an ethanol station,
+            otherwise VAP.mlme_bss_transition of its current VAP
+            @return: True if the message was sent
+        """
+        with self.__lock:
+            state = self.__state(mac_sta)
+            if state.pending is None or state.pending[0] != mac_key(target):
+                state.pending = (mac_key(target), monotonic())
+        self.__subscribe()
+        try:
+            station = stations_by_mac.get(mac_sta)
+            vap = vaps_by_bssid.get(current) if current is not None else None
+            if station is not None:
+                station.triggerTransition(target)
+            elif vap is not None:
+                vap.mlme_bss_transition(mac_sta, target)
+            else:
+                raise ValueError("the station and its VAP are unknown")
+        except Exception as e:
+            with self.__lock:
+                self.__counters['transition_errors'] += 1
+            log.warning("Could not send the transition of %s to %s: %s", mac_sta, target, e)
+            return False
+        return True
+
+    def associated(self, mac_sta, bssid):
+        """ the station associated to the VAP bssid: ends its pending handoff """
+        now = monotonic()
+        with self.__lock:
+            state = self.__stations.get(mac_key(mac_sta))
+            if state is None:
+                return
+            state.current = mac_key(bssid)
+            if state.pending is None:
+                return
+            target, t0 = state.pending
+            state.pending = None
+            if target == state.current:
+                self.__counters['succeeded'] += 1
+                self.transition_latency.record(now - t0)
+            else:
+                self.__counters['failed'] += 1
+
+    def __expire(self, now):
+        """ the handoffs that did not finish in HANDOFF_TIMEOUT seconds failed. must hold the lock """
+        for state in self.__stations.itervalues():
+            self.__expire_one(state, now)
+
+    def __expire_one(self, state, now):
+        if state.pending is not None and now - state.pending[1] > HANDOFF_TIMEOUT:
+            state.pending = None
+            self.__counters['timeouts'] += 1
+
+    def __subscribe(self):
+        """ receives the association messages (to know if the handoffs succeeded) """
+        if self.__sub is not None:
+            return
+        from pox.ethanol.ethanol.bus import bus, ASSOCIATION
+        with self.__lock:
+            if self.__sub is None:
+                self.__sub = bus.subscribe(ASSOCIATION, self.__associations, batch_size=64)
+
+    def __associations(self, events):
+        for ev in events:
+            kw = ev.kwargs
+            if kw.get('allowed') and kw.get('m_type') in JOIN_TYPES:
+                self.associated(kw.get('mac_sta'), kw.get('mac_ap'))
+
+    def stop(self):
+        """ stops receiving the association messages and the worker threads """
+        from pox.ethanol.ethanol.bus import bus
+        with self.__lock:
+            sub, self.__sub = self.__sub, None
+            executor, self.__executor = self.__executor, None
+        if sub is not None:
+            bus.unsubscribe(sub)
+        if executor is not None:
+            executor.shutdown()
+
+
+handoff = HandoffEngine()
+""" handoff engine used by process_snr_threshold() """
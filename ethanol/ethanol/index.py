@@ -0,0 +1,47 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# ##################################
+#
+# Copyright 2015 Henrique Moura
+#
+# This file is part of Ethanol.
+#
+# ##################################
+#
+"""
+This module provides the hash indexes (registry.Registry) used to find the objects of the controller in O(1):
+
+  * vaps_by_bssid: BSSID (MAC address of the VAP) --> VAP
+  * stations_by_mac: MAC address of the station --> Station
+  * radios_by_name: (ip of the AP, wiphy name) --> Radio
+
+the APs are indexed by ip in ap.py (connected_aps()) and the networks by SSID in network.py (list_of_networks()).
+The indexes are updated when the objects are created and removed (add_ap, remove_ap_byIP, add_station,
+remove_station, VAP.register_station/unregister_station).
+
+@author: Henrique Duarte Moura
+@organization: WINET/DCC/UFMG
+@copyright: h3dema (c) 2017
+@contact: henriquemoura@hotmail.com
+@licence: GNU General Public License v2.0
+(https://www.gnu.org/licenses/old-licenses/gpl-2.0.html)
+@since: July 2015
+@status: in development
+"""
+from pox.ethanol.ethanol.registry import Registry
+
+
+def mac_key(mac_address):
+    """ @return: the MAC address in the format used by the indexes (lower case) """
+    return mac_address.lower() if isinstance(mac_address, basestring) else mac_address
+
+
+vaps_by_bssid = Registry('vap', key=mac_key)
+""" BSSID --> VAP """
+
+stations_by_mac = Registry('station', key=mac_key)
+""" station's MAC address --> Station """
+
+radios_by_name = Registry('radio')
+""" (AP's ip, wiphy name) --> Radio """
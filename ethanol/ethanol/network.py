@@ -36,18 +36,21 @@ This module provides:
 
 from uuid import uuid4
 
+from pox.ethanol.ssl_message.msg_common import next_msg_id
 from pox.ethanol.ethanol.vap import VAP
 from pox.ethanol.ethanol.station import Station
 from pox.ethanol.ssl_message.msg_log import log
+from pox.ethanol.ethanol.registry import Registry
 
-__list_of_networks = {}
+__list_of_networks = Registry('network')
 """ list of all SSID's controlled by our ethanol controller
 """
 
 
 def list_of_networks():
+    """ @return: a read-only dictionary SSID --> Network (snapshot of the networks) """
     global __list_of_networks
-    return __list_of_networks
+    return __list_of_networks.snapshot()
 
 
 def add_network(ssid, net):
@@ -58,13 +61,8 @@ def add_network(ssid, net):
     """
     # ssid = net.__SSID
     global __list_of_networks
-    search_ssid = [i for i in __list_of_networks.keys() if i == ssid]
-    if len(search_ssid) > 0:
-        # duvida: atualizar a rede???
-        return False
-
-    __list_of_networks[ssid] = net
-    return True
+    # duvida: atualizar a rede???
+    return __list_of_networks.add_if_absent(ssid, net)
 
 
 def del_network(net):
@@ -73,11 +71,10 @@ def del_network(net):
     """
     global __list_of_networks
     if isinstance(net, Network):
-        ssid = net.__SSID
-        if ssid in __list_of_networks:
-            net = __list_of_networks[ssid]
+        ssid = net.SSID
+        net = __list_of_networks.remove(ssid)
+        if net is not None:
             net.releaseResources()  # release resources
-            del __list_of_networks[ssid]
 
 
 def get_or_create_network_by_ssid(ssid):
@@ -85,12 +82,13 @@ def get_or_create_network_by_ssid(ssid):
                 if none exists, a new one is created
     """
     global __list_of_networks
-    if ssid in __list_of_networks:
-        return __list_of_networks[ssid]
-    else:
-        net = Network(ssid)
-        add_network(net)
-        return net
+    net = __list_of_networks.get(ssid)
+    if net is None:
+        try:
+            net = Network(ssid)  # Network.__init__ inserts net in __list_of_networks
+        except ValueError:
+            net = __list_of_networks.get(ssid)  # created by another thread
+    return net
 
 
 class Network(object):
@@ -104,20 +102,17 @@ class Network(object):
             add the ssid to the list __list_of_networks, if does not exist
             if exists triggers an error
         """
-        if ssid in list_of_networks():
+        # create the network
+        self.__id = uuid4()  # random UUID
+        # set the name of the SSID
+        self.__SSID = ssid
+        self.__listVAP = []
+        # if the Netword does not exists, insert it in the list
+        if not add_network(ssid, self):
             # don't allow to create two networks with the same SSID
             log.debug('ssid %s already exists', ssid)
             raise ValueError("SSID %s already exists!" % ssid)
         else:
-            # create the network
-            self.__id = uuid4()  # random UUID
-            # set the name of the SSID
-            self.__SSID = ssid
-            self.__listVAP = []
-            self.__msg_id = 0  # message id used to identify the msg to the device
-            # if the Netword does not exists, insert it in the list
-            add_network(ssid, self)
-
             log.info('SSID: %s', self.__SSID)
             log.info('Constructor Network %s ended', self.__SSID)
 
@@ -132,16 +127,14 @@ class Network(object):
 
     def releaseResources(self):
         """ deconfigure vap's SSID """
-        for vap in self.__listVAP:
+        for vap in list(self.__listVAP):
             vap.ssid = None
 
     def __get_msg_id(self):
-        """ returns the current ID number to be used in the message and
-        increment this id by 1
+        """ returns the id to be used in the next message.
+           the ids are allocated by next_msg_id(), so they are unique in the whole controller
         """
-        id = self.__msg_id
-        self.__msg_id += 1
-        return id
+        return next_msg_id()
 
     @property
     def id(self):
@@ -169,15 +162,16 @@ class Network(object):
         if newSSID in list_of_networks():
             raise ValueError("ssid already exists!")
 
+        vaps = list(self.__listVAP)  # del_network releases the vaps
         del_network(self)
 
         self.__SSID = newSSID
-        add_network(self)
+        add_network(newSSID, self)
         # change vaps and network SSID
-        for vap in self.__listVAP:
+        for vap in vaps:
             vap.ssid = newSSID
-        if keepenabled:
-            vap.enabled = True
+            if keepenabled:
+                vap.enabled = True
 
     def associateVirtualAP(self, vap):
         """ join the vap to the network.
@@ -191,39 +185,35 @@ class Network(object):
             called by ssid.setter in VAP class
         """
         if isinstance(vap, VAP) and (vap in self.__listVAP):
+            self.__listVAP.remove(vap)  # before vap.ssid: the setter of the vap calls this method
             vap.enable = False
             vap.ssid = None
-            self.__listVAP.remove(vap)
 
-    def handoffUser(station, new_vap):
+    def handoffUser(self, station, new_vap):
         """ handles handoff. This method relies on 802.11 mobility domain
             feature.
             So the station and the AP should be configure to use mobility
             domain.
-            This method disassociates the station from a vap in the network and
-            moves it to a new_vap in this network.
-            It also sends a message to the station,
-            using station.triggerTransition(), instructing it to roam to a
-            new ap.
+            This method moves the station from its vap in the network to
+            new_vap in this network, sending a message to the station,
+            using station.triggerTransition(), instructing it to roam to the
+            new ap (see ethanol/handoff.py).
 
             @see: documentacao-para-handover.pdf for instruction on how to set
             up the station and the AP for handover.
-            **** not implemented yet ****
+            @return: True if the message was sent. the handoff is counted in handoff.stats()
+                     when the station associates to new_vap
 
         """
         if not isinstance(station, Station):
             raise ValueError("station parameter must be a Station class!")
         if not isinstance(new_vap, VAP):
             raise ValueError("vap parameter must be a VAP class!")
-
-        # TODO: migrate user
-        # 1) prepare new vap to get user
-        if new_vap.connectNewUser(station):
-            # 2) send message to station to request change
-            if station.triggerTransition(new_vap):
-                # 3) if not change, disconnect from old_vap
-                vap = station.vap()
-                vap.disassociateUser(station)
-        else:
-            raise Exception("Cannot connect station " + station +
-                            " to ap " + new_vap)
+        if new_vap not in self.__listVAP:
+            raise ValueError("vap %s is not in the network %s" % (new_vap.mac_address, self.__SSID))
+
+        from pox.ethanol.ethanol.handoff import handoff
+        vap = station.vap
+        return handoff.transition(station.mac_address,
+                                  None if vap is None else vap.mac_address,
+                                  new_vap.mac_address)
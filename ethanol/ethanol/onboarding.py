@@ -0,0 +1,261 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# ##################################
+#
+# Copyright 2015 Henrique Moura
+#
+# This file is part of Ethanol.
+#
+# ##################################
+#
+"""
+This module implements the onboarding of the APs (and the discovery of the stations, see station.py).
+
+The hello message is answered immediately: add_ap() creates the AP object in the PENDING state
+and puts it in the onboarding queue. The discovery of the AP (radios, SSIDs, VAPs, see AP.discover())
+is made by ONBOARDING_WORKERS threads, so many APs are discovered in parallel,
+while the steps of each AP are executed in sequence by one thread.
+If the discovery fails, it is retried after RETRY_BACKOFF, 2 * RETRY_BACKOFF, ... seconds (at most MAX_RETRIES times).
+
+When the discovery finishes, the AP is READY: it is inserted in connected_aps() and
+events_onboarding.on_ready(ap=ap) is called. If all retries fail, the AP is FAILED and
+events_onboarding.on_failed(ap=ap) is called; the next hello of the AP starts the onboarding again.
+
+  >>> from pox.ethanol.ethanol.onboarding import onboarding
+  >>> onboarding.stats()   # counters and percentiles of the onboarding latency (hello --> ready)
+
+@author: Henrique Duarte Moura
+@organization: WINET/DCC/UFMG
+@copyright: h3dema (c) 2017
+@contact: henriquemoura@hotmail.com
+@licence: GNU General Public License v2.0
+(https://www.gnu.org/licenses/old-licenses/gpl-2.0.html)
+@since: July 2015
+@status: in development
+"""
+from Queue import Queue, Full
+from threading import Thread, Lock, Timer
+
+from pox.ethanol.ssl_message.msg_log import log
+from pox.ethanol.ssl_message.latency import monotonic, LatencyHistogram
+from pox.ethanol.ethanol.registry import Registry
+from pox.ethanol.ethanol.bus import BusEvents
+
+ASYNC_ONBOARDING = True
+""" if False, add_ap() discovers the AP in the thread that processes the hello message"""
+
+ONBOARDING_WORKERS = 32
+""" number of APs discovered in parallel"""
+
+ONBOARDING_QUEUE_SIZE = 4096
+""" maximum number of APs waiting to be discovered"""
+
+MAX_RETRIES = 5
+""" number of times the discovery is retried before the AP is considered failed"""
+
+RETRY_BACKOFF = 1.0
+""" seconds before the first retry (doubled at each retry)"""
+
+MAX_BACKOFF = 60.0
+""" maximum seconds between two retries"""
+
+PENDING = 'pending'
+""" the AP said hello, but its discovery did not finish"""
+
+READY = 'ready'
+""" the AP was discovered: its radios and VAPs are available"""
+
+FAILED = 'failed'
+""" all the attempts to discover the AP failed"""
+
+events_onboarding = BusEvents('onboarding', key=lambda **kw: kw['ap'].ip)
+""" events_onboarding.on_ready(ap=ap) and events_onboarding.on_failed(ap=ap)
+    (topics 'onboarding.on_ready' and 'onboarding.on_failed' of the event bus, key: ip of the AP) """
+
+
+class OnboardingPipeline(object):
+    """ discovers the devices in a pool of threads.
+        a device is an object with the attributes ip and state, and the method discover() that
+        returns True if the device is READY or False if the discovery should be retried
+    """
+
+    def __init__(self, name, on_ready, on_failed=None,
+                 num_workers=ONBOARDING_WORKERS, max_queue=ONBOARDING_QUEUE_SIZE):
+        """
+          @param name: kind of device (used in the logs)
+          @param on_ready: function called with the device when its discovery finishes
+          @param on_failed: function called with the device when all the attempts failed
+          @param num_workers: number of threads
+          @param max_queue: maximum number of devices waiting in the queue
+        """
+        self.name = name
+        self.on_ready = on_ready
+        self.on_failed = on_failed
+        self.num_workers = num_workers
+        self.__queue = Queue(max_queue)
+        self.__lock = Lock()
+        self.__threads = []
+        self.pending = Registry('pending_%s' % name)
+        """ ip --> device that is in the pipeline (waiting, being discovered or waiting a retry)"""
+        self.__attempts = {}  # ip --> number of failed attempts
+        self.__started = {}  # ip --> time of the hello
+        self.latency = LatencyHistogram('onboarding')
+        """ hello --> ready (including the retries)"""
+        self.discovery_latency = LatencyHistogram('discovery')
+        """ duration of each attempt"""
+        self.__counters = {'submitted': 0,
+                           'coalesced': 0,  # hellos of devices already in the pipeline
+                           'rejected': 0,  # queue full
+                           'ready': 0,
+                           'retries': 0,
+                           'failed': 0,
+                           'cancelled': 0,
+                           }
+
+    def stats(self):
+        """ @return: dictionary with the counters, the number of pending devices and the latency percentiles """
+        with self.__lock:
+            d = dict(self.__counters)
+        d['pending'] = len(self.pending)
+        d['queue_length'] = self.__queue.qsize()
+        d['latency'] = self.latency.as_dict()
+        d['discovery_latency'] = self.discovery_latency.as_dict()
+        return d
+
+    def __count(self, name):
+        with self.__lock:
+            self.__counters[name] += 1
+
+    def __start(self):
+        with self.__lock:
+            while len(self.__threads) < self.num_workers:
+                t = Thread(target=self.__worker, name='onboarding-%s' % self.name)
+                t.daemon = True
+                t.start()
+                self.__threads.append(t)
+
+    def submit(self, ip, factory):
+        """ puts the device in the pipeline, unless it is already there
+            @param ip: ip address of the device
+            @param factory: function that creates the device object (not discovered yet)
+            @return: the new device object, None if the device was already in the pipeline or the queue is full
+        """
+        device, created = self.pending.get_or_create(ip, factory)
+        if not created:
+            self.__count('coalesced')
+            return None
+        with self.__lock:
+            self.__attempts[ip] = 0
+            self.__started[ip] = monotonic()
+        if not self.__enqueue(device):
+            self.__forget(device)
+            self.__count('rejected')
+            log.warning("Onboarding queue is full: %s %s will be discovered in its next hello", self.name, ip)
+            return None
+        self.__count('submitted')
+        return device
+
+    def get_pending(self, ip):
+        """ @return: the device with this ip that is in the pipeline, or None """
+        return self.pending.get(ip)
+
+    def cancel(self, ip):
+        """ removes the device from the pipeline (e.g. it said bye)
+            @return: True if the device was in the pipeline
+        """
+        device = self.pending.remove(ip)
+        if device is None:
+            return False
+        self.__forget(device)
+        self.__count('cancelled')
+        return True
+
+    def __forget(self, device):
+        self.pending.remove(device.ip, device)
+        with self.__lock:
+            self.__attempts.pop(device.ip, None)
+            self.__started.pop(device.ip, None)
+
+    def __enqueue(self, device):
+        try:
+            self.__queue.put_nowait(device)
+        except Full:
+            return False
+        if len(self.__threads) < self.num_workers:
+            self.__start()
+        return True
+
+    def __retry(self, device):
+        """ the device goes back to the queue (called by the Timer) """
+        if self.pending.get(device.ip) is not device:
+            return  # cancelled
+        if not self.__enqueue(device):
+            log.warning("Onboarding queue is full: %s %s will be discovered in its next hello", self.name, device.ip)
+            self.__forget(device)
+            self.__count('rejected')
+
+    def __worker(self):
+        while True:
+            device = self.__queue.get()
+            if self.pending.get(device.ip) is not device:
+                continue  # cancelled while it was in the queue
+            t0 = monotonic()
+            try:
+                ok = device.discover()
+            except Exception as e:
+                log.error("Error discovering %s %s: %s", self.name, device.ip, e)
+                ok = False
+            self.discovery_latency.record(monotonic() - t0)
+            if ok:
+                self.__ready(device)
+            else:
+                self.__failed(device)
+
+    def __ready(self, device):
+        with self.__lock:
+            started = self.__started.get(device.ip)
+        if self.pending.get(device.ip) is not device:
+            return  # cancelled during the discovery
+        try:
+            self.on_ready(device)
+        finally:
+            self.__forget(device)
+        if started is not None:
+            self.latency.record(monotonic() - started)
+        self.__count('ready')
+        log.info("%s %s is ready", self.name, device.ip)
+
+    def __failed(self, device):
+        with self.__lock:
+            n = self.__attempts.get(device.ip, 0) + 1
+            self.__attempts[device.ip] = n
+        if n > MAX_RETRIES:
+            device.state = FAILED
+            self.__forget(device)
+            self.__count('failed')
+            log.warning("Could not discover %s %s after %d attempts", self.name, device.ip, n)
+            if self.on_failed is not None:
+                self.on_failed(device)
+            return
+        backoff = min(RETRY_BACKOFF * (2 ** (n - 1)), MAX_BACKOFF)
+        log.info("Discovery of %s %s failed. Retrying in %.1f s", self.name, device.ip, backoff)
+        self.__count('retries')
+        t = Timer(backoff, self.__retry, args=(device,))
+        t.daemon = True
+        t.start()
+
+
+def _ap_ready(ap):
+    """ the AP was discovered: inserts it in connected_aps() """
+    from pox.ethanol.ethanol.ap import publish_ap
+    publish_ap(ap)
+    events_onboarding.on_ready(ap=ap)
+
+
+def _ap_failed(ap):
+    events_onboarding.on_failed(ap=ap)
+
+
+onboarding = OnboardingPipeline('AP', _ap_ready, _ap_failed)
+""" pipeline used by add_ap() """
@@ -0,0 +1,387 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# ##################################
+#
+# Copyright 2015 Henrique Moura
+#
+# This file is part of Ethanol.
+#
+# ##################################
+#
+"""
+This module measures the control plane latency of the devices (APs and stations) with MSG_PING.
+
+A scheduler thread pings each device at a fixed rate (AP_PROBE_INTERVAL, STATION_PROBE_INTERVAL), using the
+kept connections of the transport (see msg_common.get_transport), so each ping measures a request of the
+controller, not a TLS handshake. The pings are sent by PROBE_WORKERS threads; a device whose previous ping
+is still waiting is skipped (the round is counted in 'skipped').
+
+Each device has a latency histogram (all pings) and a window histogram (the last PROBE_WINDOW pings).
+At the end of each window the state of the device is evaluated:
+  - DEGRADED if the p90 of the window is above DEGRADED_LATENCY, or if its median is above DEGRADED_FACTOR
+    times the baseline (the lowest median of the windows) plus DEGRADED_MARGIN, or if DEGRADED_LOSS of the
+    pings were lost. The median is used for the relative limit: one slow ping does not flag the device;
+  - UNREACHABLE as soon as UNREACHABLE_LOSSES pings in a row are lost;
+  - HEALTHY otherwise.
+The changes of state are published in the bus (topic HEALTH, key: ip of the device).
+
+  >>> from pox.ethanol.ethanol.prober import prober
+  >>> prober.start()                  # pings all connected APs and stations (see sync())
+  >>> prober.state(ap.get_connection) # HEALTHY, DEGRADED or UNREACHABLE
+  >>> prober.degraded()               # devices that are not healthy
+  >>> prober.stats()
+
+@author: Henrique Duarte Moura
+@organization: WINET/DCC/UFMG
+@copyright: h3dema (c) 2017
+@contact: henriquemoura@hotmail.com
+@licence: GNU General Public License v2.0
+(https://www.gnu.org/licenses/old-licenses/gpl-2.0.html)
+@since: July 2015
+@status: in development
+"""
+import heapq
+import random
+from itertools import count
+from threading import Thread, Lock, Condition
+
+from pox.ethanol.ssl_message.msg_log import log
+from pox.ethanol.ssl_message.latency import monotonic, LatencyHistogram
+
+AP_PROBE_INTERVAL = 1.0
+""" seconds between the pings of an AP"""
+
+STATION_PROBE_INTERVAL = 5.0
+""" seconds between the pings of a station"""
+
+PROBE_SIZE = 64
+""" payload of the pings (bytes)"""
+
+PROBE_WORKERS = 16
+""" threads that send the pings"""
+
+SYNC_INTERVAL = 5.0
+""" seconds between the updates of the list of devices (see sync)"""
+
+PROBE_WINDOW = 10
+""" number of pings of each evaluation of the state of a device"""
+
+DEGRADED_LATENCY = 0.1
+""" p90 (seconds) above which a device is degraded"""
+
+DEGRADED_FACTOR = 4.0
+""" a device is degraded if its median is above DEGRADED_FACTOR * baseline + DEGRADED_MARGIN"""
+
+DEGRADED_MARGIN = 0.005
+""" seconds added to the relative limit (the baseline of a fast device is a few microseconds)"""
+
+DEGRADED_LOSS = 0.2
+""" fraction of lost pings in a window above which a device is degraded"""
+
+UNREACHABLE_LOSSES = 3
+""" number of pings lost in a row that make a device unreachable"""
+
+HEALTHY = 'healthy'
+DEGRADED = 'degraded'
+UNREACHABLE = 'unreachable'
+
+KIND_AP = 'ap'
+KIND_STATION = 'station'
+
+
+class ProbeTarget(object):
+    """ state of the pings of one device """
+    __slots__ = ('server', 'kind', 'auto', 'interval', 'when', 'in_flight', 'latency', 'window', 'window_sent',
+                 'window_lost', 'sent', 'lost', 'consecutive', 'baseline', 'state', 'last_rtt', 'changed')
+
+    def __init__(self, server, kind, interval, auto=False):
+        self.server = server  # (ip, port)
+        self.kind = kind
+        self.auto = auto  # added by sync()
+        self.interval = interval
+        self.when = None  # monotonic() of the next ping
+        self.in_flight = False
+        self.latency = LatencyHistogram('%s:%d' % server)
+        self.window = LatencyHistogram()
+        self.window_sent = 0
+        self.window_lost = 0
+        self.sent = 0
+        self.lost = 0
+        self.consecutive = 0  # pings lost in a row
+        self.baseline = None  # lowest median of the windows (seconds)
+        self.state = HEALTHY
+        self.last_rtt = None
+        self.changed = None  # monotonic() of the last change of state
+
+    def as_dict(self):
+        return {'kind': self.kind,
+                'interval': self.interval,
+                'state': self.state,
+                'sent': self.sent,
+                'lost': self.lost,
+                'loss': float(self.lost) / self.sent if self.sent > 0 else 0.0,
+                'baseline': self.baseline,
+                'last_rtt': self.last_rtt,
+                'latency': self.latency.as_dict(),
+                }
+
+
+class LatencyProber(object):
+    """ pings the devices in the background and keeps their latency histograms and health state
+    """
+
+    def __init__(self, ap_interval=AP_PROBE_INTERVAL, station_interval=STATION_PROBE_INTERVAL,
+                 p_size=PROBE_SIZE, num_workers=PROBE_WORKERS, window=PROBE_WINDOW, auto_sync=True):
+        """
+          @param ap_interval: seconds between the pings of an AP
+          @param station_interval: seconds between the pings of a station
+          @param p_size: payload of the pings (bytes)
+          @param num_workers: threads that send the pings
+          @param window: number of pings of each evaluation
+          @param auto_sync: if True, the connected APs and stations are added (and removed) automatically
+        """
+        self.ap_interval = ap_interval
+        self.station_interval = station_interval
+        self.p_size = p_size
+        self.num_workers = num_workers
+        self.window = window
+        self.auto_sync = auto_sync
+        self.__cond = Condition(Lock())
+        self.__targets = {}  # (ip, port) --> ProbeTarget
+        self.__heap = []  # (monotonic() of the next ping, (ip, port))
+        self.__ids = count()
+        self.__rnd = random.Random()
+        self.__thread = None
+        self.__executor = None
+        self.__running = False
+        self.latency = LatencyHistogram('ping')
+        """ round trip time of all pings"""
+        self.__counters = {'sent': 0, 'lost': 0, 'skipped': 0, 'changes': 0}
+
+    def stats(self, server=None):
+        """ @param server: (ip, port) of a device (None = all devices)
+            @return: dictionary with the counters and the latency of the prober and of the device(s)
+        """
+        with self.__cond:
+            if server is not None:
+                target = self.__targets.get(server)
+                return None if target is None else target.as_dict()
+            d = dict(self.__counters)
+            targets = self.__targets.values()
+        d['devices'] = len(targets)
+        for state in (HEALTHY, DEGRADED, UNREACHABLE):
+            d[state] = sum(1 for t in targets if t.state == state)
+        d['loss'] = float(d['lost']) / d['sent'] if d['sent'] > 0 else 0.0
+        d['latency'] = self.latency.as_dict()
+        return d
+
+    #
+    # devices
+    #
+    def add(self, server, kind=KIND_AP, interval=None, auto=False):
+        """ pings the device (ip, port). if it is already probed, changes its interval
+            @param kind: KIND_AP or KIND_STATION (default interval)
+            @param auto: if True, sync() stops pinging the device when it disconnects
+        """
+        if interval is None:
+            interval = self.ap_interval if kind == KIND_AP else self.station_interval
+        now = monotonic()
+        with self.__cond:
+            target = self.__targets.get(server)
+            if target is None:
+                target = self.__targets[server] = ProbeTarget(server, kind, interval, auto)
+            elif target.interval == interval:
+                return target
+            target.interval = interval
+            # spreads the first pings in the interval (the devices are not pinged in bursts)
+            target.when = now + self.__rnd.uniform(0, interval)
+            heapq.heappush(self.__heap, (target.when, server))
+            self.__cond.notify_all()
+            return target
+
+    def remove(self, server):
+        """ stops pinging the device """
+        with self.__cond:
+            return self.__targets.pop(server, None) is not None
+
+    def servers(self):
+        """ @return: list of the (ip, port) of the devices probed """
+        with self.__cond:
+            return self.__targets.keys()
+
+    def sync(self):
+        """ pings the connected APs and stations, and stops pinging the ones that disconnected
+            (the devices added by the application are kept)
+        """
+        from pox.ethanol.ethanol.ap import connected_aps
+        from pox.ethanol.ethanol.index import stations_by_mac
+        devices = {}
+        for ap in connected_aps().values():
+            devices[ap.get_connection] = KIND_AP
+        for sta in stations_by_mac.values():
+            devices.setdefault(sta.get_connection, KIND_STATION)
+        with self.__cond:
+            gone = [s for s, t in self.__targets.iteritems() if t.auto and s not in devices]
+            new = [(s, k) for s, k in devices.items() if s not in self.__targets]
+        for server in gone:
+            self.remove(server)
+        for server, kind in new:
+            self.add(server, kind, auto=True)
+
+    #
+    # health
+    #
+    def state(self, server):
+        """ @return: HEALTHY, DEGRADED or UNREACHABLE (HEALTHY if the device is not probed) """
+        with self.__cond:
+            target = self.__targets.get(server)
+            return HEALTHY if target is None else target.state
+
+    def healthy(self, server):
+        return self.state(server) == HEALTHY
+
+    def degraded(self):
+        """ @return: dictionary (ip, port) --> state of the devices that are not healthy """
+        with self.__cond:
+            return dict((s, t.state) for s, t in self.__targets.iteritems() if t.state != HEALTHY)
+
+    def __evaluate(self, target):
+        """ @return: the state of the device at the end of a window. must hold the lock """
+        if target.window_lost >= DEGRADED_LOSS * target.window_sent:
+            return DEGRADED
+        if target.window.count == 0:
+            return target.state
+        p50, p90 = [v for _, v in sorted(target.window.percentiles((50, 90)).items())]
+        target.baseline = p50 if target.baseline is None else min(target.baseline, p50)
+        if p90 > DEGRADED_LATENCY or p50 > DEGRADED_FACTOR * target.baseline + DEGRADED_MARGIN:
+            return DEGRADED
+        return HEALTHY
+
+    def record(self, target, rtt):
+        """ result of one ping of target
+            @param rtt: round trip time (seconds), None if the ping was lost
+        """
+        with self.__cond:
+            target.in_flight = False
+            target.sent += 1
+            target.window_sent += 1
+            self.__counters['sent'] += 1
+            if rtt is None:
+                target.lost += 1
+                target.window_lost += 1
+                target.consecutive += 1
+                self.__counters['lost'] += 1
+            else:
+                target.consecutive = 0
+                target.last_rtt = rtt
+                target.latency.record(rtt)
+                target.window.record(rtt)
+                self.latency.record(rtt)
+            previous = target.state
+            state = previous
+            if target.consecutive >= UNREACHABLE_LOSSES:
+                state = UNREACHABLE
+            elif previous == UNREACHABLE and rtt is not None:
+                state = HEALTHY  # answered again, the next window tells if it is degraded
+            if target.window_sent >= self.window:
+                if target.consecutive < UNREACHABLE_LOSSES:
+                    state = self.__evaluate(target)
+                target.window.reset()
+                target.window_sent = 0
+                target.window_lost = 0
+            if state == previous:
+                return
+            target.state = state
+            target.changed = monotonic()
+            self.__counters['changes'] += 1
+            info = target.as_dict()
+        log.info("Device %s:%d is %s (was %s)", target.server[0], target.server[1], state, previous)
+        from pox.ethanol.ethanol.bus import bus, HEALTH
+        bus.publish(HEALTH, key=target.server[0], ip=target.server[0], port=target.server[1],
+                    state=state, previous=previous, stats=info)
+
+    #
+    # pings
+    #
+    def probe(self, target):
+        """ sends one ping to the device and records the result
+            @return: the round trip time (seconds), None if the ping was lost
+        """
+        from pox.ethanol.ssl_message.msg_ping import ping
+        try:
+            rtt = ping(target.server, id=next(self.__ids) & 0x7fffffff, p_size=self.p_size)
+        except Exception as e:
+            log.debug("Ping to %s:%d failed: %s", target.server[0], target.server[1], e)
+            rtt = None
+        self.record(target, rtt)
+        return rtt
+
+    def start(self):
+        """ starts the scheduler thread """
+        from pox.ethanol.ssl_message.aio import Executor
+        with self.__cond:
+            if self.__running:
+                return
+            self.__running = True
+            self.__executor = Executor(self.num_workers)
+        self.__thread = Thread(target=self.__run, name='prober')
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def stop(self):
+        """ stops the scheduler thread and waits for the pings in flight """
+        with self.__cond:
+            if not self.__running:
+                return
+            self.__running = False
+            self.__cond.notify_all()
+        self.__thread.join()
+        self.__thread = None
+        self.__executor.shutdown()
+        self.__executor = None
+
+    def __due(self, now):
+        """ @return: the targets that must be pinged now (and schedules their next pings). must hold the lock """
+        due = []
+        while self.__heap and self.__heap[0][0] <= now:
+            when, server = heapq.heappop(self.__heap)
+            target = self.__targets.get(server)
+            if target is None or target.when != when:
+                continue  # removed, or rescheduled by add()
+            # fixed rate, but without a burst of pings after a stall
+            target.when = max(when + target.interval, now)
+            heapq.heappush(self.__heap, (target.when, server))
+            if target.in_flight:
+                self.__counters['skipped'] += 1
+                continue
+            target.in_flight = True
+            due.append(target)
+        return due
+
+    def __run(self):
+        next_sync = monotonic()
+        while True:
+            now = monotonic()
+            if self.auto_sync and now >= next_sync:
+                try:
+                    self.sync()
+                except Exception as e:
+                    log.error("Prober could not update the list of devices: %s", e)
+                next_sync = now + SYNC_INTERVAL
+            with self.__cond:
+                if not self.__running:
+                    return
+                due = self.__due(now)
+                if not due:
+                    wait = self.__heap[0][0] - now if self.__heap else SYNC_INTERVAL
+                    if self.auto_sync:
+                        wait = min(wait, next_sync - now)
+                    self.__cond.wait(max(wait, 0.001))
+                    continue
+            for target in due:
+                self.__executor.submit(self.probe, target)
+
+
+prober = LatencyProber()
+""" prober of the controller (started by the application, see start()) """
@@ -38,7 +38,26 @@ from pox.ethanol.ssl_message.msg_interfaces import get_interfaces
 from pox.ethanol.ssl_message.msg_powersave import \
     set_powersave_mode, get_powersave_mode
 from pox.ethanol.ssl_message.msg_log import log
+from pox.ethanol.ssl_message.msg_common import next_msg_id
 from pox.ethanol.ssl_message.msg_beacon_interval import get_beacon_interval, set_beacon_interval
+from pox.ethanol.ethanol.cache import CachedObject, cached_property
+from pox.ethanol.ethanol.index import radios_by_name
+
+
+STATIC_TTL = 300.0
+""" seconds the capabilities of the radio (channels, bitrates) are cached"""
+
+CONFIG_TTL = 60.0
+""" seconds the configuration of the radio (interfaces, preamble, beacon interval) is cached"""
+
+CHANNEL_TTL = 5.0
+""" seconds the current channel is cached (it can be changed by the AP, e.g. by ACS)"""
+
+
+def get_radio_by_name(ip, wiphy_name):
+    """ @return: the Radio object of the AP with this ip whose wireless interface is wiphy_name, or None
+    """
+    return radios_by_name.get((ip, wiphy_name))
 
 
 # import re
@@ -46,7 +65,7 @@ from pox.ethanol.ssl_message.msg_beacon_interval import get_beacon_interval, set
 #     return re.fullmatch(r"^[0-9a-fA-F]$", s or "") is not None
 
 
-class Radio(object):
+class Radio(CachedObject):
     """
     Radio represents the physical radios attached to an AP
 
@@ -63,10 +82,10 @@ class Radio(object):
         self.__id = uuid.uuid4()  #
         self.__ap = ap
 
-        self.__msg_id = 0  # message id used to identify the msg to the device
         self.__wiphy_name = wiphy_name
         self.__ip = ip
         self.__port = port
+        radios_by_name.add((ip, wiphy_name), self)
 
     @property
     def id(self):
@@ -79,13 +98,10 @@ class Radio(object):
 
     @property
     def msg_id(self):
-        """handles the radio message id's
-          @return: an id to be used in the message
-          and increments the current id
+        """ returns the id to be used in the next message.
+           the ids are allocated by next_msg_id(), so they are unique in the whole controller
         """
-        id = self.__msg_id
-        self.__msg_id += 1
-        return id
+        return next_msg_id()
 
     def __get_connection(self):
         """
@@ -102,6 +118,20 @@ class Radio(object):
         return self.__wiphy_name
 
     @property
+    def ip(self):
+        """
+          @return: the ip address of the AP (with wiphy, identifies the radio: see get_radio_by_name)
+        """
+        return self.__ip
+
+    @property
+    def ap(self):
+        """
+          @return: the AP object that has this radio
+        """
+        return self.__ap
+
+    @cached_property(ttl=STATIC_TTL)
     def validChannels(self):
         """ informs a list of valid channel numbers, supported by the device
         in its wireless interface
@@ -114,7 +144,7 @@ class Radio(object):
                                   intf_name=self.__wiphy_name)
         return value
 
-    @property
+    @cached_property(ttl=CHANNEL_TTL)
     def currentChannel(self):
         """
           @return: the channel the AP is operating
@@ -154,7 +184,7 @@ class Radio(object):
         """
         server = self.__get_connection()  # allows to send message to the AP
 
-    @property
+    @cached_property(ttl=STATIC_TTL)
     def tx_bitrates(self):
         """ @return: all bit_rates this radio supports
         """
@@ -226,6 +256,20 @@ class Radio(object):
         return value
 
     @property
+    def channelInfoArray(self):
+        """
+        same as channelInfo, but returns the information of all channels
+        as a numpy structured array (one record per channel). Requires numpy
+        """
+        if self.__wiphy_name is None:
+            return None
+        server = self.__get_connection()  # allows to send message to the AP
+        msg, value = get_channelinfo(server, id=self.msg_id,
+                                     intf_name=self.__wiphy_name,
+                                     as_array=True)
+        return value
+
+    @cached_property(ttl=CONFIG_TTL)
     def wireless_interfaces(self):
         """get a list of all wireless interfaces
         @return: list of interfaces
@@ -234,7 +278,7 @@ class Radio(object):
         msg, value = get_interfaces(server, id=self.msg_id)
         return value
 
-    @property
+    @cached_property(ttl=STATIC_TTL)
     def fastBSSTransition(self):
         """connect to ap requesting if it is "Fast BSS Transition" compatible
         """
@@ -245,7 +289,7 @@ class Radio(object):
                                             intf_name=self.__wiphy_name)
         return value
 
-    @property
+    @cached_property(ttl=CONFIG_TTL)
     def _802_11b_Preamble(self):
         """ connect to ap requesting which type of preamble is set"""
         server = self.__get_connection()
@@ -263,7 +307,7 @@ class Radio(object):
         set_preamble(server, id=self.msg_id, intf_name=self.__wiphy_name, preamble=value)
         log.debug("preamble set to %d", value)
 
-    @property
+    @cached_property(ttl=CONFIG_TTL)
     def beaconInterval(self):
         """connect to ap requesting beacon interval value"""
         server = self.__get_connection()
@@ -295,14 +339,16 @@ class Radio(object):
         # call ap to get information
         return None
 
-    def getACS(self, num_tests=1):
+    def getACS(self, num_tests=1, as_array=False):
         """ request that the AP computes the ACS factor for each frequency
         in the intf_name interface
+        @param as_array: if True, acs is a numpy structured array with the fields freq and factor
         """
         server = self.__get_connection()
         msg, num_chan, acs = get_acs(server, id=self.msg_id,
                                      intf_name=self.__wiphy_name,
-                                     num_tests=num_tests)
+                                     num_tests=num_tests,
+                                     as_array=as_array)
         log.debug("ACS message received with %d channels", num_chan)
         return num_chan, acs
 
@@ -0,0 +1,230 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# ##################################
+#
+# Copyright 2015 Henrique Moura
+#
+# This file is part of Ethanol.
+#
+# ##################################
+#
+"""
+This module provides the Registry used to keep the topology of the controller
+(APs, stations, networks, VAPs registered for association and metric messages).
+
+The registry is modified by the threads of the ssl server (one per connection), while the
+applications iterate it. The writers lock only one stripe of the registry (the keys are
+spread among REGISTRY_STRIPES locks), so the processing of the hello/association messages
+of different devices does not wait for each other.
+The readers get a snapshot(): an immutable dictionary with a consistent view of the registry.
+The snapshot is built on the first read after a change, and shared by all readers until the next change,
+so the applications can iterate it without locks and without "dict changed size during iteration".
+
+  >>> aps = connected_aps()   # snapshot
+  >>> for ip, ap in aps.items():
+  ...     print ip, ap
+
+@author: Henrique Duarte Moura
+@organization: WINET/DCC/UFMG
+@copyright: h3dema (c) 2017
+@contact: henriquemoura@hotmail.com
+@licence: GNU General Public License v2.0
+(https://www.gnu.org/licenses/old-licenses/gpl-2.0.html)
+@since: July 2015
+@status: in development
+"""
+from itertools import count
+from threading import Lock
+
+REGISTRY_STRIPES = 16
+""" number of locks used by the writers of each registry"""
+
+
+class Snapshot(dict):
+    """ read-only dictionary returned by Registry.snapshot() """
+
+    def __readonly(self, *args, **kwargs):
+        raise TypeError("registry snapshot is read-only")
+
+    __setitem__ = __delitem__ = __readonly
+    clear = pop = popitem = setdefault = update = __readonly
+
+    def __hash__(self):
+        return id(self)
+
+
+class Registry(object):
+    """ thread-safe dictionary key --> object, with lock striping for the writers and
+        copy-on-write snapshots for the readers
+    """
+
+    def __init__(self, name, key=None, stripes=REGISTRY_STRIPES):
+        """
+          @param name: identifies the registry (used in the logs)
+          @param key: function applied to the keys (e.g. index.mac_key), None = the key is used as is
+          @param stripes: number of locks
+        """
+        self.name = name
+        self.__key = key or (lambda k: k)
+        self.__locks = [Lock() for _ in range(stripes)]
+        self.__items = {}
+        self.__key_locks = {}  # key --> lock used by get_or_create()
+        self.__snapshot_lock = Lock()
+        self.__snapshot = Snapshot()
+        self.__versions = count(1)
+        self.__version = 0  # changed by each write: a new number from self.__versions
+        self.__snapshot_version = 0
+
+    def __lock(self, key):
+        """ @return: the lock of the stripe of key """
+        return self.__locks[hash(key) % len(self.__locks)]
+
+    def __changed(self):
+        """ must be called holding a stripe lock.
+            next() is atomic, so writers of different stripes never reuse a version
+        """
+        self.__version = next(self.__versions)
+
+    def __len__(self):
+        return len(self.__items)
+
+    def __contains__(self, key):
+        return self.__key(key) in self.__items
+
+    def __iter__(self):
+        return iter(self.snapshot())
+
+    def get(self, key, default=None):
+        """ @return: the object of key, or default. does not lock """
+        return self.__items.get(self.__key(key), default)
+
+    def add(self, key, obj):
+        """ inserts (or replaces) the object of key """
+        if key is None:
+            return
+        key = self.__key(key)
+        with self.__lock(key):
+            self.__items[key] = obj
+            self.__changed()
+
+    def add_if_absent(self, key, obj):
+        """ inserts obj only if there is no object with this key
+            @return: True if obj was inserted
+        """
+        key = self.__key(key)
+        with self.__lock(key):
+            if key in self.__items:
+                return False
+            self.__items[key] = obj
+            self.__changed()
+            return True
+
+    def get_or_create(self, key, factory):
+        """ returns the object of key. If it does not exist, creates it calling factory()
+            the other keys of the stripe are not locked while factory() runs.
+            if factory() returns None, nothing is inserted
+
+            @return: tuple (object, created) - created is True if the object was created
+        """
+        key = self.__key(key)
+        obj = self.__items.get(key)
+        if obj is not None:
+            return obj, False
+        stripe = self.__lock(key)
+        with stripe:
+            key_lock = self.__key_locks.setdefault(key, Lock())
+        with key_lock:  # only one thread creates the object
+            obj = self.__items.get(key)
+            if obj is not None:
+                return obj, False
+            try:
+                obj = factory()
+            except Exception:
+                with stripe:
+                    self.__key_locks.pop(key, None)
+                raise
+            with stripe:
+                self.__key_locks.pop(key, None)
+                if obj is None:
+                    return None, False
+                self.__items[key] = obj
+                self.__changed()
+        return obj, True
+
+    def remove(self, key, obj=None):
+        """ removes the entry of key.
+            @param obj: if not None, removes only if key is mapped to obj (a newer object may use the same key)
+            @return: the object removed, or None
+        """
+        if key is None:
+            return None
+        key = self.__key(key)
+        with self.__lock(key):
+            current = self.__items.get(key)
+            if current is None or (obj is not None and current is not obj):
+                return None
+            del self.__items[key]
+            self.__changed()
+            return current
+
+    def pop(self, key, default=None):
+        """ removes the entry of key
+            @return: the object removed, or default
+        """
+        obj = self.remove(key)
+        return default if obj is None else obj
+
+    def replace(self, key, old, new):
+        """ replaces old by new (compare-and-set), used to update immutable values
+            @return: True if the value was replaced
+        """
+        key = self.__key(key)
+        with self.__lock(key):
+            if self.__items.get(key) is not old:
+                return False
+            if new is None:
+                self.__items.pop(key, None)
+            else:
+                self.__items[key] = new
+            self.__changed()
+            return True
+
+    def clear(self):
+        for lock in self.__locks:
+            lock.acquire()
+        try:
+            self.__items.clear()
+            self.__changed()
+        finally:
+            for lock in self.__locks:
+                lock.release()
+
+    def snapshot(self):
+        """ @return: a Snapshot (read-only dictionary) with the contents of the registry.
+            the same object is returned until the registry changes
+        """
+        if self.__snapshot_version == self.__version:
+            return self.__snapshot
+        with self.__snapshot_lock:
+            if self.__snapshot_version != self.__version:
+                for lock in self.__locks:  # consistent view: no writer during the copy
+                    lock.acquire()
+                try:
+                    version = self.__version
+                    snapshot = Snapshot(self.__items)
+                finally:
+                    for lock in self.__locks:
+                        lock.release()
+                self.__snapshot = snapshot
+                self.__snapshot_version = version
+            return self.__snapshot
+
+    def keys(self):
+        return self.snapshot().keys()
+
+    def values(self):
+        return self.snapshot().values()
+
+    def items(self):
+        return self.snapshot().items()
@@ -21,17 +21,33 @@
 """
 from pox.ethanol.ethanol.device import Device
 from pox.ethanol.ethanol.ap import get_vap_by_mac_address
+from pox.ethanol.ethanol.index import stations_by_mac
+from pox.ethanol.ethanol.registry import Registry, Snapshot
+from pox.ethanol.ethanol.onboarding import OnboardingPipeline, PENDING, READY
 
 from pox.ethanol.ssl_message.msg_sta_link_information import get_sta_link_info
 from pox.ethanol.ssl_message.msg_interfaces import get_interfaces
 from pox.ethanol.ssl_message.msg_log import log
+from pox.ethanol.ssl_message.latency import monotonic
+from pox.ethanol.ssl_message.msg_batch import Batch
+from pox.ethanol.ssl_message.msg_common import next_msg_id
 
 
 '''
   list of all stations connected to the controller
   mantained by add_station() and remove_station()
+  ip --> read-only dictionary intf_name --> station (replaced, not changed, by remove_station)
 '''
-list_of_stations = {}
+list_of_stations = Registry('station_ip')
+
+ASYNC_STATION_DISCOVERY = True
+""" if False, add_station() creates the stations in the thread that processes the hello message"""
+
+NO_WIRELESS_TTL = 300.0
+""" seconds the hellos of a station without wireless interfaces are ignored (it is not discovered again)"""
+
+_no_wireless = Registry('station_no_wireless')
+""" ip --> monotonic() of the discovery that found no wireless interface"""
 
 
 def add_station(client_address):
@@ -42,33 +58,123 @@ def add_station(client_address):
       This function updates a list of these objects.
 
       client_address = (ip, port) used by the Hello message's process
+
+      if ASYNC_STATION_DISCOVERY is True, the objects are created by the station discovery pipeline
+      (see onboarding.py) and this function returns immediately.
+      Repeated hellos of a station that is being discovered are ignored.
+
+      @return: StationDiscovery object (its attribute stations has the stations when its state is READY),
+               or None if the station exists or is being discovered
     '''
     ip = client_address[0]
+    if ip in list_of_stations:
+        log.debug("Station with IP %s exists", ip)
+        return None
+    found = _no_wireless.get(ip)
+    if found is not None:
+        if monotonic() - found < NO_WIRELESS_TTL:
+            log.debug("Station with IP %s has no wireless interface", ip)
+            return None
+        _no_wireless.remove(ip, found)
+
+    if ASYNC_STATION_DISCOVERY:
+        return station_discovery.submit(ip, lambda: StationDiscovery(client_address))
+
+    discovery = StationDiscovery(client_address)
+    try:
+        ok = discovery.discover()
+    except Exception as e:
+        # the hello is answered anyway: the station is discovered again in its next hello
+        log.error("Error discovering station %s: %s", ip, e)
+        ok = False
+    if ok:
+        publish_stations(discovery)
+    return discovery
+
+
+class StationDiscovery(object):
+    ''' discovers the wireless interfaces of a station and creates its Station objects
+    '''
+
+    def __init__(self, client_address):
+        '''
+          @param client_address: (ip, port) used by the Hello message's process
+        '''
+        self.client_address = tuple(client_address)
+        self.ip = client_address[0]
+        self.state = PENDING
+        self.stations = None
+        """ intf_name --> Station"""
 
-    if ip not in list_of_stations:
-        log.info("Starting Station object with IP %s", ip)
-        msg, intfs = get_interfaces(server=client_address, m_id=0)
+    def __str__(self):
+        return "stations@%s:%d (%s)" % (self.client_address[0], self.client_address[1], self.state)
+
+    def discover(self):
+        ''' requests the interfaces of the station, and the link information of all its wireless
+            interfaces in one batch (two round trips, instead of one per interface)
+            @return: True if the station answered
+        '''
+        log.info("Starting Station object with IP %s", self.ip)
+        msg, intfs = get_interfaces(server=self.client_address, m_id=next_msg_id())
+        if msg is None:
+            return False  # no answer: retry
         ''' select only wireless interfaces '''
-        intfs = [intf.intf_name for intf in intfs if intf.is_wifi is True]
+        intfs = [intf for intf in intfs if intf.is_wifi is True]
         log.info("Found %d wireless interface in the device: %s", len(intfs),
-                 ",".join(intfs))
-        if len(intfs) > 0:
-            list_of_stations[ip] = {}
-            for intf_name in intfs:
-                log.info("Station interface: %s", intf_name)
-                station = Station(socket=client_address, intf_name=intf_name)
-                list_of_stations[ip][intf_name] = station
-    else:
-        log.debug("Station with IP %s exists", ip)
+                 ",".join([intf.intf_name for intf in intfs]))
+        with Batch() as b:
+            link_info = [b.submit(get_sta_link_info, self.client_address, id=next_msg_id(), intf_name=intf.intf_name)
+                         for intf in intfs]
+        stations = {}
+        for intf, info in zip(intfs, link_info):
+            log.info("Station interface: %s", intf.intf_name)
+            stations[intf.intf_name] = Station(socket=self.client_address, intf_name=intf.intf_name,
+                                               mac_address=intf.mac_addr, link_info=info.result())
+        self.stations = stations
+        self.state = READY
+        return True
+
+
+def publish_stations(discovery):
+    ''' inserts the stations found by discovery in list_of_stations and in the index
+        called by the station discovery pipeline
+    '''
+    if len(discovery.stations) == 0:
+        # no wireless interface: the next hellos don't start a new discovery (see NO_WIRELESS_TTL)
+        _no_wireless.add(discovery.ip, monotonic())
+        return
+    if list_of_stations.add_if_absent(discovery.ip, Snapshot(discovery.stations)):
+        for station in discovery.stations.values():
+            stations_by_mac.add(station.mac_address, station)
+
+
+station_discovery = OnboardingPipeline('station', publish_stations)
+""" discovers the stations that send hello messages (see onboarding.OnboardingPipeline) """
+
+
+def remove_station(station):
+    """ removes the station from list_of_stations and from the index.
+        the station is unregistered from its VAP
+    """
+    ip, port = station.get_connection
+    while True:
+        stations = list_of_stations.get(ip)
+        if stations is None or stations.get(station.intf_name) is not station:
+            break
+        new_stations = dict(stations)
+        del new_stations[station.intf_name]
+        # copy on write: readers of the old dictionary are not affected
+        if list_of_stations.replace(ip, stations, Snapshot(new_stations) if new_stations else None):
+            break
+    stations_by_mac.remove(station.mac_address, station)
+    vap = getattr(station, 'vap', None)
+    if vap is not None:
+        vap.unregister_station(station)
 
 
 def get_station_by_mac_address(mac_address):
     """returns a connected station (object), provided its mac address"""
-    for intf_name in list_of_stations:
-        for sta in list_of_stations[intf_name]:
-            if sta.mac_address == mac_address:
-                return sta
-    return None  # didn't find a station
+    return stations_by_mac.get(mac_address)  # None if didn't find a station
 
 
 def get_station_by_ip(ip):
@@ -77,10 +183,7 @@ def get_station_by_ip(ip):
        note: that the object are indexed by the intf_name, in case the station has multiple wireless interfaces
        e.g. list_of_stations[ip]['wlan0']
        """
-    if ip not in list_of_stations:
-        return None
-    else:
-        return list_of_stations[ip]
+    return list_of_stations.get(ip)
 
 
 def is_sta_with_ip_connected(ip):
@@ -99,27 +202,32 @@ class Station(Device):
       Each station is identified by its ip address and wireless interface name
     '''
 
-    def __init__(self, socket, intf_name='wlan0'):
+    def __init__(self, socket, intf_name='wlan0', mac_address=None, link_info=None):
         ''' constructor:
             creates an object that represents the user connection
             receives an ip/port pair from the hello message
             uses this info to connect to the station
             and retrieve the radio it is connected to
+
+            @param mac_address: MAC address of the wireless interface (intf_name) of the station
+            @param link_info: value returned by get_sta_link_info() for this interface, if it was already requested
         '''
         log.info('constructor Station (%s,%s)' % socket)
         super(Station, self).__init__(socket, intf_name)
+        self.mac_address = mac_address
 
-        msg, mac_addr, ssid, freq, intf = \
-            get_sta_link_info(socket, id=self.msg_id, intf_name=intf_name)
+        if link_info is None:
+            link_info = get_sta_link_info(socket, id=self.msg_id, intf_name=intf_name)
+        msg, mac_addr, ssid, freq, intf = link_info
         log.info("get_sta_link_info - mac:%s ssid:%s freq:%d intf:%s"
                  % (mac_addr, ssid, freq, intf))
-        self.__mac_address = mac_addr
+        self.__bssid = mac_addr  # the station is connected to this VAP
 
         self.__linkando()
         log.info('Station created')
 
     def __linkando(self):
-        self.__vap = get_vap_by_mac_address(self.__mac_address)
+        self.__vap = get_vap_by_mac_address(self.__bssid)
         if self.__vap is None:
             self.__radio = None
             log.debug("VAP <<nao encontrada>> na criacao da Station")
@@ -130,11 +238,7 @@ class Station(Device):
 
     def __del__(self):
         ''' destructor '''
-        self.__vap.unregister_station(self)
-
-        if self.__ip in list_of_stations and \
-                self.intf_name in list_of_stations[self.__id]:
-            del list_of_stations[self.__id][self.intf_name]
+        remove_station(self)
 
     @property
     def vap(self):
@@ -142,6 +246,12 @@ class Station(Device):
         '''
         return self.__vap
 
+    @property
+    def bssid(self):
+        ''' MAC address of the VAP the station is connected to (reported by the station)
+        '''
+        return self.__bssid
+
     @property
     def radio(self):
         ''' this station is connected to radio,
@@ -154,8 +264,8 @@ class Station(Device):
         ''' returns all wireless enabled interfaces of the device
         '''
         server = self.get_connection
-        msg, intfs = get_interfaces(server, id=0)
-        intfs = [intf.intf_name for intf in intfs if intf.is_wifi is True]
+        msg, intfs = get_interfaces(server, m_id=self.msg_id)
+        intfs = [intf.intf_name for intf in intfs or [] if intf.is_wifi is True]
         return intfs
 
     def getInterferenceMap(self):
@@ -203,4 +313,4 @@ class Station(Device):
         '''
         ip, port = self.get_connection
         return "Station %s %s conn(%s:%d)" % (self.intf_name,
-                                              self.__mac_address, ip, port)
+                                              self.mac_address, ip, port)
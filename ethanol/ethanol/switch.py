@@ -18,6 +18,7 @@ from pox.core import core
 import pox.openflow.libopenflow_01 as of
 from pox.lib.util import dpid_to_str
 from pox.lib.util import str_to_bool
+from pox.lib.addresses import EthAddr
 import time
 
 log = core.getLogger()
@@ -45,6 +46,16 @@ class LearningSwitch(object):
         # We want to hear PacketIn messages, so we listen to the connection
         connection.addListeners(self)
 
+    def learn(self, mac, port):
+        """ inserts mac in the table (e.g. a station associated to the AP: see flows.py),
+            so the packets to mac are not flooded
+        """
+        self.macToPort[EthAddr(mac)] = port
+
+    def forget(self, mac):
+        """ removes mac from the table (e.g. the station left the AP) """
+        self.macToPort.pop(EthAddr(mac), None)
+
     def __flood(self, message=None):
         """ Floods the packet """
         msg = of.ofp_packet_out()
@@ -142,10 +153,14 @@ class l2_learning(object):
     def __init__(self, transparent):
         core.openflow.addListeners(self)
         self.transparent = transparent
+        self.switches = {}  # dpid --> LearningSwitch
 
     def _handle_ConnectionUp(self, event):
         log.debug("Connection %s" %(event.connection,))
-        LearningSwitch(event.connection, self.transparent)
+        self.switches[event.dpid] = LearningSwitch(event.connection, self.transparent)
+
+    def _handle_ConnectionDown(self, event):
+        self.switches.pop(event.dpid, None)
 
 
 def launch(transparent=False, hold_down=_flood_delay):
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+from pox.ethanol.ethanol.vap import VAP
+from pox.ethanol.ethanol.network import list_of_networks
+from pox.ethanol.ethanol.admission import admission
+from pox.ethanol.ssl_message.msg_association import unregister_functions
+
+
+class _Radio(object):
+    wiphy = 'wlan0'
+
+
+class TestVapSsid(unittest.TestCase):
+    def setUp(self):
+        self.vap = VAP(('127.0.0.1', 22222), None, _Radio(), '00:00:00:00:ee:01')
+        self.other = VAP(('127.0.0.1', 22222), None, _Radio(), '00:00:00:00:ee:02')
+        self.other.ssid = 'ssid-b'
+
+    def tearDown(self):
+        for vap in (self.vap, self.other):
+            vap.ssid = None
+            unregister_functions(vap.mac_address, vap)
+
+    def test_change_twice_and_clear(self):
+        self.vap.ssid = 'ssid-a'
+        self.assertIn(self.vap, list_of_networks()['ssid-a'].vaps)
+        self.vap.ssid = 'ssid-b'
+        self.assertEqual(self.vap.ssid, 'ssid-b')
+        self.assertNotIn(self.vap, list_of_networks()['ssid-a'].vaps)
+        self.assertIn(self.vap, list_of_networks()['ssid-b'].vaps)
+        self.vap.ssid = None
+        self.assertIsNone(self.vap.ssid)
+        self.assertNotIn(self.vap, list_of_networks()['ssid-b'].vaps)
+
+    def test_admission_group(self):
+        sta = '02:00:00:00:ee:03'
+        self.vap.ssid = 'ssid-a'
+        self.assertFalse(admission.accepts(self.vap.mac_address, sta, like=self.other.mac_address))
+        self.vap.ssid = 'ssid-b'
+        self.assertTrue(admission.accepts(self.vap.mac_address, sta, like=self.other.mac_address))
+
+    def test_network_ssid(self):
+        self.vap.ssid = 'ssid-c'
+        net = list_of_networks()['ssid-c']
+        net.SSID = 'ssid-d'
+        self.assertEqual(self.vap.ssid, 'ssid-d')
+        self.assertEqual(net.vaps, [self.vap])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -28,7 +28,12 @@ from pox.ethanol.ethanol.device import Device
 
 from pox.ethanol.ssl_message.msg_association import register_functions
 from pox.ethanol.ssl_message.msg_log import log
-from pox.ethanol.events import Events
+from pox.ethanol.ethanol.bus import bus, MGMT_FRAME
+from pox.ethanol.ethanol.cache import cached_property
+from pox.ethanol.ethanol.index import vaps_by_bssid, stations_by_mac, mac_key
+
+CONFIG_TTL = 60.0
+""" seconds the configuration of the VAP (broadcast ssid, dtim interval) is cached"""
 
 
 class VAP(Device):
@@ -46,29 +51,36 @@ class VAP(Device):
         super(VAP, self).__init__(server, self.__intf_name)
 
         self.__server = server  #: saves the reference to server of ap
-        self.__mac_address = mac_address  #: virtual ap's mac address
+        self.mac_address = mac_address  #: virtual ap's mac address
         self.__radio = radio  #: physical radio to which the vap is attached
 
-        log.debug("Registering_functions: %s", self.__mac_address)
-        # register the association process for this ap
-        register_functions(self.__mac_address, self)
-
-        """ list of stations connected to this vap """
-        self.__list_of_stations = []
+        """ stations connected to this vap: mac address --> station """
+        self.__list_of_stations = {}
 
         self.__ssid = ssid  #: setting ssid will configure VAP
+        self.__net = None  #: network of the ssid (see the ssid setter)
         self.__enabled = False
-        self.__mgmtFrame = dict()  # keep a list of listeners for each type of mgmt frame received
+        self.__mgmtFrame = dict()  # keep a list of subscriptions (bus) for each type of mgmt frame received
+
+        log.debug("Registering_functions: %s", self.mac_address)
+        # register the association process for this ap (the admission control groups the VAPs by ssid)
+        register_functions(self.mac_address, self)
+        vaps_by_bssid.add(self.mac_address, self)
         log.info("Created VAP with id:%s in interface %s", self.id, self.__intf_name)
 
     def __del__(self):
-        """ destructor: not implemented yet
+        """ destructor: removes the vap from the index
         """
-        pass
+        if vaps_by_bssid is not None:  # module globals are None during the interpreter shutdown
+            vaps_by_bssid.remove(self.mac_address, self)
 
     def __str__(self):
         """ vap string representation """
-        return "vap[%s]" % self.__mac_address
+        return "vap[%s]" % self.mac_address
+
+    def __get_connection(self):
+        """ @return: tuple (ip, port) of the AP """
+        return self.get_connection
 
     def register_station(self, station=None):
         """ register a station in the list
@@ -77,24 +89,27 @@ class VAP(Device):
         from pox.ethanol.ethanol.station import Station
         if station is None or not isinstance(station, Station):
             return
-        self.__list_of_stations.append(station)
+        self.__list_of_stations[mac_key(station.mac_address)] = station
+        stations_by_mac.add(station.mac_address, station)
 
     def unregister_station(self, station):
-        """ register a station in the list
+        """ removes a station from the list
             called by station.__del__
         """
-        # TODO: use an efficient way to find the station
-        for i in range(len(self.__list_of_stations)):
-            if self.__list_of_stations[i] == station:
-                del self.__list_of_stations[i]
-                break
+        key = mac_key(station.mac_address)
+        if self.__list_of_stations.get(key) is station:
+            del self.__list_of_stations[key]
 
     @property
     def stations(self):
         """ return the stations (objects) currently connected to the VAP and to the
         controller (ethanol enabled stations)
         """
-        return self.__list_of_stations
+        return list(self.__list_of_stations.values())
+
+    def get_station(self, mac_address):
+        """ @return: the station connected to this VAP with mac_address, or None """
+        return self.__list_of_stations.get(mac_key(mac_address))
 
     @property
     def radio(self):
@@ -120,34 +135,45 @@ class VAP(Device):
     def ssid(self, value):
         """ change the vap's SSID
         """
+        from pox.ethanol.ethanol.admission import admission
         if value is None:
-            self.__net.deassociateVirtualAP(self)
+            # deassociateVirtualAP sets vap.ssid = None, so the vap leaves its network before the call
+            net, self.__net = self.__net, None
+            self.__ssid = None
+            if net is not None:
+                net.deassociateVirtualAP(self)
+            admission.set_ssid(self.mac_address, None)
         elif value != self.__ssid:  # changing network
             # changing networks (SSIDs)
-            self.__net.deassociateVirtualAP(self)
+            net, self.__net = self.__net, None
+            self.__ssid = None
+            if net is not None:
+                net.deassociateVirtualAP(self)
             # new net
             from pox.ethanol.ethanol.network import get_or_create_network_by_ssid
-            self.__net = get_or_create_network_by_ssid(ssid)
+            self.__net = get_or_create_network_by_ssid(value)
             self.__net.associateVirtualAP(self)
-            self.__ssid = ssid
+            self.__ssid = value
+            # the load balancing of the admission control uses the VAPs with the same SSID
+            admission.set_ssid(self.mac_address, value)
             self.enabled = False
             # TODO: configure physical device
             server = self.__get_connection()
 
-    @property
+    @cached_property(ttl=CONFIG_TTL)
     def broadcastSSID(self):
-        """not implemented yet"""
+        """:return if the VAP is broadcasting its SSID"""
         server = self.__get_connection()
-        # TODO: get information from physical device
-        pass
+        from pox.ethanol.ssl_message.msg_ap_broadcastssid import get_broadcastssid
+        msg, value = get_broadcastssid(server=server, id=self.msg_id, intf_name=self.__intf_name, ssid=self.__ssid)
+        return value
 
     @broadcastSSID.setter
     def broadcastSSID(self, value):
-        """not implemented yet"""
+        """enables or disables the broadcasting of the SSID"""
         server = self.__get_connection()
-        from pox.ethanol.ssl_message.msg_ap_broadcastssid import get_broadcastssid
-        msg, value = get_broadcastssid(server=server, id=self.id, intf_name=self.__intf_name, ssid=self.__ssid)
-        return value
+        from pox.ethanol.ssl_message.msg_ap_broadcastssid import set_broadcastssid
+        set_broadcastssid(server=server, id=self.msg_id, intf_name=self.__intf_name, enable=value, ssid=self.__ssid)
 
     @property
     def fastBSSTransitionEnabled(self):
@@ -182,7 +208,7 @@ class VAP(Device):
         """:return if AP has frame burst feature enabled"""
         server = self.__get_connection()
         from pox.ethanol.ssl_message.msg_ap_frameburstenabled import get_ap_frameburstenabled
-        msg, value = get_ap_frameburstenabled(server=server, id=self.id, intf_name=self.__intf_name)
+        msg, value = get_ap_frameburstenabled(server=server, id=self.msg_id, intf_name=self.__intf_name)
         return value
 
     @property
@@ -190,15 +216,15 @@ class VAP(Device):
         """:return Guard Interval"""
         server = self.__get_connection()
         from pox.ethanol.ssl_message.msg_ap_guardinterval import get_ap_guardinterval
-        msg, value = get_ap_guardinterval(server=server, id=self.id, intf_name=self.__intf_name)
+        msg, value = get_ap_guardinterval(server=server, id=self.msg_id, intf_name=self.__intf_name)
         return value
 
-    @property
+    @cached_property(ttl=CONFIG_TTL)
     def dtimInterval(self):
         """:return DTIM interval"""
         server = self.__get_connection()
         from pox.ethanol.ssl_message.msg_ap_dtiminterval import get_ap_dtiminterval
-        msg, value = get_ap_dtiminterval(server=server, id=self.id, intf_name=self.__intf_name)
+        msg, value = get_ap_dtiminterval(server=server, id=self.msg_id, intf_name=self.__intf_name)
         return value
 
     @property
@@ -206,7 +232,7 @@ class VAP(Device):
         """not implemented yet"""
         server = self.__get_connection()
         from pox.ethanol.ssl_message.msg_ap_ctsprotection_enabled import get_ctsprotection_enabled
-        msg, value = get_ctsprotection_enabled(server=server, id=self.id, intf_name=self.__intf_name)
+        msg, value = get_ctsprotection_enabled(server=server, id=self.msg_id, intf_name=self.__intf_name)
         return value
 
     @property
@@ -214,7 +240,7 @@ class VAP(Device):
         """get RTS threshold, if 0 RTS/CTS is not used"""
         server = self.__get_connection()
         from pox.ethanol.ssl_message.msg_ap_rtsthreshold import get_ap_rtsthreshold
-        msg, value = get_ap_rtsthreshold(server=server, id=self.id, intf_name=self.__intf_name)
+        msg, value = get_ap_rtsthreshold(server=server, id=self.msg_id, intf_name=self.__intf_name)
         return value
 
     def getStationInRange(self):
@@ -289,21 +315,23 @@ class VAP(Device):
                     #define IEEE80211_STYPE_DEAUTH      0x00C0
                     #define IEEE80211_STYPE_ACTION      0x00D0
             :param msg message received
+            :return: False if there is no listener for msg_type
+            the listeners are called by the threads of the event bus (topic MGMT_FRAME)
         """
-        if msg_type not in self.__mgmtFrame or len(self.__mgmtFrame[msg_type]) == 0:
-            return False
-        else:
-            self.__mgmtFrame[msg_type].on_change(msg)
+        key = (mac_key(self.mac_address), msg_type)
+        return bus.publish(MGMT_FRAME, msg, key=key) > 0
 
-    def registerMgmtFrame(self, msg_type, listener):
+    def registerMgmtFrame(self, msg_type, listener, batch_size=1):
+        """ listener(msg) is called when the VAP receives a management frame of type msg_type
+            :param batch_size: if > 1, listener receives a list of bus.Event (for frequent frames, e.g. probe requests)
+        """
         server = self.__get_connection()
         if msg_type not in self.__mgmtFrame or len(self.__mgmtFrame[msg_type]) == 0:
-            self.__mgmtFrame[msg_type] = Events()
-            self.__mgmtFrame[msg_type].on_change += listener
+            self.__mgmtFrame[msg_type] = []
             # register function in the AP
             # register this object in the message processor
-        else:
-            self.__mgmtFrame[msg_type].add(listener)
+        sub = bus.subscribe(MGMT_FRAME, listener, key=(mac_key(self.mac_address), msg_type), batch_size=batch_size)
+        self.__mgmtFrame[msg_type].append(sub)
 
     def unregisterMgmtFrame(self, msg_type):
         """not implemented yet
@@ -312,7 +340,8 @@ class VAP(Device):
         if msg_type not in self.__mgmtFrame or len(self.__mgmtFrame[msg_type]) == 0:
             return  # nothing to do
         server = self.__get_connection()
-        del self.__mgmtFrame[msg_type]
+        for sub in self.__mgmtFrame.pop(msg_type):
+            bus.unsubscribe(sub)
 
     def connectNewUser(self, station, old_ap):
         """ not implemented yet
@@ -320,18 +349,22 @@ class VAP(Device):
         """
         pass
 
-    def connected_stations(self):
+    def connected_stations(self, as_array=False):
         """
 
+        :param as_array: if True, returns the statistics of the stations as a numpy structured array
+                         (the MAC addresses are in the field 'mac_addr'). Requires numpy
         :return: list of stations MAC address
         """
         server = self.__get_connection()
         from pox.ethanol.ssl_message.msg_sta_statistics import get_sta_statistics
-        msg, stats = get_sta_statistics(server, id=self.msg_id, intf_name=self.__intf_name)
+        msg, stats = get_sta_statistics(server, id=self.msg_id, intf_name=self.__intf_name, as_array=as_array)
+        if as_array:
+            return stats
         list_macs = []
         for v in stats:
-            if 'mac_address' in v:
-                list_macs.append(v['mac_address'])
+            if 'mac_addr' in v:
+                list_macs.append(v['mac_addr'])
         return list_macs
 
     def mlme_qos_map_request(self, mac_station, mappings):
@@ -343,7 +376,7 @@ class VAP(Device):
         from pox.ethanol.ssl_message.msg_mlme import qos_map_request
         qos_map_request(server, id=self.msg_id,
                         intf_name=self.__intf_name,
-                        bssid=self.__mac_address,
+                        bssid=self.mac_address,
                         mac_station=mac_station,
                         mappings=mappings)
 
@@ -356,7 +389,7 @@ class VAP(Device):
         from pox.ethanol.ssl_message.msg_mlme import scan_request
         msg, stats = scan_request(server, id=self.msg_id,
                                   intf_name=self.__intf_name,
-                                  bssid=self.__mac_address,
+                                  bssid=self.mac_address,
                                   mac_station=mac_station,
                                   configs=configs)
         return stats
@@ -370,7 +403,7 @@ class VAP(Device):
         from pox.ethanol.ssl_message.msg_mlme import channel_switch
         msg, stats = channel_switch(server, id=self.msg_id,
                                     intf_name=self.__intf_name,
-                                    bssid=self.__mac_address,
+                                    bssid=self.mac_address,
                                     mac_station=mac_station,
                                     configs=configs)
         return stats
@@ -384,7 +417,7 @@ class VAP(Device):
         from pox.ethanol.ssl_message.msg_mlme import neighbor_report
         msg, stats = neighbor_report(server, id=self.msg_id,
                                      intf_name=self.__intf_name,
-                                     bssid=self.__mac_address,
+                                     bssid=self.mac_address,
                                      mac_station=mac_station
                                      )
         return stats
@@ -398,7 +431,7 @@ class VAP(Device):
         from pox.ethanol.ssl_message.msg_mlme import link_measurement
         msg, stats = link_measurement(server, id=self.msg_id,
                                       intf_name=self.__intf_name,
-                                      bssid=self.__mac_address,
+                                      bssid=self.mac_address,
                                       mac_station=mac_station,
                                       configs=configs
                                       )
@@ -413,7 +446,7 @@ class VAP(Device):
         from pox.ethanol.ssl_message.msg_mlme import bss_transition
         bss_transition(server, id=self.msg_id,
                        intf_name=self.__intf_name,
-                       bssid=self.__mac_address,
+                       bssid=self.mac_address,
                        mac_station=mac_station,
                        new_ap=new_ap,
                        )
@@ -0,0 +1,15 @@
+"""
+This package assigns channels to the radios of the APs connected to the controller.
+
+graph.py builds a weighted conflict graph (from the in-range scans and the channel load),
+coloring.py colors it (DSATUR and tabu search), rollout.py applies the new channels at a limited rate
+and engine.py puts them together (full plan and incremental recolor of a neighborhood).
+acs.py uses the same graph to run the ACS scans of the fleet in parallel, but never in two neighbor radios
+at the same time.
+
+"""
+from pox.ethanol.graph_coloring.graph import ConflictGraph
+from pox.ethanol.graph_coloring.coloring import dsatur, tabu_search, interference
+from pox.ethanol.graph_coloring.rollout import Rollout
+from pox.ethanol.graph_coloring.engine import ChannelAssignment, build_graph
+from pox.ethanol.graph_coloring.acs import AcsScheduler, AcsTable
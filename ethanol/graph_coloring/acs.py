@@ -0,0 +1,309 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# ##################################
+#
+# Copyright 2015 Henrique Moura
+#
+# This file is part of Ethanol.
+#
+# ##################################
+#
+"""
+This module schedules the ACS scans (Radio.getACS) of the radios of the fleet.
+
+A scan measures the interference in each frequency, so two radios that hear each other must not scan
+at the same time (the probes of one corrupt the measurements of the other). The scheduler uses the
+conflict graph of the channel assignment (see graph.py and build_graph): a radio only starts its scan when
+none of its neighbors (nor the other radios of the same AP) is scanning. The other radios scan in parallel,
+at most ACS_CONCURRENCY at a time. The radios with more neighbors start first, they are the ones that
+limit the duration of the sweep.
+
+The results are written in an AcsTable (radio, frequency) --> factor as soon as each scan finishes,
+so they can be used before the end of the sweep (see also the on_result function).
+
+  >>> from pox.ethanol.graph_coloring import AcsScheduler, build_graph
+  >>> scheduler = AcsScheduler(build_graph())
+  >>> report = scheduler.sweep(num_tests=2)   # scans all radios of the graph
+  >>> report['duration'], report['scanned'], report['max_parallel']
+  >>> scheduler.table.best(radio)             # frequency with the lowest ACS factor
+
+@author: Henrique Duarte Moura
+@organization: WINET/DCC/UFMG
+@copyright: h3dema (c) 2017
+@contact: henriquemoura@hotmail.com
+@licence: GNU General Public License v2.0
+(https://www.gnu.org/licenses/old-licenses/gpl-2.0.html)
+@since: July 2015
+@status: in development
+"""
+from threading import Lock, Condition
+
+from pox.ethanol.ssl_message.msg_log import log
+from pox.ethanol.ssl_message.latency import monotonic, LatencyHistogram
+from pox.ethanol.graph_coloring.graph import ConflictGraph
+
+ACS_CONCURRENCY = 32
+""" maximum number of radios scanning at the same time"""
+
+ACS_TESTS = 1
+""" number of tests of each scan (see Radio.getACS)"""
+
+
+def acs_radio(key, num_tests=ACS_TESTS):
+    """ runs the ACS scan of the radio (used by the scheduler)
+        @param key: (ip of the AP, wiphy name), see radio_key()
+        @return: dictionary frequency --> ACS factor
+    """
+    from pox.ethanol.ethanol.radio import get_radio_by_name
+    radio = get_radio_by_name(*key)
+    if radio is None:
+        raise ValueError("radio %s:%s does not exist" % key)
+    num_chan, acs = radio.getACS(num_tests)
+    if num_chan == 0:
+        raise ValueError("radio %s:%s returned no ACS result" % key)
+    return acs
+
+
+class AcsTable(object):
+    """ ACS factors of the radios: (radio, frequency) --> factor, with the time of the scan
+    """
+
+    def __init__(self):
+        self.__lock = Lock()
+        self.__factors = {}  # radio --> {frequency: factor}
+        self.__time = {}  # radio --> monotonic() of the scan
+
+    def __len__(self):
+        return len(self.__factors)
+
+    def __contains__(self, radio):
+        return radio in self.__factors
+
+    @property
+    def radios(self):
+        """ list of the radios with a result """
+        with self.__lock:
+            return self.__factors.keys()
+
+    def update(self, radio, acs):
+        """ replaces the result of the radio
+            @param acs: dictionary frequency --> factor
+        """
+        with self.__lock:
+            self.__factors[radio] = dict(acs)
+            self.__time[radio] = monotonic()
+
+    def remove(self, radio):
+        with self.__lock:
+            self.__factors.pop(radio, None)
+            self.__time.pop(radio, None)
+
+    def get(self, radio):
+        """ @return: dictionary frequency --> factor of the radio (empty if it was not scanned) """
+        with self.__lock:
+            return dict(self.__factors.get(radio, {}))
+
+    def factor(self, radio, frequency):
+        """ @return: the ACS factor of the frequency measured by the radio (or None) """
+        with self.__lock:
+            return self.__factors.get(radio, {}).get(frequency)
+
+    def age(self, radio):
+        """ @return: seconds since the scan of the radio (None if it was not scanned) """
+        with self.__lock:
+            t = self.__time.get(radio)
+        return None if t is None else monotonic() - t
+
+    def best(self, radio, frequencies=None):
+        """ @param frequencies: the frequencies that can be used (default: all scanned)
+            @return: the frequency with the lowest ACS factor (None if the radio was not scanned)
+        """
+        acs = self.get(radio)
+        if frequencies is not None:
+            acs = dict((f, v) for f, v in acs.items() if f in frequencies)
+        if len(acs) == 0:
+            return None
+        return min(acs, key=lambda f: (acs[f], f))
+
+    def items(self):
+        """ @return: list of (radio, frequency, factor) """
+        with self.__lock:
+            return [(r, f, v) for r, acs in self.__factors.iteritems() for f, v in acs.iteritems()]
+
+
+class AcsScheduler(object):
+    """ runs the ACS scans of the radios in parallel, but never at the same time in neighbor radios
+    """
+
+    def __init__(self, graph=None, scan=acs_radio, concurrency=ACS_CONCURRENCY, num_tests=ACS_TESTS,
+                 table=None, on_result=None, same_ap=True):
+        """
+          @param graph: ConflictGraph with the radios and their neighbors (see build_graph)
+          @param scan: function scan(radio, num_tests) that returns the dictionary frequency --> factor
+          @param concurrency: maximum number of scans at the same time
+          @param table: AcsTable that receives the results (default: a new one)
+          @param on_result: function on_result(radio, acs) called after each scan (by the thread of the scan)
+          @param same_ap: if True, the radios of the same AP (same ip) don't scan at the same time
+        """
+        self.graph = ConflictGraph() if graph is None else graph
+        self.scan = scan
+        self.concurrency = concurrency
+        self.num_tests = num_tests
+        self.table = AcsTable() if table is None else table
+        self.on_result = on_result
+        self.same_ap = same_ap
+        self.__sweep_lock = Lock()  # one sweep at a time
+        self.__cond = Condition(Lock())
+        self.scan_latency = LatencyHistogram('acs_scan')
+        """ duration of each scan"""
+        self.sweep_latency = LatencyHistogram('acs_sweep')
+        """ duration of each sweep"""
+        self.last_sweep = None
+        """ report of the last sweep (see sweep)"""
+        self.__counters = {'sweeps': 0, 'scans': 0, 'failed': 0, 'skipped': 0}
+
+    def stats(self):
+        """ @return: dictionary with the counters, the latencies and the report of the last sweep """
+        with self.__cond:
+            d = dict(self.__counters)
+        d['radios'] = len(self.table)
+        d['scan_latency'] = self.scan_latency.as_dict()
+        d['sweep_latency'] = self.sweep_latency.as_dict()
+        d['last_sweep'] = self.last_sweep
+        return d
+
+    def conflicts(self, radios):
+        """ @return: dictionary radio --> set of the radios (in radios) that can't scan at the same time """
+        radios = set(radios)
+        by_ap = {}
+        if self.same_ap:
+            for r in radios:
+                by_ap.setdefault(r[0], set()).add(r)
+        result = {}
+        for r in radios:
+            c = set(nb for nb in self.graph.neighbors(r) if nb in radios)
+            if self.same_ap:
+                c.update(by_ap[r[0]])
+            c.discard(r)
+            result[r] = c
+        return result
+
+    def __ready(self, pending, busy, conflicts):
+        """ @return: the pending radios that can start their scans now (in the order of pending) """
+        ready = []
+        for r in pending:
+            if len(busy) + len(ready) >= self.concurrency:
+                break
+            if not (conflicts[r] & busy) and not any(o in conflicts[r] for o in ready):
+                ready.append(r)
+        return ready
+
+    def sweep(self, radios=None, num_tests=None, timeout=None):
+        """ scans the radios (the results are written in self.table as they arrive)
+            @param radios: list of radio keys (default: all radios of the graph)
+            @param timeout: seconds. the radios that did not start the scan before the timeout are skipped,
+                            the scans that did not finish are counted as failed (their results still go to the table)
+            @return: dictionary with the report of the sweep: number of radios, scanned, failed, skipped,
+                     duration (seconds), max_parallel (maximum number of simultaneous scans)
+                     and speedup (sum of the duration of the scans / duration of the sweep)
+        """
+        from pox.ethanol.ssl_message.aio import Executor
+        radios = list(self.graph.radios if radios is None else radios)
+        num_tests = self.num_tests if num_tests is None else num_tests
+        conflicts = self.conflicts(radios)
+        # the radios with more neighbors first: they are the bottleneck of the sweep
+        pending = sorted(radios, key=lambda r: (-len(conflicts[r]), r))
+        report = {'radios': len(radios), 'scanned': 0, 'failed': 0, 'skipped': 0, 'max_parallel': 0}
+        busy = set()
+        scan_time = [0.0]
+        ended = [False]  # the sweep stopped waiting for the scans (timeout)
+
+        def run(radio):
+            t = monotonic()
+            try:
+                acs = self.scan(radio, num_tests)
+            except Exception as e:
+                log.warning("ACS scan of %s failed: %s", radio, e)
+                acs = None
+            elapsed = monotonic() - t
+            self.scan_latency.record(elapsed)
+            if acs is not None:
+                self.table.update(radio, acs)
+                if self.on_result is not None:
+                    try:
+                        self.on_result(radio, acs)
+                    except Exception as e:
+                        log.error("Error handling the ACS result of %s: %s", radio, e)
+            with self.__cond:
+                if ended[0]:
+                    return  # finished after the timeout: already counted as failed
+                busy.discard(radio)
+                scan_time[0] += elapsed
+                report['scanned' if acs is not None else 'failed'] += 1
+                self.__counters['scans' if acs is not None else 'failed'] += 1
+                self.__cond.notify_all()
+
+        with self.__sweep_lock:
+            t0 = monotonic()
+            deadline = None if timeout is None else t0 + timeout
+            executor = Executor(self.concurrency)
+            try:
+                while pending:
+                    with self.__cond:
+                        ready = self.__ready(pending, busy, conflicts)
+                        while not ready:
+                            remaining = None if deadline is None else deadline - monotonic()
+                            if remaining is not None and remaining <= 0:
+                                break
+                            self.__cond.wait(remaining)
+                            ready = self.__ready(pending, busy, conflicts)
+                        if not ready:
+                            break  # timeout
+                        for r in ready:
+                            pending.remove(r)
+                            busy.add(r)
+                        report['max_parallel'] = max(report['max_parallel'], len(busy))
+                    for r in ready:
+                        executor.submit(run, r)
+                with self.__cond:
+                    while busy:
+                        remaining = None if deadline is None else deadline - monotonic()
+                        if remaining is not None and remaining <= 0:
+                            break
+                        self.__cond.wait(remaining)
+                    ended[0] = True
+                    unfinished = len(busy)
+                    report['failed'] += unfinished
+                    self.__counters['failed'] += unfinished
+                if unfinished:
+                    log.warning("ACS sweep timeout: %d scans did not finish", unfinished)
+            finally:
+                executor.shutdown(wait=not busy)  # don't wait for the threads of the unfinished scans
+            duration = monotonic() - t0
+            report['skipped'] = len(pending)
+            report['duration'] = duration
+            report['speedup'] = scan_time[0] / duration if duration > 0 else 0.0
+            self.sweep_latency.record(duration)
+            with self.__cond:
+                self.__counters['sweeps'] += 1
+                self.__counters['skipped'] += len(pending)
+            self.last_sweep = report
+        log.info("ACS sweep of %d radios in %.2f s: %d scanned, %d failed, %d skipped (max %d in parallel)",
+                 report['radios'], duration, report['scanned'], report['failed'], report['skipped'],
+                 report['max_parallel'])
+        return report
+
+
+def sweep_fleet(aps=None, num_tests=ACS_TESTS, scheduler=None, timeout=None):
+    """ scans all radios of the APs (builds the conflict graph with their in-range scans)
+        @param aps: list of AP objects (default: all connected APs)
+        @param scheduler: AcsScheduler to use (its graph is updated)
+        @return: tuple (AcsScheduler, report of the sweep)
+    """
+    from pox.ethanol.graph_coloring.engine import build_graph
+    if scheduler is None:
+        scheduler = AcsScheduler(build_graph(aps))
+    else:
+        build_graph(aps, scheduler.graph)
+    return scheduler, scheduler.sweep(num_tests=num_tests, timeout=timeout)
@@ -0,0 +1,282 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# ##################################
+#
+# Copyright 2015 Henrique Moura
+#
+# This file is part of Ethanol.
+#
+# ##################################
+#
+"""
+This module implements the heuristics that assign channels to the radios of a conflict graph (see graph.py).
+
+The functions receive the snapshot of the graph:
+channels (radio --> tuple of valid channels) and adj (radio --> {neighbor: weight}).
+The cost of an assignment is the sum of weight(u, v) * overlap(channel(u), channel(v)) over the edges,
+plus change_penalty for each radio that leaves its current channel (so the engine does not move radios for nothing).
+
+  - dsatur(): greedy coloring. The radio with the most distinct channels among its colored neighbors
+    (ties: largest weighted degree) receives the cheapest channel.
+  - tabu_search(): local search that moves one conflicting radio per iteration to its best channel.
+    The move back is forbidden (tabu) for some iterations, unless it improves the best solution.
+
+Both keep, for each radio, the cost of each of its channels (cost[radio][channel]),
+updated incrementally when a neighbor is colored or moves. So an iteration costs O(degree * channels).
+They accept the set of radios that can change (nodes): the other radios keep their channels,
+this is how the engine recolors only the neighborhood of a radio.
+
+@author: Henrique Duarte Moura
+@organization: WINET/DCC/UFMG
+@copyright: h3dema (c) 2017
+@contact: henriquemoura@hotmail.com
+@licence: GNU General Public License v2.0
+(https://www.gnu.org/licenses/old-licenses/gpl-2.0.html)
+@since: July 2015
+@status: in development
+"""
+import random
+from heapq import heapify, heappush, heappop
+
+from pox.ethanol.ssl_message.latency import monotonic
+from pox.ethanol.graph_coloring.graph import overlap
+
+CHANGE_PENALTY = 0.05
+""" cost of changing the channel of a radio (compared to the weight of an edge: 0..3)"""
+
+TABU_ITERATIONS = 20000
+""" maximum number of moves of the tabu search"""
+
+TABU_TIME = 0.25
+""" maximum seconds of the tabu search"""
+
+TABU_STAGNATION = 500
+""" the tabu search stops after this number of moves without improving the best solution
+    (or 10 moves per radio that can change, if it is less)"""
+
+TABU_TENURE = 7
+""" minimum number of iterations a move back is tabu (a random value up to the same amount is added)"""
+
+TABU_CANDIDATES = 32
+""" maximum number of conflicting radios evaluated in each iteration (sampled if there are more)"""
+
+EPSILON = 1e-9
+
+_overlaps = {}
+
+
+def overlapping(channel):
+    """ @return: list of (channel, overlap) with all the channels that overlap channel """
+    ov = _overlaps.get(channel)
+    if ov is None:
+        if channel > 14:
+            ov = [(channel, 1.0)]
+        else:
+            ov = [(c, overlap(channel, c)) for c in range(1, 15) if overlap(channel, c) > 0]
+        _overlaps[channel] = ov
+    return ov
+
+
+def _add(cost, channel, w):
+    """ adds the interference of a neighbor in channel (with weight w) to the cost vector of a radio """
+    for c, ov in overlapping(channel):
+        if c in cost:
+            cost[c] += w * ov
+
+
+def _cost_vector(radio, channels, adj, assignment):
+    """ @return: dictionary channel --> interference of the colored neighbors of radio if it uses the channel """
+    cost = dict.fromkeys(channels.get(radio, ()), 0.0)
+    get = assignment.get
+    for u, w in adj.get(radio, {}).iteritems():
+        c = get(u)
+        if c is not None:
+            for c2, ov in _overlaps.get(c) or overlapping(c):  # _add() inlined: this is the hot loop
+                if c2 in cost:
+                    cost[c2] += w * ov
+    return cost
+
+
+def _edges(adj, assignment):
+    """ generates (weight, overlap) of the edges whose radios have a channel (each edge once).
+        adj may contain only part of the graph: the edges to radios that are not in adj are counted too
+    """
+    for u, neighbors in adj.iteritems():
+        cu = assignment.get(u)
+        if cu is None:
+            continue
+        for v, w in neighbors.iteritems():
+            cv = assignment.get(v)
+            if cv is not None and (u < v or v not in adj):
+                yield w, overlap(cu, cv)
+
+
+def interference(adj, assignment):
+    """ @return: the sum of weight * overlap over the edges """
+    return sum(w * ov for w, ov in _edges(adj, assignment))
+
+
+def conflicts(adj, assignment):
+    """ @return: the number of edges whose radios are in overlapping channels """
+    return sum(1 for w, ov in _edges(adj, assignment) if ov > 0)
+
+
+def cost_change(adj, old, new, change_penalty=CHANGE_PENALTY):
+    """ computes the difference of the cost of two assignments looking only at the radios that change
+
+        @param adj: adjacency of (at least) the radios that change
+        @param old: dictionary radio --> channel (the channels in use)
+        @param new: dictionary radio --> channel. the radios that are not in new keep the channel of old
+        @return: cost(new) - cost(old), including change_penalty for each radio that changes
+    """
+    changed = set(r for r, c in new.iteritems() if c is not None and c != old.get(r))
+    delta = 0.0
+    for u in changed:
+        cu_old, cu_new = old.get(u), new[u]
+        if cu_old is not None:
+            delta += change_penalty
+        for v, w in adj.get(u, {}).iteritems():
+            if v in changed:
+                if v < u:
+                    continue  # counted with v
+                cv_old, cv_new = old.get(v), new[v]
+            else:
+                cv_old = cv_new = new.get(v, old.get(v))
+            if cv_new is not None:
+                delta += w * overlap(cu_new, cv_new)
+            if cu_old is not None and cv_old is not None:
+                delta -= w * overlap(cu_old, cv_old)
+    return delta
+
+
+def dsatur(channels, adj, nodes=None, fixed=None, current=None, change_penalty=CHANGE_PENALTY):
+    """ colors the graph with DSATUR
+
+        @param channels: dictionary radio --> valid channels
+        @param adj: dictionary radio --> {neighbor: weight}
+        @param nodes: radios to color (default: all radios that are not in fixed)
+        @param fixed: dictionary radio --> channel of the radios that don't change
+        @param current: dictionary radio --> channel in use (used by change_penalty)
+        @return: dictionary radio --> channel (the radios in fixed and in nodes)
+    """
+    assignment = dict(fixed or {})
+    current = current or {}
+    if nodes is None:
+        nodes = channels.keys()
+    todo = [v for v in nodes if v not in assignment]
+    cost = {}
+    sat = {}  # radio --> distinct channels of its colored neighbors
+    degree = {}  # radio --> weighted degree
+    heap = []
+    for v in todo:
+        cost[v] = _cost_vector(v, channels, adj, assignment)
+        sat[v] = set(assignment[u] for u in adj.get(v, {}) if u in assignment)
+        degree[v] = -sum(adj.get(v, {}).itervalues())
+        heap.append((-len(sat[v]), degree[v], v))
+    heapify(heap)
+    while heap:
+        s, d, v = heappop(heap)
+        if v in assignment or -s != len(sat[v]):
+            continue  # already colored, or an old entry of the heap
+        cv = cost[v]
+        if not cv:
+            assignment[v] = current.get(v)  # unknown channels: stays where it is
+            continue
+        cur = current.get(v)
+        best = min(cv, key=lambda c: (cv[c] + (change_penalty if cur is not None and c != cur else 0.0), c != cur, c))
+        assignment[v] = best
+        for u, w in adj.get(v, {}).iteritems():
+            if u in cost and u not in assignment:
+                _add(cost[u], best, w)
+                if best not in sat[u]:
+                    sat[u].add(best)
+                    heappush(heap, (-len(sat[u]), degree[u], u))
+    return assignment
+
+
+def tabu_search(channels, adj, assignment, nodes=None, current=None,
+                max_iterations=TABU_ITERATIONS, max_time=TABU_TIME, tenure=TABU_TENURE,
+                stagnation=TABU_STAGNATION, change_penalty=CHANGE_PENALTY, seed=None):
+    """ improves an assignment with tabu search
+
+        @param assignment: dictionary radio --> channel (the initial solution, e.g. from dsatur())
+        @param nodes: radios that can change (default: all). The other radios keep their channels
+        @param current: dictionary radio --> channel in use (used by change_penalty)
+        @param max_time: seconds
+        @param stagnation: maximum number of moves without improvement
+        @return: tuple (new assignment, cost reduction)
+    """
+    rnd = random.Random(seed)
+    assignment = dict(assignment)
+    current = current or {}
+    if nodes is None:
+        nodes = assignment.keys()
+    movable = [v for v in nodes if assignment.get(v) is not None and len(channels.get(v, ())) > 1]
+    cost = dict((v, _cost_vector(v, channels, adj, assignment)) for v in movable)
+
+    def conflict(v):
+        return cost[v].get(assignment[v], 0.0) > EPSILON
+
+    conflicting = set(v for v in movable if conflict(v))
+    stagnation = min(stagnation, 10 * len(movable))
+    tabu = {}  # (radio, channel) --> last iteration the radio can't go back to channel
+    value = best_value = 0.0  # relative to the initial solution
+    history = []  # moves after the best solution: (radio, previous channel)
+    deadline = monotonic() + max_time
+    it = improved = 0
+    while conflicting and it < max_iterations and it - improved < stagnation:
+        if it & 15 == 0 and monotonic() > deadline:
+            break
+        it += 1
+        if len(conflicting) > TABU_CANDIDATES:
+            candidates = rnd.sample(list(conflicting), TABU_CANDIDATES)
+        else:
+            candidates = conflicting
+        move = None
+        move_delta = float('inf')
+        for v in candidates:
+            a = assignment[v]
+            cv = cost[v]
+            cur = current.get(v)
+            base = cv[a] + (change_penalty if cur is not None and a != cur else 0.0)
+            for c, x in cv.iteritems():
+                if c == a:
+                    continue
+                delta = x - base if cur is None or c == cur else x + change_penalty - base
+                if delta > move_delta:
+                    continue
+                if tabu.get((v, c), 0) >= it and value + delta >= best_value - EPSILON:
+                    continue  # tabu and does not improve the best solution (aspiration)
+                if move is None or delta < move_delta or rnd.random() < 0.5:
+                    move = (v, c)
+                    move_delta = delta
+        if move is None:
+            continue
+        v, c = move
+        a = assignment[v]
+        assignment[v] = c
+        tabu[(v, a)] = it + tenure + rnd.randint(0, tenure)
+        value += move_delta
+        history.append((v, a))
+        for u, w in adj.get(v, {}).iteritems():
+            cu = cost.get(u)
+            if cu is None:
+                continue
+            _add(cu, a, -w)
+            _add(cu, c, w)
+            if conflict(u):
+                conflicting.add(u)
+            else:
+                conflicting.discard(u)
+        if conflict(v):
+            conflicting.add(v)
+        else:
+            conflicting.discard(v)
+        if value < best_value - EPSILON:
+            best_value = value
+            improved = it
+            history = []
+    for v, a in reversed(history):  # back to the best solution
+        assignment[v] = a
+    return assignment, -best_value
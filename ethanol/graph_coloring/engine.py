@@ -0,0 +1,310 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# ##################################
+#
+# Copyright 2015 Henrique Moura
+#
+# This file is part of Ethanol.
+#
+# ##################################
+#
+"""
+This module implements the channel assignment engine.
+
+The radios are identified by (ip of the AP, wiphy name), the same key of get_radio_by_name().
+build_graph() asks the connected APs (in parallel) for the channels of their radios (Radio.validChannels,
+Radio.currentChannel), the channel load (busy_time / active_time of Radio.channelInfo) and the APs each
+VAP hears (the property Device.getAPsInRange). The BSSIDs heard are mapped to radios by get_vap_by_mac_address().
+
+  >>> from pox.ethanol.graph_coloring import ChannelAssignment, build_graph
+  >>> engine = ChannelAssignment(build_graph())
+  >>> engine.assign()           # plans all radios (DSATUR + tabu search) and starts the rollout
+  >>> engine.rescan(ap)         # the neighborhood of ap changed: recolors only the radios around it
+  >>> engine.stats()
+
+The new channels are applied by a Rollout (see rollout.py), at most ROLLOUT_RATE changes per second.
+A new plan is only used if its cost (interference plus CHANGE_PENALTY per radio that changes)
+is lower than the cost of the channels in use.
+
+@author: Henrique Duarte Moura
+@organization: WINET/DCC/UFMG
+@copyright: h3dema (c) 2017
+@contact: henriquemoura@hotmail.com
+@licence: GNU General Public License v2.0
+(https://www.gnu.org/licenses/old-licenses/gpl-2.0.html)
+@since: July 2015
+@status: in development
+"""
+from threading import Lock
+
+from pox.ethanol.ssl_message.msg_log import log
+from pox.ethanol.ssl_message.latency import monotonic, LatencyHistogram
+from pox.ethanol.graph_coloring.graph import ConflictGraph, MIN_SIGNAL, MAX_SIGNAL
+from pox.ethanol.graph_coloring.coloring import dsatur, tabu_search, cost_change, interference, conflicts
+from pox.ethanol.graph_coloring.coloring import CHANGE_PENALTY, TABU_TIME, EPSILON
+from pox.ethanol.graph_coloring.rollout import Rollout, ROLLOUT_RATE
+
+SCAN_CONCURRENCY = 64
+""" number of radios/VAPs asked at the same time by build_graph() and rescan()"""
+
+RECOLOR_TIME = 0.05
+""" maximum seconds of the tabu search of an incremental recolor"""
+
+LOAD_THRESHOLD = 0.1
+""" a radio is recolored only if its load changed more than this value (or its neighborhood changed)"""
+
+
+def radio_key(radio):
+    """ @return: the key of the Radio object in the conflict graph """
+    return (radio.ip, radio.wiphy)
+
+
+def set_radio_channel(key, channel):
+    """ changes the channel of the radio (used by the rollout)
+        @return: False if the radio does not exist anymore
+    """
+    from pox.ethanol.ethanol.radio import get_radio_by_name
+    radio = get_radio_by_name(*key)
+    if radio is None:
+        return False
+    radio.currentChannel = channel
+    return True
+
+
+def channel_load(radio):
+    """ @return: fraction of the time the channel in use by the radio is busy (0 if unknown) """
+    info = radio.channelInfo
+    for c in info or []:
+        if c['in_use'] and c['active_time'] > 0:
+            return float(c['busy_time']) / c['active_time']
+    return 0.0
+
+
+def signal_dBm(entry):
+    """ @return: the signal of an entry of getAPsInRange() in dBm (some drivers report a percentage) """
+    if entry['is_dBm'] is False:
+        return MIN_SIGNAL + (MAX_SIGNAL - MIN_SIGNAL) * entry['signal'] / 100.0
+    return entry['signal']
+
+
+def scan_radio(radio):
+    """ asks the radio for its channels, load and neighbors
+        @return: tuple (channels, current channel, load, {neighbor key: signal in dBm})
+    """
+    from pox.ethanol.ethanol.ap import get_vap_by_mac_address
+    channels = [c['channel'] for c in radio.validChannels or []]
+    current = radio.currentChannel
+    load = channel_load(radio)
+    heard = {}
+    ap = radio.ap
+    for vap in ap.vaps if ap is not None else []:
+        if vap.radio is not radio:
+            continue
+        num_aps, aps = vap.getAPsInRange  # property
+        for entry in aps or []:
+            other = get_vap_by_mac_address(entry['mac_addr'])
+            if other is None or other.radio is None:
+                continue  # not an ethanol AP
+            key = radio_key(other.radio)
+            heard[key] = max(heard.get(key, MIN_SIGNAL), signal_dBm(entry))
+    return channels, current, load, heard
+
+
+def _scan_all(radios):
+    """ scans the radios in parallel
+        @return: list of (radio, result of scan_radio or None if it failed)
+    """
+    from pox.ethanol.ssl_message.aio import Executor, gather
+    executor = Executor(SCAN_CONCURRENCY)
+    try:
+        results = gather([executor.submit(scan_radio, radio) for radio in radios], return_exceptions=True)
+    finally:
+        executor.shutdown()
+    scans = []
+    for radio, result in zip(radios, results):
+        if isinstance(result, Exception):
+            log.warning("Could not scan %s: %s", radio, result)
+            result = None
+        scans.append((radio, result))
+    return scans
+
+
+def build_graph(aps=None, graph=None):
+    """ builds the conflict graph of the radios of the APs
+        @param aps: list of AP objects (default: all connected APs)
+        @param graph: ConflictGraph to update (default: a new one)
+        @return: the ConflictGraph
+    """
+    if aps is None:
+        from pox.ethanol.ethanol.ap import connected_aps
+        aps = connected_aps().values()
+    graph = ConflictGraph() if graph is None else graph
+    scans = [s for s in _scan_all([r for ap in aps for r in ap.radios]) if s[1] is not None]
+    for radio, (channels, current, load, heard) in scans:
+        graph.add_radio(radio_key(radio), channels, current, load)
+    for radio, (channels, current, load, heard) in scans:  # all radios are in the graph: creates the edges
+        graph.set_scan(radio_key(radio), heard)
+    return graph
+
+
+class ChannelAssignment(object):
+    """ plans the channels of the radios of a conflict graph and applies the changes through a rollout
+    """
+
+    def __init__(self, graph=None, apply=set_radio_channel, rate=ROLLOUT_RATE,
+                 change_penalty=CHANGE_PENALTY, max_time=TABU_TIME, seed=None):
+        """
+          @param graph: ConflictGraph (see build_graph)
+          @param apply: function apply(radio key, channel) used by the rollout
+          @param rate: maximum number of channel changes per second
+          @param max_time: maximum seconds of the tabu search of each plan
+        """
+        self.graph = ConflictGraph() if graph is None else graph
+        self.rollout = Rollout(apply, rate=rate, name='channel-rollout')
+        self.change_penalty = change_penalty
+        self.max_time = max_time
+        self.seed = seed
+        self.__lock = Lock()  # one plan at a time
+        self.plan_latency = LatencyHistogram('channel_plan')
+        """ duration of assign() (without the rollout)"""
+        self.recolor_latency = LatencyHistogram('channel_recolor')
+        """ duration of recolor() (without the rollout)"""
+        self.__counters = {'plans': 0,
+                           'recolors': 0,
+                           'skipped': 0,  # updates that did not change the graph
+                           'rejected': 0,  # plans that were not better than the channels in use
+                           'changes': 0,  # channel changes sent to the rollout
+                           }
+
+    def stats(self):
+        """ @return: dictionary with the counters, the size of the graph, the current interference
+                     and the latency of the plans
+        """
+        with self.__lock:
+            d = dict(self.__counters)
+        channels, adj = self.graph.snapshot()
+        current = dict((r, self.graph.current(r)) for r in channels)
+        d['radios'] = len(channels)
+        d['edges'] = sum(len(nb) for nb in adj.itervalues()) / 2
+        d['interference'] = interference(adj, current)
+        d['conflicts'] = conflicts(adj, current)
+        d['plan_latency'] = self.plan_latency.as_dict()
+        d['recolor_latency'] = self.recolor_latency.as_dict()
+        d['rollout'] = self.rollout.stats()
+        return d
+
+    def current(self):
+        """ @return: dictionary radio --> channel in use (or being applied by the rollout) """
+        return dict((r, self.graph.current(r)) for r in self.graph.radios)
+
+    def assign(self, apply=True):
+        """ plans the channels of all radios
+            @param apply: if False, the changes are only returned
+                          (the channels of the graph and of the radios don't change)
+            @return: dictionary radio --> new channel of the radios that change
+        """
+        with self.__lock:
+            t0 = monotonic()
+            channels, adj = self.graph.snapshot()
+            changes = self.__plan(channels, adj, channels.keys(), {}, self.max_time, apply)
+            self.plan_latency.record(monotonic() - t0)
+            self.__counters['plans'] += 1
+        if apply:
+            log.info("Channel plan of %d radios: %d changes", len(channels), len(changes))
+        return changes
+
+    def recolor(self, radios, apply=True):
+        """ plans the channels of the radios and their neighbors. the other radios keep their channels
+            @param radios: radios whose neighborhood changed
+            @return: dictionary radio --> new channel of the radios that change
+        """
+        with self.__lock:
+            t0 = monotonic()
+            region = set(r for r in radios if r in self.graph)
+            for r in list(region):
+                region.update(self.graph.neighbors(r))
+            adj = dict((r, self.graph.neighbors(r)) for r in region)
+            channels = dict((r, self.graph.channels(r)) for r in region)
+            fixed = {}
+            for r in region:
+                for u in adj[r]:
+                    if u not in region:
+                        fixed[u] = self.graph.current(u)
+            changes = self.__plan(channels, adj, region, fixed, min(self.max_time, RECOLOR_TIME), apply)
+            self.recolor_latency.record(monotonic() - t0)
+            self.__counters['recolors'] += 1
+        return changes
+
+    def __plan(self, channels, adj, nodes, fixed, max_time, apply):
+        """ colors nodes (the radios in fixed keep their channels). must hold the lock """
+        current = dict((r, self.graph.current(r)) for r in nodes)
+        current.update(fixed)
+        assignment = dsatur(channels, adj, nodes=nodes, fixed=fixed, current=current,
+                            change_penalty=self.change_penalty)
+        assignment, gain = tabu_search(channels, adj, assignment, nodes=nodes, current=current,
+                                       max_time=max_time, change_penalty=self.change_penalty,
+                                       seed=self.seed)
+        if cost_change(adj, current, assignment, self.change_penalty) >= -EPSILON:
+            self.__counters['rejected'] += 1
+            return {}
+        changes = dict((r, c) for r, c in assignment.iteritems()
+                       if r in channels and c is not None and c != current.get(r))
+        if apply and changes:
+            for r, c in changes.iteritems():
+                self.graph.set_current(r, c)
+            self.rollout.schedule(changes)
+            self.__counters['changes'] += len(changes)
+        return changes
+
+    def update_radio(self, radio, heard=None, load=None, apply=True):
+        """ updates the scan and/or the load of the radio and recolors its neighborhood if they changed
+            @param heard: dictionary neighbor radio --> signal (dBm)
+            @param load: fraction of the time the channel is busy
+            @return: dictionary radio --> new channel of the radios that change
+        """
+        changed = set()
+        if load is not None and abs(load - self.graph.load(radio)) > LOAD_THRESHOLD:
+            self.graph.set_load(radio, load)
+            changed.add(radio)
+        if heard is not None:
+            changed.update(self.graph.set_scan(radio, heard))
+        if not changed:
+            with self.__lock:
+                self.__counters['skipped'] += 1
+            return {}
+        return self.recolor(changed, apply)
+
+    def add_radio(self, radio, channels, current=None, load=0.0, heard=None, apply=True):
+        """ inserts a radio in the graph (e.g. a new AP) and recolors its neighborhood
+            @return: dictionary radio --> new channel of the radios that change
+        """
+        self.graph.add_radio(radio, channels, current, load)
+        if heard is not None:
+            self.graph.set_scan(radio, heard)
+        return self.recolor([radio], apply)
+
+    def remove_radio(self, radio):
+        """ removes the radio (e.g. the AP disconnected). its neighbors keep their channels """
+        self.rollout.cancel(radio)
+        self.graph.remove_radio(radio)
+
+    def rescan(self, ap, apply=True):
+        """ scans the radios of the AP again and recolors their neighborhoods if they changed
+            @return: dictionary radio --> new channel of the radios that change
+        """
+        changes = {}
+        for radio, result in _scan_all(ap.radios):
+            if result is None:
+                continue
+            channels, current, load, heard = result
+            key = radio_key(radio)
+            if key not in self.graph:
+                changes.update(self.add_radio(key, channels, current, load, heard, apply))
+            else:
+                changes.update(self.update_radio(key, heard, load, apply))
+        return changes
+
+    def stop(self):
+        """ stops the rollout (the changes that were not applied are discarded) """
+        self.rollout.stop()
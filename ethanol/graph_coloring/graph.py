@@ -0,0 +1,200 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# ##################################
+#
+# Copyright 2015 Henrique Moura
+#
+# This file is part of Ethanol.
+#
+# ##################################
+#
+"""
+This module implements the conflict graph used by the channel assignment.
+
+Each node is a radio (any hashable key, the planner uses (ip, wiphy name)) with the channels it supports
+and its load (the fraction of the time the channel is busy). There is an edge between two radios if
+one of them hears the other in its in-range scan. The weight of the edge grows with the signal level
+and with the load of both radios: two busy radios that hear each other well must not share a channel.
+
+The cost of putting two neighbors in channels a and b is weight * overlap(a, b):
+in 2.4 GHz, channels less than 5 channels apart overlap partially; in 5 GHz only the same channel overlaps.
+
+@author: Henrique Duarte Moura
+@organization: WINET/DCC/UFMG
+@copyright: h3dema (c) 2017
+@contact: henriquemoura@hotmail.com
+@licence: GNU General Public License v2.0
+(https://www.gnu.org/licenses/old-licenses/gpl-2.0.html)
+@since: July 2015
+@status: in development
+"""
+from threading import Lock
+
+MIN_SIGNAL = -95.0
+""" dBm. neighbors heard below this level do not interfere"""
+
+MAX_SIGNAL = -40.0
+""" dBm. neighbors heard above this level have the maximum weight (1 + loads)"""
+
+OVERLAP_DISTANCE_24GHZ = 5
+""" 2.4 GHz channels that are this number of channels apart (or more) do not overlap"""
+
+
+def overlap(a, b):
+    """ @return: the fraction of the spectrum shared by channels a and b (0..1) """
+    if a == b:
+        return 1.0
+    if a > 14 or b > 14:
+        return 0.0  # 5 GHz (or different bands): channels don't overlap
+    d = abs(a - b)
+    if d >= OVERLAP_DISTANCE_24GHZ:
+        return 0.0
+    return 1.0 - float(d) / OVERLAP_DISTANCE_24GHZ
+
+
+def link_strength(signal):
+    """ @param signal: dBm
+        @return: signal mapped to 0..1 (MIN_SIGNAL --> 0, MAX_SIGNAL --> 1)
+    """
+    if signal is None:
+        return 0.0
+    v = (float(signal) - MIN_SIGNAL) / (MAX_SIGNAL - MIN_SIGNAL)
+    return min(1.0, max(0.0, v))
+
+
+class ConflictGraph(object):
+    """ weighted conflict graph of the radios.
+        the writers (the scans) lock the graph; the colorings receive a copy of the weights (see neighbors())
+    """
+
+    def __init__(self):
+        self.__lock = Lock()
+        self.__channels = {}  # radio --> tuple of valid channels
+        self.__current = {}  # radio --> channel in use (None if unknown)
+        self.__load = {}  # radio --> 0..1
+        self.__heard = {}  # radio --> {neighbor: link strength} (the in-range scan of radio)
+        self.__adj = {}  # radio --> {neighbor: weight} (symmetric)
+
+    def __len__(self):
+        return len(self.__channels)
+
+    def __contains__(self, radio):
+        return radio in self.__channels
+
+    @property
+    def radios(self):
+        """ list of the radios in the graph """
+        return self.__channels.keys()
+
+    def add_radio(self, radio, channels, current=None, load=0.0):
+        """ inserts (or updates) a radio
+            @param radio: key of the radio
+            @param channels: list of the channels supported by the radio
+            @param current: the channel the radio is using
+            @param load: fraction of the time the channel is busy (0..1)
+        """
+        with self.__lock:
+            self.__channels[radio] = tuple(sorted(set(channels)))
+            self.__current[radio] = current
+            self.__load[radio] = min(1.0, max(0.0, load))
+            self.__heard.setdefault(radio, {})
+            self.__adj.setdefault(radio, {})
+            for nb in self.__adj[radio].keys():
+                self.__update_edge(radio, nb)
+
+    def remove_radio(self, radio):
+        """ removes the radio and its edges
+            @return: set of the radios that were neighbors of radio
+        """
+        with self.__lock:
+            if radio not in self.__channels:
+                return set()
+            neighbors = set(self.__adj.pop(radio, {}).keys())
+            for nb in neighbors:
+                self.__adj[nb].pop(radio, None)
+                self.__heard[nb].pop(radio, None)
+            for d in (self.__channels, self.__current, self.__load, self.__heard):
+                d.pop(radio, None)
+            return neighbors
+
+    def set_load(self, radio, load):
+        """ updates the load of radio (changes the weights of its edges) """
+        with self.__lock:
+            if radio not in self.__channels:
+                return
+            self.__load[radio] = min(1.0, max(0.0, load))
+            for nb in self.__adj[radio].keys():
+                self.__update_edge(radio, nb)
+
+    def set_current(self, radio, channel):
+        with self.__lock:
+            if radio in self.__channels:
+                self.__current[radio] = channel
+
+    def set_scan(self, radio, heard):
+        """ replaces the in-range scan of radio
+            @param heard: dictionary neighbor radio --> signal (dBm). radios that are not in the graph are ignored
+            @return: set of radios whose edges changed (including radio), empty if nothing changed
+        """
+        with self.__lock:
+            if radio not in self.__channels:
+                return set()
+            new = dict((nb, link_strength(s)) for nb, s in heard.items()
+                       if nb != radio and nb in self.__channels)
+            new = dict((nb, v) for nb, v in new.items() if v > 0)
+            old = self.__heard[radio]
+            if new == old:
+                return set()
+            self.__heard[radio] = new
+            changed = set([radio])
+            for nb in set(old.keys()) | set(new.keys()):
+                if self.__update_edge(radio, nb):
+                    changed.add(nb)
+            return changed
+
+    def __update_edge(self, u, v):
+        """ recomputes the weight of the edge u-v. must hold the lock
+            @return: True if the weight changed
+        """
+        strength = max(self.__heard.get(u, {}).get(v, 0.0), self.__heard.get(v, {}).get(u, 0.0))
+        w = strength * (1.0 + self.__load.get(u, 0.0) + self.__load.get(v, 0.0)) if strength > 0 else 0.0
+        old = self.__adj[u].get(v, 0.0)
+        if w == old:
+            return False
+        if w > 0:
+            self.__adj[u][v] = w
+            self.__adj[v][u] = w
+        else:
+            self.__adj[u].pop(v, None)
+            self.__adj[v].pop(u, None)
+        return True
+
+    def channels(self, radio):
+        """ @return: tuple with the channels supported by radio """
+        return self.__channels.get(radio, ())
+
+    def current(self, radio):
+        """ @return: the channel in use by radio (None if unknown) """
+        return self.__current.get(radio)
+
+    def load(self, radio):
+        return self.__load.get(radio, 0.0)
+
+    def neighbors(self, radio):
+        """ @return: dictionary neighbor --> weight (a copy) """
+        with self.__lock:
+            return dict(self.__adj.get(radio, {}))
+
+    def weight(self, u, v):
+        return self.__adj.get(u, {}).get(v, 0.0)
+
+    def degree(self, radio):
+        return len(self.__adj.get(radio, {}))
+
+    def snapshot(self):
+        """ @return: (channels, adjacency) copies used by the colorings:
+                     dictionary radio --> tuple of channels, and radio --> {neighbor: weight}
+        """
+        with self.__lock:
+            return dict(self.__channels), dict((r, dict(adj)) for r, adj in self.__adj.items())
@@ -0,0 +1,180 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# ##################################
+#
+# Copyright 2015 Henrique Moura
+#
+# This file is part of Ethanol.
+#
+# ##################################
+#
+"""
+This module applies the channel changes computed by the engine at a limited rate.
+
+A channel change disconnects (for a moment) the stations of the radio, so the changes are
+not sent all at once: a thread takes them from a queue at most ROLLOUT_RATE changes per second
+(token bucket, up to ROLLOUT_BURST changes at once). If a radio receives a new channel while
+its previous change is still in the queue, only the last channel is applied (coalesced).
+
+@author: Henrique Duarte Moura
+@organization: WINET/DCC/UFMG
+@copyright: h3dema (c) 2017
+@contact: henriquemoura@hotmail.com
+@licence: GNU General Public License v2.0
+(https://www.gnu.org/licenses/old-licenses/gpl-2.0.html)
+@since: July 2015
+@status: in development
+"""
+from collections import deque
+from threading import Thread, Lock, Condition
+
+from pox.ethanol.ssl_message.msg_log import log
+from pox.ethanol.ssl_message.latency import monotonic, LatencyHistogram
+
+ROLLOUT_RATE = 10.0
+""" maximum number of channel changes per second"""
+
+ROLLOUT_BURST = 5
+""" maximum number of channel changes sent at once (after a quiet period)"""
+
+
+class Rollout(object):
+    """ queue of channel changes, applied by one thread at a limited rate
+    """
+
+    def __init__(self, apply, rate=ROLLOUT_RATE, burst=ROLLOUT_BURST, name='rollout'):
+        """
+          @param apply: function apply(radio, channel) that changes the channel of the radio.
+                        returns False (or raises an exception) if the change failed
+          @param rate: changes per second
+          @param burst: maximum number of tokens of the bucket
+        """
+        self.apply = apply
+        self.rate = float(rate)
+        self.burst = burst
+        self.name = name
+        self.__cond = Condition(Lock())
+        self.__queue = deque()  # radios in the order they were scheduled
+        self.__pending = {}  # radio --> channel
+        self.__busy = False  # a change is being applied
+        self.__tokens = float(burst)
+        self.__last = monotonic()
+        self.__thread = None
+        self.__running = True
+        self.latency = LatencyHistogram('rollout')
+        """ duration of apply()"""
+        self.__counters = {'scheduled': 0,
+                           'coalesced': 0,  # a newer channel replaced a change in the queue
+                           'cancelled': 0,
+                           'applied': 0,
+                           'failed': 0,
+                           }
+
+    def stats(self):
+        """ @return: dictionary with the counters, the number of changes in the queue and the percentiles of apply() """
+        with self.__cond:
+            d = dict(self.__counters)
+            d['pending'] = len(self.__pending)
+        d['latency'] = self.latency.as_dict()
+        return d
+
+    def __len__(self):
+        return len(self.__pending)
+
+    def pending(self):
+        """ @return: dictionary radio --> channel of the changes in the queue """
+        with self.__cond:
+            return dict(self.__pending)
+
+    def schedule(self, changes):
+        """ puts the changes in the queue
+            @param changes: dictionary radio --> new channel
+        """
+        with self.__cond:
+            for radio, channel in changes.iteritems():
+                if radio in self.__pending:
+                    self.__counters['coalesced'] += 1
+                else:
+                    self.__queue.append(radio)
+                self.__pending[radio] = channel
+                self.__counters['scheduled'] += 1
+            if self.__thread is None:
+                self.__thread = Thread(target=self.__worker, name=self.name)
+                self.__thread.daemon = True
+                self.__thread.start()
+            self.__cond.notify_all()
+
+    def cancel(self, radio):
+        """ removes the change of radio from the queue (e.g. the AP disconnected)
+            @return: True if there was a change
+        """
+        with self.__cond:
+            if self.__pending.pop(radio, None) is None:
+                return False
+            self.__queue.remove(radio)
+            self.__counters['cancelled'] += 1
+            self.__cond.notify_all()
+            return True
+
+    def wait(self, timeout=None):
+        """ waits until the queue is empty
+            @return: True if all changes were applied
+        """
+        deadline = None if timeout is None else monotonic() + timeout
+        with self.__cond:
+            while self.__pending or self.__busy:
+                remaining = None if deadline is None else deadline - monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.__cond.wait(remaining)
+            return True
+
+    def stop(self):
+        """ stops the thread. the changes in the queue are discarded """
+        with self.__cond:
+            self.__running = False
+            self.__queue.clear()
+            self.__pending.clear()
+            self.__cond.notify_all()
+            thread, self.__thread = self.__thread, None
+        if thread is not None:
+            thread.join()
+
+    def __take(self):
+        """ waits for a change and a token
+            @return: (radio, channel) or None if stopped
+        """
+        with self.__cond:
+            while self.__running:
+                now = monotonic()
+                self.__tokens = min(float(self.burst), self.__tokens + (now - self.__last) * self.rate)
+                self.__last = now
+                if not self.__queue:
+                    self.__cond.wait()
+                elif self.__tokens < 1:
+                    self.__cond.wait((1 - self.__tokens) / self.rate)
+                else:
+                    self.__tokens -= 1
+                    radio = self.__queue.popleft()
+                    self.__busy = True
+                    return radio, self.__pending.pop(radio)
+            return None
+
+    def __worker(self):
+        while True:
+            change = self.__take()
+            if change is None:
+                return
+            radio, channel = change
+            t0 = monotonic()
+            try:
+                ok = self.apply(radio, channel) is not False
+            except Exception as e:
+                log.error("Error changing the channel of %s to %s: %s", radio, channel, e)
+                ok = False
+            self.latency.record(monotonic() - t0)
+            with self.__cond:
+                self.__counters['applied' if ok else 'failed'] += 1
+                self.__busy = False
+                self.__cond.notify_all()
@@ -17,4 +17,12 @@
 
 """
 This package contains a python ovsdb client
+
+jsonrpc.py reads the JSON-RPC stream of the server, replica.py keeps a local copy of the
+Bridge/Port/Interface/QoS/Queue tables (updated by a monitor), transact.py builds the transactions
+(many operations in one request) and ovsdb.py has the Ovsdb client.
 """
+from pox.ethanol.ovsdb.jsonrpc import OvsdbError
+from pox.ethanol.ovsdb.replica import Replica
+from pox.ethanol.ovsdb.transact import Transaction, TransactionResult, Uuid
+from pox.ethanol.ovsdb.ovsdb import Ovsdb
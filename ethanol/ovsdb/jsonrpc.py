@@ -0,0 +1,337 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# ##################################
+#
+# Copyright 2015 Henrique Moura
+#
+# This file is part of Ethanol.
+#
+# ##################################
+#
+#
+"""
+  JSON-RPC connection used by the OVSDB client (see RFC 7047, section 4).
+
+  The OVSDB server sends the JSON objects one after the other, without a separator, and one object may
+  arrive in many recv() calls (a monitor reply of a switch with many ports has hundreds of kB).
+  JsonStreamReader splits the stream incrementally: each byte is scanned once, and the object is decoded
+  when its last closing brace arrives.
+
+  JsonRpcConnection has a thread that reads the socket:
+    - replies are delivered to the Future returned by request() (many requests can be in flight)
+    - "echo" requests of the server are answered
+    - notifications (e.g. "update" of a monitor) are passed to the handler registered with on_notification()
+
+@author: Henrique Duarte Moura
+@organization: WINET/DCC/UFMG
+@copyright: h3dema (c) 2017
+@contact: henriquemoura@hotmail.com
+@licence: GNU General Public License v2.0
+(https://www.gnu.org/licenses/old-licenses/gpl-2.0.html)
+@since: July 2015
+@status: in development
+"""
+import re
+import sys
+import json
+import socket
+from threading import Thread, Lock, current_thread
+
+from pox.ethanol.ssl_message.msg_log import log
+from pox.ethanol.ssl_message.latency import monotonic, LatencyHistogram
+from pox.ethanol.ssl_message.aio import Future
+
+BUFFER_SIZE = 65536
+""" bytes read from the socket at once"""
+
+MAX_MESSAGE_SIZE = 64 * 1024 * 1024
+""" a message larger than this is an error (the connection is closed)"""
+
+_OUTSIDE = re.compile(r'[{}\[\]"]')
+_INSIDE = re.compile(r'["\\]')
+_STRING_END = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*"', re.S)  # rest of a string (after the opening quote)
+
+
+class OvsdbError(Exception):
+    """ the server answered with an error (or the connection was closed before the answer) """
+
+    def __init__(self, error, details=None):
+        Exception.__init__(self, error if details is None else '%s: %s' % (error, details))
+        self.error = error
+        self.details = details
+
+
+class JsonStreamReader(object):
+    """ splits a stream of JSON objects (or arrays)
+    """
+
+    def __init__(self, max_size=MAX_MESSAGE_SIZE):
+        self.max_size = max_size
+        self.__chunks = []  # parts of the incomplete message received in previous calls of feed()
+        self.__size = 0
+        self.__depth = 0
+        self.__in_string = False
+        self.__escape = False
+
+    @property
+    def pending(self):
+        """ number of bytes of the incomplete message """
+        return self.__size
+
+    def feed(self, data):
+        """ :param data: bytes received
+            :return: list with the messages completed by data (decoded)
+            :raise ValueError: invalid JSON or message too large
+        """
+        msgs = []
+        start = 0  # beginning of the current message in data
+        pos = 0
+        n = len(data)
+        depth = self.__depth
+        while pos < n:
+            if self.__in_string:
+                if self.__escape:
+                    self.__escape = False
+                    pos += 1
+                    continue
+                m = _INSIDE.search(data, pos)
+                if m is None:
+                    break
+                pos = m.end()
+                if m.group() == '\\':
+                    self.__escape = True
+                else:
+                    self.__in_string = False
+                continue
+            m = _OUTSIDE.search(data, pos)
+            if m is None:
+                break
+            c = m.group()
+            pos = m.end()
+            if c == '"':
+                m = _STRING_END.match(data, pos)
+                if m is None:
+                    self.__in_string = True  # the string continues in the next data
+                else:
+                    pos = m.end()
+            elif c == '{' or c == '[':
+                if depth == 0:
+                    start = m.start()  # discards the whitespace between the messages
+                depth += 1
+            else:
+                depth -= 1
+                if depth < 0:
+                    raise ValueError("unbalanced '%s' in the JSON stream" % c)
+                if depth == 0:
+                    if self.__chunks:
+                        text = ''.join(self.__chunks) + data[start:pos]
+                        self.__chunks = []
+                        self.__size = 0
+                    else:
+                        text = data[start:pos]
+                    msgs.append(json.loads(text))
+                    start = pos
+        self.__depth = depth
+        if depth > 0:
+            part = data[start:]
+            self.__chunks.append(part)
+            self.__size += len(part)
+            if self.__size > self.max_size:
+                raise ValueError("JSON message larger than %d bytes" % self.max_size)
+        return msgs
+
+
+class JsonRpcConnection(object):
+    """ JSON-RPC over a TCP socket, with a thread that reads the replies and notifications
+    """
+
+    def __init__(self, address, buffer_size=BUFFER_SIZE, timeout=None):
+        """
+          :param address: tuple (ip, port)
+          :param buffer_size: bytes read at once
+          :param timeout: seconds to connect
+        """
+        self.address = address
+        self.buffer_size = buffer_size
+        self.timeout = timeout
+        self.__sock = None
+        self.__thread = None
+        self.__lock = Lock()
+        self.__send_lock = Lock()
+        self.__next_id = 0
+        self.__pending = {}  # id --> (Future, on_reply, time of the request)
+        self.__handlers = {}  # method of the notification --> function(params)
+        self.__on_close = []
+        self.latency = LatencyHistogram('ovsdb_rpc')
+        """ request --> reply"""
+        self.__counters = {'requests': 0, 'replies': 0, 'notifications': 0, 'echoes': 0, 'errors': 0,
+                           'bytes': 0, 'messages': 0}
+
+    def stats(self):
+        """ :return: dictionary with the counters, the requests in flight and the latency percentiles """
+        with self.__lock:
+            d = dict(self.__counters)
+            d['in_flight'] = len(self.__pending)
+        d['latency'] = self.latency.as_dict()
+        return d
+
+    @property
+    def connected(self):
+        return self.__sock is not None
+
+    def connect(self):
+        """ opens the connection and starts the reader thread
+            :return: True if connected
+        """
+        if self.__sock is not None:
+            return True
+        try:
+            sock = socket.create_connection(self.address, self.timeout)
+            sock.settimeout(None)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except socket.error as e:
+            log.error("Cannot connect to ovsdb at %s:%d: %s", self.address[0], self.address[1], e)
+            return False
+        self.__sock = sock
+        self.__thread = Thread(target=self.__reader, args=(sock,), name='ovsdb-%s' % self.address[0])
+        self.__thread.daemon = True
+        self.__thread.start()
+        return True
+
+    def close(self):
+        """ closes the connection. the requests in flight fail with OvsdbError """
+        sock, self.__sock = self.__sock, None
+        if sock is None:
+            return
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
+        sock.close()
+        thread = self.__thread
+        if thread is not None and thread.ident is not None and thread is not current_thread():
+            thread.join()
+
+    def on_notification(self, method, handler):
+        """ handler(params) is called (by the reader thread) for each notification of method """
+        self.__handlers[method] = handler
+
+    def on_close(self, handler):
+        """ handler() is called (by the reader thread) when the connection is closed """
+        self.__on_close.append(handler)
+
+    def request(self, method, params, on_reply=None):
+        """ sends a request without waiting for the reply (the requests are pipelined)
+
+            :param on_reply: function on_reply(result) called by the reader thread before the Future is done
+                             (the notifications received after the reply are handled after on_reply)
+            :return: Future with the "result" of the reply (OvsdbError if the reply has an "error")
+        """
+        future = Future()
+        with self.__lock:
+            msg_id = self.__next_id
+            self.__next_id += 1
+            self.__pending[msg_id] = (future, on_reply, monotonic())
+            self.__counters['requests'] += 1
+        if not self.send({"method": method, "params": params, "id": msg_id}):
+            with self.__lock:
+                self.__pending.pop(msg_id, None)
+            self.__fail(future, OvsdbError('not connected'))
+        return future
+
+    def call(self, method, params, timeout=None):
+        """ sends the request and waits for the reply
+            :return: the "result" of the reply
+            :raise OvsdbError: the reply has an error. aio.TimeoutError: no reply in timeout seconds
+        """
+        return self.request(method, params).result(timeout)
+
+    def send(self, msg):
+        """ sends msg (a dictionary) to the server
+            :return: False if the connection is closed
+        """
+        sock = self.__sock
+        if sock is None:
+            return False
+        data = json.dumps(msg, separators=(',', ':'))
+        try:
+            with self.__send_lock:
+                sock.sendall(data)
+        except socket.error as e:
+            log.error("Error sending to ovsdb at %s:%d: %s", self.address[0], self.address[1], e)
+            return False
+        return True
+
+    def __fail(self, future, error):
+        try:
+            raise error
+        except OvsdbError:
+            future.set_exception(sys.exc_info())
+
+    def __dispatch(self, msg):
+        """ called by the reader thread for each message received """
+        method = msg.get('method')
+        if method is not None:
+            if method == 'echo' and msg.get('id') is not None:
+                self.__counters['echoes'] += 1
+                self.send({"result": msg.get('params'), "error": None, "id": msg['id']})
+                return
+            self.__counters['notifications'] += 1
+            handler = self.__handlers.get(method)
+            if handler is not None:
+                try:
+                    handler(msg.get('params'))
+                except Exception as e:
+                    log.error("Error handling the ovsdb notification %s: %s", method, e)
+            return
+        with self.__lock:
+            entry = self.__pending.pop(msg.get('id'), None)
+        if entry is None:
+            return  # reply of a request that was not sent by request() (e.g. the echo of the server)
+        future, on_reply, t0 = entry
+        self.latency.record(monotonic() - t0)
+        self.__counters['replies'] += 1
+        error = msg.get('error')
+        if error is not None:
+            self.__counters['errors'] += 1
+            if isinstance(error, dict):
+                self.__fail(future, OvsdbError(error.get('error'), error.get('details')))
+            else:
+                self.__fail(future, OvsdbError(error))
+            return
+        result = msg.get('result')
+        if on_reply is not None:
+            try:
+                on_reply(result)
+            except Exception as e:
+                log.error("Error handling the ovsdb reply: %s", e)
+        future.set_result(result)
+
+    def __reader(self, sock):
+        reader = JsonStreamReader()
+        try:
+            while True:
+                data = sock.recv(self.buffer_size)
+                if not data:
+                    break
+                self.__counters['bytes'] += len(data)
+                for msg in reader.feed(data):
+                    self.__counters['messages'] += 1
+                    if isinstance(msg, dict):
+                        self.__dispatch(msg)
+        except (socket.error, ValueError) as e:
+            if self.__sock is sock:
+                log.error("ovsdb connection %s:%d: %s", self.address[0], self.address[1], e)
+        if self.__sock is sock:
+            self.__sock = None
+            sock.close()
+        with self.__lock:
+            pending, self.__pending = self.__pending, {}
+        for future, on_reply, t0 in pending.values():
+            self.__fail(future, OvsdbError('connection closed'))
+        for handler in self.__on_close:
+            try:
+                handler()
+            except Exception as e:
+                log.error("Error handling the end of the ovsdb connection: %s", e)
@@ -14,6 +14,17 @@
   OVSDB calls.
   see more information in https://tools.ietf.org/html/rfc7047
 
+  The methods send the requests over one JSON-RPC connection (see jsonrpc.py): echo(), list_dbs(), get_schema()
+  and monitor() wait for the reply, request() returns a Future (the requests are pipelined).
+
+  replicate() starts a monitor of the Bridge, Port, Interface, QoS and Queue tables and keeps a local copy
+  of them (see replica.py). The queries (list_bridges, ports, interfaces, ofport, qos, queues) are answered
+  from this copy, without a round trip. The copy is updated by the "update" notifications of the monitor.
+
+  transact() sends a Transaction (see transact.py) with many operations in one request, transact_async()
+  does not wait for the reply, so the transactions of many switches are pipelined. set_queues() changes the
+  QoS/Queue rows of many ports of the switch in one round trip.
+
 @author: Henrique Duarte Moura
 @organization: WINET/DCC/UFMG
 @copyright: h3dema (c) 2017
@@ -25,100 +36,216 @@
 """
 
 import sys
-import socket
-import json
-from select import select
+
+from pox.ethanol.ssl_message.msg_log import log
+from pox.ethanol.ovsdb.jsonrpc import JsonRpcConnection, BUFFER_SIZE
+from pox.ethanol.ovsdb.replica import Replica, REPLICA_TABLES
+from pox.ethanol.ovsdb.transact import Transaction, TransactionResult, PendingTransaction, DEFAULT_QOS_TYPE
+from pox.ethanol.ovsdb.transact import set_queues
+
+OVSDB_PORT = 6632
+""" default port of the ovsdb server of the APs"""
+
+OVSDB_DB = 'Open_vSwitch'
+""" default database"""
+
+OVSDB_TIMEOUT = 10.0
+""" seconds to wait for a reply"""
+
+REPLICA_MONITOR_ID = 'ethanol-replica'
+""" id of the monitor used by replicate()"""
+
+REPLICA_UPDATE_TIMEOUT = 1.0
+""" seconds set_queues() waits for the update of the replica after a wait condition failed"""
+
 
 class Ovsdb:
 
-    def __init__(self, server_ip, server_port=6632, buffer_size=4096):
+    def __init__(self, server_ip, server_port=OVSDB_PORT, buffer_size=BUFFER_SIZE, timeout=OVSDB_TIMEOUT):
         self.server_ip = server_ip
         self.server_port = server_port
         self.buffer_size = buffer_size
-        self.socket = None
-        self.__id = 0
-
-    @property
-    def id(self):
-        """message id (autoincrement)"""
-        _id = self.__id
-        self.__id += 1
-        return _id
+        self.timeout = timeout
+        self.connection = JsonRpcConnection((server_ip, server_port), buffer_size=buffer_size, timeout=timeout)
+        self.connection.on_notification('update', self.__update)
+        self.connection.on_close(self.__closed)
+        self.__monitors = {}  # monitor id --> (db, monitor requests, function(updates), function(initial contents))
+        self.__replica = None
 
     def connect(self):
-        """connect to the openvswitch ovsdb port"""
-        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.socket.connect((self.server_ip, self.server_port))
-
-    def gather_data(self):
-        """receive all json data"""
-        if self.socket is None:
-            return None
-        result = ""
-        while "error" not in result or "id" not in result or "result" not in result:
-            # check if we got the whole thing
-            # by verifying if we've received all the fields
-            reply = self.socket.recv(self.buffer_size)
-            result += reply
-        return json.loads(result)
+        """connect to the openvswitch ovsdb port. the monitors started before are started again
+
+        :return: True if connected
+        """
+        if self.connection.connected:
+            return True
+        if not self.connection.connect():
+            return False
+        for monitor_id, (db, requests, handler, on_reply) in self.__monitors.items():
+            self.connection.request("monitor", [db, monitor_id, requests], on_reply=on_reply)
+        return True
+
+    def close(self):
+        self.connection.close()
+
+    def stats(self):
+        """ :return: statistics of the connection (see JsonRpcConnection.stats) """
+        return self.connection.stats()
+
+    def request(self, method, *params, **kwargs):
+        """ sends the request without waiting (pipelined)
+
+        :param on_reply: (keyword) function called with the result by the reader thread
+        :return: aio.Future with the result
+        """
+        return self.connection.request(method, list(params), on_reply=kwargs.get('on_reply'))
+
+    def call(self, method, *params):
+        """ sends the request and waits for the reply (at most self.timeout seconds)
+
+        :return: the result of the reply
+        :raise OvsdbError: if the server answered with an error
+        """
+        return self.connection.call(method, list(params), timeout=self.timeout)
 
     def echo(self):
         """ perform an echo (ping) to the ovsdb """
-        req = json.dumps({"method":"echo",
-                          "id":"echo",
-                          "params":[]})
-        self.socket.send(req)
-        return self.gather_data()
+        return self.call("echo")
 
     def list_dbs(self):
         """list all databases"""
-        req = json.dumps({"method":"list_dbs",
-                           "params":[], 
-                           "id": 0})
-        self.socket.send(req)
-        return self.gather_data()
-
-    def monitor(self, db, columns, monitor_id=None, msg_id=None):
-        msg = {"method":"monitor", "params":[db, monitor_id, columns], "id":msg_id}
-        return json.dumps(msg)
-
-    def monitor_cancel(self, db, columns, monitor_id=None, msg_id=None):
-        assert monitor_id is not None, 'provide the correct monitor id (same as request)'
-        msg = {"method":"monitor_cancel", "params":[db, monitor_id, columns], "id":msg_id}
-        return json.dumps(msg)
-
-    def list_bridges(self, db=None):
+        return self.call("list_dbs")
+
+    def monitor(self, db, requests, monitor_id, handler=None, on_reply=None):
+        """ starts a monitor. handler(table-updates) receives the updates (by the reader thread)
+
+        :param db: the database name
+        :param requests: monitor-requests: table --> {"columns": [...]}
+        :param monitor_id: id of the monitor (any JSON value, used by monitor_cancel)
+        :param on_reply: function that receives the initial contents (default: handler).
+                         it is called again with the new contents if the connection is opened again
+        :return: the initial contents of the tables (table-updates)
+        """
+        on_reply = handler if on_reply is None else on_reply
+        if handler is not None:
+            self.__monitors[monitor_id] = (db, requests, handler, on_reply)
+        try:
+            return self.connection.request("monitor", [db, monitor_id, requests],
+                                           on_reply=on_reply).result(self.timeout)
+        except Exception:
+            self.__monitors.pop(monitor_id, None)
+            raise
+
+    def monitor_cancel(self, monitor_id):
+        """ stops the monitor """
+        self.__monitors.pop(monitor_id, None)
+        return self.call("monitor_cancel", monitor_id)
+
+    def __update(self, params):
+        """ "update" notification: [monitor id, table-updates] """
+        entry = self.__monitors.get(params[0])
+        if entry is not None:
+            entry[2](params[1])
+
+    def __closed(self):
+        if self.__replica is not None:
+            self.__replica.ready = False
+            log.warning("ovsdb replica of %s is not updated: connection closed", self.server_ip)
+
+    def replicate(self, db=OVSDB_DB, tables=REPLICA_TABLES):
+        """ starts (once) the monitor that keeps the local copy of the tables
+
+        :param db: the database name
+        :param tables: table --> list of columns
+        :return: the Replica
+        """
+        if self.__replica is None:
+            replica = Replica(tables)
+            self.monitor(db, replica.monitor_requests(), REPLICA_MONITOR_ID, replica.apply, replica.load)
+            self.__replica = replica
+        return self.__replica
+
+    @property
+    def replica(self):
+        """ the Replica (None if replicate() was not called) """
+        return self.__replica
+
+    def list_bridges(self, db=OVSDB_DB):
         """
 
         :param db: the database name
-        :return: list of bridges
+        :return: list of bridges (names)
         """
         assert db is not None and isinstance(db, str), 'db should be a string with the database name'
-        columns = {"Port": {"columns": ["fake_bridge",
-                                        "interfaces",
-                                        "name",
-                                        "tag"]
-                            },
-                   "Controller": {"columns": []},
-                   "Interface": {"columns": ["name"]},
-                   "Open_vSwitch": {"columns": ["bridges", 
-                                                "cur_cfg"]
-                                    },
-                   "Bridge": {"columns": ["controller",
-                                          "fail_mode",
-                                          "name",
-                                          "ports"]
-                              }
-                   }
-        id = self.id
-        mon = self.monitor(columns, db, monitor_id=id, msg_id = id)
-        self.socket.send(mon)
-        result = self.gather_data()
-        # TODO: cancel the monitor after we're done !!
-        mon_cancel = self.monitor_cancel(columns, db, monitor_id=id)
-        self.socket.send(mon_cancel)
-        return result
-    
+        return self.replicate(db).bridges()
+
+    def ports(self, bridge):
+        """ :return: list with the names of the ports of the bridge (from the replica) """
+        return self.replicate().ports(bridge)
+
+    def interfaces(self, port):
+        """ :return: list with the names of the interfaces of the port (from the replica) """
+        return self.replicate().interfaces(port)
+
+    def ofport(self, interface):
+        """ :return: the OpenFlow port number of the interface (from the replica) """
+        return self.replicate().ofport(interface)
+
+    def qos(self, port):
+        """ :return: the QoS row of the port (from the replica) """
+        return self.replicate().qos(port)
+
+    def queues(self, port):
+        """ :return: dictionary queue number --> Queue row of the port (from the replica) """
+        return self.replicate().queues(port)
+
+    def transaction(self, db=OVSDB_DB):
+        """ :return: a new (empty) Transaction """
+        return Transaction(db)
+
+    def transact_async(self, txn):
+        """ sends the transaction without waiting for the reply (pipelined)
+
+        :param txn: Transaction
+        :return: PendingTransaction, use result() to get the TransactionResult
+        """
+        return PendingTransaction(txn, self.connection.request("transact", txn.params()))
+
+    def transact(self, txn):
+        """ sends the transaction and waits for the reply (at most self.timeout seconds)
+
+        :param txn: Transaction
+        :return: TransactionResult (result.ok is False if an operation failed: no operation was applied)
+        """
+        if len(txn) == 0:
+            return TransactionResult(txn, [])
+        return self.transact_async(txn).result(self.timeout)
+
+    def set_queues(self, ports, qos_type=DEFAULT_QOS_TYPE, qos_config=None, retries=1):
+        """ configures the queues of the ports in one transaction (see transact.set_queues)
+
+        :param ports: dictionary port name --> {queue number: other_config of the queue}
+        :param retries: number of times the transaction is built again if the rows were changed by
+                        another client (a wait condition failed)
+        :return: TransactionResult
+        """
+        replica = self.replicate()
+        while True:
+            version = replica.version  # the transaction is built from this version of the replica
+            txn = set_queues(replica, ports, qos_type, qos_config, Transaction(OVSDB_DB))
+            result = self.transact(txn)
+            if result.ok or retries <= 0 or result.error.get('error') != 'timed out':
+                if not result.ok:
+                    log.error("ovsdb %s: cannot set the queues: %s", self.server_ip, result.error)
+                return result
+            retries -= 1
+            log.debug("ovsdb %s: queues changed by another client, trying again", self.server_ip)
+            # the update with the rows changed by the other client may not have arrived yet:
+            # the transaction built now would have the same (stale) wait conditions
+            if not replica.wait(version, REPLICA_UPDATE_TIMEOUT):
+                log.error("ovsdb %s: the replica was not updated after a failed wait condition", self.server_ip)
+                return result
+
     def get_schema(self, db):
         """
         get the database schema
@@ -131,11 +258,7 @@ class Ovsdb:
            "tables": {<id>: <table-schema>, ...}   required
         """
         assert db is not None and isinstance(db, str), 'db should be a string with the database name'
-        req = json.dumps({"method": "get_schema",
-                          "params":[db_name],
-                          "id": current_id})
-        self.socket.send(req)
-        return self.gather_data()
+        return self.call("get_schema", db)
 
     def list_tables(self, db):
         """
@@ -149,31 +272,28 @@ class Ovsdb:
          "indexes": [<column-set>*]                optional
         """
         assert db is not None and isinstance(db, str), 'db should be a string with the database name'
-        db_schema = self.get_schema(socket, db)
+        db_schema = self.get_schema(db)
         return db_schema['tables']
 
     def list_table_names(self, db):
         """return a list of all table names"""
         assert db is not None and isinstance(db, str), 'db should be a string with the database name'
-        return self.list_tables().keys()
+        return self.list_tables(db).keys()
+
 
 if __name__ == '__main__':
-    ovs = Ovsdb()
+    ovs = Ovsdb(sys.argv[1] if len(sys.argv) > 1 else '127.0.0.1')
     if not ovs.connect():
         print "Cannot connect to database"
         sys.exit(0)
 
     db_list = ovs.list_dbs()
-    db_name = db_list['result'][0]
-    
-    bridge_list = ovs.list_bridges(db_name)
-    print "list bridges:", bridge_list
-        
-    bridges = bridge_list['result']['Bridge']
-    print "\nbridges\n"
-    print bridges.values()
-    for bridge in bridges.values():
+    db_name = str(db_list[0])
+
+    print "list bridges:", ovs.list_bridges(db_name)
+    for bridge in ovs.list_bridges(db_name):
         print "---"
-        print bridge['new']['name']
+        print bridge, ovs.ports(bridge)
 
-    print ovs.list_tables(db_name)
+    print ovs.list_table_names(db_name)
+    ovs.close()
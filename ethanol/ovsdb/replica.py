@@ -0,0 +1,255 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# ##################################
+#
+# Copyright 2015 Henrique Moura
+#
+# This file is part of Ethanol.
+#
+# ##################################
+#
+#
+"""
+  in-memory replica of the tables of an OVSDB database.
+
+  Ovsdb.replicate() starts a monitor (RFC 7047, section 4.1.5) of the tables in REPLICA_TABLES:
+  the reply of the monitor has all rows, and the "update" notifications have the rows that changed.
+  Both are applied by Replica.apply(), so the queries (bridges, ports, interfaces, qos, queues, ...)
+  are answered from memory, without a round trip to the switch.
+
+  The rows are dictionaries column --> value (with "_uuid"), with the OVSDB values converted
+  by from_datum(): ["uuid", u] --> u, ["set", [...]] --> list, ["map", [[k, v], ...]] --> dict.
+  A set with one element is sent by OVSDB as the element itself, use as_list() to read set columns.
+
+@author: Henrique Duarte Moura
+@organization: WINET/DCC/UFMG
+@copyright: h3dema (c) 2017
+@contact: henriquemoura@hotmail.com
+@licence: GNU General Public License v2.0
+(https://www.gnu.org/licenses/old-licenses/gpl-2.0.html)
+@since: July 2015
+@status: in development
+"""
+from threading import Lock, Condition
+
+from pox.ethanol.ssl_message.latency import monotonic
+
+REPLICA_TABLES = {'Bridge': ['name', 'ports', 'controller', 'fail_mode', 'datapath_id', 'external_ids'],
+                  'Port': ['name', 'interfaces', 'qos', 'tag', 'fake_bridge', 'external_ids'],
+                  'Interface': ['name', 'ofport', 'type', 'mac_in_use', 'external_ids'],
+                  'QoS': ['type', 'queues', 'other_config', 'external_ids'],
+                  'Queue': ['dscp', 'other_config', 'external_ids'],
+                  }
+""" tables (and columns) kept in the replica"""
+
+CHILDREN = {'Bridge': 'ports', 'Port': 'interfaces'}
+""" columns used to find the parent of a row (see Replica.parent) """
+
+
+def from_datum(value):
+    """ :return: the python value of an OVSDB value (see the module documentation) """
+    if isinstance(value, list) and len(value) == 2:
+        kind = value[0]
+        if kind == 'uuid' or kind == 'named-uuid':
+            return value[1]
+        elif kind == 'set':
+            return [from_datum(v) for v in value[1]]
+        elif kind == 'map':
+            return dict((from_datum(k), from_datum(v)) for k, v in value[1])
+    return value
+
+
+def as_list(value):
+    """ :return: the value of a set column as a list """
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+class Replica(object):
+    """ rows of the monitored tables, updated by the monitor of Ovsdb.replicate()
+    """
+
+    def __init__(self, tables=REPLICA_TABLES):
+        """
+          :param tables: dictionary table --> list of columns (None = all columns)
+        """
+        self.tables = tables
+        self.__cond = Condition(Lock())
+        known = set(tables) | set(REPLICA_TABLES)  # the queries use these tables (empty if not monitored)
+        self.__rows = dict((t, {}) for t in known)  # table --> uuid --> row
+        self.__names = dict((t, {}) for t in known)  # table --> name --> uuid
+        self.__parent = {}  # uuid of a port (interface) --> uuid of its bridge (port)
+        self.__version = 0
+        self.__updated = None
+        self.ready = False
+        """ True after the reply of the monitor was applied (False if the connection was lost)"""
+
+    def monitor_requests(self):
+        """ :return: the monitor-requests parameter of the monitor method """
+        return dict((t, {} if columns is None else {'columns': columns}) for t, columns in self.tables.items())
+
+    @property
+    def version(self):
+        """ number of updates applied """
+        return self.__version
+
+    @property
+    def age(self):
+        """ seconds since the last update (None if there was no update) """
+        return None if self.__updated is None else monotonic() - self.__updated
+
+    def load(self, updates):
+        """ replaces all rows by the contents of a monitor reply """
+        with self.__cond:
+            for t in self.__rows:
+                self.__rows[t] = {}
+                self.__names[t] = {}
+            self.__parent = {}
+            self.__apply(updates)
+
+    def apply(self, updates):
+        """ applies the table-updates of an "update" notification
+            :param updates: dictionary table --> uuid --> {"old": row, "new": row}
+        """
+        with self.__cond:
+            self.__apply(updates)
+
+    def __apply(self, updates):
+        """ must hold the lock """
+        for table, changes in (updates or {}).iteritems():
+            rows = self.__rows.setdefault(table, {})
+            names = self.__names.setdefault(table, {})
+            for uuid, change in changes.iteritems():
+                self.__unindex(table, rows.pop(uuid, None), names)
+                new = change.get('new')
+                if new is None:
+                    continue  # deleted
+                row = dict((c, from_datum(v)) for c, v in new.iteritems())
+                row['_uuid'] = uuid
+                rows[uuid] = row
+                self.__index(table, row, names)
+        self.__version += 1
+        self.__updated = monotonic()
+        self.ready = True
+        self.__cond.notify_all()
+
+    def __index(self, table, row, names):
+        name = row.get('name')
+        if name is not None:
+            names[name] = row['_uuid']
+        column = CHILDREN.get(table)
+        if column is not None:
+            for child in as_list(row.get(column)):
+                self.__parent[child] = row['_uuid']
+
+    def __unindex(self, table, row, names):
+        if row is None:
+            return
+        name = row.get('name')
+        if name is not None and names.get(name) == row['_uuid']:
+            del names[name]
+        column = CHILDREN.get(table)
+        if column is not None:
+            for child in as_list(row.get(column)):
+                if self.__parent.get(child) == row['_uuid']:
+                    del self.__parent[child]
+
+    def wait(self, version=None, timeout=None):
+        """ waits for an update
+            :param version: waits until the version is greater than this (default: the current version)
+            :return: True if there was an update
+        """
+        deadline = None if timeout is None else monotonic() + timeout
+        with self.__cond:
+            if version is None:
+                version = self.__version
+            while self.__version <= version:
+                remaining = None if deadline is None else deadline - monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.__cond.wait(remaining)
+            return True
+
+    #
+    # queries
+    #
+    def rows(self, table):
+        """ :return: list with the rows of the table """
+        with self.__cond:
+            return [dict(r) for r in self.__rows.get(table, {}).itervalues()]
+
+    def row(self, table, uuid):
+        """ :return: the row of the table with this uuid (or None) """
+        with self.__cond:
+            r = self.__rows.get(table, {}).get(uuid)
+            return None if r is None else dict(r)
+
+    def find(self, table, name):
+        """ :return: the row of the table (Bridge, Port, Interface) with this name (or None) """
+        with self.__cond:
+            uuid = self.__names.get(table, {}).get(name)
+            r = None if uuid is None else self.__rows[table].get(uuid)
+            return None if r is None else dict(r)
+
+    def parent(self, uuid):
+        """ :return: the uuid of the bridge of a port, or of the port of an interface (or None) """
+        return self.__parent.get(uuid)
+
+    def __names_of(self, table, uuids):
+        rows = self.__rows.get(table, {})
+        return sorted(rows[u]['name'] for u in uuids if u in rows and 'name' in rows[u])
+
+    def bridges(self):
+        """ :return: list with the names of the bridges """
+        with self.__cond:
+            return sorted(self.__names.get('Bridge', {}).keys())
+
+    def ports(self, bridge):
+        """ :return: list with the names of the ports of the bridge """
+        with self.__cond:
+            b = self.__rows['Bridge'].get(self.__names['Bridge'].get(bridge))
+            return [] if b is None else self.__names_of('Port', as_list(b.get('ports')))
+
+    def interfaces(self, port):
+        """ :return: list with the names of the interfaces of the port """
+        with self.__cond:
+            p = self.__rows['Port'].get(self.__names['Port'].get(port))
+            return [] if p is None else self.__names_of('Interface', as_list(p.get('interfaces')))
+
+    def ofport(self, interface):
+        """ :return: the OpenFlow port number of the interface (or None) """
+        with self.__cond:
+            i = self.__rows['Interface'].get(self.__names['Interface'].get(interface))
+            ofport = None if i is None else i.get('ofport')
+            return ofport if isinstance(ofport, int) else None
+
+    def bridge_of_port(self, port):
+        """ :return: the name of the bridge of the port (or None) """
+        with self.__cond:
+            b = self.__rows['Bridge'].get(self.__parent.get(self.__names['Port'].get(port)))
+            return None if b is None else b.get('name')
+
+    def port_of_interface(self, interface):
+        """ :return: the name of the port of the interface (or None) """
+        with self.__cond:
+            p = self.__rows['Port'].get(self.__parent.get(self.__names['Interface'].get(interface)))
+            return None if p is None else p.get('name')
+
+    def qos(self, port):
+        """ :return: the QoS row of the port (or None) """
+        with self.__cond:
+            p = self.__rows['Port'].get(self.__names['Port'].get(port))
+            uuids = [] if p is None else as_list(p.get('qos'))
+            q = self.__rows['QoS'].get(uuids[0]) if uuids else None
+            return None if q is None else dict(q)
+
+    def queues(self, port):
+        """ :return: dictionary queue number --> Queue row, of the QoS of the port """
+        q = self.qos(port)
+        if q is None:
+            return {}
+        with self.__cond:
+            rows = self.__rows['Queue']
+            return dict((n, dict(rows[u])) for n, u in (q.get('queues') or {}).iteritems() if u in rows)
@@ -0,0 +1,275 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# ##################################
+#
+# Copyright 2015 Henrique Moura
+#
+# This file is part of Ethanol.
+#
+# ##################################
+#
+#
+"""
+  builds the "transact" requests of OVSDB (RFC 7047, sections 4.1.3 and 5.2).
+
+  A Transaction collects many operations (insert, update, mutate, delete, wait, select) that are
+  sent in one "transact" call and are executed atomically by the server: if one operation fails
+  (e.g. a wait condition is false) none is applied.
+
+  >>> txn = Transaction()
+  >>> q = txn.insert('Queue', {'other_config': {'max-rate': '1000000'}})      # named-uuid
+  >>> qos = txn.insert('QoS', {'type': 'linux-htb', 'queues': {1: q}})
+  >>> txn.update('Port', where_name('wlan0'), {'qos': qos})
+  >>> result = ovs.transact(txn)
+  >>> result.ok, result.uuids[q]        # uuid of the new Queue row
+
+  The python values are converted by to_datum(): dict --> map, list/tuple/set --> set, None --> empty set,
+  Uuid('...') --> ["uuid", ...], the values returned by insert() --> ["named-uuid", ...].
+
+  set_queues() programs the queues of many ports (e.g. one queue per station of the AP) in one transaction,
+  using the replica (see replica.py) to know the current QoS/Queue rows. Wait conditions make the transaction
+  fail if the rows were changed by someone else since the replica was updated (optimistic concurrency).
+
+@author: Henrique Duarte Moura
+@organization: WINET/DCC/UFMG
+@copyright: h3dema (c) 2017
+@contact: henriquemoura@hotmail.com
+@licence: GNU General Public License v2.0
+(https://www.gnu.org/licenses/old-licenses/gpl-2.0.html)
+@since: July 2015
+@status: in development
+"""
+from pox.ethanol.ovsdb.replica import as_list
+
+DEFAULT_QOS_TYPE = 'linux-htb'
+""" type of the QoS rows created by set_queues()"""
+
+
+class Uuid(str):
+    """ uuid of an existing row (sent as ["uuid", ...]) """
+    pass
+
+
+class NamedUuid(str):
+    """ uuid of a row inserted in the same transaction (sent as ["named-uuid", ...]) """
+    pass
+
+
+def to_datum(value):
+    """ :return: the OVSDB value of a python value (see the module documentation) """
+    if isinstance(value, NamedUuid):
+        return ['named-uuid', str(value)]
+    elif isinstance(value, Uuid):
+        return ['uuid', str(value)]
+    elif isinstance(value, dict):
+        return ['map', [[to_datum(k), to_datum(v)] for k, v in sorted(value.items())]]
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        return ['set', [to_datum(v) for v in value]]
+    elif value is None:
+        return ['set', []]
+    return value
+
+
+def to_row(row):
+    """ :return: dictionary column --> OVSDB value """
+    return dict((column, to_datum(value)) for column, value in row.items())
+
+
+def where_uuid(uuid):
+    """ :return: condition that selects the row with this uuid """
+    return [('_uuid', '==', Uuid(uuid))]
+
+
+def where_name(name):
+    """ :return: condition that selects the row(s) with this name """
+    return [('name', '==', name)]
+
+
+def _where(where):
+    return [[column, function, to_datum(value)] for column, function, value in where]
+
+
+class Transaction(object):
+    """ operations sent in one transact request
+    """
+
+    def __init__(self, db='Open_vSwitch'):
+        self.db = db
+        self.ops = []
+        self.__names = 0
+
+    def __len__(self):
+        return len(self.ops)
+
+    def params(self):
+        """ :return: the params of the transact request """
+        return [self.db] + self.ops
+
+    def insert(self, table, row, uuid_name=None):
+        """ inserts a row
+            :param uuid_name: name of the new row (default: a new name)
+            :return: NamedUuid that refers to the new row in the other operations (and in TransactionResult.uuids)
+        """
+        if uuid_name is None:
+            uuid_name = 'row%d' % self.__names
+            self.__names += 1
+        self.ops.append({'op': 'insert', 'table': table, 'row': to_row(row), 'uuid-name': uuid_name})
+        return NamedUuid(uuid_name)
+
+    def update(self, table, where, row):
+        """ changes the columns of row in the rows that match where (list of (column, function, value)) """
+        self.ops.append({'op': 'update', 'table': table, 'where': _where(where), 'row': to_row(row)})
+        return len(self.ops) - 1
+
+    def mutate(self, table, where, mutations):
+        """ :param mutations: list of (column, mutator, value), e.g. ('queues', 'insert', {2: q}) """
+        self.ops.append({'op': 'mutate', 'table': table, 'where': _where(where),
+                         'mutations': [[c, m, to_datum(v)] for c, m, v in mutations]})
+        return len(self.ops) - 1
+
+    def delete(self, table, where):
+        self.ops.append({'op': 'delete', 'table': table, 'where': _where(where)})
+        return len(self.ops) - 1
+
+    def select(self, table, where, columns=None):
+        """ :return: index of the operation (see TransactionResult.rows) """
+        op = {'op': 'select', 'table': table, 'where': _where(where)}
+        if columns is not None:
+            op['columns'] = columns
+        self.ops.append(op)
+        return len(self.ops) - 1
+
+    def wait(self, table, where, columns, rows, until='==', timeout=0):
+        """ the transaction fails if the columns of the rows that match where are not (until='!=': are) rows
+            :param rows: list of dictionaries column --> value
+            :param timeout: milliseconds the server waits for the condition (0 = fails at once)
+        """
+        self.ops.append({'op': 'wait', 'table': table, 'where': _where(where), 'columns': columns,
+                         'rows': [to_row(r) for r in rows], 'until': until, 'timeout': timeout})
+        return len(self.ops) - 1
+
+    def comment(self, text):
+        """ text is written in the log of the server """
+        self.ops.append({'op': 'comment', 'comment': text})
+
+
+class TransactionResult(object):
+    """ reply of a transact request
+    """
+
+    def __init__(self, txn, results):
+        """
+          :param txn: the Transaction
+          :param results: the result of the reply (one object per operation, plus one if the commit failed)
+        """
+        self.results = results or []
+        self.errors = [r for r in self.results if isinstance(r, dict) and r.get('error') is not None]
+        self.uuids = {}  # NamedUuid --> uuid of the inserted row
+        """ uuids of the inserted rows"""
+        for op, r in zip(txn.ops, self.results):
+            if op['op'] == 'insert' and isinstance(r, dict) and 'uuid' in r:
+                self.uuids[NamedUuid(op['uuid-name'])] = r['uuid'][1]
+
+    @property
+    def ok(self):
+        return len(self.errors) == 0
+
+    @property
+    def error(self):
+        """ the first error (dictionary with "error" and "details") or None """
+        return self.errors[0] if self.errors else None
+
+    def rows(self, index):
+        """ :return: the rows returned by the select operation index """
+        return self.results[index].get('rows', []) if index < len(self.results) else []
+
+    def count(self, index):
+        """ :return: number of rows changed by the update/mutate/delete operation index """
+        return self.results[index].get('count', 0) if index < len(self.results) else 0
+
+
+class PendingTransaction(object):
+    """ a transaction that was sent (see Ovsdb.transact_async) """
+
+    def __init__(self, txn, future):
+        self.txn = txn
+        self.future = future
+
+    def done(self):
+        return self.future.done()
+
+    def result(self, timeout=None):
+        """ :return: TransactionResult (waits for the reply) """
+        return TransactionResult(self.txn, self.future.result(timeout))
+
+
+def _queue_row(config):
+    """ :param config: dictionary other_config (max-rate, min-rate, priority, ...) and optionally dscp """
+    config = dict(config)
+    row = {}
+    if 'dscp' in config:
+        row['dscp'] = config.pop('dscp')
+    row['other_config'] = dict((k, str(v)) for k, v in config.items())
+    return row
+
+
+def _same_queue(row, config):
+    wanted = _queue_row(config)
+    return row.get('other_config', {}) == wanted['other_config'] and \
+        as_list(row.get('dscp')) == as_list(wanted.get('dscp'))
+
+
+def set_queues(replica, ports, qos_type=DEFAULT_QOS_TYPE, qos_config=None, txn=None):
+    """ builds the transaction that configures the queues of the ports
+
+        :param replica: Replica with the current Port, QoS and Queue rows
+        :param ports: dictionary port name --> {queue number: config}. config is a dictionary with the
+                      other_config of the queue (e.g. {'max-rate': 1000000}) and optionally 'dscp'.
+                      The queues of the port that are not in the dictionary are removed.
+        :param qos_config: other_config of the QoS rows created (e.g. {'max-rate': 10000000})
+        :param txn: Transaction to append the operations (default: a new one)
+        :return: the Transaction (empty if nothing changes)
+    """
+    txn = Transaction() if txn is None else txn
+    for port_name, queues in sorted(ports.items()):
+        port = replica.find('Port', port_name)
+        if port is None:
+            raise KeyError("port %s is not in the replica" % port_name)
+        qos = replica.qos(port_name)
+        if qos is None:
+            if not queues:
+                continue
+            # the port has no QoS: creates it with all queues
+            txn.wait('Port', where_uuid(port['_uuid']), ['qos'], [{'qos': None}])
+            refs = dict((n, txn.insert('Queue', _queue_row(c))) for n, c in queues.items())
+            new_qos = txn.insert('QoS', {'type': qos_type, 'queues': refs,
+                                         'other_config': dict((k, str(v)) for k, v in (qos_config or {}).items())})
+            txn.update('Port', where_uuid(port['_uuid']), {'qos': new_qos})
+            continue
+        current = qos.get('queues') or {}
+        rows = replica.queues(port_name)
+        added = {}
+        removed = {}
+        changes = 0
+        for n, config in sorted(queues.items()):
+            if n not in current:
+                added[n] = txn.insert('Queue', _queue_row(config))
+            elif n not in rows or not _same_queue(rows[n], config):
+                txn.update('Queue', where_uuid(current[n]), _queue_row(config))
+                changes += 1
+        for n, uuid in current.items():
+            if n not in queues:
+                removed[n] = Uuid(uuid)
+        if not added and not removed and not changes:
+            continue
+        # fails if someone changed the queues of the QoS since the replica was updated
+        txn.wait('QoS', where_uuid(qos['_uuid']), ['queues'],
+                 [{'queues': dict((n, Uuid(u)) for n, u in current.items())}])
+        if removed:
+            txn.mutate('QoS', where_uuid(qos['_uuid']), [('queues', 'delete', set(removed.keys()))])
+            for uuid in removed.values():
+                txn.delete('Queue', where_uuid(uuid))
+        if added:
+            txn.mutate('QoS', where_uuid(qos['_uuid']), [('queues', 'insert', added)])
+    return txn
@@ -13,7 +13,7 @@ Command sample:
 from threading import Thread
 
 from pox.ethanol.ssl_message.msg_log import log
-from pox.ethanol.ssl_message.msg_server import run
+from pox.ethanol.ssl_message.msg_server import run, LISTEN_BACKLOG, NUM_WORKERS
 # from pox.ethanol.ssl_message.msg_common import SERVER_ADDR
 from pox.ethanol.ssl_message.msg_common import SERVER_PORT, SERVER_ADDR, VERSION
 from pox.ethanol.ethanol.ap import add_ap_openflow
@@ -22,7 +22,8 @@ from pox.core import core
 # import pox.openflow.libopenflow_01 as of
 
 
-def run_server(server_address=SERVER_ADDR, server_port=SERVER_PORT):
+def run_server(server_address=SERVER_ADDR, server_port=SERVER_PORT,
+               backlog=LISTEN_BACKLOG, num_workers=NUM_WORKERS):
     """ creates an Ethanol server at SERVER_PORT and activates it
         @param server_address: bind the server to an interface. 
                                if this parameters is '0.0.0.0', then binds to all interfaces.
@@ -30,11 +31,15 @@ def run_server(server_address=SERVER_ADDR, server_port=SERVER_PORT):
         @type server_address: str
         @param server_port: server port to bind this python server
         @type server_port: int
+        @param backlog: maximum number of connections waiting to be accepted
+        @type backlog: int
+        @param num_workers: number of threads that process the messages received
+        @type num_workers: int
     """
     server = (server_address, server_port)  # socket provided by the server
     log.info("Listening @ %s:%i" % server)
     log.info("Ethanol version %s" % VERSION)
-    if run(server) == -1:
+    if run(server, backlog=backlog, num_workers=num_workers) == -1:
         log.info("Server error. Not receiving messages!")
     log.info("Server finished!")
 
@@ -69,9 +74,11 @@ class ethanol_ap_server(object):
 """
 
 
-def launch():
+def launch(backlog=LISTEN_BACKLOG, num_workers=NUM_WORKERS):
     """
       registra a classe que trata as conexões dos Aps
+
+      ./pox.py ethanol.server --backlog=512 --num_workers=32
     """
     log.info("Registering ethanol_ap_server")
     core.registerNew(ethanol_ap_server)
@@ -80,6 +87,7 @@ def launch():
       ativa parte wireless do servidor ethanol
     """
     log.info("Starting server thread")
-    thread = Thread(target=run_server)
+    thread = Thread(target=run_server,
+                    kwargs={'backlog': int(backlog), 'num_workers': int(num_workers)})
     thread.daemon = True
     thread.start()
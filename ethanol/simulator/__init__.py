@@ -0,0 +1,10 @@
+"""
+This package contains simulated Ethanol agents (APs and stations) that answer the controller
+using the Ethanol messages, so the controller can be tested without ethanol_hostapd.
+See fleet.py to run thousands of devices on the loopback interface, e.g. from the pox directory:
+
+python -m pox.ethanol.simulator.fleet 1000 5
+
+"""
+from pox.ethanol.simulator.agent import SimulatedAP, SimulatedStation
+from pox.ethanol.simulator.fleet import Fleet
@@ -0,0 +1,642 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# ##################################
+#
+# Copyright 2015 Henrique Moura
+#
+# This file is part of Ethanol.
+#
+# ##################################
+#
+"""
+This module implements simulated Ethanol agents: python objects that answer the messages
+the controller sends to ethanol_hostapd (APs) and to the stations, using the same structs
+of ssl_message/*. They are used with the SslServer of msg_server.py (see fleet.py):
+
+  >>> ap = SimulatedAP('127.1.0.1', 22223, mac_prefix='02:00:00:00:01')
+  >>> server.add_listener(ap.server, ap.handle)
+
+The state of the agent (interfaces, SSIDs, channels, associated stations, counters) is kept in memory
+and changes with the time (statistics) or with the messages received (set channel, set tx power).
+Each request waits latency + uniform(0, jitter) seconds before the reply is sent.
+
+Messages implemented (the others are answered with an error message, like a real agent):
+radio wlans, SSIDs, interfaces, link information, statistics, station statistics, channel info,
+valid / current channel, APs in range, ACS, SNR, tx power, uptime, cpu, memory, trigger transition,
+ping and batch.
+
+An ACS request holds the AP for ACS_SCAN_TIME seconds per test. If an AP that hears it (or that it hears)
+is scanning at the same time, both scans are counted as overlapped (their measurements would be corrupted).
+
+@author: Henrique Duarte Moura
+@organization: WINET/DCC/UFMG
+@copyright: h3dema (c) 2017
+@contact: henriquemoura@hotmail.com
+@licence: GNU General Public License v2.0
+(https://www.gnu.org/licenses/old-licenses/gpl-2.0.html)
+@since: July 2015
+@status: in development
+
+@requires: construct 2.5.2
+"""
+import time
+import random
+from threading import Lock
+
+from construct import Container
+
+from pox.ethanol.ssl_message.msg_common import MSG_TYPE, VERSION, len_of_string
+from pox.ethanol.ssl_message.msg_core import decode_default_fields
+from pox.ethanol.ssl_message.msg_codec import fast
+from pox.ethanol.ssl_message.msg_error import return_error_msg_struct
+from pox.ethanol.ssl_message.msg_framing import set_msg_size
+from pox.ethanol.ssl_message.msg_log import log
+from pox.ethanol.ssl_message.msg_batch import msg_batch
+from pox.ethanol.ssl_message.msg_ping import process_msg_ping
+from pox.ethanol.ssl_message.msg_radio_wlans import msg_radio_wlans
+from pox.ethanol.ssl_message.msg_ap_ssid import msg_ap_ssid
+from pox.ethanol.ssl_message.msg_interfaces import msg_intf
+from pox.ethanol.ssl_message.msg_sta_link_information import msg_sta_link_info
+from pox.ethanol.ssl_message.msg_statistics import msg_statistics
+from pox.ethanol.ssl_message.msg_sta_statistics import msg_sta_statistics
+from pox.ethanol.ssl_message.msg_channelinfo import msg_channelinfo
+from pox.ethanol.ssl_message.msg_channels import msg_channels, msg_currentchannel
+from pox.ethanol.ssl_message.msg_ap_in_range import msg_ap_in_range
+from pox.ethanol.ssl_message.msg_snr_power import msg_snr_power
+from pox.ethanol.ssl_message.msg_uptime import msg_uptime
+from pox.ethanol.ssl_message.msg_memcpu import msg_memcpu
+from pox.ethanol.ssl_message.msg_acs import msg_acs, ACS_SCALE_FACTOR
+from pox.ethanol.ssl_message.msg_station_trigger_transition import msg_station_trigger_transition
+
+DEVICE_AP = 1
+""" device_type of the hello message sent by the APs"""
+
+DEVICE_STATION = 2
+""" device_type of the hello message sent by the stations"""
+
+VALID_CHANNELS = [(2412, 1), (2417, 2), (2422, 3), (2427, 4), (2432, 5), (2437, 6),
+                  (2442, 7), (2447, 8), (2452, 9), (2457, 10), (2462, 11),
+                  (5180, 36), (5200, 40), (5220, 44), (5240, 48)]
+""" (frequency, channel) supported by the simulated radios"""
+
+NOISE_FLOOR = -95
+""" dBm"""
+
+ACS_SCAN_TIME = 0.1
+""" seconds of each test of an ACS scan"""
+
+
+def frequency_of(channel):
+    """ @return: the frequency (MHz) of the channel, 0 if the channel is not in VALID_CHANNELS """
+    for freq, ch in VALID_CHANNELS:
+        if ch == channel:
+            return freq
+    return 0
+
+
+def mac_address(prefix, n):
+    """ @return: the MAC address prefix:nn (prefix has five bytes, e.g. '02:00:00:00:01') """
+    return '%s:%02x' % (prefix, n & 0xff)
+
+
+def ap_in_range_entry(intf_name, vap, signal, rnd):
+    """ @return: the entry of the reply of MSG_GET_AP_IN_RANGE_TYPE for the VAP (SimulatedInterface) heard
+                 with signal dBm by the interface intf_name
+    """
+    return Container(intf_name_size=len_of_string(intf_name),
+                     intf_name=intf_name,
+                     mac_addr_size=len_of_string(vap.mac_addr),
+                     mac_addr=vap.mac_addr,
+                     ssid_size=len_of_string(vap.ssid),
+                     ssid=vap.ssid,
+                     status=0,
+                     frequency=vap.frequency,
+                     channel=vap.channel,
+                     signal=signal,
+                     powerconstraint=0,
+                     tx_power=vap.txpower,
+                     link_margin=0,
+                     age=rnd.randint(0, 5000),
+                     is_dBm=1,
+                     )
+
+
+class SimulatedInterface(object):
+    """ a network interface of a simulated agent. the counters grow with the time, at a random rate """
+
+    def __init__(self, name, mac_addr, ifindex, is_wifi=True, wiphy=0, ssid=None, channel=1, rnd=None):
+        self.name = name
+        self.mac_addr = mac_addr
+        self.ifindex = ifindex
+        self.is_wifi = is_wifi
+        self.wiphy = wiphy
+        self.ssid = ssid
+        self.channel = channel
+        self.txpower = 20
+        rnd = rnd or random
+        self.started = time.time()
+        self.pps = rnd.uniform(10, 1000)  # packets per second
+        self.packet_size = rnd.randint(64, 1500)
+        self.loss = rnd.uniform(0, 0.01)
+
+    @property
+    def frequency(self):
+        return frequency_of(self.channel)
+
+    def counters(self):
+        """ @return: dictionary with the rx/tx counters (same names of msg_statistics) """
+        packets = int((time.time() - self.started) * self.pps)
+        lost = int(packets * self.loss)
+        return {'rx_packets': packets, 'rx_bytes': packets * self.packet_size,
+                'rx_dropped': lost, 'rx_errors': lost // 2,
+                'tx_packets': packets // 2, 'tx_bytes': packets // 2 * self.packet_size,
+                'tx_dropped': lost // 2, 'tx_errors': lost // 4,
+                }
+
+
+class SimulatedDevice(object):
+    """ state and message handlers common to the simulated APs and stations.
+        handle() is used as the handler of the SslServer listener of the device
+    """
+
+    device_type = None
+
+    def __init__(self, ip, port, latency=0.0, jitter=0.0, seed=None):
+        """
+          @param ip: loopback address of the device (e.g. 127.1.0.1)
+          @param port: port the device listens to
+          @param latency: seconds added to each reply
+          @param jitter: maximum random seconds added to latency
+          @param seed: seed of the random values of this device
+        """
+        self.ip = ip
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.rnd = random.Random(seed)
+        self.started = time.time()
+        self.interfaces = []
+        self.lock = Lock()
+        self.__counters = {'requests': 0, 'not_implemented': 0}
+
+    @property
+    def server(self):
+        """ (ip, port) of the device """
+        return (self.ip, self.port)
+
+    def stats(self):
+        with self.lock:
+            return dict(self.__counters)
+
+    def __count(self, name):
+        with self.lock:
+            self.__counters[name] += 1
+
+    def get_interface(self, name):
+        """ @return: the SimulatedInterface called name or None """
+        for intf in self.interfaces:
+            if intf.name == name:
+                return intf
+        return None
+
+    def wireless_interfaces(self):
+        return [intf for intf in self.interfaces if intf.is_wifi]
+
+    def delay(self):
+        """ @return: seconds to wait before the reply """
+        d = self.latency
+        if self.jitter > 0:
+            d += self.rnd.uniform(0, self.jitter)
+        return d
+
+    def handle(self, received_msg, fromaddr):
+        """ handler of the SslServer: waits the simulated latency and returns the reply
+            @return: the binary reply or None (no reply)
+        """
+        d = self.delay()
+        if d > 0:
+            time.sleep(d)
+        return self.reply(received_msg, fromaddr)
+
+    def reply(self, received_msg, fromaddr):
+        """ decodes the message and calls the method of the device that fills the reply
+            @return: the binary reply or None (no reply)
+        """
+        header = decode_default_fields(received_msg)
+        m_type = header['m_type']
+        self.__count('requests')
+        if m_type == MSG_TYPE.MSG_BATCH:
+            return self.process_batch(received_msg, fromaddr)
+        if m_type == MSG_TYPE.MSG_PING:
+            return process_msg_ping(received_msg, fromaddr)
+        if m_type not in handlers:
+            self.__count('not_implemented')
+            return return_error_msg_struct(header['m_id'])
+        struct_con, method_name = handlers[m_type]
+        method = getattr(self, method_name, None)
+        if method is None:
+            self.__count('not_implemented')
+            return return_error_msg_struct(header['m_id'])
+        msg = fast(struct_con.parse)(received_msg)
+        try:
+            msg = method(msg)
+        except Exception as e:
+            log.error("Simulated device %s:%d could not process message type %d: %s", self.ip, self.port, m_type, e)
+            return return_error_msg_struct(header['m_id'])
+        if msg is None:
+            return None  # set message: the controller does not wait for a reply
+        msg['m_size'] = 0
+        return fast(struct_con.build)(msg)
+
+    def process_batch(self, received_msg, fromaddr):
+        """ processes the sub-requests (without the latency, it is only one round trip) """
+        msg = msg_batch.parse(received_msg)
+        replies = []
+        for item in msg['batch_item']:
+            reply = self.reply(item['data'], fromaddr)
+            replies.append('' if reply is None else set_msg_size(reply))
+        result = Container(m_type=MSG_TYPE.MSG_BATCH,
+                           m_id=msg['m_id'],
+                           p_version_length=len_of_string(VERSION),
+                           p_version=VERSION,
+                           m_size=0,
+                           num_msgs=len(replies),
+                           batch_item=[Container(size=len(r), data=r) for r in replies],
+                           )
+        return msg_batch.build(result)
+
+    #
+    # message handlers: receive the parsed request, fill it and return it (None = no reply)
+    #
+    def _interfaces(self, msg):
+        names = [e['intf_name'] for e in msg['intfs'] if e['intf_name'] is not None]
+        intfs = [i for i in self.interfaces if len(names) == 0 or i.name in names]
+        msg['num_intf'] = len(intfs)
+        msg['intfs'] = [Container(ifindex=i.ifindex,
+                                  intf_name_size=len_of_string(i.name),
+                                  intf_name=i.name,
+                                  intf_type=1,
+                                  mac_addr_size=len_of_string(i.mac_addr),
+                                  mac_addr=i.mac_addr,
+                                  is_wifi=1 if i.is_wifi else 0,
+                                  ) for i in intfs]
+        return msg
+
+    def _statistics(self, msg):
+        intf = self.get_interface(msg['intf_name'])
+        if intf is None:
+            raise ValueError("no interface %s" % msg['intf_name'])
+        for k, v in intf.counters().items():
+            msg[k] = v
+        ts = time.strftime('%Y-%m-%d %H:%M:%S')
+        msg['time_stamp_size'] = len_of_string(ts)
+        msg['time_stamp'] = ts
+        return msg
+
+    def _channel_info(self, msg):
+        intf = self.get_interface(msg['intf_name'])
+        if intf is None:
+            raise ValueError("no interface %s" % msg['intf_name'])
+        elapsed = int((time.time() - self.started) * 1000)
+        info = []
+        for freq, ch in VALID_CHANNELS:
+            busy = self.rnd.uniform(0.05, 0.6)
+            info.append(Container(frequency=freq,
+                                  in_use=1 if ch == intf.channel else 0,
+                                  noise=NOISE_FLOOR + self.rnd.randint(0, 5),
+                                  receive_time=int(elapsed * busy / 2),
+                                  transmit_time=int(elapsed * busy / 4),
+                                  active_time=elapsed,
+                                  busy_time=int(elapsed * busy),
+                                  channel_type=0,
+                                  extension_channel_busy_time=0,
+                                  ))
+        msg['channel'] = intf.channel
+        msg['num_freqs'] = len(info)
+        msg['channel_info'] = info
+        return msg
+
+    def _valid_channels(self, msg):
+        msg['num_channels'] = len(VALID_CHANNELS)
+        msg['valid_channel'] = [Container(frequency=f, channel=c) for f, c in VALID_CHANNELS]
+        return msg
+
+    def _current_channel(self, msg):
+        intf = self.get_interface(msg['intf_name'])
+        if intf is None:
+            raise ValueError("no interface %s" % msg['intf_name'])
+        msg['channel'] = intf.channel
+        msg['frequency'] = intf.frequency
+        msg['autochannel'] = 0
+        return msg
+
+    def _set_current_channel(self, msg):
+        intf = self.get_interface(msg['intf_name'])
+        if intf is not None and frequency_of(msg['channel']) > 0:
+            intf.channel = msg['channel']
+        return None
+
+    def _snr(self, msg):
+        msg['value'] = self.snr(msg['intf_name'])
+        return msg
+
+    def _txpower(self, msg):
+        intf = self.get_interface(msg['intf_name'])
+        msg['value'] = 0 if intf is None else intf.txpower
+        return msg
+
+    def _set_txpower(self, msg):
+        intf = self.get_interface(msg['intf_name'])
+        if intf is not None:
+            intf.txpower = msg['value']
+        return None
+
+    def _uptime(self, msg):
+        uptime = time.time() - self.started
+        msg['uptime'] = uptime
+        msg['idle'] = uptime * self.rnd.uniform(0.5, 0.9)
+        return msg
+
+    def _cpu(self, msg):
+        msg['value'] = int(self.rnd.uniform(0.01, 0.5) * 1000000)  # the controller divides by 10^6
+        return msg
+
+    def _memory(self, msg):
+        msg['value'] = int(self.rnd.uniform(0.2, 0.6) * 1000000)
+        return msg
+
+    def snr(self, intf_name):
+        """ @return: the SNR (dB) of the interface """
+        return self.rnd.randint(20, 40)
+
+
+class SimulatedAP(SimulatedDevice):
+    """ an AP with one VAP (SSID) in each radio. the stations are associated to the VAPs """
+
+    device_type = DEVICE_AP
+
+    def __init__(self, ip, port, mac_prefix, num_radios=1, ssids=('ethanol',), channels=(1, 6, 11),
+                 latency=0.0, jitter=0.0, seed=None):
+        """
+          @param mac_prefix: five bytes of the MAC addresses of the interfaces (e.g. '02:00:00:00:01')
+          @param num_radios: number of radios (wlan0, wlan1, ...)
+          @param ssids: the SSID of radio n is ssids[n % len(ssids)]
+          @param channels: the channel of radio n is chosen from channels
+        """
+        super(SimulatedAP, self).__init__(ip, port, latency, jitter, seed)
+        self.interfaces.append(SimulatedInterface('eth0', mac_address(mac_prefix, 0), 1, is_wifi=False, rnd=self.rnd))
+        for n in range(num_radios):
+            self.interfaces.append(SimulatedInterface('wlan%d' % n, mac_address(mac_prefix, n + 1), n + 2,
+                                                      wiphy=n, ssid=ssids[n % len(ssids)],
+                                                      channel=self.rnd.choice(channels), rnd=self.rnd))
+        self.stations = {}  # mac address of the station --> (SimulatedStation, interface)
+        self.neighbors = {}  # SimulatedAP --> signal (dBm) of its beacons received by this AP
+        self.scanning = 0  # ACS scans in progress
+        self.acs_time = ACS_SCAN_TIME
+        self.acs_scans = 0
+        self.acs_overlaps = 0  # scans that were running when a neighbor scanned too
+
+    @property
+    def bssids(self):
+        """ MAC addresses of the VAPs """
+        return [intf.mac_addr for intf in self.wireless_interfaces()]
+
+    def associate(self, station, intf=None):
+        """ associates the station to one VAP of this AP (the first, if intf is None)
+            @return: the SimulatedInterface of the VAP
+        """
+        if intf is None:
+            intf = self.wireless_interfaces()[0]
+        with self.lock:
+            self.stations[station.mac_addr] = (station, intf)
+        station.link_to(self, intf)
+        return intf
+
+    def disassociate(self, station):
+        with self.lock:
+            entry = self.stations.pop(station.mac_addr, None)
+        if entry is not None and station.ap is self:
+            station.link_to(None, None)
+        return entry is not None
+
+    def hear(self, ap, signal):
+        """ this AP receives the beacons of the VAPs of ap with the signal (dBm) """
+        with self.lock:
+            self.neighbors[ap] = signal
+
+    def associated_stations(self, intf_name=None):
+        """ @return: list of (station, interface) """
+        with self.lock:
+            entries = list(self.stations.values())
+        return [(s, i) for s, i in entries if intf_name is None or i.name == intf_name]
+
+    def snr(self, intf_name):
+        entries = self.associated_stations(intf_name)
+        if len(entries) == 0:
+            return 0
+        return sum(s.snr(None) for s, _ in entries) // len(entries)
+
+    def _radio_wlans(self, msg):
+        wlans = self.wireless_interfaces()
+        msg['num_wlans'] = len(wlans)
+        msg['list_of_radio_wlans'] = [Container(intf_name_size=len_of_string(i.name),
+                                                intf_name=i.name,
+                                                mac_addr_size=len_of_string(i.mac_addr),
+                                                mac_addr=i.mac_addr,
+                                                wiphy=i.wiphy,
+                                                ) for i in wlans]
+        return msg
+
+    def _ssids(self, msg):
+        names = [e['intf_name'] for e in msg['ssid_info'] if e['intf_name'] is not None]
+        wlans = [i for i in self.wireless_interfaces() if len(names) == 0 or i.name in names]
+        msg['num_ssids'] = len(wlans)
+        msg['ssid_info'] = [Container(intf_name_size=len_of_string(i.name),
+                                      intf_name=i.name,
+                                      ssid_size=len_of_string(i.ssid),
+                                      ssid=i.ssid,
+                                      channel=i.channel,
+                                      frequency=i.frequency,
+                                      ) for i in wlans]
+        return msg
+
+    def _aps_in_range(self, msg):
+        intf = self.get_interface(msg['intf_name'])
+        if intf is None:
+            raise ValueError("no interface %s" % msg['intf_name'])
+        with self.lock:
+            neighbors = list(self.neighbors.items())
+        aps = []
+        for ap, signal in neighbors:
+            for i in ap.wireless_interfaces():
+                aps.append(ap_in_range_entry(intf.name, i, signal + self.rnd.uniform(-2, 2), self.rnd))
+        msg['num_aps'] = len(aps)
+        msg['ap_in_range'] = aps
+        return msg
+
+    def _acs(self, msg):
+        intf = self.get_interface(msg['intf_name'])
+        if intf is None:
+            raise ValueError("no interface %s" % msg['intf_name'])
+        with self.lock:
+            neighbors = list(self.neighbors.items())
+            self.scanning += 1
+            self.acs_scans += 1
+        try:
+            overlapped = [ap for ap, _ in neighbors if ap.scanning > 0]
+            for ap in overlapped + ([self] if overlapped else []):
+                with ap.lock:
+                    ap.acs_overlaps += 1
+            time.sleep(self.acs_time * max(1, msg['num_tests']))
+        finally:
+            with self.lock:
+                self.scanning -= 1
+        interference = {}
+        for ap, signal in neighbors:
+            for i in ap.wireless_interfaces():
+                interference[i.channel] = interference.get(i.channel, 0.0) + 10 ** ((signal - NOISE_FLOOR) / 20.0) / 100.0
+        freqs = [f for f, _ in VALID_CHANNELS]
+        factors = [min(8.0, self.rnd.uniform(0.1, 0.5) + interference.get(ch, 0.0)) for _, ch in VALID_CHANNELS]
+        msg['num_chan'] = len(freqs)
+        msg['freq'] = freqs
+        msg['factor'] = [int(f * ACS_SCALE_FACTOR) for f in factors]
+        return msg
+
+    def _sta_statistics(self, msg):
+        stats = []
+        for station, intf in self.associated_stations(msg['intf_name']):
+            c = station.wlan.counters()
+            signal = NOISE_FLOOR + station.snr(None)
+            stats.append(Container(mac_addr_size=len_of_string(station.mac_addr),
+                                   mac_addr=station.mac_addr,
+                                   intf_name_size=len_of_string(intf.name),
+                                   intf_name=intf.name,
+                                   inactive_time=self.rnd.randint(0, 1000),
+                                   rx_bytes=c['tx_bytes'],
+                                   tx_bytes=c['rx_bytes'],
+                                   rx_packets=c['tx_packets'],
+                                   rx_duration=0,
+                                   tx_packets=c['rx_packets'],
+                                   tx_retries=c['rx_dropped'],
+                                   tx_failed=c['rx_errors'],
+                                   beacon_loss=0,
+                                   beacon_rx=0,
+                                   rx_drop_misc=0,
+                                   signal=signal,
+                                   signal_avg=signal,
+                                   beacon_signal_avg=signal,
+                                   time_offset=0,
+                                   connected_time=int(time.time() - station.associated_at),
+                                   tx_bitrate=54.0,
+                                   ))
+        ts = time.strftime('%Y-%m-%d %H:%M:%S')
+        msg['num_stats'] = len(stats)
+        msg['stats'] = stats
+        msg['time_stamp_size'] = len_of_string(ts)
+        msg['time_stamp'] = ts
+        return msg
+
+
+class SimulatedStation(SimulatedDevice):
+    """ a station with one wireless interface (wlan0), associated to at most one SimulatedAP """
+
+    device_type = DEVICE_STATION
+
+    def __init__(self, ip, port, mac_prefix, latency=0.0, jitter=0.0, seed=None):
+        super(SimulatedStation, self).__init__(ip, port, latency, jitter, seed)
+        self.interfaces.append(SimulatedInterface('eth0', mac_address(mac_prefix, 0), 1, is_wifi=False, rnd=self.rnd))
+        self.wlan = SimulatedInterface('wlan0', mac_address(mac_prefix, 1), 2, rnd=self.rnd)
+        self.interfaces.append(self.wlan)
+        self.ap = None
+        self.vap = None  # SimulatedInterface of the AP
+        self.associated_at = 0
+        self.base_snr = self.rnd.randint(15, 45)
+        self.offsets = {}  # SimulatedAP --> dB added to the signal of its beacons (position of the station)
+        self.on_transition = None  # function on_transition(station, bssid) called by MSG_TRIGGER_TRANSITION
+
+    @property
+    def mac_addr(self):
+        """ MAC address of the wireless interface """
+        return self.wlan.mac_addr
+
+    def link_to(self, ap, vap):
+        """ called by SimulatedAP.associate() and disassociate() """
+        with self.lock:
+            self.ap = ap
+            self.vap = vap
+            self.associated_at = time.time()
+            if vap is not None:
+                self.wlan.channel = vap.channel
+                self.wlan.ssid = vap.ssid
+
+    def snr(self, intf_name):
+        if self.vap is None:
+            return 0
+        return max(0, self.base_snr + self.rnd.randint(-3, 3))
+
+    def _aps_in_range(self, msg):
+        """ the station hears its AP (with its SNR) and the APs its AP hears """
+        ap = self.ap
+        if msg['intf_name'] != self.wlan.name or ap is None:
+            raise ValueError("no interface %s or not associated" % msg['intf_name'])
+        with ap.lock:
+            neighbors = list(ap.neighbors.items())
+        aps = [ap_in_range_entry(self.wlan.name, self.vap, NOISE_FLOOR + self.snr(None), self.rnd)]
+        for other, signal in neighbors:
+            offset = self.offsets.get(other)
+            if offset is None:
+                offset = self.offsets[other] = self.rnd.uniform(-20, 5)
+            for i in other.wireless_interfaces():
+                aps.append(ap_in_range_entry(self.wlan.name, i, signal + offset + self.rnd.uniform(-2, 2), self.rnd))
+        msg['num_aps'] = len(aps)
+        msg['ap_in_range'] = aps
+        return msg
+
+    def _trigger_transition(self, msg):
+        """ the controller asks the station to move to the VAP mac_new_ap """
+        if self.on_transition is not None and msg['mac_new_ap'] is not None:
+            self.on_transition(self, msg['mac_new_ap'])
+        return None
+
+    def _link_info(self, msg):
+        vap = self.vap
+        if msg['intf_name'] != self.wlan.name or vap is None:
+            msg['mac_addr_size'] = 0
+            msg['mac_addr'] = None
+            msg['ssid_size'] = 0
+            msg['ssid'] = None
+            msg['frequency'] = 0
+            return msg
+        msg['mac_addr_size'] = len_of_string(vap.mac_addr)
+        msg['mac_addr'] = vap.mac_addr
+        msg['ssid_size'] = len_of_string(vap.ssid)
+        msg['ssid'] = vap.ssid
+        msg['frequency'] = vap.frequency
+        return msg
+
+
+handlers = {MSG_TYPE.MSG_GET_RADIO_WLANS: (msg_radio_wlans, '_radio_wlans'),
+            MSG_TYPE.MSG_GET_AP_SSID: (msg_ap_ssid, '_ssids'),
+            MSG_TYPE.MSG_GET_ALL_INTF: (msg_intf, '_interfaces'),
+            MSG_TYPE.MSG_GET_ONE_INTF: (msg_intf, '_interfaces'),
+            MSG_TYPE.MSG_GET_LINK_INFO: (msg_sta_link_info, '_link_info'),
+            MSG_TYPE.MSG_GET_STATISTICS: (msg_statistics, '_statistics'),
+            MSG_TYPE.MSG_GET_STA_STATISTICS: (msg_sta_statistics, '_sta_statistics'),
+            MSG_TYPE.MSG_GET_CHANNELINFO: (msg_channelinfo, '_channel_info'),
+            MSG_TYPE.MSG_GET_VALIDCHANNELS: (msg_channels, '_valid_channels'),
+            MSG_TYPE.MSG_GET_CURRENTCHANNEL: (msg_currentchannel, '_current_channel'),
+            MSG_TYPE.MSG_GET_AP_IN_RANGE_TYPE: (msg_ap_in_range, '_aps_in_range'),
+            MSG_TYPE.MSG_GET_ACS: (msg_acs, '_acs'),
+            MSG_TYPE.MSG_TRIGGER_TRANSITION: (msg_station_trigger_transition, '_trigger_transition'),
+            MSG_TYPE.MSG_SET_CURRENTCHANNEL: (msg_currentchannel, '_set_current_channel'),
+            MSG_TYPE.MSG_GET_SNR: (msg_snr_power, '_snr'),
+            MSG_TYPE.MSG_GET_TXPOWER: (msg_snr_power, '_txpower'),
+            MSG_TYPE.MSG_SET_TXPOWER: (msg_snr_power, '_set_txpower'),
+            MSG_TYPE.MSG_GET_UPTIME: (msg_uptime, '_uptime'),
+            MSG_TYPE.MSG_GET_CPU: (msg_memcpu, '_cpu'),
+            MSG_TYPE.MSG_GET_MEMORY: (msg_memcpu, '_memory'),
+            }
+""" message type --> (struct of the message, method of SimulatedDevice that fills the reply)
+    a device that does not have the method answers with an error message
+"""
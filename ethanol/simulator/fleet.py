@@ -0,0 +1,489 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# ##################################
+#
+# Copyright 2015 Henrique Moura
+#
+# This file is part of Ethanol.
+#
+# ##################################
+#
+"""
+This module runs a fleet of simulated agents (see agent.py) on the loopback interface,
+so the controller can be tested without ethanol_hostapd.
+
+The APs are placed on a square grid: each AP hears the beacons of the APs that are up to IN_RANGE_DISTANCE
+cells away (see SimulatedAP.hear), so the in-range scans form a realistic interference graph.
+
+Each device has its own loopback address (APs: 127.1.x.y, stations: 127.2.x.y), because the controller
+identifies the devices by the ip address of the hello message. All devices are served by one SslServer
+(one listener per device). The devices connect to the controller from their own address
+to send the hello, bye and association messages.
+
+  >>> fleet = Fleet(('127.0.0.1', 22222), num_aps=1000, stations_per_ap=5, latency=0.002, jitter=0.001)
+  >>> fleet.start()          # listeners + hellos of the APs, association + hellos of the stations
+  >>> fleet.start_churn(10)  # 10 events per second: roaming, stations leaving and joining, AP restarts
+  >>> fleet.stats()
+  >>> fleet.stop()           # sends the byes
+
+usage: python -m pox.ethanol.simulator.fleet [num_aps] [stations_per_ap] [latency ms] [jitter ms] [churn/s] [controller ip]
+
+@author: Henrique Duarte Moura
+@organization: WINET/DCC/UFMG
+@copyright: h3dema (c) 2017
+@contact: henriquemoura@hotmail.com
+@licence: GNU General Public License v2.0
+(https://www.gnu.org/licenses/old-licenses/gpl-2.0.html)
+@since: July 2015
+@status: in development
+
+@requires: construct 2.5.2
+"""
+import sys
+import math
+import time
+import json
+import random
+import socket
+import ssl
+from threading import Thread, Lock, Event
+
+from construct import Container
+
+from pox.ethanol.ssl_message.msg_common import MSG_TYPE, VERSION, SERVER_PORT, len_of_string
+from pox.ethanol.ssl_message.msg_framing import MessageReader, set_msg_size
+from pox.ethanol.ssl_message.msg_server import SslServer
+from pox.ethanol.ssl_message.msg_hello import msg_hello
+from pox.ethanol.ssl_message.msg_bye import msg_bye
+from pox.ethanol.ssl_message.msg_association import msg_association
+from pox.ethanol.ssl_message.msg_handle_snr import msg_snr_threshold_reached
+from pox.ethanol.ssl_message.msg_log import log
+from pox.ethanol.ssl_message.latency import LatencyHistogram, monotonic
+from pox.ethanol.ssl_message.aio import Executor, gather
+from pox.ethanol.simulator.agent import SimulatedAP, SimulatedStation
+
+AGENT_PORT = 22223
+""" port of the simulated devices (each device has its own address)"""
+
+AP_NETWORK = 1
+""" the APs use the addresses 127.AP_NETWORK.x.y"""
+
+STATION_NETWORK = 2
+""" the stations use the addresses 127.STATION_NETWORK.x.y"""
+
+SIMULATOR_WORKERS = 64
+""" threads of the SslServer that answer the controller (the simulated latency holds a thread)"""
+
+HELLO_CONCURRENCY = 32
+""" number of devices that connect to the controller at the same time in start()"""
+
+CONNECT_TIMEOUT = 10.0
+""" seconds to connect to the controller and wait for its reply"""
+
+CHURN_EVENTS = [('roam', 5), ('leave', 2), ('join', 2), ('restart', 1)]
+""" kind of churn event and its weight"""
+
+IN_RANGE_DISTANCE = 2.0
+""" an AP hears the APs that are up to this number of grid cells away"""
+
+REFERENCE_SIGNAL = -45.0
+""" dBm. signal of the beacons of an AP one grid cell away (it decreases 35 dB per decade of distance)"""
+
+
+def loopback_address(network, n):
+    """ @return: the n-th address of 127.network.0.0/16 (n starts at 0) """
+    return '127.%d.%d.%d' % (network, (n // 254) % 256, n % 254 + 1)
+
+
+class ControllerLink(object):
+    """ ssl connection from one simulated device (its loopback address) to the controller.
+        the connection is kept open, and reopened if the controller closes it
+    """
+
+    def __init__(self, controller, source_ip, timeout=CONNECT_TIMEOUT):
+        self.controller = controller
+        self.source_ip = source_ip
+        self.timeout = timeout
+        self.__lock = Lock()
+        self.__sock = None
+        self.__reader = None
+
+    def __connect(self):
+        sckt = socket.create_connection(self.controller, self.timeout, (self.source_ip, 0))
+        sckt.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)  # the hello goes right after the handshake
+        self.__sock = ssl.wrap_socket(sckt)
+        self.__reader = MessageReader(self.__sock)
+
+    def close(self):
+        with self.__lock:
+            self.__close()
+
+    def __close(self):
+        if self.__sock is not None:
+            try:
+                self.__sock.close()
+            except (socket.error, ssl.SSLError):
+                pass
+        self.__sock = None
+        self.__reader = None
+
+    def request(self, msg):
+        """ sends msg and waits for the reply (the controller answers all messages)
+            @return: the binary reply, None if the controller did not answer
+        """
+        msg = set_msg_size(msg)
+        with self.__lock:
+            for attempt in range(2):  # a kept connection may have been closed by the controller
+                try:
+                    if self.__sock is None:
+                        self.__connect()
+                    self.__sock.write(msg)
+                    reply = self.__reader.read_msg()
+                    if len(reply) > 0 and self.__reader.in_sync:
+                        return reply
+                except (socket.error, ssl.SSLError) as e:
+                    log.debug("Link %s --> %s:%d: %s", self.source_ip, self.controller[0], self.controller[1], e)
+                self.__close()
+        return None
+
+
+def default_fields(m_type):
+    """ @return: dictionary with the header fields (msg_default) of a message of type m_type """
+    return dict(m_type=m_type,
+                m_id=0,
+                p_version_length=len_of_string(VERSION),
+                p_version=VERSION,
+                m_size=0,
+                )
+
+
+def build_hello(device):
+    """ @return: the binary hello message of the simulated device """
+    return msg_hello.build(Container(device_type=device.device_type, tcp_port=device.port, rtt=0,
+                                     **default_fields(MSG_TYPE.MSG_HELLO_TYPE)))
+
+
+def build_bye(device):
+    return msg_bye.build(Container(tcp_port=device.port, **default_fields(MSG_TYPE.MSG_BYE_TYPE)))
+
+
+def build_association(m_type, mac_ap, mac_sta):
+    """ @param m_type: MSG_ASSOCIATION, MSG_DISASSOCIATION, MSG_USER_CONNECTING, ... """
+    return msg_association.build(Container(mac_ap_size=len_of_string(mac_ap), mac_ap=mac_ap,
+                                           mac_sta_size=len_of_string(mac_sta), mac_sta=mac_sta,
+                                           allowed=1, response=0,
+                                           **default_fields(m_type)))
+
+
+def build_snr_threshold(sta):
+    """ @return: the binary MSG_SET_SNR_THRESHOLD_REACHED message of the station (with its current AP and SNR) """
+    mac_ap = sta.vap.mac_addr
+    return msg_snr_threshold_reached.build(Container(sta_ip_size=len_of_string(sta.ip), sta_ip=sta.ip,
+                                                     sta_port=sta.port,
+                                                     mac_addr_size=len_of_string(sta.mac_addr),
+                                                     mac_addr=sta.mac_addr,
+                                                     intf_name_size=len_of_string(sta.wlan.name),
+                                                     intf_name=sta.wlan.name,
+                                                     mac_ap_size=len_of_string(mac_ap), mac_ap=mac_ap,
+                                                     snr=sta.snr(None),
+                                                     **default_fields(MSG_TYPE.MSG_SET_SNR_THRESHOLD_REACHED)))
+
+
+class Fleet(object):
+    """ many simulated APs and stations, served by one SslServer """
+
+    def __init__(self, controller=('127.0.0.1', SERVER_PORT), num_aps=10, stations_per_ap=0,
+                 num_radios=1, ssids=('ethanol',), latency=0.0, jitter=0.0,
+                 port=AGENT_PORT, certfile=None, num_workers=SIMULATOR_WORKERS, seed=0):
+        """
+          @param controller: (ip, port) of the controller
+          @param num_aps: number of simulated APs
+          @param stations_per_ap: number of stations associated to each AP at the start
+          @param num_radios: number of radios of each AP
+          @param ssids: SSIDs of the radios
+          @param latency: seconds added to each reply of the devices
+          @param jitter: maximum random seconds added to latency
+          @param port: port used by all devices
+          @param certfile: ssl certificate (default: the certificate of the controller)
+          @param num_workers: threads that answer the requests of the controller
+          @param seed: the same seed creates the same fleet and the same churn events
+        """
+        self.controller = controller
+        self.rnd = random.Random(seed)
+        self.aps = []
+        self.stations = []
+        for n in range(num_aps):
+            self.aps.append(SimulatedAP(loopback_address(AP_NETWORK, n), port,
+                                        mac_prefix='02:00:%02x:%02x:%02x' % ((n >> 16) & 0xff, (n >> 8) & 0xff, n & 0xff),
+                                        num_radios=num_radios, ssids=ssids,
+                                        latency=latency, jitter=jitter, seed=self.rnd.random()))
+        for n in range(num_aps * stations_per_ap):
+            self.stations.append(SimulatedStation(loopback_address(STATION_NETWORK, n), port,
+                                                  mac_prefix='02:01:%02x:%02x:%02x' % ((n >> 16) & 0xff, (n >> 8) & 0xff, n & 0xff),
+                                                  latency=latency, jitter=jitter, seed=self.rnd.random()))
+        self.__by_bssid = {}  # mac address of a VAP --> SimulatedAP
+        for ap in self.aps:
+            for i in ap.wireless_interfaces():
+                self.__by_bssid[i.mac_addr] = ap
+        for sta in self.stations:
+            sta.on_transition = self.__on_transition
+        self.place_aps()
+        self.server = SslServer(certfile, num_workers=num_workers)
+        self.__links = {}  # ip --> ControllerLink
+        self.__thread = None
+        self.__churn_thread = None
+        self.__stop_churn = Event()
+        self.__lock = Lock()
+        self.__offline = set()  # stations that left the network
+        self.hello_latency = LatencyHistogram('hello')
+        """ hello sent --> reply of the controller"""
+        self.association_latency = LatencyHistogram('association')
+        self.__counters = {'hellos': 0, 'byes': 0, 'associations': 0, 'denied': 0, 'errors': 0,
+                           'roam': 0, 'leave': 0, 'join': 0, 'restart': 0,
+                           'snr_reports': 0, 'transitions': 0}
+
+    def place_aps(self):
+        """ puts the APs on a square grid (in the order of self.aps) and sets the APs each one hears """
+        side = int(math.ceil(math.sqrt(len(self.aps)))) or 1
+        r = int(IN_RANGE_DISTANCE)
+        for n, ap in enumerate(self.aps):
+            x, y = n % side, n // side
+            for dx in range(-r, r + 1):
+                for dy in range(-r, r + 1):
+                    d = math.hypot(dx, dy)
+                    m = (y + dy) * side + x + dx
+                    if d == 0 or d > IN_RANGE_DISTANCE or not (0 <= x + dx < side) or not (0 <= m < len(self.aps)):
+                        continue
+                    ap.hear(self.aps[m], REFERENCE_SIGNAL - 35 * math.log10(d))
+
+    def __count(self, name, n=1):
+        with self.__lock:
+            self.__counters[name] += n
+
+    def stats(self):
+        """ @return: dictionary with the counters of the fleet, the latencies and the stats of the SslServer """
+        with self.__lock:
+            d = dict(self.__counters)
+        d['aps'] = len(self.aps)
+        d['stations'] = len(self.stations)
+        d['requests'] = sum(dev.stats()['requests'] for dev in self.aps + self.stations)
+        d['acs_scans'] = sum(ap.acs_scans for ap in self.aps)
+        d['acs_overlaps'] = sum(ap.acs_overlaps for ap in self.aps)
+        d['hello_latency'] = self.hello_latency.as_dict()
+        d['association_latency'] = self.association_latency.as_dict()
+        d['server'] = self.server.stats()
+        return d
+
+    def link(self, device):
+        """ @return: the ControllerLink of the device """
+        with self.__lock:
+            link = self.__links.get(device.ip)
+            if link is None:
+                link = ControllerLink(self.controller, device.ip)
+                self.__links[device.ip] = link
+            return link
+
+    def start(self, hello=True):
+        """ starts the listeners of all devices. if hello is True, the devices connect to the controller """
+        for dev in self.aps + self.stations:
+            self.server.add_listener(dev.server, dev.handle)
+        self.__thread = Thread(target=self.server.serve_forever, name='simulator')
+        self.__thread.daemon = True
+        self.__thread.start()
+        log.info("Simulating %d APs and %d stations", len(self.aps), len(self.stations))
+        if not hello:
+            for n, sta in enumerate(self.stations):
+                self.aps[n % len(self.aps)].associate(sta)
+            return
+        executor = Executor(HELLO_CONCURRENCY)
+        try:
+            gather([executor.submit(self.hello, ap) for ap in self.aps])
+            gather([executor.submit(self.connect_station, sta, self.aps[n % len(self.aps)])
+                    for n, sta in enumerate(self.stations)])
+        finally:
+            executor.shutdown()
+
+    def stop(self, bye=True):
+        """ stops the churn and the listeners. if bye is True, the devices say bye to the controller """
+        self.stop_churn()
+        if bye:
+            for dev in self.stations + self.aps:
+                self.bye(dev)
+        with self.__lock:
+            links = self.__links.values()
+            self.__links = {}
+        for link in links:
+            link.close()
+        self.server.stop()
+        if self.__thread is not None:
+            self.__thread.join()
+
+    def hello(self, device):
+        """ sends the hello of the device
+            @return: True if the controller answered
+        """
+        t0 = monotonic()
+        reply = self.link(device).request(build_hello(device))
+        if reply is None:
+            self.__count('errors')
+            return False
+        self.hello_latency.record(monotonic() - t0)
+        self.__count('hellos')
+        return True
+
+    def bye(self, device):
+        reply = self.link(device).request(build_bye(device))
+        self.__count('byes' if reply is not None else 'errors')
+        return reply is not None
+
+    def associate(self, ap, sta, m_types=(MSG_TYPE.MSG_ASSOCIATION, MSG_TYPE.MSG_USER_CONNECTING)):
+        """ the AP informs the controller that sta associated to its VAP (sends the messages of m_types)
+            @return: False if the controller did not answer or denied one of the messages
+        """
+        link = self.link(ap)
+        for m_type in m_types:
+            t0 = monotonic()
+            reply = link.request(build_association(m_type, sta.vap.mac_addr, sta.mac_addr))
+            if reply is None:
+                self.__count('errors')
+                return False
+            self.association_latency.record(monotonic() - t0)
+            self.__count('associations')
+            if not msg_association.parse(reply)['allowed']:
+                self.__count('denied')
+                return False
+        return True
+
+    def connect_station(self, sta, ap):
+        """ sta associates to ap: the AP sends the association messages and the station says hello
+            @return: False if the controller denied the association
+        """
+        ap.associate(sta)
+        if not self.associate(ap, sta):
+            ap.disassociate(sta)
+            return False
+        return self.hello(sta)
+
+    def disconnect_station(self, sta):
+        """ the station leaves its AP: the AP sends the disassociation messages and the station says bye """
+        ap = sta.ap
+        if ap is None:
+            return
+        if sta.vap is not None:
+            self.associate(ap, sta, (MSG_TYPE.MSG_DISASSOCIATION, MSG_TYPE.MSG_USER_DISCONNECTING))
+        ap.disassociate(sta)
+        self.bye(sta)
+
+    def roam(self, sta, new_ap):
+        """ sta moves to new_ap: the old AP sends the disassociation, the new AP the reassociation
+            @return: False if the controller denied the reassociation (the station goes offline)
+        """
+        old_ap = sta.ap
+        if old_ap is not None:
+            self.associate(old_ap, sta, (MSG_TYPE.MSG_DISASSOCIATION,))
+            old_ap.disassociate(sta)
+        new_ap.associate(sta)
+        if not self.associate(new_ap, sta, (MSG_TYPE.MSG_REASSOCIATION, MSG_TYPE.MSG_USER_CONNECTING)):
+            new_ap.disassociate(sta)
+            with self.__lock:
+                self.__offline.add(sta)  # denied: tries again later ('join')
+            return False
+        return True
+
+    def report_snr(self, sta):
+        """ the station tells the controller that its SNR reached the threshold
+            @return: the mac address of the VAP in the reply (the VAP the station should use), None on error
+        """
+        if sta.vap is None:
+            return None
+        reply = self.link(sta).request(build_snr_threshold(sta))
+        if reply is None:
+            self.__count('errors')
+            return None
+        self.__count('snr_reports')
+        return msg_snr_threshold_reached.parse(reply)['mac_ap']
+
+    def __on_transition(self, sta, bssid):
+        """ MSG_TRIGGER_TRANSITION received by the station: it roams to the AP of bssid (in another thread,
+            the request of the controller is answered first)
+        """
+        ap = self.__by_bssid.get(bssid)
+        if ap is None or ap is sta.ap:
+            return
+        self.__count('transitions')
+        t = Thread(target=self.roam, args=(sta, ap), name='transition')
+        t.daemon = True
+        t.start()
+
+    def start_churn(self, rate):
+        """ generates rate events per second (poisson process), until stop_churn() is called """
+        if rate <= 0 or self.__churn_thread is not None:
+            return
+        self.__stop_churn.clear()
+        self.__churn_thread = Thread(target=self.__churn, args=(rate,), name='churn')
+        self.__churn_thread.daemon = True
+        self.__churn_thread.start()
+
+    def stop_churn(self):
+        if self.__churn_thread is None:
+            return
+        self.__stop_churn.set()
+        self.__churn_thread.join()
+        self.__churn_thread = None
+
+    def __churn(self, rate):
+        total = sum(w for _, w in CHURN_EVENTS)
+        while not self.__stop_churn.wait(self.rnd.expovariate(rate)):
+            r = self.rnd.uniform(0, total)
+            for event, w in CHURN_EVENTS:
+                r -= w
+                if r <= 0:
+                    break
+            try:
+                self.churn_event(event)
+            except Exception as e:
+                log.error("Churn event %s failed: %s", event, e)
+
+    def churn_event(self, event):
+        """ executes one churn event
+            @param event: 'roam' (a station moves to another AP), 'leave' (a station disconnects),
+                          'join' (a station that left connects again), 'restart' (an AP says bye and hello)
+        """
+        online = [sta for sta in self.stations if sta not in self.__offline]
+        if event == 'roam' and len(online) > 0 and len(self.aps) > 1:
+            sta = self.rnd.choice(online)
+            self.roam(sta, self.rnd.choice([ap for ap in self.aps if ap is not sta.ap]))
+        elif event == 'leave' and len(online) > 0:
+            sta = self.rnd.choice(online)
+            self.__offline.add(sta)
+            self.disconnect_station(sta)
+        elif event == 'join' and len(self.__offline) > 0:
+            sta = self.rnd.choice(list(self.__offline))
+            self.__offline.discard(sta)
+            self.connect_station(sta, self.rnd.choice(self.aps))
+        elif event == 'restart' and len(self.aps) > 0:
+            ap = self.rnd.choice(self.aps)
+            self.bye(ap)
+            self.hello(ap)
+        else:
+            return
+        self.__count(event)
+
+
+if __name__ == "__main__":
+    num_aps = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    stations_per_ap = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    latency = float(sys.argv[3]) / 1000.0 if len(sys.argv) > 3 else 0.0
+    jitter = float(sys.argv[4]) / 1000.0 if len(sys.argv) > 4 else 0.0
+    churn = float(sys.argv[5]) if len(sys.argv) > 5 else 0.0
+    controller = (sys.argv[6] if len(sys.argv) > 6 else '127.0.0.1', SERVER_PORT)
+    fleet = Fleet(controller, num_aps, stations_per_ap, latency=latency, jitter=jitter)
+    fleet.start()
+    fleet.start_churn(churn)
+    try:
+        while True:
+            time.sleep(10)
+            print json.dumps(fleet.stats(), indent=2, sort_keys=True)
+    except KeyboardInterrupt:
+        fleet.stop()
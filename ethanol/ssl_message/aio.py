@@ -0,0 +1,294 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+  asynchronous versions of the functions that send requests to the ethanol devices.
+
+  every get_/set_/send_msg_ function of the msg_*.py modules has a version here with the same name
+  and the same parameters, that returns a Future instead of blocking.
+  They call the original function (so they use the same construct structs) in a pool of threads,
+  limited to max_concurrency requests in flight.
+
+  example: polls all aps at once
+
+  >>> from pox.ethanol.ssl_message import aio
+  >>> futures = [aio.get_snr(server, intf_name='wlan0') for server in servers]
+  >>> results = aio.gather(futures, timeout=5)
+
+  @note: python 2.7 does not have asyncio, so the "async" functions return a Future (similar to concurrent.futures)
+         and gather() waits for a list of futures.
+
+@author: Henrique Duarte Moura
+@organization: WINET/DCC/UFMG
+@copyright: h3dema (c) 2017
+@contact: henriquemoura@hotmail.com
+@licence: GNU General Public License v2.0
+(https://www.gnu.org/licenses/old-licenses/gpl-2.0.html)
+@since: July 2015
+@status: in development
+
+@requires: construct 2.5.2
+"""
+import sys
+from importlib import import_module
+from threading import Thread, Lock, Condition
+from Queue import Queue
+
+from pox.ethanol.ssl_message.msg_log import log
+
+MAX_CONCURRENCY = 64
+""" default maximum number of requests in flight (number of threads of the default executor)"""
+
+
+class TimeoutError(Exception):
+    """ the result of a Future was not available in time """
+    pass
+
+
+class Future(object):
+    """ the result of a request that is running (or will run) in the executor
+    """
+
+    def __init__(self):
+        self.__cond = Condition(Lock())
+        self.__done = False
+        self.__result = None
+        self.__exc_info = None
+        self.__callbacks = []
+
+    def done(self):
+        """ @return: True if the request finished """
+        return self.__done
+
+    def __finish(self, result, exc_info):
+        with self.__cond:
+            self.__result = result
+            self.__exc_info = exc_info
+            self.__done = True
+            self.__cond.notify_all()
+            callbacks, self.__callbacks = self.__callbacks, []
+        for fn in callbacks:
+            self.__call(fn)
+
+    def set_result(self, result):
+        self.__finish(result, None)
+
+    def set_exception(self, exc_info):
+        """ @param exc_info: value returned by sys.exc_info() """
+        self.__finish(None, exc_info)
+
+    def __call(self, fn):
+        try:
+            fn(self)
+        except Exception as e:
+            log.error("Error in future callback: %s", e)
+
+    def add_done_callback(self, fn):
+        """ calls fn(future) when the request finishes (immediately if it is already done) """
+        with self.__cond:
+            if not self.__done:
+                self.__callbacks.append(fn)
+                return
+        self.__call(fn)
+
+    def wait(self, timeout=None):
+        """ waits for the request to finish
+            @return: True if it is done
+        """
+        with self.__cond:
+            if not self.__done:
+                self.__cond.wait(timeout)
+            return self.__done
+
+    def exception(self, timeout=None):
+        """ @return: the exception raised by the request, or None """
+        if not self.wait(timeout):
+            raise TimeoutError()
+        return None if self.__exc_info is None else self.__exc_info[1]
+
+    def result(self, timeout=None):
+        """ waits for the request and returns its result. if the request raised an exception, raises it again
+            @param timeout: seconds to wait (None = forever)
+        """
+        if not self.wait(timeout):
+            raise TimeoutError()
+        if self.__exc_info is not None:
+            raise self.__exc_info[0], self.__exc_info[1], self.__exc_info[2]
+        return self.__result
+
+
+class Executor(object):
+    """ runs the blocking requests in a fixed number of threads
+        (the number of threads is the maximum number of requests in flight)
+    """
+
+    def __init__(self, max_concurrency=MAX_CONCURRENCY):
+        """
+          @param max_concurrency: number of threads
+        """
+        self.max_concurrency = max_concurrency
+        self.__queue = Queue()
+        self.__lock = Lock()
+        self.__threads = []
+
+    def __start_threads(self):
+        """ threads are created on demand, up to max_concurrency """
+        with self.__lock:
+            if len(self.__threads) < self.max_concurrency and self.__queue.qsize() > 0:
+                t = Thread(target=self.__worker)
+                t.daemon = True
+                t.start()
+                self.__threads.append(t)
+
+    def __worker(self):
+        while True:
+            job = self.__queue.get()
+            if job is None:
+                return
+            future, func, args, kwargs = job
+            try:
+                future.set_result(func(*args, **kwargs))
+            except Exception:
+                future.set_exception(sys.exc_info())
+
+    def submit(self, func, *args, **kwargs):
+        """ schedules func(*args, **kwargs)
+            @return: a Future with the result of func
+        """
+        future = Future()
+        self.__queue.put((future, func, args, kwargs))
+        self.__start_threads()
+        return future
+
+    def shutdown(self, wait=True):
+        """ stops the threads after the requests already submitted """
+        with self.__lock:
+            threads, self.__threads = self.__threads, []
+        for _ in threads:
+            self.__queue.put(None)
+        if wait:
+            for t in threads:
+                t.join()
+
+
+default_executor = Executor()
+""" executor used by the functions of this module"""
+
+
+def set_max_concurrency(max_concurrency):
+    """ changes the maximum number of requests in flight of the default executor """
+    default_executor.max_concurrency = max_concurrency
+
+
+def gather(futures, timeout=None, return_exceptions=False):
+    """ waits for all futures
+
+        @param futures: list of Future
+        @param timeout: seconds to wait for all of them (None = forever). Raises TimeoutError
+        @param return_exceptions: if True, an exception raised by a request is returned in the list
+                                  instead of being raised
+        @return: list with the results, in the same order of futures
+    """
+    from pox.ethanol.ssl_message.latency import monotonic
+    deadline = None if timeout is None else monotonic() + timeout
+    results = []
+    for f in futures:
+        remaining = None if deadline is None else max(0, deadline - monotonic())
+        if return_exceptions:
+            e = f.exception(remaining)
+            results.append(f.result() if e is None else e)
+        else:
+            results.append(f.result(remaining))
+    return results
+
+
+def run_all(func, servers, timeout=None, return_exceptions=False, **kwargs):
+    """ calls func(server, **kwargs) for all servers at the same time
+
+        @param func: one of the functions of this module (e.g. aio.get_snr)
+        @param servers: list of tuples (ip, port)
+        @return: list of results, in the same order of servers
+    """
+    return gather([func(server, **kwargs) for server in servers],
+                  timeout=timeout, return_exceptions=return_exceptions)
+
+
+""" module --> request functions that have an asynchronous version.
+    a tuple (name, new_name) is used when two modules have functions with the same name
+"""
+_REQUEST_FUNCTIONS = [
+    ('msg_acs', ['get_acs']),
+    ('msg_ap_broadcastssid', ['get_broadcastssid', 'set_broadcastssid']),
+    ('msg_ap_ctsprotection_enabled', ['get_ctsprotection_enabled', 'set_ctsprotection_enabled']),
+    ('msg_ap_dtiminterval', ['get_ap_dtiminterval', 'set_ap_dtiminterval']),
+    ('msg_ap_frameburstenabled', ['get_ap_frameburstenabled', 'set_ap_frameburstenabled']),
+    ('msg_ap_guardinterval', ['get_ap_guardinterval', 'set_ap_guardinterval']),
+    ('msg_ap_in_range', ['get_ap_in_range']),
+    ('msg_ap_interferencemap', ['get_ap_interferenceMap']),
+    ('msg_ap_modes', ['get_ap_supported_intf_modes']),
+    ('msg_ap_rtsthreshold', ['get_ap_rtsthreshold', 'set_ap_rtsthreshold']),
+    ('msg_ap_ssid', ['get_ap_ssids']),
+    ('msg_association', ['get_association', 'set_event_association']),
+    ('msg_batch', ['send_msg_batch']),
+    ('msg_beacon_interval', ['get_beacon_interval', 'set_beacon_interval']),
+    ('msg_bitrates', ['get_tx_bitrates', 'get_tx_bitrate', 'set_tx_bitrate', 'set_mcs_indexes']),
+    ('msg_bye', ['send_msg_bye']),
+    ('msg_changed_ap', ['changed_ap']),
+    ('msg_channelinfo', ['get_channelinfo']),
+    ('msg_channels', ['get_channels', 'get_currentchannel', 'set_currentchannel']),
+    ('msg_enabled', ['is_802_11e_enabled', 'is_fastbsstransition_compatible']),
+    ('msg_frequency', ['get_frequency', ('set_currentchannel', 'set_frequency')]),
+    ('msg_handle_snr', ['set_snr_threshold']),
+    ('msg_hello', ['send_msg_hello']),
+    ('msg_hostapd_conf', ['get_hostapd_conf', 'set_hostapd_conf']),
+    ('msg_interfaces', ['get_one_intf', 'get_interfaces']),
+    ('msg_mean_sta_stats', ['send_msg_mean_sta_statistics',
+                            'send_msg_mean_sta_statistics_interface_add',
+                            'send_msg_mean_sta_statistics_interface_remove',
+                            'send_msg_mean_sta_statistics_alpha',
+                            'send_msg_mean_sta_statistics_time']),
+    ('msg_memcpu', ['get_memory_usage', 'get_cpu_usage']),
+    ('msg_metric', ['set_metric']),
+    ('msg_mtu_qlen', ['set_mtu', 'set_txqueuelen']),
+    ('msg_ping', ['send_msg_ping']),
+    ('msg_powersave', ['get_powersave_mode', 'set_powersave_mode']),
+    ('msg_preamble', ['get_preamble', 'set_preamble']),
+    ('msg_radio_wlans', ['get_radio_wlans']),
+    ('msg_sent_received', ['send_msg_get_bytesreceived', 'send_msg_get_bytessent', 'send_msg_get_byteslost',
+                           'send_msg_get_packetsreceived', 'send_msg_get_packetssent',
+                           'send_msg_get_packetslost']),
+    ('msg_snr_power', ['get_snr', 'get_txpower', 'set_txpower']),
+    ('msg_ssid', ['get_ssid']),
+    ('msg_sta_link_information', ['get_sta_link_info']),
+    ('msg_sta_statistics', ['get_sta_statistics']),
+    ('msg_station_trigger_transition', ['station_trigger_transition']),
+    ('msg_statistics', ['send_msg_get_statistics']),
+    ('msg_tos', ['tos_cleanall', 'tos_add', 'tos_replace']),
+    ('msg_uptime', ['get_uptime']),
+    ('msg_wlan_info', ['req_wlan_info']),
+]
+
+
+def _make_async(func):
+    """ @return: a function with the same parameters as func, that runs func in the default executor """
+    def async_func(*args, **kwargs):
+        return default_executor.submit(func, *args, **kwargs)
+    async_func.__name__ = func.__name__
+    async_func.__doc__ = "asynchronous version of %s.%s (returns a Future)\n%s" % \
+        (func.__module__, func.__name__, func.__doc__ or '')
+    async_func.blocking = func
+    return async_func
+
+
+def _create_async_functions():
+    names = []
+    for module_name, functions in _REQUEST_FUNCTIONS:
+        module = import_module('pox.ethanol.ssl_message.' + module_name)
+        for name in functions:
+            name, new_name = name if isinstance(name, tuple) else (name, name)
+            globals()[new_name] = _make_async(getattr(module, name))
+            names.append(new_name)
+    return names
+
+
+__all__ = ['Future', 'Executor', 'TimeoutError', 'default_executor', 'set_max_concurrency',
+           'gather', 'run_all'] + _create_async_functions()
@@ -0,0 +1,174 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+  helpers to measure latencies:
+
+  * monotonic(): a clock that never goes back (python 2.7 does not have time.monotonic)
+
+  * LatencyHistogram: a HDR-like histogram (log-linear buckets) that records latencies
+    with constant memory and gives percentiles
+
+@author: Henrique Duarte Moura
+@organization: WINET/DCC/UFMG
+@copyright: h3dema (c) 2017
+@contact: henriquemoura@hotmail.com
+@licence: GNU General Public License v2.0
+(https://www.gnu.org/licenses/old-licenses/gpl-2.0.html)
+@since: July 2015
+@status: in development
+"""
+from threading import Lock
+
+try:
+    from time import monotonic
+except ImportError:
+    # python 2.7: use clock_gettime(CLOCK_MONOTONIC) from librt
+    import ctypes
+
+    class _timespec(ctypes.Structure):
+        _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+    CLOCK_MONOTONIC = 1  # see <linux/time.h>
+
+    try:
+        _clock_gettime = ctypes.CDLL('librt.so.1', use_errno=True).clock_gettime
+        _clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(_timespec)]
+
+        def monotonic():
+            """ @return: seconds (float) of a monotonic clock """
+            t = _timespec()
+            if _clock_gettime(CLOCK_MONOTONIC, ctypes.byref(t)) != 0:
+                errno = ctypes.get_errno()
+                raise OSError(errno, 'clock_gettime failed')
+            return t.tv_sec + t.tv_nsec * 1e-9
+    except (OSError, AttributeError):
+        # not linux: time.time() is the best we have
+        from time import time as monotonic
+
+
+SUB_BUCKET_BITS = 5
+""" each power of two is divided in 2 ** (SUB_BUCKET_BITS - 1) buckets (precision ~ 3%)"""
+
+
+def _bucket_index(v):
+    """ @param v: value (integer >= 0)
+        @return: index of the bucket of v
+    """
+    if v < (1 << SUB_BUCKET_BITS):
+        return v
+    e = v.bit_length() - SUB_BUCKET_BITS
+    return (e << (SUB_BUCKET_BITS - 1)) + (v >> e)
+
+
+def _bucket_value(idx):
+    """ @return: value that represents bucket idx (the middle of the bucket) """
+    if idx < (1 << SUB_BUCKET_BITS):
+        return idx
+    e = (idx >> (SUB_BUCKET_BITS - 1)) - 1
+    m = idx - (e << (SUB_BUCKET_BITS - 1))
+    return (m << e) + ((1 << e) >> 1)
+
+
+class LatencyHistogram(object):
+    """ records latencies (in seconds) with microsecond resolution.
+        the buckets grow exponentially, so the memory does not depend on the number of samples
+    """
+
+    def __init__(self, name=None):
+        """
+          @param name: identifies the histogram (used in as_dict())
+        """
+        self.name = name
+        self.__lock = Lock()
+        self.reset()
+
+    def reset(self):
+        """ discards all samples """
+        self.__counts = {}  # bucket index --> number of samples
+        self.__count = 0
+        self.__sum = 0
+        self.__min = None
+        self.__max = None
+
+    def record(self, seconds):
+        """ inserts a sample
+            @param seconds: latency in seconds
+        """
+        v = int(seconds * 1000000) if seconds > 0 else 0
+        idx = _bucket_index(v)
+        with self.__lock:
+            self.__counts[idx] = self.__counts.get(idx, 0) + 1
+            self.__count += 1
+            self.__sum += v
+            if self.__min is None or v < self.__min:
+                self.__min = v
+            if self.__max is None or v > self.__max:
+                self.__max = v
+
+    def merge(self, other):
+        """ adds the samples of other (a LatencyHistogram) to this histogram """
+        counts, count, total, vmin, vmax = other.__state()
+        with self.__lock:
+            for idx, n in counts.items():
+                self.__counts[idx] = self.__counts.get(idx, 0) + n
+            self.__count += count
+            self.__sum += total
+            if vmin is not None and (self.__min is None or vmin < self.__min):
+                self.__min = vmin
+            if vmax is not None and (self.__max is None or vmax > self.__max):
+                self.__max = vmax
+
+    def __state(self):
+        with self.__lock:
+            return dict(self.__counts), self.__count, self.__sum, self.__min, self.__max
+
+    @property
+    def count(self):
+        """ number of samples """
+        return self.__count
+
+    def mean(self):
+        """ @return: mean latency in seconds (0 if there are no samples) """
+        with self.__lock:
+            return self.__sum / 1000000.0 / self.__count if self.__count > 0 else 0.0
+
+    def percentiles(self, ps=(50, 90, 99, 99.9)):
+        """ @param ps: list of percentiles (0..100)
+            @return: dictionary percentile --> latency in seconds
+        """
+        counts, count, _, vmin, vmax = self.__state()
+        result = {}
+        if count == 0:
+            for p in ps:
+                result[p] = 0.0
+            return result
+        buckets = sorted(counts.items())
+        for p in ps:
+            rank = max(1, int(round(p / 100.0 * count)))
+            seen = 0
+            value = vmax
+            for idx, n in buckets:
+                seen += n
+                if seen >= rank:
+                    value = min(max(_bucket_value(idx), vmin), vmax)
+                    break
+            result[p] = value / 1000000.0
+        return result
+
+    def percentile(self, p):
+        """ @return: the p-th percentile in seconds """
+        return self.percentiles((p,))[p]
+
+    def as_dict(self):
+        """ @return: a summary of the histogram (values in seconds) """
+        counts, count, _, vmin, vmax = self.__state()
+        d = {'count': count,
+             'mean': self.mean(),
+             'min': (vmin or 0) / 1000000.0,
+             'max': (vmax or 0) / 1000000.0,
+             }
+        for p, v in self.percentiles().items():
+            d['p%s' % p] = v
+        if self.name is not None:
+            d['name'] = self.name
+        return d
@@ -46,7 +46,7 @@ msg_acs = Struct('msg_ap_in_range',
 ACS_SCALE_FACTOR = 1000000000000000000.0
 
 
-def get_acs(server, id=0, intf_name=None, sta_ip=None, sta_port=0, num_tests=1):
+def get_acs(server, id=0, intf_name=None, sta_ip=None, sta_port=0, num_tests=1, as_array=False):
     """ request the ap to provide ACS information
         @param server: tuple (ip, port_num)
         @param id: message id
@@ -56,6 +56,8 @@ def get_acs(server, id=0, intf_name=None, sta_ip=None, sta_port=0, num_tests=1):
         @param sta_port: socket port of the station
         @param num_tests: number of tests (greater than or equal to 1) that should be executed
         @param num_tests: int
+        @param as_array: if True, acs is a numpy structured array with the fields 'freq' and 'factor' (requires numpy)
+        @type as_array: bool
 
         @return msg: received message
         @return num_chan: number of channels scanned by the device
@@ -84,7 +86,19 @@ def get_acs(server, id=0, intf_name=None, sta_ip=None, sta_port=0, num_tests=1):
         factor=[],  # field will be filled by the AP
     )
 
-    error, msg = send_and_receive_msg(server, msg_struct, msg_acs.build, msg_acs.parse)
+    parser = msg_acs.parse
+    if as_array:
+        from pox.ethanol.ssl_message.msg_codec import array_parser
+        parser = array_parser(msg_acs)
+    error, msg = send_and_receive_msg(server, msg_struct, msg_acs.build, parser)
+
+    if as_array:
+        import numpy as np
+        acs = np.empty(0 if error else len(msg['freq']), dtype=[('freq', '<i4'), ('factor', '<f8')])
+        if not error:
+            acs['freq'] = msg['freq']
+            acs['factor'] = msg['factor'] / ACS_SCALE_FACTOR
+        return msg, 0 if error else msg['num_chan'], acs
 
     acs = {}
     if not error:
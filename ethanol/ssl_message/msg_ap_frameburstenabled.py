@@ -108,5 +108,5 @@ def set_ap_frameburstenabled(server, id=0, intf_name=None, enabled=False):
         intf_name=intf_name,
         enabled=enabled,
     )
-    error, msg = send_and_receive_msg(server, msg_struct, msg_ap_frameburstenabled.build,
-                                      msg_ap_frameburstenabled.parse, only_send=True)
+    send_and_receive_msg(server, msg_struct, msg_ap_frameburstenabled.build,
+                         msg_ap_frameburstenabled.parse, only_send=True)
@@ -9,7 +9,7 @@
 
   * get_association()
 
-  * register_functions() used in VAP
+  * register_functions() and unregister_functions() used in VAP
 
   * set_event_association()
 
@@ -26,6 +26,8 @@
 
 @requires: construct 2.5.2
 """
+import struct
+
 from construct import SLInt8, SLInt32, ULInt64, CString
 from construct import Embed, Struct, Container
 from construct import If
@@ -33,6 +35,10 @@ from construct import If
 from pox.ethanol.ssl_message.msg_core import msg_default
 from pox.ethanol.ssl_message.msg_common import MSG_TYPE, VERSION, tri_boolean
 from pox.ethanol.ssl_message.msg_common import send_and_receive_msg, len_of_string
+from pox.ethanol.ssl_message.latency import monotonic
+from pox.ethanol.ethanol.index import mac_key
+from pox.ethanol.ethanol.registry import Registry
+from pox.ethanol.ethanol.bus import BusEvents, ASSOCIATION
 
 field_mac_ap = Struct('mac_ap',
                       SLInt32('mac_ap_size'),
@@ -57,6 +63,13 @@ msg_association = Struct('msg_association',
 """ all association message types are the same, and use msg_association struct to send information
 """
 
+events_association = BusEvents(ASSOCIATION, key=lambda **kw: mac_key(kw.get('mac_sta')))
+""" the decided association messages are published in this event (after the reply is built)
+    your function must use 'def my_funct(**kwargs)' signature for compatibility
+    we send the parameters: m_type, mac_ap, mac_sta, allowed, fromaddr
+    the functions are called by the threads of the event bus (see ethanol/bus.py)
+"""
+
 
 def get_association(server, id=0, association_type=None, mac_sta=None, mac_ap=None):
     """ only for tests. the controller don't use this!!!
@@ -89,7 +102,7 @@ def get_association(server, id=0, association_type=None, mac_sta=None, mac_ap=No
     maps the AP's MAC to the VAP object
     all VAPs must implement those functions
 """
-registered_functions = {}
+registered_functions = Registry('association', key=mac_key)
 
 
 def register_functions(mac, vap):
@@ -97,42 +110,42 @@ def register_functions(mac, vap):
         process_association will call the object's methods to deal with each one of the association steps
     """
     # print "inside register_functions"
-    registered_functions[mac] = vap
+    from pox.ethanol.ethanol.admission import admission
+    registered_functions.add(mac, vap)
+    admission.add_vap(mac, vap)
+
+
+def unregister_functions(mac, vap=None):
+    """ removes the VAP registered with register_functions() (e.g. the AP disconnected)
+        @param vap: if not None, removes only if mac is registered to this object
+    """
+    from pox.ethanol.ethanol.admission import admission
+    if registered_functions.remove(mac, vap) is not None:
+        admission.remove_vap(mac)
+
+
+_reply_fields = struct.Struct('<bi')
+""" fields allowed (SLInt8) and response (SLInt32) at the end of msg_association"""
 
 
 #
 # returns the message to the ssl server process
 #
 def process_association(received_msg, fromaddr):
-    msg = msg_association.parse(received_msg)
-    mac_ap = msg['mac_ap']
-    if mac_ap in registered_functions:
-        vap = register_functions[mac_ap]
-        m_type = msg['m_type']
-        mac_sta = msg['mac_sta']
-        response = 0  # default value is accepted
-        if m_type == MSG_TYPE.MSG_ASSOCIATION:
-            enabled = vap.evUserAssociating(mac_sta)
-            response = 1 if enabled else 0
-        elif m_type == MSG_TYPE.MSG_DISASSOCIATION:
-            enabled = vap.evUserDisassociating(mac_sta)
-            response = 1 if enabled else 0
-        elif m_type == MSG_TYPE.MSG_REASSOCIATION:
-            enabled = vap.evUserReassociating(mac_sta)
-            response = 1 if enabled else 0
-        elif m_type == MSG_TYPE.MSG_AUTHORIZATION:
-            enabled = vap.evUserAuthenticating(mac_sta)
-            response = 1 if enabled else 0
-        elif m_type == MSG_TYPE.MSG_USER_DISCONNECTING:
-            enabled = vap.evUserDisconnecting(mac_sta)
-        elif m_type == MSG_TYPE.MSG_USER_CONNECTING:
-            enabled = vap.evUserConnecting(mac_sta)
-    else:
-        # default is to return true
-        enabled = True
-    msg['allowed'] = enabled
-    msg['response'] = response
-    return received_msg
+    """ decides the association message using the admission control (see admission.py)
+        the reply is the received message with the fields allowed and response changed
+        (they are the last 5 bytes of msg_association, so the reply is built in place)
+    """
+    from pox.ethanol.ssl_message.msg_codec import fast
+    from pox.ethanol.ethanol.admission import admission
+    t0 = monotonic()
+    msg = fast(msg_association.parse)(received_msg)
+    allowed, response = admission.decide(msg['m_type'], msg['mac_ap'], msg['mac_sta'])
+    reply = received_msg[:-_reply_fields.size] + _reply_fields.pack(1 if allowed else 0, response)
+    admission.reply_latency.record(monotonic() - t0)
+    events_association.on_change(m_type=msg['m_type'], mac_ap=msg['mac_ap'], mac_sta=msg['mac_sta'],
+                                 allowed=allowed, fromaddr=fromaddr)
+    return reply
 
 
 EVENT_MSG_ASSOCIATION = 1 << 0
@@ -167,7 +180,7 @@ def set_event_association(server, id=0, mac_sta=None, events=[], action=True):
         events_to_change=events_to_change,
         action=action,
     )
-    error, msg = send_and_receive_msg(server, msg_struct,
-                                      msg_event_association.build,
-                                      msg_event_association.parse,
-                                      only_send=True)
+    send_and_receive_msg(server, msg_struct,
+                         msg_event_association.build,
+                         msg_event_association.parse,
+                         only_send=True)
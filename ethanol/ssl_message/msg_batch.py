@@ -0,0 +1,358 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+  MSG_BATCH: an envelope that carries many messages (sub-requests) in a single round trip.
+  The device processes the sub-requests in order and answers with a MSG_BATCH carrying the
+  sub-replies in the same order (an empty sub-reply for the messages that have no reply).
+
+  Batch collects the requests made by the usual functions (get_*, send_msg_*, or the properties
+  of the Device/AP objects) and sends them at once:
+
+  >>> with station.batch() as b:
+  ...     rx = b.bytesReceived
+  ...     tx = b.bytesSent
+  >>> print rx.result(), tx.result()
+
+  the calls are executed (in threads) when the block finishes, and their requests are sent in one
+  MSG_BATCH per device. If a device does not support MSG_BATCH (it returns an error or closes the
+  connection), the requests are sent one by one and the device is not asked again.
+
+@author: Henrique Duarte Moura
+@organization: WINET/DCC/UFMG
+@copyright: h3dema (c) 2017
+@contact: henriquemoura@hotmail.com
+@licence: GNU General Public License v2.0
+(https://www.gnu.org/licenses/old-licenses/gpl-2.0.html)
+@since: July 2015
+@status: in development
+
+@requires: construct 2.5.2
+"""
+import sys
+from threading import Lock, Condition, Event
+
+from construct import SLInt32, String
+from construct import Embed, Struct, Container, Array
+# from construct.debug import Probe
+
+from pox.ethanol.ssl_message.msg_core import msg_default
+from pox.ethanol.ssl_message.msg_common import MSG_TYPE, VERSION
+from pox.ethanol.ssl_message.msg_common import is_error_msg, len_of_string
+from pox.ethanol.ssl_message.msg_common import get_transport, set_thread_transport
+from pox.ethanol.ssl_message.msg_framing import MAX_MSG_SIZE, set_msg_size
+from pox.ethanol.ssl_message.msg_log import log
+
+USE_BATCH_MESSAGES = True
+""" if False, Batch sends the requests one by one (same results, one round trip per request)"""
+
+MAX_BATCH_MSGS = 64
+""" maximum number of sub-requests in one MSG_BATCH"""
+
+BATCH_TIMEOUT = 10.0
+""" seconds to wait for the reply of a MSG_BATCH (an agent that does not know the message may not answer it)"""
+
+BATCH_WORKERS = 64
+""" threads that run the calls of the Batch objects (see Batch.flush)"""
+
+batch_item = Struct('batch_item',
+                    SLInt32('size'),
+                    String('data', lambda ctx: ctx.size),
+                    )
+""" one sub-request (or sub-reply): a complete ethanol message"""
+
+msg_batch = Struct('msg_batch',
+                   Embed(msg_default),  # default fields
+                   SLInt32('num_msgs'),
+                   Array(lambda ctx: ctx.num_msgs, batch_item),
+                   # Probe(),
+                   )
+""" batch message data structure (used in the request and in the reply)
+"""
+
+_unsupported = set()
+""" devices (ip, port) that did not answer a MSG_BATCH correctly (error, no reply or connection closed)"""
+
+_unsupported_lock = Lock()
+
+_executor = None
+_executor_lock = Lock()
+
+
+def _calls_executor():
+    """ @return: the executor of the calls of the batches (it is not aio.default_executor, that sends the
+                 batches: a call waiting for its reply must not hold the thread needed to send it)
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            from pox.ethanol.ssl_message.aio import Executor
+            _executor = Executor(BATCH_WORKERS)
+        return _executor
+
+
+def send_msg_batch(server, id=0, msgs=None, timeout=None):
+    """ sends many messages to the device in one round trip
+
+      @param server: tuple (ip, port_num)
+      @param id: message id
+      @param msgs: list of binary messages (built by construct)
+      @param timeout: seconds to wait for the reply (default: BATCH_TIMEOUT)
+
+      @return: error - True if the device did not process the batch
+               replies - list with the binary replies, in the same order of msgs ('' if a message has no reply).
+                         None if the device did not answer
+    """
+    msgs = [set_msg_size(m) for m in msgs or []]
+    msg_struct = Container(m_type=MSG_TYPE.MSG_BATCH,
+                           m_id=id,
+                           p_version_length=len_of_string(VERSION),
+                           p_version=VERSION,
+                           m_size=0,
+                           num_msgs=len(msgs),
+                           batch_item=[Container(size=len(m), data=m) for m in msgs],
+                           )
+    from pox.ethanol.ssl_message.msg_codec import fast
+    received_msg = get_transport().request(server, fast(msg_batch.build)(msg_struct),
+                                            timeout=BATCH_TIMEOUT if timeout is None else timeout)
+    if received_msg is None or received_msg == '':
+        return True, None
+    if is_error_msg(received_msg):
+        return True, []
+    msg = fast(msg_batch.parse)(received_msg)
+    if msg['num_msgs'] != len(msgs):
+        return True, []
+    return False, [item['data'] for item in msg['batch_item']]
+
+
+def process_msg_batch(received_msg, fromaddr):
+    """ processes each sub-request with msg_server.process_msg() and returns the sub-replies in a MSG_BATCH
+    """
+    # import placed here to avoid 'import loop'
+    from pox.ethanol.ssl_message.msg_server import process_msg
+
+    msg = msg_batch.parse(received_msg)
+    replies = []
+    for item in msg['batch_item']:
+        try:
+            reply = process_msg(item['data'], fromaddr)
+        except Exception as e:
+            log.error("Error processing message in batch from %s: %s", fromaddr, e)
+            reply = None
+        replies.append('' if reply is None else set_msg_size(reply))
+    result = Container(m_type=MSG_TYPE.MSG_BATCH,
+                       m_id=msg['m_id'],
+                       p_version_length=len_of_string(VERSION),
+                       p_version=VERSION,
+                       m_size=0,
+                       num_msgs=len(replies),
+                       batch_item=[Container(size=len(r), data=r) for r in replies],
+                       )
+    return msg_batch.build(result)
+
+
+def batch_supported(server):
+    """ @return: False if the device already refused a MSG_BATCH """
+    return USE_BATCH_MESSAGES and tuple(server) not in _unsupported
+
+
+def _chunks(msgs):
+    """ splits msgs so that each MSG_BATCH has at most MAX_BATCH_MSGS messages and MAX_MSG_SIZE bytes """
+    chunk, size = [], 0
+    for m in msgs:
+        if chunk and (len(chunk) == MAX_BATCH_MSGS or size + len(m) + 64 > MAX_MSG_SIZE):
+            yield chunk
+            chunk, size = [], 0
+        chunk.append(m)
+        size += len(m) + 4
+    if chunk:
+        yield chunk
+
+
+def request_all(server, msgs, only_send=None):
+    """ sends msgs to server, using MSG_BATCH if the device supports it
+
+        @param server: tuple (ip, port)
+        @param msgs: list of binary messages
+        @param only_send: list of bool (one per message): the message has no reply
+        @return: list of binary replies (None if the message failed, '' if only_send),
+                 in the same order of msgs, and the number of round trips
+    """
+    from pox.ethanol.ssl_message.msg_common import next_msg_id
+
+    server = tuple(server)
+    if only_send is None:
+        only_send = [False] * len(msgs)
+    transport = get_transport()
+    replies = []
+    round_trips = 0
+    if len(msgs) > 1 and batch_supported(server):
+        for chunk in _chunks(msgs):
+            error, r = send_msg_batch(server, id=next_msg_id(), msgs=chunk)
+            if error:
+                # an error, no reply in BATCH_TIMEOUT or a closed connection: the device does not know MSG_BATCH
+                log.info("%s:%d does not support MSG_BATCH. Sending the messages one by one",
+                         server[0], server[1])
+                with _unsupported_lock:
+                    _unsupported.add(server)
+                break
+            replies.extend(r)
+            round_trips += 1
+    # the messages that were not sent in a batch are sent one by one
+    for i in range(len(replies), len(msgs)):
+        replies.append(transport.request(server, msgs[i], only_send=only_send[i]))
+        round_trips += 1
+    return replies, round_trips
+
+
+class _Request(object):
+    """ a request made by one of the calls of the batch, waiting to be sent """
+
+    def __init__(self, server, msg, only_send):
+        self.server = tuple(server)
+        self.msg = msg
+        self.only_send = only_send
+        self.reply = None
+        self.event = Event()
+
+
+class _BatchTransport(object):
+    """ transport used by the threads of a Batch: the requests are queued instead of being sent """
+
+    def __init__(self, batch):
+        self.__batch = batch
+
+    def request(self, server, msg, only_send=False, timeout=None):
+        return self.__batch._wait_reply(_Request(server, msg, only_send))
+
+
+class Batch(object):
+    """ gathers requests and sends them in one MSG_BATCH per device.
+
+        submit(func, *args, **kwargs) schedules a call of any function that sends messages,
+        if the Batch was created with an object (Device, AP, Radio, ...),
+        batch.<property> reads the property and batch.<method>(...) calls the method of this object.
+        all of them return a Future (see aio.py): the result is available after flush()
+        (called at the end of the with block).
+    """
+
+    def __init__(self, obj=None):
+        """
+          @param obj: object whose properties and methods are called through this batch
+        """
+        self.__obj = obj
+        self.__calls = []
+        self.__cond = Condition(Lock())
+        self.__pending = []  # _Request not sent yet
+        self.__queued = 0  # calls waiting for a thread of the executor
+        self.__running = 0  # calls that started and are neither finished nor waiting for a reply
+        self.round_trips = 0
+        """ number of messages sent to the devices by flush() """
+
+    def submit(self, func, *args, **kwargs):
+        """ schedules func(*args, **kwargs)
+            @return: Future with the value returned by func
+        """
+        from pox.ethanol.ssl_message.aio import Future
+        future = Future()
+        self.__calls.append((future, func, args, kwargs))
+        return future
+
+    def __getattr__(self, name):
+        if name.startswith('_') or self.__obj is None:
+            raise AttributeError(name)
+        obj = self.__obj
+        attr = getattr(type(obj), name, None)
+        if isinstance(attr, property):
+            return self.submit(getattr, obj, name)
+        method = getattr(obj, name)
+        if not callable(method):
+            raise AttributeError(name)
+
+        def call_method(*args, **kwargs):
+            return self.submit(method, *args, **kwargs)
+        return call_method
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.flush()
+        return False
+
+    def _wait_reply(self, request):
+        """ called by the threads of the calls: queues the request and waits for the reply """
+        with self.__cond:
+            self.__pending.append(request)
+            if request.only_send:
+                self.__cond.notify_all()
+                return ''
+            self.__running -= 1
+            self.__cond.notify_all()
+        request.event.wait()
+        return request.reply
+
+    def __run(self, future, func, args, kwargs):
+        with self.__cond:
+            self.__queued -= 1
+            self.__running += 1
+        set_thread_transport(_BatchTransport(self))
+        try:
+            future.set_result(func(*args, **kwargs))
+        except Exception:
+            future.set_exception(sys.exc_info())
+        finally:
+            set_thread_transport(None)
+            with self.__cond:
+                self.__running -= 1
+                self.__cond.notify_all()
+
+    def __send(self, requests):
+        """ sends the requests, one MSG_BATCH per device (the devices are called in parallel) """
+        from pox.ethanol.ssl_message.aio import default_executor
+        by_server = {}
+        for r in requests:
+            by_server.setdefault(r.server, []).append(r)
+        futures = []
+        for server, reqs in by_server.items():
+            futures.append((reqs, default_executor.submit(request_all, server,
+                                                          [r.msg for r in reqs], [r.only_send for r in reqs])))
+        for reqs, future in futures:
+            try:
+                replies, n = future.result()
+            except Exception as e:
+                log.error("Error sending batch: %s", e)
+                replies, n = [None] * len(reqs), 0
+            self.round_trips += n
+            for r, reply in zip(reqs, replies):
+                r.reply = reply
+
+    def flush(self):
+        """ executes the calls submitted. their requests are sent in batches
+            (one batch per round: a call that makes many requests in sequence takes many rounds).
+            the calls run in the threads of a bounded executor (BATCH_WORKERS): if there are more calls,
+            a round is sent when all the threads are waiting for replies
+        """
+        calls, self.__calls = self.__calls, []
+        if len(calls) == 0:
+            return
+        with self.__cond:
+            self.__queued = len(calls)
+            self.__running = 0
+        executor = _calls_executor()
+        for future, func, args, kwargs in calls:
+            executor.submit(self.__run, future, func, args, kwargs)
+        while True:
+            with self.__cond:
+                # waits until no call can make a new request without the replies of the pending ones
+                while self.__running > 0 or (self.__queued > 0 and len(self.__pending) == 0):
+                    self.__cond.wait()
+                requests, self.__pending = self.__pending, []
+            if len(requests) == 0:
+                break
+            self.__send(requests)
+            with self.__cond:
+                for r in requests:
+                    if not r.only_send:
+                        self.__running += 1
+                        r.event.set()
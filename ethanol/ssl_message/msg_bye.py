@@ -22,12 +22,13 @@ from pox.ethanol.ssl_message.msg_core import msg_default
 from pox.ethanol.ssl_message.msg_common import MSG_TYPE, VERSION
 from pox.ethanol.ssl_message.msg_common import send_and_receive_msg, len_of_string
 
-from pox.ethanol.events import Events
+from pox.ethanol.ethanol.bus import BusEvents, BYE
 
-events_bye = Events()
+events_bye = BusEvents(BYE, key=lambda **kw: kw['fromaddr'][0])
 """to handle a receiving bye messages, just add your function to events_bye
    your function must use 'def my_funct(**kwargs)' signature for compatibility
    @change: we send to parameters: msg, fromaddr
+   @change: the functions are called by the threads of the event bus (see ethanol/bus.py)
 """
 
 msg_bye = Struct('msg_bye',
@@ -56,9 +57,7 @@ def send_msg_bye(server, id=0, tcp_port=None):
         m_size=0,
         tcp_port=tcp_port,
     )
-    error, msg = send_and_receive_msg(server, msg_struct, msg_bye.build, msg_bye.parse, only_send=True)
-
-    return msg
+    send_and_receive_msg(server, msg_struct, msg_bye.build, msg_bye.parse, only_send=True)
 
 
 def process_bye(received_msg, fromaddr):
@@ -73,7 +73,7 @@ def changed_ap(server, id=0, status=0, current_ap=None, intf_name=None):
         current_ap=current_ap,
         status=status,
     )
-    error, msg = send_and_receive_msg(server, msg_struct, msg_changed_ap.build, msg_changed_ap.parse, only_send=True)
+    send_and_receive_msg(server, msg_struct, msg_changed_ap.build, msg_changed_ap.parse, only_send=True)
 
 
 def process_hello(received_msg, fromaddr):
@@ -51,7 +51,7 @@ msg_channelinfo = Struct('msg_channelinfo',
                          )
 
 
-def get_channelinfo(server, id=0, intf_name=None, channel=0, only_channel_in_use=False):
+def get_channelinfo(server, id=0, intf_name=None, channel=0, only_channel_in_use=False, as_array=False):
     """ get the channels the interface inff_name supports, this function applies to access points
 
       @param server: tuple (ip, port_num)
@@ -62,6 +62,10 @@ def get_channelinfo(server, id=0, intf_name=None, channel=0, only_channel_in_use
       @type channel: int
       @param only_channel_in_use: return only the channel in use
       @type only_channel_in_use: bool
+      @param as_array: return the channels as a numpy structured array with the fields of channel_info
+                       (in_use is not converted to bool). The array is decoded without copying the message.
+                       Requires numpy
+      @type as_array: bool
 
       @return: msg - received message
        a list
@@ -80,11 +84,23 @@ def get_channelinfo(server, id=0, intf_name=None, channel=0, only_channel_in_use
                            num_freqs=0,  # don´t know how many bands are in the AP
                            channel_info=[],  # field will be filled by the AP
                            )
-    error, msg = send_and_receive_msg(server, msg_struct, msg_channelinfo.build, msg_channelinfo.parse)
+    parser = msg_channelinfo.parse
+    if as_array:
+        from pox.ethanol.ssl_message.msg_codec import array_parser
+        parser = array_parser(msg_channelinfo)
+    error, msg = send_and_receive_msg(server, msg_struct, msg_channelinfo.build, parser)
     # print msg
     if error:
         return msg, []
 
+    if as_array:
+        value = msg['channel_info']
+        if only_channel_in_use and len(value) > 0:
+            in_use = value[value['in_use'] == 1][:1]
+            if len(in_use) > 0:
+                value = in_use
+        return msg, value
+
     value = msg['channel_info'] if 'channel_info' in msg else []
     if (value != []) and only_channel_in_use:
         for i in range(len(value)):
@@ -0,0 +1,639 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+  compiles the construct Structs used by the ethanol messages into python functions that use struct.Struct.
+
+  construct interprets the Struct tree field by field. Here, each Struct is translated (once) into the source code
+  of a decoder and an encoder:
+
+  * consecutive numeric fields (SLInt32, SLInt64, LFloat32, ...) are read/written with a single struct.Struct
+  * the pattern used by msg_core.field_* (a SLInt32 with the length, followed by If(length > 0, CString)) is
+    read with str.index('\\x00')
+  * arrays of numbers are read with one struct call, arrays of fixed size records with one struct.Struct per record
+
+  the lambdas used by If() and Array() are not parsed: they are called with a fake context to find out
+  which field they read (see _probe_key).
+  A Struct with something that is not supported is not compiled (get_codec returns None), and
+  each compiled codec is checked against construct (same bytes when building, same Container when parsing)
+  before being used.
+  If the compiled codec fails with a message, the message is processed by construct (so the errors
+  are the same as before).
+
+  send_and_receive_msg() uses the compiled codecs by default. To disable: msg_codec.USE_COMPILED_CODECS = False
+
+  array_parser(struct) returns a decoder (optional, requires numpy) that gives the arrays of the message
+  as numpy arrays: arrays of fixed size records are mapped with np.frombuffer (no copy) to structured arrays,
+  e.g. msg_channelinfo and msg_mean_statistics. It is used by the as_array=True option of the get_ functions.
+
+@author: Henrique Duarte Moura
+@organization: WINET/DCC/UFMG
+@copyright: h3dema (c) 2017
+@contact: henriquemoura@hotmail.com
+@licence: GNU General Public License v2.0
+(https://www.gnu.org/licenses/old-licenses/gpl-2.0.html)
+@since: July 2015
+@status: in development
+
+@requires: construct 2.5.2
+"""
+import struct
+import random
+from itertools import izip
+from threading import Lock
+
+from construct import Struct, FormatField, Switch, MetaArray, Value
+from construct.core import Reconfig
+from construct.adapters import CStringAdapter
+from construct.lib import Container, ListContainer
+
+from pox.ethanol.ssl_message.msg_log import log
+
+try:
+    import numpy as np
+except ImportError:
+    np = None  # numpy is optional: only Codec.parse_arrays() needs it
+
+USE_COMPILED_CODECS = True
+""" if False, send_and_receive_msg() uses construct to build and parse the messages"""
+
+NUM_VERIFICATION_SAMPLES = 16
+""" number of random messages used to compare a compiled codec with construct"""
+
+_INT_RANGES = {'b': (-2 ** 7, 2 ** 7 - 1), 'B': (0, 2 ** 8 - 1),
+               'h': (-2 ** 15, 2 ** 15 - 1), 'H': (0, 2 ** 16 - 1),
+               'i': (-2 ** 31, 2 ** 31 - 1), 'I': (0, 2 ** 32 - 1),
+               'l': (-2 ** 31, 2 ** 31 - 1), 'L': (0, 2 ** 32 - 1),
+               'q': (-2 ** 63, 2 ** 63 - 1), 'Q': (0, 2 ** 64 - 1),
+               }
+_FLOAT_CODES = 'fd'
+
+_NUMPY_CODES = {'b': 'i1', 'B': 'u1', 'h': 'i2', 'H': 'u2', 'i': 'i4', 'I': 'u4', 'l': 'i4', 'L': 'u4',
+                'q': 'i8', 'Q': 'u8', 'f': 'f4', 'd': 'f8'}
+_NUMPY_ENDIAN = {'<': '<', '>': '>', '!': '>', '=': '='}
+
+
+def _numpy_type(fmt):
+    """ @param fmt: tuple (endianity, code) of a FormatField
+        @return: the numpy type with the same size and byte order (e.g. '<i4')
+    """
+    return _NUMPY_ENDIAN[fmt[0]] + _NUMPY_CODES[fmt[1]]
+
+
+class UnsupportedConstruct(Exception):
+    """ the Struct uses something the compiler does not know """
+    pass
+
+
+class _Recorder(dict):
+    """ a fake context: records the keys read by a lambda """
+
+    def __init__(self, values=None, default=3):
+        dict.__init__(self, values or {})
+        self.keys_read = []
+        self.default = default
+
+    def __getitem__(self, key):
+        self.keys_read.append(key)
+        return dict.get(self, key, self.default)
+
+    def __getattr__(self, key):
+        if key.startswith('__'):
+            raise AttributeError(key)
+        return self[key]
+
+
+def _probe_key(func):
+    """ @return: the only key of the context read by func. raises UnsupportedConstruct if func reads other things """
+    ctx = _Recorder()
+    try:
+        func(ctx)
+    except Exception:
+        raise UnsupportedConstruct("cannot probe %r" % func)
+    keys = set(ctx.keys_read)
+    if len(keys) != 1 or '_' in keys:
+        raise UnsupportedConstruct("function reads %r" % keys)
+    return keys.pop()
+
+
+def _count_key(countfunc):
+    """ verifies that countfunc is lambda ctx: ctx[key] """
+    key = _probe_key(countfunc)
+    for n in (0, 1, 2, 7, 1000):
+        if countfunc(_Recorder({key: n})) != n:
+            raise UnsupportedConstruct("count is not ctx.%s" % key)
+    return key
+
+
+def _length_key(predicate):
+    """ verifies that predicate is lambda ctx: ctx[key] > 0 """
+    key = _probe_key(predicate)
+    for n in (-3, -1, 0, 1, 2, 64):
+        if bool(predicate(_Recorder({key: n}))) != (n > 0):
+            raise UnsupportedConstruct("predicate is not ctx.%s > 0" % key)
+    return key
+
+
+def _is_cstring(sc):
+    """ CString(name) is Rename(name, CStringAdapter(...)) """
+    return isinstance(sc, Reconfig) and isinstance(sc.subcon, CStringAdapter) and \
+        sc.subcon.terminators == '\x00' and sc.subcon.encoding is None
+
+
+def _format(sc):
+    """ @return: (endianity, code) of a FormatField """
+    fmt = sc.packer.format
+    if len(fmt) != 2 or fmt[0] not in '<>=!' or fmt[1] not in _FLOAT_CODES + ''.join(_INT_RANGES.keys()):
+        raise UnsupportedConstruct("format %r" % fmt)
+    return fmt[0], fmt[1]
+
+
+def _flatten(struct_con, nodes, names):
+    """ translates the subcons of struct_con to a list of nodes. embedded structs are inlined
+        @param names: names of the fields already defined (in order)
+    """
+    for sc in struct_con.subcons:
+        if sc.conflags & sc.FLAG_EMBED:
+            inner = sc.subcon if isinstance(sc, Reconfig) else sc
+            if not isinstance(inner, Struct):
+                raise UnsupportedConstruct("embedded %r" % sc)
+            _flatten(inner, nodes, names)
+            continue
+        name = sc.name
+        if name is None:
+            raise UnsupportedConstruct("field without a name")
+        if isinstance(sc, FormatField):
+            nodes.append(('fmt', name, _format(sc)))
+        elif isinstance(sc, Switch):
+            cases = sc.cases
+            if set(cases.keys()) != set([True, False]) or not _is_cstring(cases[True]) or \
+                    not isinstance(cases[False], Value):
+                raise UnsupportedConstruct("switch %s" % name)
+            key = _length_key(sc.keyfunc)
+            if key not in names:
+                raise UnsupportedConstruct("%s depends on %s" % (name, key))
+            try:
+                elsevalue = cases[False].func(Container())
+            except Exception:
+                raise UnsupportedConstruct("else value of %s" % name)
+            nodes.append(('cstr_if', name, (key, elsevalue)))
+        elif _is_cstring(sc):
+            nodes.append(('cstr', name, None))
+        elif isinstance(sc, MetaArray):
+            key = _count_key(sc.countfunc)
+            if key not in names:
+                raise UnsupportedConstruct("%s depends on %s" % (name, key))
+            sub = sc.subcon
+            if isinstance(sub, FormatField):
+                nodes.append(('array', name, (key, 'fmt', _format(sub))))
+            elif _is_cstring(sub):
+                nodes.append(('array', name, (key, 'cstr', None)))
+            elif isinstance(sub, Struct):
+                nodes.append(('array', name, (key, 'struct', CompiledStruct(sub))))
+            else:
+                raise UnsupportedConstruct("array of %r" % sub)
+        elif isinstance(sc, Struct):
+            nodes.append(('struct', name, CompiledStruct(sc)))
+        else:
+            raise UnsupportedConstruct("%r" % sc)
+        if name not in names:
+            names.append(name)
+
+
+def _new_container(keys, values):
+    """ creates a Container faster than Container(**kw) (keeps the order of the keys) """
+    c = Container()
+    dict.update(c, izip(keys, values))
+    object.__setattr__(c, '__keys_order__', list(keys))
+    return c
+
+
+class CompiledStruct(object):
+    """ the decoder and encoder generated for a construct Struct """
+
+    def __init__(self, struct_con):
+        """
+          @param struct_con: a construct Struct
+          raises UnsupportedConstruct if the Struct cannot be compiled
+        """
+        self.struct = struct_con
+        self.nodes = []
+        self.keys = []
+        _flatten(struct_con, self.nodes, self.keys)
+        self.keys = tuple(self.keys)
+        # a record has only numeric fields with the same endianity: can be read with one struct.Struct
+        endians = set(node[2][0] for node in self.nodes if node[0] == 'fmt')
+        self.record = None
+        if all(node[0] == 'fmt' for node in self.nodes) and len(endians) == 1 and \
+                len(set(node[1] for node in self.nodes)) == len(self.nodes):
+            self.record = struct.Struct(endians.pop() + ''.join(node[2][1] for node in self.nodes))
+        self.decode, self.encode = self.__generate()
+        self.__array_decode = None
+
+    @property
+    def dtype(self):
+        """ numpy dtype of a record (numeric fields only), or None """
+        if self.record is None or np is None:
+            return None
+        return np.dtype([(node[1], _numpy_type(node[2])) for node in self.nodes])
+
+    @property
+    def decode_arrays(self):
+        """ decoder that returns the arrays of numbers and of records as numpy arrays (see Codec.parse_arrays) """
+        if self.__array_decode is None:
+            if np is None:
+                raise ImportError("numpy is not installed")
+            self.__array_decode = self.__generate(as_array=True)[0]
+        return self.__array_decode
+
+    def __numpy_array(self, i, v, item, sub, ns, dec):
+        """ generates the code that reads an array as a numpy array (array node i of self.nodes)
+            @return: False if the array cannot be read as a numpy array
+        """
+        if item == 'fmt':
+            ns['T%d' % i] = np.dtype(_numpy_type(sub))
+            dec.append('    %s = _frombuffer(buf, T%d, n, pos)' % (v, i))
+            dec.append('    pos += n * %d' % ns['T%d' % i].itemsize)
+            return True
+        if item != 'struct':
+            return False
+        if sub.record is not None:
+            # fixed size records: the array points to buf (no copy)
+            ns['T%d' % i] = sub.dtype
+            dec.append('    %s = _frombuffer(buf, T%d, n, pos)' % (v, i))
+            dec.append('    pos += n * %d' % sub.record.size)
+            return True
+        if any(node[0] not in ('fmt', 'cstr_if', 'cstr') for node in sub.nodes) or \
+                len(set(node[1] for node in sub.nodes)) != len(sub.nodes):
+            return False
+        # records with strings: the numbers of all records are copied to one buffer, read by numpy at once,
+        # and the strings are stored in 'object' fields
+        keys = set(node[2][0] for node in sub.nodes if node[0] == 'cstr_if')
+        fields = []
+        numeric = []
+        loop = []
+        j = 0
+        while j < len(sub.nodes):
+            kind, name, arg = sub.nodes[j]
+            if kind == 'fmt':
+                k = j
+                while k < len(sub.nodes) and sub.nodes[k][0] == 'fmt':
+                    k += 1
+                run = sub.nodes[j:k]
+                size = sum(struct.calcsize(n[2][0] + n[2][1]) for n in run)
+                loop.append('        chunks.append(buf[pos:pos + %d])' % size)
+                offset = 0
+                for kind_, name_, arg_ in run:
+                    fields.append((name_, _numpy_type(arg_)))
+                    numeric.append(name_)
+                    if name_ in keys:
+                        ns['P%d_%s' % (i, name_)] = struct.Struct(arg_[0] + arg_[1])
+                        loop.append('        k_%s, = P%d_%s.unpack_from(buf, pos + %d)' % (name_, i, name_, offset))
+                    offset += struct.calcsize(arg_[0] + arg_[1])
+                loop.append('        pos += %d' % size)
+                j = k
+                continue
+            fields.append((name, 'O'))
+            if kind == 'cstr_if':
+                ns['E%d_%s' % (i, name)] = arg[1]
+                loop.append('        if k_%s > 0:' % arg[0])
+                loop.append('            end = buf.index("\\x00", pos)')
+                loop.append('            s_%s.append(buf[pos:end])' % name)
+                loop.append('            pos = end + 1')
+                loop.append('        else:')
+                loop.append('            s_%s.append(E%d_%s)' % (name, i, name))
+            else:
+                loop.append('        end = buf.index("\\x00", pos)')
+                loop.append('        s_%s.append(buf[pos:end])' % name)
+                loop.append('        pos = end + 1')
+            j += 1
+        ns['T%d' % i] = np.dtype(fields)
+        ns['N%d' % i] = np.dtype([f for f in fields if f[1] != 'O'])
+        strings = [f[0] for f in fields if f[1] == 'O']
+        dec.append('    chunks = []')
+        for name in strings:
+            dec.append('    s_%s = []' % name)
+        dec.append('    for _ in xrange(n):')
+        dec.extend(loop)
+        dec.append('    %s = _empty(n, T%d)' % (v, i))
+        if numeric:
+            dec.append('    if n > 0:')
+            dec.append('        num = _frombuffer("".join(chunks), N%d, n)' % i)
+            for name in numeric:
+                dec.append('        %s[%r] = num[%r]' % (v, name, name))
+        for name in strings:
+            dec.append('    %s[%r] = s_%s' % (v, name, name))
+        return True
+
+    def __generate(self, as_array=False):
+        """ @param as_array: the decoder returns the arrays as numpy arrays """
+        ns = {'_mk': _new_container, '_LC': ListContainer, '_getattr': getattr,
+              '_unpack_from': struct.unpack_from, '_pack': struct.pack, 'Struct': struct.Struct}
+        if as_array:
+            ns['_frombuffer'] = np.frombuffer
+            ns['_empty'] = np.empty
+        var = dict((name, 'v%d' % i) for i, name in enumerate(self.keys))
+        dec = ['def decode(buf, pos):']
+        enc = ['def encode(obj, out):']
+        i = 0
+        nodes = self.nodes
+        while i < len(nodes):
+            kind, name, arg = nodes[i]
+            v = var[name]
+            if kind == 'fmt':
+                # group the consecutive numeric fields
+                j = i
+                while j < len(nodes) and nodes[j][0] == 'fmt' and nodes[j][2][0] == arg[0]:
+                    j += 1
+                run = nodes[i:j]
+                s = 'S%d' % i
+                ns[s] = struct.Struct(arg[0] + ''.join(n[2][1] for n in run))
+                names = ', '.join(var[n[1]] for n in run)
+                dec.append('    %s, = %s.unpack_from(buf, pos)' % (names, s))
+                dec.append('    pos += %d' % ns[s].size)
+                for n in run:
+                    enc.append('    %s = _getattr(obj, %r)' % (var[n[1]], n[1]))
+                enc.append('    out.append(%s.pack(%s))' % (s, names))
+                i = j
+                continue
+            if kind == 'cstr_if':
+                key, elsevalue = arg
+                e = 'E%d' % i
+                ns[e] = elsevalue
+                dec.append('    if %s > 0:' % var[key])
+                dec.append('        end = buf.index("\\x00", pos)')
+                dec.append('        %s = buf[pos:end]' % v)
+                dec.append('        pos = end + 1')
+                dec.append('    else:')
+                dec.append('        %s = %s' % (v, e))
+                enc.append('    %s = _getattr(obj, %r)' % (v, name))
+                enc.append('    if %s > 0:' % var[key])
+                enc.append('        out.append(%s + "\\x00")' % v)
+            elif kind == 'cstr':
+                dec.append('    end = buf.index("\\x00", pos)')
+                dec.append('    %s = buf[pos:end]' % v)
+                dec.append('    pos = end + 1')
+                enc.append('    %s = _getattr(obj, %r)' % (v, name))
+                enc.append('    out.append(%s + "\\x00")' % v)
+            elif kind == 'array':
+                key, item, sub = arg
+                dec.append('    n = %s' % var[key])
+                dec.append('    if n < 0:')
+                dec.append('        raise ValueError("negative count")')
+                enc.append('    %s = _getattr(obj, %r)' % (v, name))
+                enc.append('    if len(%s) != %s:' % (v, var[key]))
+                enc.append('        raise ValueError("wrong number of items")')
+                if as_array and self.__numpy_array(i, v, item, sub, ns, dec):
+                    # the encoder does not change
+                    if item == 'fmt':
+                        ns['F%d' % i] = sub[0] + '%d' + sub[1]
+                        enc.append('    out.append(_pack(F%d %% len(%s), *%s))' % (i, v, v))
+                    else:
+                        ns['C%d' % i] = sub.encode
+                        enc.append('    for item in %s:' % v)
+                        enc.append('        C%d(item, out)' % i)
+                elif item == 'fmt':
+                    f = 'F%d' % i
+                    ns[f] = sub[0] + '%d' + sub[1]
+                    size = struct.calcsize(sub[0] + sub[1])
+                    dec.append('    %s = _LC(_unpack_from(%s %% n, buf, pos))' % (v, f))
+                    dec.append('    pos += n * %d' % size)
+                    enc.append('    out.append(_pack(%s %% len(%s), *%s))' % (f, v, v))
+                elif item == 'cstr':
+                    dec.append('    %s = _LC()' % v)
+                    dec.append('    for _ in xrange(n):')
+                    dec.append('        end = buf.index("\\x00", pos)')
+                    dec.append('        %s.append(buf[pos:end])' % v)
+                    dec.append('        pos = end + 1')
+                    enc.append('    for item in %s:' % v)
+                    enc.append('        out.append(item + "\\x00")')
+                else:
+                    d = 'D%d' % i
+                    ns[d] = sub.decode
+                    ns['C%d' % i] = sub.encode
+                    dec.append('    %s = _LC()' % v)
+                    if sub.record is not None:
+                        # fixed size records
+                        ns['R%d' % i] = sub.record
+                        ns['K%d' % i] = sub.keys
+                        dec.append('    for _ in xrange(n):')
+                        dec.append('        %s.append(_mk(K%d, R%d.unpack_from(buf, pos)))' % (v, i, i))
+                        dec.append('        pos += %d' % sub.record.size)
+                    else:
+                        dec.append('    for _ in xrange(n):')
+                        dec.append('        item, pos = %s(buf, pos)' % d)
+                        dec.append('        %s.append(item)' % v)
+                    enc.append('    for item in %s:' % v)
+                    enc.append('        C%d(item, out)' % i)
+            elif kind == 'struct':
+                ns['D%d' % i] = arg.decode
+                ns['C%d' % i] = arg.encode
+                dec.append('    %s, pos = D%d(buf, pos)' % (v, i))
+                enc.append('    %s = _getattr(obj, %r)' % (v, name))
+                enc.append('    C%d(%s, out)' % (i, v))
+            i += 1
+        ns['KEYS'] = self.keys
+        dec.append('    return _mk(KEYS, (%s,)), pos' % ', '.join(var[k] for k in self.keys))
+        enc.append('    return out')
+        source = '\n'.join(dec) + '\n\n' + '\n'.join(enc) + '\n'
+        if not as_array:
+            self.source = source
+        exec compile(source, '<codec %s>' % self.struct.name, 'exec') in ns
+        return ns['decode'], ns['encode']
+
+
+def make_sample(struct_con, seed=0, max_items=3):
+    """ creates a random Container that can be built by struct_con
+
+        @param struct_con: a construct Struct
+        @param seed: seed of the random numbers
+        @param max_items: maximum number of items of the arrays
+        @return: a Container
+    """
+    rnd = random.Random(seed)
+    return _sample(CompiledStruct(struct_con), rnd, max_items)
+
+
+def _random_value(code, rnd):
+    if code in _FLOAT_CODES:
+        return rnd.choice([0.0, 1.5, -2.25, 54.0, 1024.5])
+    lo, hi = _INT_RANGES[code]
+    return rnd.choice([lo, hi, 0, 1, rnd.randint(lo, hi)])
+
+
+def _random_string(rnd):
+    return ''.join(chr(rnd.randint(1, 255)) for _ in range(rnd.randint(0, 12)))
+
+
+def _sample(compiled, rnd, max_items):
+    obj = Container()
+    counts = {}  # arrays that use the same count
+    for kind, name, arg in compiled.nodes:
+        if kind == 'fmt':
+            obj[name] = _random_value(arg[1], rnd)
+        elif kind == 'cstr_if':
+            key, elsevalue = arg
+            if rnd.random() < 0.3:
+                obj[key] = 0
+                obj[name] = elsevalue
+            else:
+                obj[name] = _random_string(rnd)
+                obj[key] = len(obj[name]) + 1
+        elif kind == 'cstr':
+            obj[name] = _random_string(rnd)
+        elif kind == 'array':
+            key, item, sub = arg
+            n = counts.setdefault(key, rnd.randint(0, max_items))
+            obj[key] = n
+            if item == 'fmt':
+                obj[name] = [_random_value(sub[1], rnd) for _ in range(n)]
+            elif item == 'cstr':
+                obj[name] = [_random_string(rnd) for _ in range(n)]
+            else:
+                obj[name] = [_sample(sub, rnd, max_items) for _ in range(n)]
+        elif kind == 'struct':
+            obj[name] = _sample(arg, rnd, max_items)
+    return obj
+
+
+class Codec(object):
+    """ parse() and build() with the same results as the construct Struct, using the compiled functions.
+        if the compiled function fails, construct is used
+    """
+
+    def __init__(self, struct_con, compiled):
+        self.struct = struct_con
+        self.compiled = compiled
+        self.__decode = compiled.decode
+        self.__encode = compiled.encode
+
+    def parse(self, data):
+        try:
+            return self.__decode(data, 0)[0]
+        except Exception:
+            return self.struct.parse(data)
+
+    def build(self, obj):
+        try:
+            return ''.join(self.__encode(obj, []))
+        except Exception:
+            return self.struct.build(obj)
+
+    def parse_arrays(self, data):
+        """ like parse(), but the arrays of numbers are returned as numpy arrays,
+            and the arrays of records as numpy structured arrays (the strings are 'object' fields).
+            The arrays of fixed size records are not copied: they point to data.
+
+            @requires: numpy
+        """
+        decode = self.compiled.decode_arrays
+        try:
+            return decode(data, 0)[0]
+        except Exception:
+            self.struct.parse(data)  # raises the same error as construct
+            raise
+
+    def verify_arrays(self, num_samples=NUM_VERIFICATION_SAMPLES):
+        """ compares parse_arrays() with construct using random messages
+            @return: True if the values are the same
+        """
+        for seed in range(num_samples):
+            obj = _sample(self.compiled, random.Random(seed), max_items=3)
+            data = self.struct.build(obj)
+            if not _same_values(self.compiled.decode_arrays(data, 0)[0], self.struct.parse(data)):
+                return False
+        return True
+
+    def verify(self, num_samples=NUM_VERIFICATION_SAMPLES):
+        """ compares the compiled functions with construct using random messages
+            @return: True if the results are the same
+        """
+        for seed in range(num_samples):
+            obj = _sample(self.compiled, random.Random(seed), max_items=3)
+            data = self.struct.build(obj)
+            if ''.join(self.__encode(obj, [])) != data:
+                return False
+            expected = self.struct.parse(data)
+            parsed = self.__decode(data, 0)[0]
+            if parsed != expected or list(parsed.keys()) != list(expected.keys()):
+                return False
+        return True
+
+
+_codecs = {}  # construct Struct --> Codec (None if it cannot be compiled)
+_codecs_lock = Lock()
+
+
+def _same_values(parsed, expected):
+    """ compares a Container returned by parse_arrays() with the one returned by construct """
+    if list(parsed.keys()) != list(expected.keys()):
+        return False
+    for k in expected.keys():
+        a, b = parsed[k], expected[k]
+        if not isinstance(a, np.ndarray):
+            if a != b:
+                return False
+        elif len(a) != len(b):
+            return False
+        elif a.dtype.names is None:
+            if a.tolist() != list(b):
+                return False
+        else:
+            for record, obj in izip(a, b):
+                if any(record[name] != obj[name] for name in a.dtype.names):
+                    return False
+    return True
+
+
+def get_codec(struct_con):
+    """ @param struct_con: a construct Struct
+        @return: the Codec of struct_con, or None if it cannot be compiled
+    """
+    try:
+        return _codecs[struct_con]
+    except KeyError:
+        pass
+    codec = None
+    try:
+        codec = Codec(struct_con, CompiledStruct(struct_con))
+        if not codec.verify():
+            log.debug("compiled codec of %s differs from construct. Not used", struct_con.name)
+            codec = None
+    except UnsupportedConstruct as e:
+        log.debug("%s cannot be compiled: %s", struct_con.name, e)
+    except Exception as e:
+        log.debug("error compiling %s: %s", struct_con.name, e)
+    with _codecs_lock:
+        _codecs[struct_con] = codec
+    return codec
+
+
+_array_codecs = {}  # construct Struct --> Codec verified for parse_arrays()
+
+
+def array_parser(struct_con):
+    """ @param struct_con: a construct Struct
+        @return: a function that parses the message returning numpy arrays (see Codec.parse_arrays)
+        raises ImportError if numpy is not installed, ValueError if the Struct cannot be compiled
+    """
+    codec = _array_codecs.get(struct_con)
+    if codec is None:
+        if np is None:
+            raise ImportError("numpy is required to decode %s as arrays" % struct_con.name)
+        codec = get_codec(struct_con)
+        if codec is None or not codec.verify_arrays():
+            raise ValueError("%s cannot be decoded as arrays" % struct_con.name)
+        _array_codecs[struct_con] = codec
+    return codec.parse_arrays
+
+
+def fast(func):
+    """ @param func: the build or parse method of a construct Struct (e.g. msg_ping.build)
+        @return: the equivalent method of the compiled codec, or func if it is not possible to compile
+    """
+    struct_con = getattr(func, '__self__', None)
+    if not USE_COMPILED_CODECS or not isinstance(struct_con, Struct):
+        return func
+    codec = get_codec(struct_con)
+    if codec is None:
+        return func
+    return getattr(codec, func.__name__, func)
@@ -14,6 +14,7 @@
 """
 import ssl
 import socket
+from threading import Lock, local
 
 from pox.ethanol.ssl_message.enum import Enum
 from pox.ethanol.ssl_message.msg_core import msg_default
@@ -181,6 +182,9 @@ MSG_TYPE = Enum('MSG_HELLO_TYPE',
                 'MSG_SET_QUEUE_PARAMS',
                 'MSG_GET_WMM_PARAMS',
                 'MSG_SET_WMM_PARAMS',
+                'MSG_BATCH',  # envelope with many messages (see msg_batch.py)
+                'MSG_METRIC_RECEIVED',  # reports pushed by the agents (see msg_telemetry.py)
+                'MSG_MEAN_STA_STATISTICS_REPORT',
                 )
 """ contains all constants used as message type.
     this enumeration defines the types of message dealt by the ethanol messaging system.
@@ -220,6 +224,24 @@ MSG_ERROR_TYPE = Enum('ERROR_UNKNOWN',
 
 DEFAULT_WIFI_INTFNAME = 'wlan0'
 
+MAX_MSG_ID = 2 ** 31 - 1
+""" m_id is a signed 32 bits integer"""
+
+_msg_id_lock = Lock()
+_last_msg_id = [0]
+
+
+def next_msg_id():
+    """ controller-wide message id allocator, shared by all objects that send messages (aps, radios, devices...).
+        the ids increase by 1 up to MAX_MSG_ID, then start again at 1
+
+        @return: the id to be used in a new message
+    """
+    with _msg_id_lock:
+        m_id = _last_msg_id[0] % MAX_MSG_ID + 1
+        _last_msg_id[0] = m_id
+    return m_id
+
 
 def tri_boolean(v, d):
     if v not in d:
@@ -297,7 +319,8 @@ def is_error_msg(received_msg):
         @param received_msg: binary message received by the server.
         @return: true, if it is an error
     """
-    msg = msg_default.parse(received_msg)
+    from pox.ethanol.ssl_message.msg_codec import fast
+    msg = fast(msg_default.parse)(received_msg)
     return msg.m_type == MSG_TYPE.MSG_ERR_TYPE
 
 
@@ -309,11 +332,39 @@ def get_error_msg(received_msg):
     """
     if not is_error_msg(received_msg):
         return None
-    from msg_error import msg_error
-    msg = msg_error.parse(received_msg)
+    from pox.ethanol.ssl_message.msg_error import msg_error
+    from pox.ethanol.ssl_message.msg_codec import fast
+    msg = fast(msg_error.parse)(received_msg)
     return msg
 
 
+_thread_transport = local()
+""" transport used only by the current thread (see set_thread_transport) """
+
+
+def set_thread_transport(transport):
+    """ the requests made by the current thread are sent using transport (None = default transport).
+        used by msg_batch.Batch to collect the messages
+        @param transport: object with a method request(server, msg, only_send=False)
+    """
+    _thread_transport.transport = transport
+
+
+def get_transport():
+    """ @return: the object that sends the requests to the devices:
+                 the transport set by set_thread_transport(), or
+                 the multiplexed channels (msg_mux.mux_manager) if enabled, otherwise the connection pool
+    """
+    transport = getattr(_thread_transport, 'transport', None)
+    if transport is not None:
+        return transport
+    from pox.ethanol.ssl_message.msg_mux import mux_manager
+    if mux_manager.enabled:
+        return mux_manager
+    from pox.ethanol.ssl_message.msg_pool import connection_pool
+    return connection_pool
+
+
 def send_and_receive_msg(server, msg_struct, builder, parser, only_send=False):
     """ generic function to send and receive message
 
@@ -322,34 +373,28 @@ def send_and_receive_msg(server, msg_struct, builder, parser, only_send=False):
         @param builder: Struct.build
         @param parser: Struc.parse
         this Struct class must be able to interpret Cointainer fields
+        (the compiled codec of the Struct is used if possible, see msg_codec.py)
 
         @return:
         error : true if something goes wrong
         msg : a Container with the message
     """
-    ssl_sock, sckt = connect_ssl_socket(server)
-    if ssl_sock == -1:
-        # error
-        return True, None
+    from pox.ethanol.ssl_message.msg_codec import fast
 
-    msg = builder(msg_struct)
-    ssl_sock.write(msg)  # return number of bytes
+    msg = fast(builder)(msg_struct)
+    # uses a pooled (or multiplexed) connection: the ssl handshake is only made if there is no open connection to server
+    received_msg = get_transport().request(server, msg, only_send=only_send)
     if only_send:
-        ssl_sock.close()
-        sckt.close()
         # in this case, just return
         # no return parameters
         return
 
-    received_msg = ssl_sock.read(BUFFER_SIZE)
-    ssl_sock.close()
-    sckt.close()
-    if received_msg != '':
+    if received_msg is not None and received_msg != '':
         if is_error_msg(received_msg):
             msg = get_error_msg(received_msg)
             return True, msg
         else:
-            msg = parser(received_msg)
+            msg = fast(parser)(received_msg)
             # error
             return False, msg
     else:
@@ -140,7 +140,8 @@ def decode_default_fields(received_msg):
     """
     # from pox.ethanol.ssl_message.msg_core import toHex
     # print ">>>>> ", toHex(received_msg)
-    msg = msg_default.parse(received_msg)
+    from pox.ethanol.ssl_message.msg_codec import fast
+    msg = fast(msg_default.parse)(received_msg)
     # print "decode_default_fields", msg
     return msg
 
@@ -0,0 +1,216 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+  splits the ssl stream into ethanol messages.
+
+  every message starts with msg_default (see msg_core.py):
+
+    m_type (4 bytes) | m_id (4 bytes) | p_version_length (4 bytes) | p_version (p_version_length + 1 bytes) | m_size (4 bytes)
+
+  MessageReader reads this header and uses m_size to read exactly one message, so a reply larger than one
+  ssl record (or larger than BUFFER_SIZE) is read completely, and many messages can be sent back to back
+  in the same connection.
+  set_msg_size() fills m_size in the messages we send.
+
+  @note: the messages built in python always had m_size = 0, and hostapd may count a null string as 5 bytes
+         (see the note in msg_common.py). So if m_size is not valid, we fall back to reading what is available
+         and, if the stream stalls before m_size bytes arrive, the (partial) message is returned.
+         In both cases the connection is marked as out of sync (in_sync = False) and should not be reused.
+
+@author: Henrique Duarte Moura
+@organization: WINET/DCC/UFMG
+@copyright: h3dema (c) 2017
+@contact: henriquemoura@hotmail.com
+@licence: GNU General Public License v2.0
+(https://www.gnu.org/licenses/old-licenses/gpl-2.0.html)
+@since: July 2015
+@status: in development
+
+@requires: construct 2.5.2
+"""
+import ssl
+import socket
+from struct import Struct as _Struct
+
+from pox.ethanol.ssl_message.msg_common import BUFFER_SIZE
+from pox.ethanol.ssl_message.latency import monotonic
+
+HEADER_PREFIX = _Struct('<iii')
+""" m_type, m_id, p_version_length """
+
+FIELD_SIZE = _Struct('<i')
+""" m_size """
+
+MAX_MSG_SIZE = 16 * 1024 * 1024
+""" a m_size greater than this is considered garbage"""
+
+FRAME_STALL_TIMEOUT = 0.5
+""" seconds to wait for the rest of a message, before considering that m_size is wrong"""
+
+
+def _timed_out(e):
+    """ @return: True if the exception raised by recv is a timeout (python 2 ssl sockets raise SSLError) """
+    return isinstance(e, socket.timeout) or (isinstance(e, ssl.SSLError) and 'timed out' in str(e))
+
+
+def msg_size_offset(msg):
+    """ @return: the position of the m_size field in the binary message msg """
+    p_version_length = HEADER_PREFIX.unpack_from(msg, 0)[2]
+    return HEADER_PREFIX.size + (p_version_length + 1 if p_version_length > 0 else 0)
+
+
+def set_msg_size(msg):
+    """ fills the m_size field with the real size of the message
+
+        @param msg: binary message (built by construct)
+        @return: the binary message with m_size = len(msg)
+    """
+    if len(msg) < HEADER_PREFIX.size + FIELD_SIZE.size:
+        return msg
+    offset = msg_size_offset(msg)
+    if FIELD_SIZE.unpack_from(msg, offset)[0] == len(msg):
+        return msg
+    buf = bytearray(msg)
+    FIELD_SIZE.pack_into(buf, offset, len(buf))
+    return str(buf)
+
+
+class MessageReader(object):
+    """ reads one message at a time from a ssl socket, using a preallocated buffer
+    """
+
+    def __init__(self, sock, buffer_size=BUFFER_SIZE, stall_timeout=FRAME_STALL_TIMEOUT):
+        """
+          @param sock: ssl socket
+          @param buffer_size: initial size of the buffer (grows if a larger message arrives)
+          @param stall_timeout: seconds to wait for the missing part of a message
+        """
+        self.sock = sock
+        self.stall_timeout = stall_timeout
+        self.in_sync = True
+        self.timed_out = False  #: the last read_msg did not receive the whole message in time
+        self.__deadline = None  # monotonic() when read_msg must give up (None = no limit)
+        self.__timeout = None  # timeout of the socket when read_msg was called
+        self.__buffer = bytearray(buffer_size)
+        self.__view = memoryview(self.__buffer)
+
+    def __grow(self, size):
+        """ makes sure the buffer can hold size bytes """
+        if size > len(self.__buffer):
+            new_buffer = bytearray(max(size, 2 * len(self.__buffer)))
+            new_buffer[:len(self.__buffer)] = self.__buffer
+            self.__buffer = new_buffer
+            self.__view = memoryview(self.__buffer)
+
+    def __recv(self, pos, end, timeout=None):
+        """ receives into buffer[pos:end], waiting at most timeout seconds and not after the deadline of read_msg
+            @param timeout: seconds to wait (None = the timeout of the socket)
+            @return: number of bytes read, 0 if the connection was closed or the time is over
+        """
+        while True:
+            by_deadline = False
+            if self.__deadline is not None:
+                remaining = self.__deadline - monotonic()
+                if remaining <= 0:
+                    self.timed_out = True
+                    return 0
+                wait = self.__timeout if timeout is None else timeout
+                by_deadline = wait is None or remaining < wait
+                self.sock.settimeout(remaining if by_deadline else wait)
+            try:
+                return self.sock.recv_into(self.__view[pos:end], end - pos)
+            except (socket.error, ssl.SSLError) as e:
+                if not by_deadline or not _timed_out(e):
+                    return 0
+                # woke up at the deadline: checked in the next iteration
+
+    def __read_into(self, start, n, timeout=None):
+        """ reads n bytes into buffer[start:start + n]
+            @param timeout: seconds to wait for each part (None = the timeout of the socket)
+            @return: number of bytes read, less than n if the connection was closed or the time is over
+        """
+        pos = start
+        end = start + n
+        while pos < end:
+            r = self.__recv(pos, end, timeout)
+            if r == 0:
+                break
+            pos += r
+        return pos - start
+
+    def __read_body(self, start, n):
+        """ reads the rest of a message. waits at most stall_timeout for each part of it
+            @return: number of bytes read
+        """
+        old_timeout = self.sock.gettimeout()
+        self.sock.settimeout(self.stall_timeout)
+        try:
+            return self.__read_into(start, n, self.stall_timeout)
+        finally:
+            self.sock.settimeout(old_timeout)
+
+    def read_msg(self, timeout=None):
+        """ reads exactly one message from the socket
+
+            @param timeout: seconds to read the whole message, header included (None = no limit).
+                            if the message does not arrive in time, timed_out is set and '' is returned
+            @return: the binary message. '' if the connection was closed before a new message
+        """
+        self.timed_out = False
+        if timeout is None:
+            return self.__read_msg()
+        self.__timeout = self.sock.gettimeout()
+        self.__deadline = monotonic() + timeout
+        try:
+            msg = self.__read_msg()
+        finally:
+            self.__deadline = None
+            self.sock.settimeout(self.__timeout)
+        if self.timed_out:
+            self.in_sync = False
+            return ''
+        return msg
+
+    def __read_msg(self):
+        prefix = HEADER_PREFIX.size
+        r = self.__read_into(0, prefix)
+        if r < prefix:
+            self.in_sync = False
+            return '' if r == 0 else str(self.__buffer[:r])
+
+        p_version_length = HEADER_PREFIX.unpack_from(self.__buffer, 0)[2]
+        version_size = p_version_length + 1 if p_version_length > 0 else 0
+        if version_size > BUFFER_SIZE:
+            # garbage
+            self.in_sync = False
+            return str(self.__buffer[:prefix])
+        header_size = prefix + version_size + FIELD_SIZE.size
+        self.__grow(header_size)
+        r = self.__read_into(prefix, header_size - prefix)
+        if r < header_size - prefix:
+            self.in_sync = False
+            return str(self.__buffer[:prefix + r])
+
+        m_size = FIELD_SIZE.unpack_from(self.__buffer, header_size - FIELD_SIZE.size)[0]
+        if header_size <= m_size <= MAX_MSG_SIZE:
+            self.__grow(m_size)
+            r = self.__read_body(header_size, m_size - header_size)
+            if r < m_size - header_size:
+                self.in_sync = False
+            return str(self.__buffer[:header_size + r])
+
+        # m_size not filled: the message ends when the device closes the connection (or stops sending)
+        self.in_sync = False
+        pos = header_size
+        old_timeout = self.sock.gettimeout()
+        self.sock.settimeout(self.stall_timeout)
+        try:
+            while pos < MAX_MSG_SIZE:
+                self.__grow(pos + BUFFER_SIZE)
+                r = self.__recv(pos, pos + BUFFER_SIZE, self.stall_timeout)
+                if r == 0:
+                    break
+                pos += r
+        finally:
+            self.sock.settimeout(old_timeout)
+        return str(self.__buffer[:pos])
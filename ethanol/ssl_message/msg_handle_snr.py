@@ -27,13 +27,17 @@ from pox.ethanol.ssl_message.msg_core import field_intf_name, field_station
 from pox.ethanol.ssl_message.msg_core import field_mac_addr
 from pox.ethanol.ssl_message.msg_common import MSG_TYPE, VERSION
 from pox.ethanol.ssl_message.msg_common import send_and_receive_msg, len_of_string
+from pox.ethanol.ssl_message.latency import monotonic
 
-from pox.ethanol.events import Events
+from pox.ethanol.ethanol.bus import BusEvents, SNR_THRESHOLD
+from pox.ethanol.ethanol.index import mac_key
 
-events_snr_threshold_reached = Events()
+events_snr_threshold_reached = BusEvents(SNR_THRESHOLD, key=lambda **kw: mac_key(kw.get('sta_mac')))
 """to handle a receiving snr_threshold_reached message, just add your function to events_snr_threshold_reached
    your function must use 'def my_funct(**kwargs)' signature for compatibility
-   @change: we send to parameters: msg, fromaddr, sta_mac, intf_name, mac_ap
+   @change: we send to parameters: msg, fromaddr, sta_mac, intf_name, mac_ap, new_ap (None if the station stays)
+   @change: the functions are called by the threads of the event bus (see ethanol/bus.py),
+            use bus.subscribe(SNR_THRESHOLD, f, key=sta_mac) to receive only the messages of one station
 """
 
 field_mac_ap = Struct('mac_ap',
@@ -95,17 +99,32 @@ def snr_threshold_reached(server, id=0, sta_ip=None, sta_port=0, sta_mac=None, i
 
 
 def process_snr_threshold(received_msg, fromaddr):
-    msg = msg_snr_threshold_reached.parse(received_msg)
+    """ the SNR of a station reached the threshold: the reply has the VAP the station should move to
+        (the current VAP if it should stay), chosen by the handoff engine (see ethanol/handoff.py).
+        the transition is sent after the reply
+    """
+    from pox.ethanol.ssl_message.msg_codec import fast
+    from pox.ethanol.ethanol.handoff import handoff
+    t0 = monotonic()
+    msg = fast(msg_snr_threshold_reached.parse)(received_msg)
+    sta_mac = msg['mac_addr']
+    current = msg['mac_ap']
+    new_ap = handoff.decide(sta_mac, current, msg['snr'])
+    reply_ap = current if new_ap is None else new_ap
+    msg['mac_ap'] = reply_ap
+    msg['mac_ap_size'] = len_of_string(reply_ap)
+    reply = fast(msg_snr_threshold_reached.build)(msg)
+    handoff.reply_latency.record(monotonic() - t0)
+
     events_snr_threshold_reached.on_change(msg=msg,
-                                           fromaddr=msg['fromaddr'],
-                                           sta_mac=msg['sta_mac'],
+                                           fromaddr=fromaddr,
+                                           sta_mac=sta_mac,
                                            intf_name=msg['intf_name'],
-                                           mac_ap=msg['mac_ap'])
-
-    # TODO: define the new ap
-    new_ap = None
-    msg['mac_ap'] = new_ap
-    return msg_snr_threshold_reached.build(msg)
+                                           mac_ap=current,
+                                           new_ap=new_ap)
+    if new_ap is not None:
+        handoff.execute(sta_mac, current, new_ap)
+    return reply
 
 
 def bogus_snr_threshold_reached_on_change(**kwargs):
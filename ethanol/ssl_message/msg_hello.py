@@ -23,20 +23,23 @@ from construct import Container
 
 from pox.ethanol.ssl_message.msg_core import msg_default
 from pox.ethanol.ssl_message.msg_common import is_error_msg, get_error_msg
-from pox.ethanol.ssl_message.msg_common import MSG_TYPE, VERSION, BUFFER_SIZE, SERVER_PORT
+from pox.ethanol.ssl_message.msg_common import MSG_TYPE, VERSION, SERVER_PORT
 from pox.ethanol.ssl_message.msg_common import hexadecimal
-from pox.ethanol.ssl_message.msg_common import connect_ssl_socket, len_of_string
+from pox.ethanol.ssl_message.msg_common import len_of_string
+from pox.ethanol.ssl_message.msg_common import get_transport
 from pox.ethanol.ssl_message.msg_log import log
 
 from pox.ethanol.ethanol.ap import add_ap, connected_aps
 from pox.ethanol.ethanol.station import add_station
 
-from pox.ethanol.events import Events
+from pox.ethanol.ethanol.bus import BusEvents, HELLO
 
-events_hello = Events()
+events_hello = BusEvents(HELLO, key=lambda **kw: kw['fromaddr'][0])
 """to handle a receiving hello message, just add your function to events_hello
    your function must use 'def my_funct(**kwargs)' signature for compatibility
    @change: we send to parameters: msg, fromaddr
+   @change: the functions are called by the threads of the event bus (see ethanol/bus.py),
+            use bus.subscribe(HELLO, f, key=ip) to receive only the hellos of one device
 """
 
 msg_hello = Struct('msg_hello',
@@ -54,8 +57,6 @@ def send_msg_hello(server, m_id=0):
 
       @return: msg - received message
     """
-    ssl_sock, sckt = connect_ssl_socket(server)
-
     # print "send_msg_hello id:", m_id
     # 1) create message
     msg_struct = Container(m_type=MSG_TYPE.MSG_HELLO_TYPE,
@@ -72,12 +73,10 @@ def send_msg_hello(server, m_id=0):
     # 2) sending message
     t0 = datetime.now()
     log.debug(hexadecimal(msg))
-    num_bytes = ssl_sock.write(msg)
-    log.debug("num bytes enviados: %d" % num_bytes)
+    received_msg = get_transport().request(server, msg)
 
     # 3) retrieve server's response
-    received_msg = ssl_sock.read(BUFFER_SIZE)
-    if received_msg != '':
+    if received_msg is not None and received_msg != '':
         t1 = datetime.now()
         # print "msg recebida > ", hexadecimal(received_msg)
 
@@ -89,8 +88,6 @@ def send_msg_hello(server, m_id=0):
             msg.rtt = t1 - t0
     else:
         msg = None
-    ssl_sock.close()
-    sckt.close()
     return msg
 
 
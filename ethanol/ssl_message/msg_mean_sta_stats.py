@@ -13,7 +13,9 @@
 
 * send_msg_mean_sta_statistics_time
 
-no process is implemented: the controller is not supposed to respond to these message
+no process is implemented: the controller is not supposed to respond to these message.
+The periodic reports (MSG_MEAN_STA_STATISTICS_REPORT, same structure as msg_mean_statistics)
+pushed by the agents are processed by msg_telemetry.
 
 @author: Henrique Duarte Moura
 @organization: WINET/DCC/UFMG
@@ -74,7 +76,7 @@ msg_mean_statistics = Struct('msg_mean_statistics',
                              )
 
 
-def send_msg_mean_sta_statistics(server, id=0, sta_ip=None, sta_port=0):
+def send_msg_mean_sta_statistics(server, id=0, sta_ip=None, sta_port=0, as_array=False):
     """
       @param server: tuple (ip, port_num)
       @param id: message id
@@ -82,6 +84,9 @@ def send_msg_mean_sta_statistics(server, id=0, sta_ip=None, sta_port=0):
       @type sta_ip: str
       @param sta_port: socket port number of the station
       @type sta_port: int
+      @param as_array: if True, msg['mean_net_statistics'] is a numpy structured array (one record per interface)
+                       and the values of the dictionary are its records (requires numpy)
+      @type as_array: bool
 
       @return: msg - received message
     """
@@ -99,7 +104,11 @@ def send_msg_mean_sta_statistics(server, id=0, sta_ip=None, sta_port=0):
         intf=[],
         mean_net_statistics=[],
     )
-    error, msg = send_and_receive_msg(server, msg_struct, msg_mean_statistics.build, msg_mean_statistics.parse)
+    parser = msg_mean_statistics.parse
+    if as_array:
+        from pox.ethanol.ssl_message.msg_codec import array_parser
+        parser = array_parser(msg_mean_statistics)
+    error, msg = send_and_receive_msg(server, msg_struct, msg_mean_statistics.build, parser)
     value = {}
     if not error:
         for i in range(msg['num']):
@@ -3,9 +3,9 @@
 """
   implements:
 
-  * the default process function used by the controller
+  * the default process function used by the controller (the reports are delivered by msg_telemetry)
 
-  * register_metric() used in VAP
+  * register_metric() / unregister_metric() used by Device.subscribe_metric()
 
   * set_metric()
 
@@ -26,8 +26,10 @@ from construct import SLInt8, SLInt32, ULInt64, LFloat32
 from construct import Embed, Struct, Container
 
 from pox.ethanol.ssl_message.msg_core import msg_default
-from pox.ethanol.ssl_message.msg_common import MSG_TYPE, VERSION, tri_boolean
+from pox.ethanol.ssl_message.msg_common import MSG_TYPE, VERSION
 from pox.ethanol.ssl_message.msg_common import send_and_receive_msg, len_of_string
+from pox.ethanol.ethanol.index import mac_key
+from pox.ethanol.ethanol.registry import Registry
 from pox.ethanol.ssl_message.msg_core import field_mac_addr
 
 
@@ -55,21 +57,14 @@ def set_metric(server, id=0, metric=0, enable=True, period=100):
                            period=period,
                            metric=metric,
                            )
-    error, msg = send_and_receive_msg(server, msg_struct, msg_metric.build, msg_metric.parse, only_send=True)
-    if not error and 'allowed' in msg and 'response' in msg:
-        allowed = tri_boolean('allowed', msg)
-        response = msg['response']
-    else:
-        allowed = True
-        response = 0
-    return msg, allowed, response
+    send_and_receive_msg(server, msg_struct, msg_metric.build, msg_metric.parse, only_send=True)
 
 
 """ keeps a list of the functions in the VAP that treat the process
     maps the AP's MAC to the VAP object
     all VAPs must implement those functions
 """
-registered_functions = {}
+registered_functions = Registry('metric', key=mac_key)
 
 
 def register_metric(mac, device):
@@ -78,7 +73,12 @@ def register_metric(mac, device):
         mac is the device's mac address
     """
     # print "inside register_functions"
-    registered_functions[mac] = device
+    registered_functions.add(mac, device)
+
+
+def unregister_metric(mac):
+    """ the device with this mac address does not receive metrics anymore """
+    registered_functions.remove(mac)
 
 
 msg_metric_received = Struct('msg_metric',
@@ -92,12 +92,6 @@ msg_metric_received = Struct('msg_metric',
 
 
 def process_metric(received_msg, fromaddr):
-    """ calls the device evMetric"""
-    msg = msg_metric_received.parse(received_msg)
-    mac_device = msg['mac_addr']
-    if mac_device in registered_functions:
-        device = registered_functions[mac_device]
-        value = msg['value']
-        metric = msg['metric']
-        device.evMetric(metric, value)
-    return None
+    """ queues the report. the telemetry thread decodes it and calls the device evMetric"""
+    from pox.ethanol.ssl_message.msg_telemetry import process_metric_report
+    return process_metric_report(received_msg, fromaddr)
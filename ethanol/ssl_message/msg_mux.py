@@ -0,0 +1,372 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+  multiplexes many requests over a single ssl connection per device.
+
+  the requests are written to the connection as soon as they are made (they don't wait for the
+  previous reply), and each reply is given back to the caller that sent the message with the same m_id.
+  If two requests in flight have the same m_id, the m_id of the second one is changed (in the binary
+  message only) using next_msg_id().
+
+  Each channel has one thread that does all the i/o of its connection (the ssl socket is never used
+  by two threads at the same time). The callers wait for their replies with a timeout.
+
+  this is disabled by default. To use it:
+
+  >>> from pox.ethanol.ssl_message.msg_mux import enable_multiplexing
+  >>> enable_multiplexing()
+
+  after this, send_and_receive_msg() uses mux_manager instead of the connection pool.
+
+  @note: the device must fill m_size correctly in its replies, because the replies are split
+         using m_size only. A channel that loses sync is closed and its requests fail.
+
+@author: Henrique Duarte Moura
+@organization: WINET/DCC/UFMG
+@copyright: h3dema (c) 2017
+@contact: henriquemoura@hotmail.com
+@licence: GNU General Public License v2.0
+(https://www.gnu.org/licenses/old-licenses/gpl-2.0.html)
+@since: July 2015
+@status: in development
+
+@requires: construct 2.5.2
+"""
+import os
+import ssl
+import socket
+import fcntl
+from select import select
+from threading import Thread, Lock, Event
+
+from pox.ethanol.ssl_message.msg_common import BUFFER_SIZE, connect_ssl_socket, next_msg_id
+from pox.ethanol.ssl_message.msg_framing import HEADER_PREFIX, FIELD_SIZE, MAX_MSG_SIZE, set_msg_size
+from pox.ethanol.ssl_message.msg_log import log
+
+MUX_REQUEST_TIMEOUT = 10.0
+""" seconds a request waits for its reply"""
+
+M_ID_OFFSET = 4
+""" position of m_id in the binary message"""
+
+
+def _frame_size(buf):
+    """ @param buf: bytes received and not consumed yet
+        @return: size of the first message in buf, 0 if the header is not complete, -1 if m_size is not valid
+    """
+    if len(buf) < HEADER_PREFIX.size:
+        return 0
+    p_version_length = HEADER_PREFIX.unpack_from(buf, 0)[2]
+    header_size = HEADER_PREFIX.size + (p_version_length + 1 if p_version_length > 0 else 0) + FIELD_SIZE.size
+    if p_version_length < 0 or header_size > BUFFER_SIZE:
+        return -1
+    if len(buf) < header_size:
+        return 0
+    m_size = FIELD_SIZE.unpack_from(buf, header_size - FIELD_SIZE.size)[0]
+    if m_size < header_size or m_size > MAX_MSG_SIZE:
+        return -1
+    return m_size
+
+
+class _PendingRequest(object):
+    """ a request waiting for its reply """
+
+    def __init__(self):
+        self.event = Event()
+        self.reply = None
+
+
+class MuxChannel(object):
+    """ a persistent ssl connection to a device, shared by all requests sent to it
+    """
+
+    def __init__(self, server, counters, counters_lock):
+        """
+          @param server: tuple (ip, port)
+          @param counters: dictionary with the counters of the MuxManager
+          @param counters_lock: lock of counters
+        """
+        self.server = server
+        self.__counters = counters
+        self.__counters_lock = counters_lock
+        self.__lock = Lock()
+        self.__pending = {}  # m_id --> _PendingRequest
+        self.__outgoing = []  # messages waiting to be written
+        self.__closed = False
+
+        ret = connect_ssl_socket(server)
+        if ret == -1:
+            raise socket.error("cannot connect to %s:%d" % server)
+        self.__ssl_sock, self.__sckt = ret
+        self.__ssl_sock.setblocking(False)
+        self.__wakeup_r, self.__wakeup_w = os.pipe()
+        for fd in [self.__wakeup_r, self.__wakeup_w]:
+            fcntl.fcntl(fd, fcntl.F_SETFL, fcntl.fcntl(fd, fcntl.F_GETFL) | os.O_NONBLOCK)
+
+        self.__thread = Thread(target=self.__loop)
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def __count(self, name, n=1):
+        with self.__counters_lock:
+            self.__counters[name] += n
+
+    @property
+    def closed(self):
+        return self.__closed
+
+    @property
+    def in_flight(self):
+        """ number of requests waiting for a reply """
+        return len(self.__pending)
+
+    def __wakeup(self):
+        with self.__lock:
+            if self.__wakeup_w is None:
+                return  # the i/o thread finished
+            try:
+                os.write(self.__wakeup_w, b'x')
+            except OSError:
+                pass  # pipe is full: the thread will wake up anyway
+
+    def request(self, msg, only_send=False, timeout=MUX_REQUEST_TIMEOUT):
+        """ sends msg and waits for the reply with the same m_id
+
+            @param msg: binary message (m_size is filled here)
+            @param only_send: don't wait for a reply
+            @param timeout: seconds to wait for the reply
+            @return: the binary reply ('' if only_send), or None if something goes wrong
+        """
+        msg = set_msg_size(msg)
+        pending = None
+        with self.__lock:
+            if self.__closed:
+                return None
+            m_id = None
+            if not only_send:
+                m_id = HEADER_PREFIX.unpack_from(msg, 0)[1]
+                if m_id in self.__pending:
+                    # another request with the same id is in flight: use a new id
+                    while m_id in self.__pending:
+                        m_id = next_msg_id()
+                    buf = bytearray(msg)
+                    FIELD_SIZE.pack_into(buf, M_ID_OFFSET, m_id)
+                    msg = str(buf)
+                    self.__count('id_rewrites')
+                pending = _PendingRequest()
+                self.__pending[m_id] = pending
+            self.__outgoing.append(msg)
+        self.__wakeup()
+        if only_send:
+            return ''
+        if not pending.event.wait(timeout):
+            with self.__lock:
+                if self.__pending.get(m_id) is pending:
+                    del self.__pending[m_id]
+            self.__count('timeouts')
+            log.debug("no reply from %s:%d for message %d", self.server[0], self.server[1], m_id)
+        return pending.reply
+
+    def __deliver(self, reply):
+        m_id = HEADER_PREFIX.unpack_from(reply, 0)[1]
+        with self.__lock:
+            pending = self.__pending.pop(m_id, None)
+        if pending is None:
+            self.__count('unmatched')  # late reply (the request timed out) or unsolicited message
+            return
+        pending.reply = reply
+        pending.event.set()
+
+    def __read(self, buf):
+        """ reads everything available (without blocking)
+            @return: False if the connection was closed
+        """
+        while True:
+            try:
+                data = self.__ssl_sock.recv(BUFFER_SIZE)
+            except ssl.SSLError as e:
+                if e.args[0] in (ssl.SSL_ERROR_WANT_READ, ssl.SSL_ERROR_WANT_WRITE):
+                    return True
+                raise
+            if not data:
+                return False
+            buf.extend(data)
+            if self.__ssl_sock.pending() == 0 and len(data) < BUFFER_SIZE:
+                return True
+
+    def __loop(self):
+        """ thread that writes the requests and reads the replies """
+        buf = bytearray()
+        out = ''
+        try:
+            while not self.__closed:
+                timeout = 0 if self.__ssl_sock.pending() > 0 else 1.0
+                r, _, _ = select([self.__sckt, self.__wakeup_r], [self.__sckt] if out else [], [], timeout)
+                if self.__wakeup_r in r:
+                    try:
+                        while os.read(self.__wakeup_r, 4096):
+                            pass
+                    except OSError:
+                        pass
+                with self.__lock:
+                    if self.__outgoing:
+                        out += ''.join(self.__outgoing)
+                        self.__outgoing = []
+                while out:
+                    try:
+                        n = self.__ssl_sock.write(out[:BUFFER_SIZE])
+                    except ssl.SSLError as e:
+                        if e.args[0] in (ssl.SSL_ERROR_WANT_READ, ssl.SSL_ERROR_WANT_WRITE):
+                            break  # wait until the socket is writable
+                        raise
+                    out = out[n:]
+                if self.__sckt in r or self.__ssl_sock.pending() > 0:
+                    alive = self.__read(buf)
+                    while True:
+                        size = _frame_size(buf)
+                        if size == -1:
+                            log.error("message without a valid m_size from %s:%d. Closing channel",
+                                      self.server[0], self.server[1])
+                            self.__count('out_of_sync')
+                            return
+                        if size == 0 or len(buf) < size:
+                            break
+                        self.__deliver(str(buf[:size]))
+                        del buf[:size]
+                    if not alive:
+                        return
+        except (socket.error, ssl.SSLError, OSError) as e:
+            log.debug("channel to %s:%d closed: %s", self.server[0], self.server[1], e)
+            self.__count('errors')
+        finally:
+            self.close()
+            with self.__lock:
+                os.close(self.__wakeup_r)
+                os.close(self.__wakeup_w)
+                self.__wakeup_w = None
+
+    def close(self):
+        """ closes the connection. the requests waiting for a reply fail (return None) """
+        with self.__lock:
+            if self.__closed:
+                return
+            self.__closed = True
+            pending, self.__pending = self.__pending, {}
+        for p in pending.values():
+            p.event.set()
+        self.__wakeup()
+        try:
+            self.__ssl_sock.close()
+            self.__sckt.close()
+        except (socket.error, ssl.SSLError):
+            pass
+
+
+class MuxManager(object):
+    """ keeps one MuxChannel per device.
+        request() has the same parameters and return values as ConnectionPool.request()
+    """
+
+    def __init__(self, enabled=False, request_timeout=MUX_REQUEST_TIMEOUT):
+        """
+          @param enabled: if True, send_and_receive_msg() uses this object
+          @param request_timeout: seconds a request waits for its reply
+        """
+        self.enabled = enabled
+        self.request_timeout = request_timeout
+        self.__lock = Lock()
+        self.__channels = {}  # (ip, port) --> MuxChannel
+        self.__connecting = {}  # (ip, port) --> Event set when the handshake of the new channel ends
+        self.__counters_lock = Lock()
+        self.__counters = {'channels': 0,  # connections created
+                           'requests': 0,
+                           'id_rewrites': 0,  # m_id changed because another request had the same id
+                           'timeouts': 0,
+                           'unmatched': 0,  # replies without a request waiting for them
+                           'out_of_sync': 0,
+                           'errors': 0,
+                           'connect_errors': 0,
+                           }
+
+    def stats(self):
+        """ @return: dictionary with the counters, the number of open channels and requests in flight """
+        with self.__counters_lock:
+            d = dict(self.__counters)
+        with self.__lock:
+            channels = list(self.__channels.values())
+        d['open'] = len([c for c in channels if not c.closed])
+        d['in_flight'] = sum(c.in_flight for c in channels)
+        return d
+
+    def channel(self, server):
+        """ @return: the channel to server (creates it if necessary), or None if it is not possible to connect """
+        server = tuple(server)
+        with self.__lock:
+            channel = self.__channels.get(server)
+            if channel is not None and not channel.closed:
+                return channel
+            connecting = self.__connecting.get(server)
+            if connecting is None:
+                connecting = self.__connecting[server] = Event()
+                owner = True
+            else:
+                owner = False
+        if not owner:
+            # another thread is connecting to this device: uses its channel
+            connecting.wait()
+            with self.__lock:
+                channel = self.__channels.get(server)
+            return channel if channel is not None and not channel.closed else None
+        # the handshake is made outside the lock: a slow device does not delay the requests to the others
+        channel = None
+        try:
+            channel = MuxChannel(server, self.__counters, self.__counters_lock)
+        except (socket.error, ssl.SSLError) as e:
+            log.debug("cannot connect to %s:%d: %s", server[0], server[1], e)
+            with self.__counters_lock:
+                self.__counters['connect_errors'] += 1
+        finally:
+            with self.__lock:
+                if channel is not None:
+                    self.__channels[server] = channel
+                del self.__connecting[server]
+            connecting.set()
+        if channel is not None:
+            with self.__counters_lock:
+                self.__counters['channels'] += 1
+        return channel
+
+    def request(self, server, msg, only_send=False, timeout=None):
+        """ sends msg to server using its channel and waits for the reply
+
+            @param server: tuple (ip, port)
+            @param msg: binary message
+            @param only_send: don't wait for a reply
+            @param timeout: seconds to wait for the reply (default: request_timeout)
+            @return: the binary reply ('' if only_send), or None if something goes wrong
+        """
+        channel = self.channel(server)
+        if channel is None:
+            return None
+        with self.__counters_lock:
+            self.__counters['requests'] += 1
+        return channel.request(msg, only_send=only_send,
+                               timeout=self.request_timeout if timeout is None else timeout)
+
+    def close_all(self):
+        """ closes all channels """
+        with self.__lock:
+            channels, self.__channels = self.__channels.values(), {}
+        for channel in channels:
+            channel.close()
+
+
+mux_manager = MuxManager()
+""" channels used by send_and_receive_msg() when multiplexing is enabled"""
+
+
+def enable_multiplexing(enabled=True):
+    """ send the requests using one multiplexed channel per device (True) or the connection pool (False) """
+    mux_manager.enabled = enabled
+    if not enabled:
+        mux_manager.close_all()
@@ -7,6 +7,11 @@
 
 * send_msg_ping(): send a ping to another device
 
+* ping(): one ping, returns the round trip time (used by the latency prober, see ethanol/prober.py)
+
+the messages are sent by the transport of msg_common.get_transport() (kept connections), and the rtt is
+measured with a monotonic clock, in seconds
+
 @note: see msg_ping.h in hostapd/src/messaging
 
 @author: Henrique Duarte Moura
@@ -19,16 +24,16 @@
 
 @requires: construct 2.5.2
 """
-from datetime import datetime
 from construct import SLInt32, LFloat32, CString, SLInt8
 from construct import Embed, Struct, Container
 from construct import If
 # from construct.debug import Probe
 
 from pox.ethanol.ssl_message.msg_core import msg_default
-from pox.ethanol.ssl_message.msg_common import MSG_TYPE, VERSION, BUFFER_SIZE
-from pox.ethanol.ssl_message.msg_common import connect_ssl_socket
+from pox.ethanol.ssl_message.msg_common import MSG_TYPE, VERSION
+from pox.ethanol.ssl_message.msg_common import get_transport
 from pox.ethanol.ssl_message.msg_common import is_error_msg, tri_boolean, len_of_string
+from pox.ethanol.ssl_message.latency import monotonic
 
 msg_ping = Struct('msg_ping',
                   Embed(msg_default),  # default fields
@@ -50,13 +55,18 @@ msg_pong = Struct('msg_pong',
 
 BYTE_INICIAL = 48
 
+_PATTERN = ''.join(chr((BYTE_INICIAL + i) % 128) for i in range(128))  # 7-bit ASCII, repeats every 128 bytes
+_ping_data = {}  # p_size --> payload
+
 
 def generate_ping_data(p_size=64):
-    data = '';
-    for i in range(p_size):
-        data += chr((BYTE_INICIAL + i) % 128)  # 7-bit ASCII
-    data += chr(0)
-    return data;
+    """ @return: the payload of a ping with p_size bytes (plus the ending chr(0)). the payloads are cached """
+    data = _ping_data.get(p_size)
+    if data is None:
+        data = (_PATTERN * (p_size // len(_PATTERN) + 1))[:p_size] + chr(0)
+        if len(_ping_data) < 1024:
+            _ping_data[p_size] = data
+    return data
 
 
 def verify_data(data, p_size):
@@ -72,18 +82,12 @@ def send_msg(server, msg):
     """ sends a message PING msg to the server
         @param server: tuple (ip, port) used to socket connect to the client
         @param msg: message to be sent (ping or pong)
+        @return: the pong message, with the round trip time in rtt (seconds)
     """
-    ssl_sock, sckt = connect_ssl_socket(server)
-
-    t0 = datetime.now()
-    num_bytes = ssl_sock.write(msg)
-
-    # 3) retrieve server's response
-    received_msg = ssl_sock.read(BUFFER_SIZE)
-    t1 = datetime.now()
-    ssl_sock.close()
-    sckt.close()
-    if is_error_msg(received_msg):
+    t0 = monotonic()
+    received_msg = get_transport().request(server, msg)
+    t1 = monotonic()
+    if received_msg is None or received_msg == '' or is_error_msg(received_msg):
         return None
     else:
         msg = msg_pong.parse(received_msg)
@@ -91,6 +95,24 @@ def send_msg(server, msg):
         return msg
 
 
+def ping(server, id=0, p_size=64):
+    """ sends one ping
+        @param server: tuple (ip, port_num)
+        @return: the round trip time in seconds, or None if there was no valid pong (lost)
+    """
+    msg = msg_ping.build(Container(m_type=MSG_TYPE.MSG_PING,
+                                   m_id=id,
+                                   p_version_length=len_of_string(VERSION),
+                                   p_version=VERSION,
+                                   m_size=0,
+                                   data_size=p_size,
+                                   data=generate_ping_data(p_size)))
+    pong = send_msg(server, msg)
+    if pong is None or tri_boolean('verify_data', pong) is not True:
+        return None
+    return pong.rtt
+
+
 def send_msg_ping(server, id=0, num_tries=1, p_size=64):
     """ send a ping message to other ethanol device (mainly to the controller)
         and receives a pong response
@@ -0,0 +1,287 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+  keeps persistent ssl connections to the ethanol devices (aps and stations).
+
+  instead of doing a TCP + SSL handshake for every message, send_and_receive_msg() asks
+  connection_pool for a connection to (ip, port), uses it and gives it back to the pool,
+  so the next message to the same device reuses the connection.
+
+  * connections idle for more than idle_timeout seconds are closed
+  * at most max_per_agent connections are opened to the same device
+  * a pooled connection closed by the device is detected and replaced by a new one (reconnect)
+
+@author: Henrique Duarte Moura
+@organization: WINET/DCC/UFMG
+@copyright: h3dema (c) 2017
+@contact: henriquemoura@hotmail.com
+@licence: GNU General Public License v2.0
+(https://www.gnu.org/licenses/old-licenses/gpl-2.0.html)
+@since: July 2015
+@status: in development
+
+@requires: construct 2.5.2
+"""
+import ssl
+import socket
+import time
+from select import select
+from threading import Condition, Lock
+
+from pox.ethanol.ssl_message.msg_common import connect_ssl_socket
+from pox.ethanol.ssl_message.msg_framing import MessageReader, set_msg_size
+from pox.ethanol.ssl_message.msg_log import log
+
+POOL_MAX_CONNECTIONS_PER_AGENT = 4
+""" maximum number of simultaneous connections to the same device (ip, port)"""
+
+POOL_IDLE_TIMEOUT = 30.0
+""" a connection not used for this number of seconds is closed"""
+
+POOL_ACQUIRE_TIMEOUT = 10.0
+""" seconds a request waits for a free connection when the device already has POOL_MAX_CONNECTIONS_PER_AGENT connections"""
+
+
+class PooledConnection(object):
+    """ a ssl connection to a device, owned by the ConnectionPool
+    """
+
+    def __init__(self, server, ssl_sock, sckt):
+        """
+          @param server: tuple (ip, port)
+          @param ssl_sock: the ssl socket returned by connect_ssl_socket()
+          @param sckt: the underlying tcp socket
+        """
+        self.server = server
+        self.ssl_sock = ssl_sock
+        self.sckt = sckt
+        self.reader = MessageReader(ssl_sock)
+        self.last_used = time.time()
+        self.num_requests = 0
+
+    def is_dropped(self):
+        """ verifies if an idle connection can still be used.
+            an idle connection should have nothing to read: if select() says it is readable,
+            either the device closed it or it sent something we did not ask for.
+
+            @return: True if the connection should be discarded
+        """
+        try:
+            if self.ssl_sock.pending() > 0:
+                return True  # unexpected data
+            readable, _, _ = select([self.sckt], [], [], 0)
+            if not readable:
+                return False
+            # only ssl records (e.g. session tickets) may be pending
+            self.ssl_sock.settimeout(0.0)
+            try:
+                self.ssl_sock.read(1)
+            except ssl.SSLError as e:
+                if e.errno == ssl.SSL_ERROR_WANT_READ:
+                    return False
+            finally:
+                self.ssl_sock.settimeout(None)
+        except (socket.error, ssl.SSLError, ValueError):
+            pass
+        return True
+
+    def close(self):
+        """ closes the ssl socket and the tcp socket """
+        try:
+            self.ssl_sock.close()
+            self.sckt.close()
+        except (socket.error, ssl.SSLError):
+            pass
+
+
+class ConnectionPool(object):
+    """ keeps connections to the devices, indexed by the tuple (ip, port)
+    """
+
+    def __init__(self, max_per_agent=POOL_MAX_CONNECTIONS_PER_AGENT,
+                 idle_timeout=POOL_IDLE_TIMEOUT,
+                 acquire_timeout=POOL_ACQUIRE_TIMEOUT,
+                 keep_alive=True):
+        """
+          @param max_per_agent: maximum number of connections to the same device
+          @param idle_timeout: idle connections are closed after idle_timeout seconds
+          @param acquire_timeout: seconds to wait for a free connection
+          @param keep_alive: if False, the connection is closed after each message (old behavior)
+        """
+        self.max_per_agent = max_per_agent
+        self.idle_timeout = idle_timeout
+        self.acquire_timeout = acquire_timeout
+        self.keep_alive = keep_alive
+
+        self.__cond = Condition(Lock())
+        self.__idle = {}  # (ip, port) --> list of idle PooledConnection
+        self.__num_open = {}  # (ip, port) --> number of connections (idle + in use)
+        self.__last_sweep = time.time()
+        self.__counters = {'handshakes': 0,  # new connections created
+                           'reused': 0,  # requests that did not need a handshake
+                           'reconnects': 0,  # reused connections found closed while in use
+                           'dropped': 0,  # idle connections found closed before use
+                           'evicted': 0,  # idle connections closed by idle_timeout
+                           'connect_errors': 0,
+                           'exhausted': 0,  # acquire() timed out waiting for a free connection
+                           }
+
+    @property
+    def handshakes_saved(self):
+        """ number of requests served by an already established connection """
+        return self.__counters['reused']
+
+    def stats(self):
+        """ @return: a dictionary with the pool counters and the number of open connections """
+        with self.__cond:
+            d = dict(self.__counters)
+            d['open'] = sum(self.__num_open.values())
+            d['idle'] = sum(len(v) for v in self.__idle.values())
+        return d
+
+    def __discard(self, conn):
+        """ closes conn and frees its slot. must be called holding self.__cond """
+        conn.close()
+        n = self.__num_open.get(conn.server, 1) - 1
+        if n > 0:
+            self.__num_open[conn.server] = n
+        else:
+            self.__num_open.pop(conn.server, None)
+        self.__cond.notify_all()
+
+    def __evict(self, now):
+        """ closes connections idle for more than idle_timeout. must be called holding self.__cond """
+        for server in list(self.__idle.keys()):
+            idle = self.__idle[server]
+            keep = []
+            for conn in idle:
+                if now - conn.last_used > self.idle_timeout:
+                    self.__counters['evicted'] += 1
+                    self.__discard(conn)
+                else:
+                    keep.append(conn)
+            if keep:
+                self.__idle[server] = keep
+            else:
+                del self.__idle[server]
+        self.__last_sweep = now
+
+    def evict_idle(self):
+        """ closes all connections idle for more than idle_timeout seconds """
+        with self.__cond:
+            self.__evict(time.time())
+
+    def acquire(self, server):
+        """ get a connection to server: reuses an idle one or creates a new connection
+
+            @param server: tuple (ip, port)
+            @return: a PooledConnection or None if it was not possible to connect
+        """
+        server = tuple(server)
+        deadline = time.time() + self.acquire_timeout
+        with self.__cond:
+            while True:
+                now = time.time()
+                if now - self.__last_sweep > self.idle_timeout / 2.0:
+                    self.__evict(now)
+                idle = self.__idle.get(server)
+                while idle:
+                    conn = idle.pop()  # most recently used first
+                    if conn.is_dropped():
+                        self.__counters['dropped'] += 1
+                        self.__discard(conn)
+                        continue
+                    self.__counters['reused'] += 1
+                    return conn
+                if self.__num_open.get(server, 0) < self.max_per_agent:
+                    self.__num_open[server] = self.__num_open.get(server, 0) + 1
+                    break
+                if now >= deadline:
+                    self.__counters['exhausted'] += 1
+                    log.debug("no free connection to %s:%d", server[0], server[1])
+                    return None
+                self.__cond.wait(deadline - now)
+
+        # handshake outside the lock
+        ret = connect_ssl_socket(server)
+        with self.__cond:
+            if ret == -1:
+                self.__counters['connect_errors'] += 1
+                n = self.__num_open.get(server, 1) - 1
+                if n > 0:
+                    self.__num_open[server] = n
+                else:
+                    self.__num_open.pop(server, None)
+                self.__cond.notify_all()
+                return None
+            self.__counters['handshakes'] += 1
+        ssl_sock, sckt = ret
+        return PooledConnection(server, ssl_sock, sckt)
+
+    def release(self, conn, reuse=True):
+        """ gives the connection back to the pool
+
+            @param conn: connection returned by acquire()
+            @param reuse: if False, the connection is closed
+        """
+        with self.__cond:
+            if reuse and self.keep_alive:
+                conn.last_used = time.time()
+                self.__idle.setdefault(conn.server, []).append(conn)
+                self.__cond.notify_all()
+            else:
+                self.__discard(conn)
+
+    def request(self, server, msg, only_send=False, timeout=None):
+        """ sends msg to server and reads the reply.
+            if a reused connection was closed by the device, a new connection is made and msg is sent again.
+
+            @param server: tuple (ip, port)
+            @param msg: binary message
+            @param only_send: don't wait for a reply
+            @param timeout: seconds to wait for the reply (None = no limit). the request is not repeated after a timeout
+            @return: the binary reply ('' if only_send), or None if something goes wrong
+        """
+        msg = set_msg_size(msg)
+        while True:
+            conn = self.acquire(server)
+            if conn is None:
+                return None
+            reused = conn.num_requests > 0
+            t0 = time.time()
+            try:
+                if timeout is not None:
+                    conn.ssl_sock.settimeout(timeout)
+                conn.ssl_sock.write(msg)
+                received = '' if only_send else conn.reader.read_msg()
+                if timeout is not None:
+                    conn.ssl_sock.settimeout(None)
+            except (socket.error, ssl.SSLError):
+                received = None
+            if received is None or (received == '' and not only_send):
+                self.release(conn, reuse=False)
+                if timeout is not None and time.time() - t0 >= timeout:
+                    log.debug("no reply from %s:%d in %.1f s", server[0], server[1], timeout)
+                    return None
+                if reused:
+                    # the device closed our connection: try again using a new one
+                    with self.__cond:
+                        self.__counters['reconnects'] += 1
+                    continue
+                return None
+            conn.num_requests += 1
+            # if the reply was not correctly framed, we don't know where the next message starts
+            self.release(conn, reuse=conn.reader.in_sync)
+            return received
+
+    def close_all(self):
+        """ closes all idle connections """
+        with self.__cond:
+            for idle in self.__idle.values():
+                for conn in idle:
+                    self.__discard(conn)
+            self.__idle = {}
+
+
+connection_pool = ConnectionPool()
+""" pool used by send_and_receive_msg() and the other functions that send messages to the devices """
@@ -5,6 +5,9 @@
   the messages implemented are mapped in map_msg_to_procedure
   main entry to this module is: call run(server)
 
+  the server is a reactor (SslServer): one thread accepts the connections and does the ssl handshakes
+  without blocking, and a fixed number of worker threads process the messages
+
 @author: Henrique Duarte Moura
 @organization: WINET/DCC/UFMG
 @copyright: h3dema (c) 2017
@@ -16,13 +19,17 @@
 
 @requires: construct 2.5.2
 """
-from threading import Thread
+from threading import Thread, Lock
+from Queue import Queue, Full, Empty
 import socket
 import ssl
 import os
-import sys
+import errno
+import fcntl
+import select
 
-from pox.ethanol.ssl_message.msg_common import MSG_TYPE, SERVER_ADDR, SERVER_PORT, BUFFER_SIZE
+from pox.ethanol.ssl_message.msg_common import MSG_TYPE, SERVER_ADDR, SERVER_PORT
+from pox.ethanol.ssl_message.msg_framing import MessageReader, set_msg_size
 from pox.ethanol.ssl_message.msg_hello import process_hello
 from pox.ethanol.ssl_message.msg_bye import process_bye
 from pox.ethanol.ssl_message.msg_ping import process_msg_ping
@@ -30,7 +37,12 @@ from pox.ethanol.ssl_message.msg_error import return_error_msg_struct
 from pox.ethanol.ssl_message.msg_core import decode_default_fields
 from pox.ethanol.ssl_message.msg_error import process_msg_not_implemented
 from pox.ethanol.ssl_message.msg_association import process_association
+from pox.ethanol.ssl_message.msg_handle_snr import process_snr_threshold
 from pox.ethanol.ssl_message.msg_metric import process_metric
+from pox.ethanol.ssl_message.msg_batch import process_msg_batch
+from pox.ethanol.ssl_message.msg_telemetry import process_statistics_report
+from pox.ethanol.ssl_message.msg_log import log
+from pox.ethanol.ssl_message.latency import LatencyHistogram, monotonic
 
 """ maps the message type (received in the client's message) to the function that will process it
     there aren't many, because the controller is supposed to be the active part (it requests info or sets values)
@@ -78,6 +90,7 @@ map_msg_to_procedure = {MSG_TYPE.MSG_ASSOCIATION: process_association,
                         MSG_TYPE.MSG_SET_AP_RTSTHRESHOLD: process_msg_not_implemented,
                         MSG_TYPE.MSG_SET_CURRENTCHANNEL: process_msg_not_implemented,
                         MSG_TYPE.MSG_SET_PREAMBLE: process_msg_not_implemented,
+                        MSG_TYPE.MSG_SET_SNR_THRESHOLD_REACHED: process_snr_threshold,
                         MSG_TYPE.MSG_USER_CONNECTING: process_association,
                         MSG_TYPE.MSG_USER_DISCONNECTING: process_association,
                         MSG_TYPE.MSG_MEAN_STA_STATISTICS_GET: process_msg_not_implemented,
@@ -86,37 +99,50 @@ map_msg_to_procedure = {MSG_TYPE.MSG_ASSOCIATION: process_association,
                         MSG_TYPE.MSG_MEAN_STA_STATISTICS_SET_ALPHA: process_msg_not_implemented,
                         MSG_TYPE.MSG_MEAN_STA_STATISTICS_SET_TIME: process_msg_not_implemented,
                         MSG_TYPE.MSG_SET_METRIC: process_msg_not_implemented,
-                        # MSG_TYPE.MSG_METRIC_RECEIVED: process_metric,  # ** not implemented in the ethanol_hostapd messaging module
+                        MSG_TYPE.MSG_BATCH: process_msg_batch,
+                        MSG_TYPE.MSG_METRIC_RECEIVED: process_metric,
+                        MSG_TYPE.MSG_MEAN_STA_STATISTICS_REPORT: process_statistics_report,
                         }
 """all message types supported"""
 
 
+def process_msg(received_msg, fromaddr):
+    """ decodes the message header and calls the function that deals with this type of message
+
+        @param received_msg: binary message received from the client
+        @param fromaddr: (ip, port) of the client
+        @return: the binary reply or None (no reply)
+    """
+    msg = decode_default_fields(received_msg)
+    m_type = msg['m_type']
+    # To print the messages received on controler
+    # print "msg recebida - tipo:", m_type
+    if m_type in map_msg_to_procedure:
+        # switch...case to deal with each kind of message
+        func = map_msg_to_procedure[m_type]
+        return func(received_msg, fromaddr)
+    return return_error_msg_struct(msg.m_id)
+
+
 def deal_with_client(connstream, fromaddr):
-    """ this function is called as a Thread to manage each connection
+    """ manages a connection until the client closes it (blocking).
+        the client can send many messages (back to back) using the same connection
 
         @param connstream:
         @param fromaddr:
     """
-    # read data from client
-    received_msg = connstream.read(BUFFER_SIZE)
-    if len(received_msg) > 0:
-        # decode message
-        msg = decode_default_fields(received_msg)
-        m_type = msg['m_type']
-        # To print the messages received on controler
-        # print "msg recebida - tipo:", m_type
-        if m_type in map_msg_to_procedure:
-            # switch...case to deal with each kind of message
-            func = map_msg_to_procedure[msg.m_type]
-            reply = func(received_msg, fromaddr)
-        else:
-            reply = return_error_msg_struct(msg.id)
-
-    # reply to client, if necessary
-    if reply is not None:
-        # num_bytes = connstream.write(reply)
-        connstream.write(reply)
-        # log.debug(num_bytes)
+    reader = MessageReader(connstream)
+    while True:
+        # read data from client
+        received_msg = reader.read_msg()
+        if len(received_msg) == 0:
+            break  # client closed the connection
+        reply = process_msg(received_msg, fromaddr)
+        # reply to client, if necessary
+        if reply is not None:
+            connstream.write(set_msg_size(reply))
+        if not reader.in_sync:
+            break  # we don't know where the next message starts
 
     # finished with client
     connstream.close()
@@ -127,38 +153,386 @@ DEFAULT_CERT_PATH = os.path.dirname(os.path.abspath(__file__))
 SSL_CERTIFICATE = DEFAULT_CERT_PATH + '/mycert.pem'
 """path and default name of the ssl certificate"""
 
+SSL_VERSION = getattr(ssl, 'PROTOCOL_SSLv3', ssl.PROTOCOL_SSLv23)
+"""same as ssl_server.c. newer openssl versions don't have SSLv3, so we negotiate the protocol"""
 
-def run(server):
-    """ to use this module only call this method, providing a tuple with (server ip address, server port)
-       @param server: (ip, port) tuple
+LISTEN_BACKLOG = 128
+"""maximum number of connections waiting to be accepted"""
+
+NUM_WORKERS = 16
+"""number of threads that process the messages (the handlers may block)"""
+
+MAX_PENDING_MESSAGES = 1024
+"""connections with a message waiting for a worker. if full, new messages are refused (connection closed)"""
+
+HANDSHAKE_TIMEOUT = 10.0
+"""seconds a client has to finish the ssl handshake"""
+
+READ_TIMEOUT = 2.0
+"""seconds a worker waits for a whole message (or to send a reply) before closing the connection"""
+
+# connection states
+_HANDSHAKE = 0
+_IDLE = 1
+_BUSY = 2
+
+
+class _Connection(object):
+    """ a client connection managed by SslServer """
+
+    def __init__(self, sock, fromaddr, handler, now):
+        self.sock = sock
+        self.fd = sock.fileno()
+        self.fromaddr = fromaddr
+        self.handler = handler
+        self.state = _HANDSHAKE
+        self.accepted_at = now
+        self.queued_at = None
+        self.reader = None
+
+    def close(self):
+        try:
+            self.sock.close()
+        except (socket.error, ssl.SSLError):
+            pass
+
+
+class SslServer(object):
+    """ a reactor (one thread with poll/epoll) that accepts the connections and does the ssl handshakes
+        without blocking. When a connection has a message to read, it is handed to a pool of worker threads
+        that read the message, call the handler and write the reply. After that, the connection goes back
+        to the reactor, waiting for the next message.
+
+        So a slow client does not stop the other ones, and the number of threads does not depend on the
+        number of connected clients.
     """
-    # check if certificate exists
-    if not os.path.exists(SSL_CERTIFICATE):
-        print "Cannot run server without the certificate: %s" % SSL_CERTIFICATE
-        print "Fatal error..exiting now"
-        return -1
-    else:
-        # socket
+
+    def __init__(self, certfile=None, handler=None,
+                 backlog=LISTEN_BACKLOG,
+                 num_workers=NUM_WORKERS,
+                 max_pending=MAX_PENDING_MESSAGES,
+                 handshake_timeout=HANDSHAKE_TIMEOUT,
+                 read_timeout=READ_TIMEOUT):
+        """
+          @param certfile: ssl certificate (and key). Default: SSL_CERTIFICATE
+          @param handler: function(received_msg, fromaddr) that returns the reply or None. Default: process_msg
+          @param backlog: listen backlog
+          @param num_workers: number of worker threads
+          @param max_pending: maximum number of messages waiting for a worker
+          @param handshake_timeout: connections that don't finish the handshake in this time are closed
+          @param read_timeout: connections that don't send a whole message in this time (after the reactor saw
+                               its first bytes) are closed, so a slow client does not hold a worker
+        """
+        self.certfile = SSL_CERTIFICATE if certfile is None else certfile
+        self.handler = process_msg if handler is None else handler
+        self.backlog = backlog
+        self.num_workers = num_workers
+        self.handshake_timeout = handshake_timeout
+        self.read_timeout = read_timeout
+
+        self.context = ssl.SSLContext(SSL_VERSION)
+        self.context.load_cert_chain(self.certfile, self.certfile)
+
+        self.__poller = _Poller()
+        self.__listeners = {}  # fd --> (listening socket, handler)
+        self.__conns = {}  # fd --> _Connection
+        self.__jobs = Queue(maxsize=max_pending)
+        self.__returned = Queue()  # connections given back by the workers
+        self.__wakeup_r, self.__wakeup_w = os.pipe()
+        for fd in [self.__wakeup_r, self.__wakeup_w]:
+            fcntl.fcntl(fd, fcntl.F_SETFL, fcntl.fcntl(fd, fcntl.F_GETFL) | os.O_NONBLOCK)
+        self.__poller.register(self.__wakeup_r, _POLLIN)
+        self.__running = False
+        self.__workers = []
+
+        self.__lock = Lock()
+        self.__counters = {'accepted': 0,
+                           'handshakes': 0,
+                           'handshake_errors': 0,
+                           'handshake_timeouts': 0,
+                           'messages': 0,
+                           'read_timeouts': 0,  # closed because the message did not arrive in read_timeout
+                           'rejected': 0,  # worker queue was full
+                           'closed': 0,
+                           }
+        self.accept_latency = LatencyHistogram('accept')  # accept() --> end of handshake
+        self.queue_latency = LatencyHistogram('queue')  # message available --> a worker starts processing
+        self.handler_latency = LatencyHistogram('handler')  # read + handler + reply
+
+    def __count(self, name, n=1):
+        with self.__lock:
+            self.__counters[name] += n
+
+    def stats(self):
+        """ @return: dictionary with the server counters and the latency histograms """
+        with self.__lock:
+            d = dict(self.__counters)
+        d['connections'] = len(self.__conns)
+        d['pending'] = self.__jobs.qsize()
+        d['accept_latency'] = self.accept_latency.as_dict()
+        d['queue_latency'] = self.queue_latency.as_dict()
+        d['handler_latency'] = self.handler_latency.as_dict()
+        return d
+
+    def add_listener(self, server, handler=None):
+        """ listens at server. can be called many times to serve many addresses with the same reactor
+            @param server: (ip, port) tuple
+            @param handler: function that processes the messages received in this address. Default: self.handler
+            @return: the listening socket
+        """
         bindsocket = socket.socket()
+        bindsocket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         bindsocket.bind(server)
-        bindsocket.listen(5)  # specifies the maximum number of queued connections
+        bindsocket.listen(self.backlog)  # specifies the maximum number of queued connections
+        bindsocket.setblocking(False)
+        self.__listeners[bindsocket.fileno()] = (bindsocket, self.handler if handler is None else handler)
+        self.__poller.register(bindsocket.fileno(), _POLLIN)
+        return bindsocket
+
+    def __wakeup(self):
+        try:
+            os.write(self.__wakeup_w, b'x')
+        except OSError:
+            pass  # pipe is full: the reactor will wake up anyway
+
+    def __accept(self, bindsocket, handler):
+        """ accepts all waiting connections and starts their handshakes """
         while True:
             try:
                 newsocket, fromaddr = bindsocket.accept()
-                connstream = ssl.wrap_socket(newsocket,
-                                             server_side=True,
-                                             certfile=SSL_CERTIFICATE,  # load certs
-                                             keyfile=SSL_CERTIFICATE,
-                                             ssl_version=ssl.PROTOCOL_SSLv3)  # same as ssl_server.c
-                """ deal without a thread """
-                # deal_with_client(connstream, fromaddr)
-                """ deal with the request in a thread, so multiple connections can be served """
-                t = Thread(target=deal_with_client, args=(connstream, fromaddr))
-                t.start()
-            except:
-                error_found = sys.exc_info()[0]
-                print "Error: ", str(error_found)
+            except socket.error as e:
+                if e.errno not in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                    log.error("Error accepting connection: %s", e)
+                return
+            self.__count('accepted')
+            newsocket.setblocking(False)
+            newsocket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            try:
+                connstream = self.context.wrap_socket(newsocket, server_side=True,
+                                                      do_handshake_on_connect=False)
+            except (socket.error, ssl.SSLError) as e:
+                log.debug("Error wrapping connection from %s: %s", fromaddr, e)
+                newsocket.close()
+                self.__count('handshake_errors')
+                continue
+            conn = _Connection(connstream, fromaddr, handler, monotonic())
+            self.__conns[conn.fd] = conn
+            self.__poller.register(conn.fd, _POLLIN)
+            self.__handshake(conn)
 
+    def __close(self, conn):
+        if self.__conns.pop(conn.fd, None) is not None and conn.state != _BUSY:
+            self.__poller.unregister(conn.fd)
+        conn.close()
+        self.__count('closed')
+
+    def __handshake(self, conn):
+        """ continues the handshake of conn, without blocking """
+        fd = conn.fd
+        try:
+            conn.sock.do_handshake()
+        except ssl.SSLError as e:
+            if e.args[0] == ssl.SSL_ERROR_WANT_READ:
+                self.__poller.modify(fd, _POLLIN)
+                return
+            if e.args[0] == ssl.SSL_ERROR_WANT_WRITE:
+                self.__poller.modify(fd, _POLLOUT)
+                return
+            log.debug("Handshake error from %s: %s", conn.fromaddr, e)
+            self.__count('handshake_errors')
+            self.__close(conn)
+            return
+        except socket.error as e:
+            self.__count('handshake_errors')
+            self.__close(conn)
+            return
+        self.accept_latency.record(monotonic() - conn.accepted_at)
+        self.__count('handshakes')
+        conn.state = _IDLE
+        conn.reader = MessageReader(conn.sock)
+        self.__poller.modify(fd, _POLLIN)
+        if conn.sock.pending() > 0:
+            self.__dispatch(conn)  # the client sent its message together with the handshake
+
+    def __dispatch(self, conn):
+        """ conn has a message to read: hand it to a worker """
+        self.__poller.unregister(conn.fd)
+        conn.state = _BUSY
+        conn.queued_at = monotonic()
+        try:
+            self.__jobs.put_nowait(conn)
+        except Full:
+            log.debug("Too many pending messages. Closing connection from %s", conn.fromaddr)
+            self.__count('rejected')
+            self.__close(conn)
+
+    def __give_back(self):
+        """ connections returned by the workers wait for the next message """
+        try:
+            while os.read(self.__wakeup_r, 4096):
+                pass
+        except OSError:
+            pass
+        while True:
+            try:
+                conn, keep = self.__returned.get_nowait()
+            except Empty:
+                return
+            if not keep or conn.fd not in self.__conns:
+                self.__close(conn)
+                continue
+            conn.sock.setblocking(False)
+            conn.state = _IDLE
+            self.__poller.register(conn.fd, _POLLIN)
+
+    def __expire_handshakes(self, now):
+        for conn in list(self.__conns.values()):
+            if conn.state == _HANDSHAKE and now - conn.accepted_at > self.handshake_timeout:
+                log.debug("Handshake timeout: %s", conn.fromaddr)
+                self.__count('handshake_timeouts')
+                self.__close(conn)
+
+    def __worker(self):
+        """ reads the messages, calls the handler and replies """
+        while True:
+            conn = self.__jobs.get()
+            if conn is None:
+                return  # stop
+            self.queue_latency.record(monotonic() - conn.queued_at)
+            keep = False
+            try:
+                conn.sock.settimeout(self.read_timeout)  # also limits the time to write the reply
+                while True:
+                    t0 = monotonic()
+                    received_msg = conn.reader.read_msg(self.read_timeout)
+                    if len(received_msg) == 0:
+                        if conn.reader.timed_out:
+                            log.debug("Read timeout: %s", conn.fromaddr)
+                            self.__count('read_timeouts')
+                        break  # client closed the connection (or is too slow)
+                    self.__count('messages')
+                    reply = conn.handler(received_msg, conn.fromaddr)
+                    # reply to client, if necessary
+                    if reply is not None:
+                        conn.sock.write(set_msg_size(reply))
+                    self.handler_latency.record(monotonic() - t0)
+                    if not conn.reader.in_sync:
+                        break  # we don't know where the next message starts
+                    if conn.sock.pending() == 0:
+                        keep = True  # wait for the next message in the reactor
+                        break
+            except Exception as e:
+                log.error("Error processing message from %s: %s", conn.fromaddr, e)
+            self.__returned.put((conn, keep))
+            self.__wakeup()
+
+    def serve_forever(self, poll_interval=1.0):
+        """ runs the reactor (blocks until stop() is called)
+            @param poll_interval: seconds between checks for handshake timeouts
+        """
+        self.__running = True
+        for _ in range(self.num_workers):
+            t = Thread(target=self.__worker)
+            t.daemon = True
+            t.start()
+            self.__workers.append(t)
+        last_check = monotonic()
+        while self.__running:
+            try:
+                events = self.__poller.poll(poll_interval)
+            except (IOError, OSError, select.error) as e:
+                if e.args[0] == errno.EINTR:
+                    continue
+                raise
+            for fd, event in events:
+                if fd == self.__wakeup_r:
+                    self.__give_back()
+                elif fd in self.__listeners:
+                    bindsocket, handler = self.__listeners[fd]
+                    self.__accept(bindsocket, handler)
+                elif fd in self.__conns:
+                    conn = self.__conns[fd]
+                    if conn.state == _HANDSHAKE:
+                        self.__handshake(conn)
+                    elif conn.state == _IDLE:
+                        self.__dispatch(conn)
+            now = monotonic()
+            if now - last_check > poll_interval:
+                self.__expire_handshakes(now)
+                last_check = now
+        self.__shutdown()
+
+    def stop(self):
+        """ stops the reactor and the workers """
+        self.__running = False
+        self.__wakeup()
+
+    def __shutdown(self):
+        for _ in self.__workers:
+            self.__jobs.put(None)
+        for t in self.__workers:
+            t.join()
+        self.__workers = []
+        self.__give_back()
+        for conn in list(self.__conns.values()):
+            self.__close(conn)
+        for bindsocket, _ in self.__listeners.values():
+            self.__poller.unregister(bindsocket.fileno())
+            bindsocket.close()
+        self.__listeners = {}
+
+
+_POLLIN = select.POLLIN
+_POLLOUT = select.POLLOUT
+
+
+class _Poller(object):
+    """ uses epoll if available, otherwise poll. timeouts are in seconds """
+
+    def __init__(self):
+        if hasattr(select, 'epoll'):
+            self.__p = select.epoll()
+            self.__scale = 1
+        else:
+            self.__p = select.poll()
+            self.__scale = 1000  # poll() uses ms
+
+    def register(self, fd, events):
+        self.__p.register(fd, events)
+
+    def modify(self, fd, events):
+        self.__p.modify(fd, events)
+
+    def unregister(self, fd):
+        self.__p.unregister(fd)
+
+    def poll(self, timeout):
+        return self.__p.poll(timeout * self.__scale)
+
+
+ethanol_server = None
+"""the SslServer created by run()"""
+
+
+def run(server, backlog=LISTEN_BACKLOG, num_workers=NUM_WORKERS):
+    """ to use this module only call this method, providing a tuple with (server ip address, server port)
+       @param server: (ip, port) tuple
+       @param backlog: maximum number of connections waiting to be accepted
+       @param num_workers: number of threads that process the messages
+    """
+    global ethanol_server
+    # check if certificate exists
+    if not os.path.exists(SSL_CERTIFICATE):
+        log.error("Cannot run server without the certificate: %s" % SSL_CERTIFICATE)
+        log.error("Fatal error..exiting now")
+        return -1
+    try:
+        ethanol_server = SslServer(backlog=backlog, num_workers=num_workers)
+        ethanol_server.add_listener(server)
+    except (socket.error, ssl.SSLError, IOError) as e:
+        log.error("Error: %s" % e)
+        return -1
+    ethanol_server.serve_forever()
     return 0
 
 
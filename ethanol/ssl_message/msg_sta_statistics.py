@@ -68,7 +68,7 @@ msg_sta_statistics = Struct('msg_sta_statistics',
                             )
 
 
-def get_sta_statistics(server, id=0, intf_name=None, sta_ip=None, sta_port=0):
+def get_sta_statistics(server, id=0, intf_name=None, sta_ip=None, sta_port=0, as_array=False):
     """
       returns the value
       None equals an error has occured (or no interface found)
@@ -80,6 +80,9 @@ def get_sta_statistics(server, id=0, intf_name=None, sta_ip=None, sta_port=0):
       @type sta_ip: str
       @param sta_port: socket port number of the station
       @type sta_port: int
+      @param as_array: return the statistics as a numpy structured array
+                       (mac_addr and intf_name are 'object' fields). Requires numpy
+      @type as_array: bool
 
       @return: msg - received message
     """
@@ -99,7 +102,11 @@ def get_sta_statistics(server, id=0, intf_name=None, sta_ip=None, sta_port=0):
                            time_stamp_size=0,
                            time_stamp=None,
                            )
-    error, msg = send_and_receive_msg(server, msg_struct, msg_sta_statistics.build, msg_sta_statistics.parse)
+    parser = msg_sta_statistics.parse
+    if as_array:
+        from pox.ethanol.ssl_message.msg_codec import array_parser
+        parser = array_parser(msg_sta_statistics)
+    error, msg = send_and_receive_msg(server, msg_struct, msg_sta_statistics.build, parser)
     if not error:
         value = msg['stats'] if 'stats' in msg else []
     else:
@@ -75,5 +75,5 @@ def station_trigger_transition(server, id=0, sta_ip=None, sta_port=0,
                            mac_new_ap_size=len_of_string(mac_new_ap),
                            mac_new_ap=mac_new_ap,
                            )
-    error, msg = send_and_receive_msg(server, msg_struct, msg_station_trigger_transition.build,
-                                      msg_station_trigger_transition.parse, only_send=True)
+    send_and_receive_msg(server, msg_struct, msg_station_trigger_transition.build,
+                         msg_station_trigger_transition.parse, only_send=True)
@@ -0,0 +1,221 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+  receives the reports that the agents push to the controller, instead of being polled:
+
+  * MSG_METRIC_RECEIVED: the EWMA of a metric of a device, programmed with Device.subscribe_metric()
+  * MSG_MEAN_STA_STATISTICS_REPORT: the mean statistics of the interfaces of an AP (same fields as
+    MSG_MEAN_STA_STATISTICS_GET), sent every AP.statistics_time milliseconds
+
+  the server thread only puts the binary report in a bounded queue (telemetry.submit), so a burst
+  of reports does not delay the other messages. The reports are decoded and delivered by
+  the telemetry thread(s):
+
+  * metric reports go to Device.evMetric() (devices registered with msg_metric.register_metric)
+  * statistics reports go to AP.evInterfaceStats()
+  * both go to the callbacks registered with telemetry.subscribe()
+
+  >>> from pox.ethanol.ssl_message.msg_telemetry import telemetry
+  >>> token = telemetry.subscribe('bytesReceived', lambda mac, metric, value: ...)
+  >>> telemetry.unsubscribe(token)
+
+  backpressure: if the queue is full, the oldest report is discarded (a newer report of the same
+  metric is more useful than an old one) and counted in stats()['dropped'].
+
+@author: Henrique Duarte Moura
+@organization: WINET/DCC/UFMG
+@copyright: h3dema (c) 2017
+@contact: henriquemoura@hotmail.com
+@licence: GNU General Public License v2.0
+(https://www.gnu.org/licenses/old-licenses/gpl-2.0.html)
+@since: July 2015
+@status: in development
+
+@requires: construct 2.5.2
+"""
+from collections import deque
+from itertools import count
+from threading import Thread, Lock, Condition
+
+from pox.ethanol.ssl_message.msg_log import log
+
+TELEMETRY_QUEUE_SIZE = 65536
+""" maximum number of reports waiting to be processed"""
+
+TELEMETRY_WORKERS = 2
+""" number of threads that decode and deliver the reports"""
+
+STATISTICS = 'statistics'
+""" name used to subscribe to the statistics reports"""
+
+METRIC = 'metric'
+""" kind of report: MSG_METRIC_RECEIVED"""
+
+STATS_REPORT = 'stats'
+""" kind of report: MSG_MEAN_STA_STATISTICS_REPORT"""
+
+
+class TelemetryDispatcher(object):
+    """ decodes the reports pushed by the agents and delivers them to the devices and subscribers
+    """
+
+    def __init__(self, max_queue=TELEMETRY_QUEUE_SIZE, num_workers=TELEMETRY_WORKERS):
+        """
+          @param max_queue: maximum number of reports waiting in the queue
+          @param num_workers: number of threads that deliver the reports
+        """
+        self.max_queue = max_queue
+        self.num_workers = num_workers
+        self.__cond = Condition(Lock())
+        self.__queue = deque()
+        self.__threads = []
+        self.__ids = count(1)
+        self.__subscribers = {}  # name --> {token: (callback, mac)}
+        self.__counters = {'received': 0,
+                           'delivered': 0,  # reports processed
+                           'dropped': 0,  # reports discarded because the queue was full
+                           'decode_errors': 0,
+                           'unknown_device': 0,  # no device registered for the report
+                           'callback_errors': 0,
+                           'max_queue_length': 0,
+                           }
+
+    def stats(self):
+        """ @return: dictionary with the counters and the current queue length """
+        with self.__cond:
+            d = dict(self.__counters)
+            d['queue_length'] = len(self.__queue)
+        return d
+
+    def __start(self):
+        """ starts the threads (on the first report). must be called holding self.__cond """
+        while len(self.__threads) < self.num_workers:
+            t = Thread(target=self.__worker, name='telemetry')
+            t.daemon = True
+            t.start()
+            self.__threads.append(t)
+
+    def submit(self, kind, received_msg, fromaddr):
+        """ queues a report. does not block: if the queue is full, the oldest report is discarded
+
+            @param kind: METRIC or STATS_REPORT
+            @param received_msg: binary message
+            @param fromaddr: (ip, port) of the agent
+        """
+        with self.__cond:
+            self.__counters['received'] += 1
+            if len(self.__queue) >= self.max_queue:
+                self.__queue.popleft()
+                if self.__counters['dropped'] == 0:
+                    log.warning("telemetry queue is full: discarding the oldest reports")
+                self.__counters['dropped'] += 1
+            self.__queue.append((kind, received_msg, fromaddr))
+            if len(self.__queue) > self.__counters['max_queue_length']:
+                self.__counters['max_queue_length'] = len(self.__queue)
+            if len(self.__threads) < self.num_workers:
+                self.__start()
+            self.__cond.notify()
+
+    def subscribe(self, name, callback, mac=None):
+        """ registers a callback
+
+            @param name: name of a metric (see device.METRIC_TO_SUBSCRIBE) or STATISTICS
+            @param callback: for metrics: callback(mac, metric_name, value)
+                             for STATISTICS: callback(fromaddr, stats), stats is a dictionary intf --> statistics
+            @param mac: receive only the reports of this device (None = all devices)
+            @return: token used by unsubscribe()
+        """
+        token = next(self.__ids)
+        with self.__cond:
+            subscribers = dict(self.__subscribers.get(name, {}))  # copy on write: the workers iterate without lock
+            subscribers[token] = (callback, mac)
+            self.__subscribers[name] = subscribers
+        return token
+
+    def unsubscribe(self, token):
+        """ removes the callback registered with subscribe() """
+        with self.__cond:
+            for name, subscribers in self.__subscribers.items():
+                if token in subscribers:
+                    subscribers = dict(subscribers)
+                    del subscribers[token]
+                    self.__subscribers[name] = subscribers
+                    return True
+        return False
+
+    def __count(self, name):
+        with self.__cond:
+            self.__counters[name] += 1
+
+    def __notify(self, name, mac, *args):
+        for callback, only_mac in self.__subscribers.get(name, {}).values():
+            if only_mac is not None and only_mac != mac:
+                continue
+            try:
+                callback(*args)
+            except Exception as e:
+                self.__count('callback_errors')
+                log.error("Error in telemetry callback for %s: %s", name, e)
+
+    def __process_metric(self, received_msg, fromaddr):
+        from pox.ethanol.ssl_message.msg_metric import msg_metric_received, registered_functions
+        from pox.ethanol.ssl_message.msg_codec import fast
+        from pox.ethanol.ethanol.device import METRIC_TO_SUBSCRIBE
+
+        msg = fast(msg_metric_received.parse)(received_msg)
+        mac = msg['mac_addr']
+        metric, value = msg['metric'], msg['value']
+        name = METRIC_TO_SUBSCRIBE[metric] if 0 <= metric < len(METRIC_TO_SUBSCRIBE) else metric
+        device = registered_functions.get(mac)
+        if device is not None:
+            device.evMetric(metric, value)
+        else:
+            self.__count('unknown_device')
+        self.__notify(name, mac, mac, name, value)
+
+    def __process_stats(self, received_msg, fromaddr):
+        from pox.ethanol.ssl_message.msg_mean_sta_stats import msg_mean_statistics
+        from pox.ethanol.ssl_message.msg_codec import fast
+        from pox.ethanol.ethanol.ap import get_ap_by_ip
+
+        msg = fast(msg_mean_statistics.parse)(received_msg)
+        stats = dict(zip(msg['intf'], msg['mean_net_statistics']))
+        ap = get_ap_by_ip(fromaddr[0])
+        if ap is not None:
+            ap.evInterfaceStats(stats)
+        else:
+            self.__count('unknown_device')
+        self.__notify(STATISTICS, None, fromaddr, stats)
+
+    def __worker(self):
+        while True:
+            with self.__cond:
+                while len(self.__queue) == 0:
+                    self.__cond.wait()
+                kind, received_msg, fromaddr = self.__queue.popleft()
+            try:
+                if kind == METRIC:
+                    self.__process_metric(received_msg, fromaddr)
+                else:
+                    self.__process_stats(received_msg, fromaddr)
+            except Exception as e:
+                self.__count('decode_errors')
+                log.debug("invalid telemetry report from %s: %s", fromaddr, e)
+                continue
+            self.__count('delivered')
+
+
+telemetry = TelemetryDispatcher()
+""" dispatcher used by the controller server"""
+
+
+def process_metric_report(received_msg, fromaddr):
+    """ MSG_METRIC_RECEIVED: queues the report. no reply """
+    telemetry.submit(METRIC, received_msg, fromaddr)
+    return None
+
+
+def process_statistics_report(received_msg, fromaddr):
+    """ MSG_MEAN_STA_STATISTICS_REPORT: queues the report. no reply """
+    telemetry.submit(STATS_REPORT, received_msg, fromaddr)
+    return None